@@ -17,6 +17,7 @@ __author__    =  ('Felix Croes'
 # Import all modules containing rules into the package namespace,
 # so that they become visible to iRODS.
 
+from batch                  import *
 from browse                 import *
 from folder                 import *
 from group                  import *
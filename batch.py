@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Functions for running several API calls in one request."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import time
+from collections import OrderedDict
+
+from util import *
+
+__all__ = ['api_batch']
+
+# Maximum amount of API calls in one batch.
+MAX_BATCH_SIZE = 50
+
+
+@api.make()
+def api_batch(ctx, calls):
+    """Run several API calls in one request.
+
+    Calls are run in order, as the client user, sharing one rule context
+    (and with it the request cache). Each call succeeds or fails
+    independently of the others.
+
+    Example:
+
+        api_batch {"calls": [{"fn": "api_browse_folder", "args": {"coll": "/tempZone/home/research-a"}},
+                             {"fn": "api_meta_form_load", "args": {"coll": "/tempZone/home/research-a"}}]}
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param calls: List of API calls, as objects with the name of the API function ('fn')
+                  and its arguments ('args', optional)
+
+    :returns: List of results, in order of the calls. Each result contains
+              the name of the function, the time it took in milliseconds,
+              and the status, status info and data as returned by the function.
+    """
+    if type(calls) is not list or not all(type(x) is OrderedDict and 'fn' in x for x in calls):
+        return api.Error('badrequest', 'Calls must be a list of objects with a function name')
+
+    if len(calls) > MAX_BATCH_SIZE:
+        return api.Error('badrequest', 'At most {} calls can be batched'.format(MAX_BATCH_SIZE))
+
+    results = []
+    for x in calls:
+        name = x['fn']
+        args = x.get('args', OrderedDict())
+        t    = time.time()
+
+        if name == 'api_batch':
+            result = api.Error('badrequest', 'Batches cannot be nested').as_dict()
+        elif type(args) is not OrderedDict:
+            result = api.Error('badrequest', 'Arguments of <{}> must be an object'.format(name)).as_dict()
+        else:
+            try:
+                result = api.call(ctx, name, args)
+            except KeyError:
+                result = api.Error('badrequest', 'Unknown API function <{}>'.format(name)).as_dict()
+
+        results.append(OrderedDict([('fn',   name),
+                                    ('time', round((time.time() - t) * 1000, 3))] + list(result.items())))
+
+    return results
@@ -4,7 +4,6 @@
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import re
 from collections import OrderedDict
 
 from util import *
@@ -22,7 +21,9 @@ def api_browse_folder(ctx,
                       sort_order='asc',
                       offset=0,
                       limit=10,
-                      space=pathutil.Space.OTHER.value):
+                      space=pathutil.Space.OTHER.value,
+                      cursor=None,
+                      count=True):
     """Get paginated collection contents, including size/modify date information.
 
     :param ctx:        Combined type of a callback and rei struct
@@ -32,22 +33,22 @@ def api_browse_folder(ctx,
     :param offset:     Offset to start browsing from
     :param limit:      Limit number of results
     :param space:      Space the collection is in
+    :param cursor:     Cursor to continue browsing from ('' for the first page), see _cursor_page
+    :param count:      Count the total number of results (with cursor only)
 
     :returns: Dict with paginated collection contents
     """
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        if 'DATA_NAME' in x:
-            return {'name':        x['DATA_NAME'],
+        # Field names of AS_ROW results have ORDER_BY etc. wrappers removed.
+        if 'DATA_NAME' in row._fields:
+            return {'name':        row.DATA_NAME,
                     'type':        'data',
-                    'size':        int(x['DATA_SIZE']),
-                    'modify_time': int(x['DATA_MODIFY_TIME'])}
+                    'size':        int(row.DATA_SIZE),
+                    'modify_time': int(row.DATA_MODIFY_TIME)}
         else:
-            return {'name':        x['COLL_NAME'].split('/')[-1],
+            return {'name':        row.COLL_NAME.split('/')[-1],
                     'type':        'coll',
-                    'modify_time': int(x['COLL_MODIFY_TIME'])}
+                    'modify_time': int(row.COLL_MODIFY_TIME)}
 
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
@@ -71,24 +72,21 @@ def api_browse_folder(ctx,
         dcols = [x.replace('ORDER(', 'ORDER_DESC(') for x in dcols]
 
     zone = user.zone(ctx)
+    ccond = _coll_condition(coll, zone, space)
+
+    if cursor is not None:
+        return _cursor_page(ctx, coll, transform,
+                            [(ccols, ccond, _sort_key('COLL', sort_on), 'COLL_ID'),
+                             (dcols, "COLL_NAME = '{}'".format(coll), _sort_key('DATA', sort_on), 'DATA_ID')],
+                            cursor, limit, sort_order, count)
 
     # We make offset/limit act on two queries at once, placing qdata right after qcoll.
-    if space == str(pathutil.Space.RESEARCH):
-        qcoll = Query(ctx, ccols,
-                      "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll, zone, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
-    elif space == str(pathutil.Space.VAULT):
-        qcoll = Query(ctx, ccols,
-                      "COLL_PARENT_NAME = '{}' AND COLL_NAME like '/{}/home/%vault-%'".format(coll, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
-    else:
-        qcoll = Query(ctx, ccols, "COLL_PARENT_NAME = '{}'".format(coll),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+    qcoll = Query(ctx, ccols, ccond, offset=offset, limit=limit, output=query.AS_ROW)
 
     colls = map(transform, list(qcoll))
 
     qdata = Query(ctx, dcols, "COLL_NAME = '{}'".format(coll),
-                  offset=max(0, offset - qcoll.total_rows()), limit=limit - len(colls), output=query.AS_DICT)
+                  offset=max(0, offset - qcoll.total_rows()), limit=limit - len(colls), output=query.AS_ROW)
     datas = map(transform, list(qdata))
 
     if len(colls) + len(datas) == 0:
@@ -109,7 +107,9 @@ def api_browse_collections(ctx,
                            sort_order='asc',
                            offset=0,
                            limit=10,
-                           space=pathutil.Space.OTHER.value):
+                           space=pathutil.Space.OTHER.value,
+                           cursor=None,
+                           count=True):
     """Get paginated collection contents, including size/modify date information.
 
     This function browses a folder and only looks at the collections in it. No dataobjects.
@@ -122,22 +122,22 @@ def api_browse_collections(ctx,
     :param offset:     Offset to start browsing from
     :param limit:      Limit number of results
     :param space:      Space the collection is in
+    :param cursor:     Cursor to continue browsing from ('' for the first page), see _cursor_page
+    :param count:      Count the total number of results (with cursor only)
 
     :returns: Dict with paginated collection contents
     """
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        if 'DATA_NAME' in x:
-            return {'name':        x['DATA_NAME'],
+        # Field names of AS_ROW results have ORDER_BY etc. wrappers removed.
+        if 'DATA_NAME' in row._fields:
+            return {'name':        row.DATA_NAME,
                     'type':        'data',
-                    'size':        int(x['DATA_SIZE']),
-                    'modify_time': int(x['DATA_MODIFY_TIME'])}
+                    'size':        int(row.DATA_SIZE),
+                    'modify_time': int(row.DATA_MODIFY_TIME)}
         else:
-            return {'name':        x['COLL_NAME'].split('/')[-1],
+            return {'name':        row.COLL_NAME.split('/')[-1],
                     'type':        'coll',
-                    'modify_time': int(x['COLL_MODIFY_TIME'])}
+                    'modify_time': int(row.COLL_MODIFY_TIME)}
 
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
@@ -157,19 +157,14 @@ def api_browse_collections(ctx,
         ccols = [x.replace('ORDER(', 'ORDER_DESC(') for x in ccols]
 
     zone = user.zone(ctx)
+    ccond = _coll_condition(coll, zone, space)
 
-    # We make offset/limit act on two queries at once, placing qdata right after qcoll.
-    if space == str(pathutil.Space.RESEARCH):
-        qcoll = Query(ctx, ccols,
-                      "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll, zone, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
-    elif space == str(pathutil.Space.VAULT):
-        qcoll = Query(ctx, ccols,
-                      "COLL_PARENT_NAME = '{}' AND COLL_NAME like '/{}/home/%vault-%'".format(coll, zone),
-                      offset=offset, limit=limit, output=query.AS_DICT)
-    else:
-        qcoll = Query(ctx, ccols, "COLL_PARENT_NAME = '{}'".format(coll),
-                      offset=offset, limit=limit, output=query.AS_DICT)
+    if cursor is not None:
+        return _cursor_page(ctx, coll, transform,
+                            [(ccols, ccond, _sort_key('COLL', sort_on), 'COLL_ID')],
+                            cursor, limit, sort_order, count)
+
+    qcoll = Query(ctx, ccols, ccond, offset=offset, limit=limit, output=query.AS_ROW)
 
     colls = map(transform, list(qcoll))
 
@@ -184,6 +179,62 @@ def api_browse_collections(ctx,
                         ('items', colls)])
 
 
+def _coll_condition(coll, zone, space):
+    """Get the condition for subcollections of a collection to browse."""
+    if space == str(pathutil.Space.RESEARCH):
+        return "COLL_PARENT_NAME = '{}' AND COLL_NAME not like '/{}/home/vault-%' AND COLL_NAME not like '/{}/home/grp-vault-%'".format(coll, zone, zone)
+    elif space == str(pathutil.Space.VAULT):
+        return "COLL_PARENT_NAME = '{}' AND COLL_NAME like '/{}/home/%vault-%'".format(coll, zone)
+    else:
+        return "COLL_PARENT_NAME = '{}'".format(coll)
+
+
+def _sort_key(typ, sort_on):
+    """Get the column to sort collections ('COLL') or data objects ('DATA') on."""
+    if sort_on == 'modified':
+        return typ + '_MODIFY_TIME'
+    elif sort_on == 'size' and typ == 'DATA':
+        return 'DATA_SIZE'
+    else:
+        return typ + '_NAME'
+
+
+def _cursor_page(ctx, coll, transform, queries, cursor, limit, sort_order, count):
+    """Get a page of browse results using a cursor (keyset pagination).
+
+    Clients pass cursor='' for the first page, and the returned 'next_cursor'
+    for subsequent pages. The last page has no next_cursor. In contrast to
+    pagination with an offset, every page costs the same amount of work.
+    The total is counted on the first page only (if requested), and passed on
+    in the cursor.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param coll:           Collection being browsed, checked for existence if there are no results (optional)
+    :param transform:      Function to transform result rows with
+    :param queries:        List of (columns, conditions, key, tiebreaker), see query.page()
+    :param cursor:         Cursor string
+    :param limit:          Limit number of results
+    :param sort_order:     Column sort order ('asc' or 'desc')
+    :param count:          Count the total number of results
+
+    :returns: Dict with paginated results
+    """
+    try:
+        rows, next_cursor, total = query.paginate(ctx, queries, cursor, limit=int(limit),
+                                                  descending=sort_order == 'desc', count=count)
+    except ValueError:
+        return api.Error('badrequest', 'Invalid cursor')
+
+    if len(rows) == 0 and coll is not None and not cursor:
+        # Make sure the collection actually exists.
+        if not collection.exists(ctx, coll):
+            return api.Error('nonexistent', 'The given path does not exist')
+
+    return OrderedDict([('total',       total),
+                        ('items',       map(transform, rows)),
+                        ('next_cursor', next_cursor)])
+
+
 @api.make()
 def api_search(ctx,
                search_string,
@@ -194,6 +245,9 @@ def api_search(ctx,
                limit=10):
     """Get paginated search results, including size/modify date/location information.
 
+    Search results cannot be paginated with a cursor: searches are case
+    insensitive, whereas GenQuery orders results case sensitively.
+
     :param ctx:           Combined type of a callback and rei struct
     :param search_string: String used to search
     :param search_type:   Search type ('filename', 'folder', 'metadata', 'status')
@@ -205,27 +259,25 @@ def api_search(ctx,
     :returns: Dict with paginated search results
     """
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        if 'DATA_NAME' in x:
-            _, _, path, subpath = pathutil.info(x['COLL_NAME'])
+        # Field names of AS_ROW results have ORDER_BY etc. wrappers removed.
+        if 'DATA_NAME' in row._fields:
+            _, _, path, subpath = pathutil.info(row.COLL_NAME)
             if subpath != '':
                 path = path + "/" + subpath
 
-            return {'name':        "/{}/{}".format(path, x['DATA_NAME']),
+            return {'name':        "/{}/{}".format(path, row.DATA_NAME),
                     'type':        'data',
-                    'size':        int(x['DATA_SIZE']),
-                    'modify_time': int(x['DATA_MODIFY_TIME'])}
+                    'size':        int(row.DATA_SIZE),
+                    'modify_time': int(row.DATA_MODIFY_TIME)}
 
-        if 'COLL_NAME' in x:
-            _, _, path, subpath = pathutil.info(x['COLL_NAME'])
+        if 'COLL_NAME' in row._fields:
+            _, _, path, subpath = pathutil.info(row.COLL_NAME)
             if subpath != '':
                 path = path + "/" + subpath
 
             return {'name':        "/{}".format(path),
                     'type':        'coll',
-                    'modify_time': int(x['COLL_MODIFY_TIME'])}
+                    'modify_time': int(row.COLL_MODIFY_TIME)}
 
     # Replace, %, _ and \ since iRODS does not handle those correctly.
     # HdR this can only be done in a situation where search_type is NOT status!
@@ -265,7 +317,7 @@ def api_search(ctx,
         cols = [x.replace('ORDER(', 'ORDER_DESC(') for x in cols]
 
     qdata = Query(ctx, cols, where, offset=max(0, int(offset)),
-                  limit=int(limit), case_sensitive=False, output=query.AS_DICT)
+                  limit=int(limit), case_sensitive=False, output=query.AS_ROW)
 
     datas = map(transform, list(qdata))
 
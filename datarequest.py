@@ -6,7 +6,6 @@ __license__   = 'GPLv3, see LICENSE'
 __author__    = ('Lazlo Westerhof, Jelmer Zondergeld')
 
 import json
-import re
 from collections import OrderedDict
 from datetime import datetime
 from enum import Enum
@@ -398,7 +397,7 @@ def datarequest_data_valid(ctx, data, schema_name):
 ###################################################
 
 @api.make()
-def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limit=10):
+def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limit=10, cursor=None, count=True):
     """Get paginated datarequests, including size/modify date information.
 
     :param ctx:        Combined type of a callback and rei struct
@@ -406,26 +405,23 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
     :param sort_order: Column sort order ('asc' or 'desc')
     :param offset:     Offset to start browsing from
     :param limit:      Limit number of results
+    :param cursor:     Cursor to continue browsing from ('' for the first page, returns 'next_cursor')
+    :param count:      Count the total number of results (with cursor only)
 
     :returns: Dict with paginated datarequests
     """
     coll = "/{}/{}".format(user.zone(ctx), DRCOLLECTION)
 
     def transform(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        return {'id':          x['COLL_NAME'].split('/')[-1],
-                'name':        x['COLL_OWNER_NAME'],
-                'create_time': int(x['COLL_CREATE_TIME']),
-                'status':      x['META_DATA_ATTR_VALUE']}
+        # Field names of AS_ROW results have ORDER_BY etc. wrappers removed.
+        return {'id':          row.COLL_NAME.split('/')[-1],
+                'name':        row.COLL_OWNER_NAME,
+                'create_time': int(row.COLL_CREATE_TIME),
+                'status':      row.META_DATA_ATTR_VALUE}
 
     def transform_title(row):
-        # Remove ORDER_BY etc. wrappers from column names.
-        x = {re.sub('.*\((.*)\)', '\\1', k): v for k, v in row.items()}
-
-        return {'id':          x['COLL_NAME'].split('/')[-1],
-                'title':       x['META_DATA_ATTR_VALUE']}
+        return {'id':          row.COLL_NAME.split('/')[-1],
+                'title':       row.META_DATA_ATTR_VALUE}
 
     if sort_on == 'modified':
         # FIXME: Sorting on modify date is borked: There appears to be no
@@ -442,12 +438,35 @@ def api_datarequest_browse(ctx, sort_on='name', sort_order='asc', offset=0, limi
     if sort_order == 'desc':
         ccols = [x.replace('ORDER(', 'ORDER_DESC(') for x in ccols]
 
+    if cursor is not None:
+        # Keyset pagination: the next page is selected by the sort key of the last row.
+        try:
+            rows, next_cursor, total = query.paginate(
+                ctx, [(ccols, "COLL_PARENT_NAME = '{}' AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'status'".format(coll, DATAREQUEST + JSON_EXT),
+                       'COLL_CREATE_TIME' if sort_on == 'modified' else 'COLL_NAME', 'COLL_ID')],
+                cursor, limit=int(limit), descending=sort_order == 'desc', count=count)
+        except ValueError:
+            return api.Error('badrequest', 'Invalid cursor')
+
+        colls = map(transform, rows)
+
+        # Get the titles of the datarequests on this page.
+        titles = query.lookup(ctx, 'COLL_NAME', ['{}/{}'.format(coll, x['id']) for x in colls], 'META_DATA_ATTR_VALUE',
+                              "DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'title'".format(DATAREQUEST + JSON_EXT))
+        for datarequest in colls:
+            for title in titles['{}/{}'.format(coll, datarequest['id'])]:
+                datarequest['title'] = title
+
+        return OrderedDict([('total',       total),
+                            ('items',       colls),
+                            ('next_cursor', next_cursor)])
+
     qcoll = Query(ctx, ccols, "COLL_PARENT_NAME = '{}' AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'status'".format(coll, DATAREQUEST + JSON_EXT),
-                  offset=offset, limit=limit, output=query.AS_DICT)
+                  offset=offset, limit=limit, output=query.AS_ROW)
 
     ccols_title = ['COLL_NAME', "META_DATA_ATTR_VALUE"]
     qcoll_title = Query(ctx, ccols_title, "COLL_PARENT_NAME = '{}' AND DATA_NAME = '{}' AND META_DATA_ATTR_NAME = 'title'".format(coll, DATAREQUEST + JSON_EXT),
-                        offset=offset, limit=limit, output=query.AS_DICT)
+                        offset=offset, limit=limit, output=query.AS_ROW)
 
     colls = map(transform, list(qcoll))
     colls_title = map(transform_title, list(qcoll_title))
@@ -199,7 +199,7 @@ def folder_secure(ctx, coll, target):
         try:
             msi.set_acl(ctx, "default", "admin:write", user.full_name(ctx), coll)
         except msi.Error as e:
-            log.write(ctx, "Could not set acl (admin:write) for collection: " + coll)
+            log.error(ctx, "Could not set acl (admin:write) for collection: " + coll)
             return '1'
 
     avu.set_on_coll(ctx, coll, constants.UUORGMETADATAPREFIX + "cronjob_copy_to_vault", constants.CRONJOB_STATE['PROCESSING'])
@@ -221,14 +221,14 @@ def folder_secure(ctx, coll, target):
         try:
             msi.set_acl(ctx, "default", "admin:null", user.full_name(ctx), coll)
         except msi.Error as e:
-            log.write(ctx, "Could not set acl (admin:null) for collection: " + coll)
+            log.error(ctx, "Could not set acl (admin:null) for collection: " + coll)
             return '1'
 
     # Determine vault target if it does not exist.
     if not found:
         target = determine_vault_target(ctx, coll)
         if target == "":
-            log.write(ctx, "folder_secure: No vault target found")
+            log.error(ctx, "folder_secure: No vault target found")
             return '1'
 
         # Create vault target and set status to INCOMPLETE.
@@ -264,7 +264,7 @@ def folder_secure(ctx, coll, target):
 
         if (http_code != "0" and http_code != "200" and http_code != "201"):
             # Something went wrong while registering EPIC PID, set cronjob state to retry.
-            log.write(ctx, "folder_secure: epid pid returned http <{}>".format(http_code))
+            log.warning(ctx, "folder_secure: epid pid returned http <{}>".format(http_code))
             if modify_access != b'\x01':
                 try:
                     msi.set_acl(ctx, "default", "admin:write", user.full_name(ctx), coll)
@@ -278,7 +278,7 @@ def folder_secure(ctx, coll, target):
                 try:
                     msi.set_acl(ctx, "default", "admin:null", user.full_name(ctx), coll)
                 except msi.Error as e:
-                    log.write(ctx, "Could not set acl (admin:null) for collection: " + coll)
+                    log.error(ctx, "Could not set acl (admin:null) for collection: " + coll)
                     return '1'
 
         if http_code != "0":
@@ -288,7 +288,7 @@ def folder_secure(ctx, coll, target):
     # Set vault permissions for new vault package.
     group = collection_group_name(ctx, coll)
     if group == '':
-        log.write(ctx, "folder_secure: Cannot determine which research group <{}> belongs to".format(coll))
+        log.error(ctx, "folder_secure: Cannot determine which research group <{}> belongs to".format(coll))
         return '1'
 
     vault.set_vault_permissions(ctx, group, coll, target)
@@ -298,7 +298,7 @@ def folder_secure(ctx, coll, target):
         try:
             msi.set_acl(ctx, "default", "admin:write", user.full_name(ctx), coll)
         except msi.Error:
-            log.write(ctx, "Could not set acl (admin:write) for collection: " + coll)
+            log.error(ctx, "Could not set acl (admin:write) for collection: " + coll)
             return '1'
 
     avu.set_on_coll(ctx, coll, constants.UUORGMETADATAPREFIX + "cronjob_copy_to_vault", constants.CRONJOB_STATE['OK'])
@@ -307,7 +307,7 @@ def folder_secure(ctx, coll, target):
         try:
             msi.set_acl(ctx, "default", "admin:null", user.full_name(ctx), coll)
         except msi.Error:
-            log.write(ctx, "Could not set acl (admin:null) for collection: " + coll)
+            log.error(ctx, "Could not set acl (admin:null) for collection: " + coll)
             return '1'
 
     # Vault package is ready, set vault package state to UNPUBLISHED.
@@ -317,7 +317,7 @@ def folder_secure(ctx, coll, target):
     try:
         msi.set_acl(ctx, "recursive", "admin:write", user.full_name(ctx), coll)
     except msi.Error:
-        log.write(ctx, "Could not set acl (admin:write) for collection: " + coll)
+        log.error(ctx, "Could not set acl (admin:write) for collection: " + coll)
         return '1'
 
     parent, chopped_coll = pathutil.chop(coll)
@@ -325,7 +325,7 @@ def folder_secure(ctx, coll, target):
         try:
             msi.set_acl(ctx, "default", "admin:write", user.full_name(ctx), parent)
         except msi.Error:
-            log.write(ctx, "Could not set ACL on " + parent)
+            log.error(ctx, "Could not set ACL on " + parent)
         parent, chopped_coll = pathutil.chop(parent)
 
     avu.set_on_coll(ctx, coll, constants.IISTATUSATTRNAME, constants.research_package_state.SECURED)
@@ -333,7 +333,7 @@ def folder_secure(ctx, coll, target):
     try:
         msi.set_acl(ctx, "recursive", "admin:null", user.full_name(ctx), coll)
     except msi.Error:
-        log.write(ctx, "Could not set acl (admin:null) for collection: " + coll)
+        log.error(ctx, "Could not set acl (admin:null) for collection: " + coll)
         return '1'
 
     parent, chopped_coll = pathutil.chop(coll)
@@ -341,7 +341,7 @@ def folder_secure(ctx, coll, target):
         try:
             msi.set_acl(ctx, "default", "admin:null", user.full_name(ctx), parent)
         except msi.Error:
-            log.write(ctx, "Could not set ACL (admin:null) on " + parent)
+            log.error(ctx, "Could not set ACL (admin:null) on " + parent)
 
         parent, chopped_coll = pathutil.chop(parent)
 
@@ -354,7 +354,7 @@ def determine_vault_target(ctx, folder):
 
     group = collection_group_name(ctx, folder)
     if group == '':
-        log.write(ctx, "Cannot determine which research group " + + " ibelongs to")
+        log.error(ctx, "Cannot determine which research group " + folder + " belongs to")
         return ""
 
     parts = group.split('-')
@@ -434,7 +434,8 @@ def get_org_metadata(ctx, path, object_type=pathutil.ObjectType.COLL):
                      "META_{}_ATTR_NAME like '{}%'".format(typ, constants.UUORGMETADATAPREFIX)
                      + (" AND COLL_NAME = '{}' AND DATA_NAME = '{}'".format(*pathutil.chop(path))
                         if object_type is pathutil.ObjectType.DATA
-                        else " AND COLL_NAME = '{}'".format(path)))]
+                        else " AND COLL_NAME = '{}'".format(path)),
+                     cache=True)]
 
 
 def get_locks(ctx, path, org_metadata=None, object_type=pathutil.ObjectType.COLL):
@@ -502,7 +503,7 @@ def get_status(ctx, path, org_metadata=None):
         try:
             return constants.research_package_state(x)
         except Exception as e:
-            log.write(ctx, 'Invalid folder status <{}>'.format(x))
+            log.warning(ctx, 'Invalid folder status <{}>'.format(x))
 
     return constants.research_package_state.FOLDER
 
@@ -61,12 +61,16 @@ iiRevisionCreateAsynchronously(*resource, *path, *maxSize) {
 #      msiDataObjCopy causes a deadlock for files of size
 #      maximum_size_for_single_buffer_in_megabytes (32) or larger due to an iRODS PREP bug.
 #      https://github.com/irods/irods_rule_engine_plugin_python/issues/54
+#      Smaller data objects can also be processed in parallel by the Python
+#      implementation, rule_revision_batch in revisions.py.
 #
 uuRevisionBatch() {
     writeLine("serverLog", "Batch revision job started");
     *count        = 0;
     *countOk      = 0;
     *countIgnored = 0;
+    *countDedup   = 0;
+    *bytesSaved   = double(0);
 
     *attr      = UUORGMETADATAPREFIX ++ "revision_scheduled";
     *errorattr = UUORGMETADATAPREFIX ++ "revision_failed";
@@ -79,7 +83,7 @@ uuRevisionBatch() {
         *path  = *row."COLL_NAME" ++ "/" ++ *row."DATA_NAME";
         *resc  = *row."META_DATA_ATTR_VALUE";
         *size  = *row."DATA_SIZE";
-        *revstatus = errorcode(iiRevisionCreate(*resc, *path, UUMAXREVISIONSIZE, *id));
+        *revstatus = errorcode(iiRevisionCreateOrUpdate(*resc, *path, UUMAXREVISIONSIZE, *id, *deduplicated));
 
         *kv.*attr = *resc;
 
@@ -100,7 +104,10 @@ uuRevisionBatch() {
         }
 
         if (*revstatus == 0) {
-            if (*id != "") {
+            if (*deduplicated) {
+                *countDedup = *countDedup + 1;
+                *bytesSaved = *bytesSaved + double(*size);
+            } else if (*id != "") {
                 writeLine("serverLog", "iiRevisionCreate: Revision created for *path ID=*id");
                 *countOk = *countOk + 1;
             } else {
@@ -131,7 +138,7 @@ uuRevisionBatch() {
         }
     }
 
-    writeLine("serverLog", "Batch revision job finished. " ++ str(*countOk+*countIgnored) ++ "/*count successfully processed, of which *countOk resulted in new revisions");
+    writeLine("serverLog", "Batch revision job finished. " ++ str(*countOk+*countIgnored+*countDedup) ++ "/*count successfully processed, of which *countOk resulted in new revisions and *countDedup were identical to their latest revision (" ++ str(*bytesSaved) ++ " bytes saved)");
 }
 
 # \brief Create a revision of a dataobject in a revision folder.  ## BLIJFT ##
@@ -139,14 +146,36 @@ uuRevisionBatch() {
 # \param[in] resource		resource to retreive original from
 # \param[in] path		path of data object to create a revision for
 # \param[in] maxSize		max size of files in bytes
-# \param[out] id		object id of revision
+# \param[out] id		object id of revision, empty if no revision was created
 #
 iiRevisionCreate(*resource, *path, *maxSize, *id) {
+    iiRevisionCreateOrUpdate(*resource, *path, *maxSize, *id, *deduplicated);
+    if (*deduplicated) {
+        *id = "";
+    }
+}
+
+# \brief Create a revision of a dataobject in a revision folder, unless its content
+#        is identical to the latest revision of the data object.
+#
+#        When the size and checksum of the data object equal those of its latest revision
+#        (e.g. when an editor saved an unchanged file), no copy is made. Instead, the
+#        modification time of the latest revision is updated, and the saved bytes are
+#        counted in metadata on the revision store of the group.
+#
+# \param[in] resource		resource to retreive original from
+# \param[in] path		path of data object to create a revision for
+# \param[in] maxSize		max size of files in bytes
+# \param[out] id		object id of the new or updated revision
+# \param[out] deduplicated	true if the latest revision was updated instead of creating a new revision
+#
+iiRevisionCreateOrUpdate(*resource, *path, *maxSize, *id, *deduplicated) {
     *id = "";
+    *deduplicated = false;
     uuChopPath(*path, *parent, *basename);
     *objectId = 0;
     *found = false;
-    foreach(*row in SELECT DATA_ID, DATA_MODIFY_TIME, DATA_OWNER_NAME, DATA_SIZE, COLL_ID, DATA_RESC_HIER
+    foreach(*row in SELECT DATA_ID, DATA_MODIFY_TIME, DATA_OWNER_NAME, DATA_SIZE, COLL_ID, DATA_RESC_HIER, DATA_REPL_NUM, DATA_CHECKSUM
             WHERE DATA_NAME = *basename AND COLL_NAME = *parent AND DATA_RESC_HIER like '*resource%') {
         if (!*found) {
             *found = true;
@@ -155,6 +184,8 @@ iiRevisionCreate(*resource, *path, *maxSize, *id) {
             *dataSize = *row.DATA_SIZE;
             *collId = *row.COLL_ID;
             *dataOwner = *row.DATA_OWNER_NAME;
+            *replNum = *row.DATA_REPL_NUM;
+            *dataChecksum = *row.DATA_CHECKSUM;
         }
     }
 
@@ -191,6 +222,24 @@ iiRevisionCreate(*resource, *path, *maxSize, *id) {
         # Allow rodsadmin to create subcollections.
         errorcode(msiSetACL("default", "admin:own", "rods#$rodsZoneClient", *revisionStore));
 
+        # Do not store the same content twice: compare with the latest revision of this data object.
+        iiRevisionLatest(*revisionStore, *path, *latestId, *latestPath, *latestSize, *latestChecksum);
+        if (*latestId != "" && *latestChecksum != "" && double(*latestSize) == double(*dataSize)) {
+            if (*dataChecksum == "") {
+                # Only computed for data objects that may be identical to their latest revision,
+                # reading the data object is still cheaper than copying it.
+                if (errorcode(msiDataObjChksum(*path, "replNum=*replNum", *dataChecksum)) < 0) {
+                    *dataChecksum = "";
+                }
+            }
+            if (*dataChecksum == *latestChecksum) {
+                iiRevisionUpdate(*revisionStore, *path, *latestId, *latestPath, *modifyTime, *dataSize);
+                *id = *latestId;
+                *deduplicated = true;
+                succeed;
+            }
+        }
+
         # generate a timestamp in iso8601 format to append to the filename of the revised file.
         msiGetIcatTime(*timestamp, "icat");
         *iso8601 = uuiso8601(*timestamp);
@@ -241,6 +290,14 @@ iiRevisionCreate(*resource, *path, *maxSize, *id) {
             msiAddKeyVal(*revkv, UUORGMETADATAPREFIX ++ "original_filesize", *dataSize);
 
             msiAssociateKeyValuePairsToObj(*revkv, *revPath, "-d");
+
+            # Add revision to the revision index of the group (see revisions.py).
+            *err = errorcode(msi_add_avu("-C", *revisionStore, UUREVISIONINDEX, *path, "*id:*modifyTime:*dataSize"));
+            if (*err < 0) {
+                writeLine("serverLog", "iiRevisionCreate: could not add *revPath to the revision index (*err)");
+            }
+            # Fails if the original path was indexed before.
+            errorcode(msi_add_avu("-C", *revisionStore, UUREVISIONNAMEINDEX, *basename, *path));
         }
     } else {
         writeLine("serverLog", "iiRevisionCreate: *revisionStore does not exists or is inaccessible for current client.");
@@ -249,6 +306,79 @@ iiRevisionCreate(*resource, *path, *maxSize, *id) {
 }
 
 
+# \brief Find the latest revision of a data object.
+#
+# \param[in] revisionStore	revision store of the group of the data object
+# \param[in] path		path of the data object
+# \param[out] id		object id of the latest revision, empty if there is no revision
+# \param[out] revPath		path of the latest revision
+# \param[out] size		size of the latest revision
+# \param[out] checksum		checksum of the latest revision, empty if unknown
+#
+iiRevisionLatest(*revisionStore, *path, *id, *revPath, *size, *checksum) {
+    *id = "";
+    *revPath = "";
+    *size = "0";
+    *checksum = "";
+    *originalPathKey = UUORGMETADATAPREFIX ++ "original_path";
+    foreach(*row in SELECT DATA_ID, COLL_NAME, DATA_NAME, DATA_SIZE, DATA_CHECKSUM
+            WHERE META_DATA_ATTR_NAME = *originalPathKey AND META_DATA_ATTR_VALUE = *path
+              AND COLL_NAME like '*revisionStore/%') {
+        # Revisions are created in order, so the latest revision has the highest object id.
+        *newer = true;
+        if (*id != "") {
+            *newer = double(*row.DATA_ID) > double(*id);
+        }
+        if (*newer) {
+            *id = *row.DATA_ID;
+            *revPath = *row.COLL_NAME ++ "/" ++ *row.DATA_NAME;
+            *size = *row.DATA_SIZE;
+            *checksum = *row.DATA_CHECKSUM;
+        } else if (*row.DATA_ID == *id && *checksum == "") {
+            # Another replica of the latest revision.
+            *checksum = *row.DATA_CHECKSUM;
+        }
+    }
+}
+
+# \brief Update the latest revision of a data object, when the data object was modified
+#        without changing its content.
+#
+# \param[in] revisionStore	revision store of the group of the data object
+# \param[in] path		path of the data object
+# \param[in] id		object id of the latest revision
+# \param[in] revPath		path of the latest revision
+# \param[in] modifyTime	modification time of the data object
+# \param[in] size		size of the data object
+#
+iiRevisionUpdate(*revisionStore, *path, *id, *revPath, *modifyTime, *size) {
+    msiString2KeyValPair(UUORGMETADATAPREFIX ++ "original_modify_time=*modifyTime", *kv);
+    msiSetKeyValuePairsToObj(*kv, *revPath, "-d");
+
+    errorcode(msi_rmw_avu("-C", *revisionStore, UUREVISIONINDEX, "%", "*id:%"));
+    errorcode(msi_add_avu("-C", *revisionStore, UUREVISIONINDEX, *path, "*id:*modifyTime:*size"));
+
+    # Count the deduplicated revisions and saved bytes per group.
+    # The batch workers of rule_revision_batch keep their own counters, with the shard as unit.
+    *count = 1;
+    *bytes = double(*size);
+    *countAttr = UUREVISIONDEDUPCOUNT;
+    *bytesAttr = UUREVISIONDEDUPBYTES;
+    foreach(*row in SELECT META_COLL_ATTR_VALUE WHERE COLL_NAME = *revisionStore AND META_COLL_ATTR_NAME = *countAttr AND META_COLL_ATTR_UNITS = 'rule') {
+        *count = *count + int(*row.META_COLL_ATTR_VALUE);
+    }
+    foreach(*row in SELECT META_COLL_ATTR_VALUE WHERE COLL_NAME = *revisionStore AND META_COLL_ATTR_NAME = *bytesAttr AND META_COLL_ATTR_UNITS = 'rule') {
+        *bytes = *bytes + double(*row.META_COLL_ATTR_VALUE);
+    }
+    errorcode(msi_rmw_avu("-C", *revisionStore, UUREVISIONDEDUPCOUNT, "%", "rule"));
+    errorcode(msi_add_avu("-C", *revisionStore, UUREVISIONDEDUPCOUNT, str(*count), "rule"));
+    errorcode(msi_rmw_avu("-C", *revisionStore, UUREVISIONDEDUPBYTES, "%", "rule"));
+    errorcode(msi_add_avu("-C", *revisionStore, UUREVISIONDEDUPBYTES, str(*bytes), "rule"));
+
+    writeLine("serverLog", "iiRevisionCreate: *path is identical to revision ID=*id, updated its modification time");
+}
+
+
 # \brief Calculate the unix timestamp for the end of the current day (Same as start of next day).   ## KAN WEG ##
 #
 # param[out] endOfCalendarDay		Timestamp of the end of the current day
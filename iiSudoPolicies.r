@@ -12,3 +12,28 @@ acPreSudoObjAclSet(*recursive, *accessLevel, *otherName, *objPath, *policyKv) {
 		iiDatamanagerPreSudoObjAclSet(*recursive, *accessLevel, *otherName, *objPath, *policyKv);
 	}
 }
+
+# This policy override enables policies to maintain the running storage counters of a group,
+# which are reserved for rodsadmin (see py_acPreProcForModifyAVUMetadata).
+# The implementation is redirected to rule_resource_storage_usage_sudo_allowed in resources.py
+acPreSudoObjMetaAdd(*objName, *objType, *attribute, *value, *unit, *policyKv) {
+	ON (*objType == "-C" && *attribute like "org_storage_usage_*") {
+		*allowed = "";
+		rule_resource_storage_usage_sudo_allowed(*objName, *attribute, *allowed);
+		if (*allowed == "true") {
+			succeed;
+		}
+		fail;
+	}
+}
+
+acPreSudoObjMetaRemove(*objName, *objType, *wildcards, *attribute, *value, *unit, *policyKv) {
+	ON (*objType == "-C" && *attribute like "org_storage_usage_*") {
+		*allowed = "";
+		rule_resource_storage_usage_sudo_allowed(*objName, *attribute, *allowed);
+		if (*allowed == "true") {
+			succeed;
+		}
+		fail;
+	}
+}
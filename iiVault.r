@@ -14,78 +14,15 @@
 iiCopyFolderToVault(*folder, *target) {
 
 	writeLine("serverLog", "iiCopyFolderToVault: Copying *folder to *target")
-	*buffer.source = *folder;
-	*buffer.destination = *target ++ "/original";
-	uuTreeWalk("forward", *folder, "iiIngestObject", *buffer, *error);
-	if (*error != 0) {
-		msiGetValByKey(*buffer, "msg", *msg); # using . syntax here lead to type error
-		writeLine("stdout", "iiIngestObject: *error: *msg");
+	*status = "";
+	rule_vault_copy_folder_to_vault(*folder, *target, *status);
+	if (*status != "0") {
+		writeLine("stdout", "iiCopyFolderToVault: Failed to copy *folder to *target");
 		fail;
 	}
 }
 
 
-# \brief Called by uuTreeWalk for each collection and dataobject to copy to the vault.
-#
-# \param[in] itemParent
-# \param[in] itemName
-# \param[in] itemIsCollection
-# \param[in/out] buffer
-# \param[in/out] error
-#
-iiIngestObject(*itemParent, *itemName, *itemIsCollection, *buffer, *error) {
-        writeLine("serverLog", "INGEST OBJECT");
-	*sourcePath = "*itemParent/*itemName";
-	msiCheckAccess(*sourcePath, "read object", *readAccess);
-	if (*readAccess != 1) {
-		*error = errorcode(msiSetACL("default", "admin:read", uuClientFullName, *sourcePath));
-		if (*error < 0) {
-			*buffer.msg = "Failed to acquire read access to *sourcePath";
-			succeed;
-		} else {
-			writeLine("stdout", "iiIngestObject: Read access to *sourcePath acquired");
-		}
-	}
-
-	*destPath = *buffer.destination;
-	if (*sourcePath != *buffer."source") {
-		# rewrite path to copy objects that are located underneath the toplevel collection
-		*sourceLength = strlen(*sourcePath);
-		*relativePath = substr(*sourcePath, strlen(*buffer."source") + 1, *sourceLength);
-		*destPath = *buffer."destination" ++ "/" ++ *relativePath;
-		*markIncomplete = false;
-	} else {
-		*markIncomplete = true;
-	}
-
-	if (*itemIsCollection) {
-		*error = errorcode(msiCollCreate(*destPath, 1, *status));
-		if (*error < 0) {
-			*buffer.msg = "Failed to create collection *destPath";
-		} else if (*markIncomplete) {
-			# The root collection of the vault package is marked incomplete until the last step in FolderSecure
-			*vaultStatus = IIVAULTSTATUSATTRNAME;
-			msiString2KeyValPair("*vaultStatus=" ++ INCOMPLETE, *kvp);
-			msiAssociateKeyValuePairsToObj(*kvp, *destPath, "-C");
-		}
-	} else {
-	    # Copy data object to vault and compute checksum.
-	    *error = errorcode(msiDataObjCopy(*sourcePath, *destPath, "verifyChksum=", *status));
-	    if (*error < 0) {
-		    *buffer.msg = "Failed to copy *sourcePath to *destPath";
-	    }
-	}
-	if (*readAccess != 1) {
-		*error = errorcode(msiSetACL("default", "admin:null", uuClientFullName, *sourcePath));
-		if (*error < 0) {
-			*buffer.msg = "Failed to revoke read access to *sourcePath";
-		} else {
-			writeLine("stdout", "iiIngestObject: Read access to *sourcePath revoked");
-		}
-	}
-}
-
-
 # \brief Called by uuTreeWalk for each collection and dataobject to copy to the research area.
 #
 # \param[in] itemParent
@@ -103,7 +103,7 @@ def api_intake_count_total_files(ctx, coll):
     :returns: Total file count
     """
 
-    log.write(ctx, coll)
+    log.debug(ctx, coll)
     # Include coll name as equal names do occur and genquery delivers distinct results.
     iter = genquery.row_iterator(
         "COLL_NAME, DATA_NAME",
@@ -115,7 +115,7 @@ def api_intake_count_total_files(ctx, coll):
     for row in iter:
         exclusion_matched = any(fnmatch.fnmatch(row[1], p) for p in INTAKE_FILE_EXCLUSION_PATTERNS)
         if not exclusion_matched:
-            log.write(ctx, row[0] + '/' + row[1])
+            log.debug(ctx, '{}/{}', row[0], row[1])
             count += 1
 
     return count
@@ -200,7 +200,7 @@ def api_intake_list_datasets(ctx, coll):
         genquery.AS_LIST, ctx
     )
     for row in iter:
-        log.write(ctx, 'DATASET COLL: ' + row[1])
+        log.debug(ctx, 'DATASET COLL: {}', row[1])
         dataset = get_dataset_details(ctx, row[0], row[1])
         datasets.append(dataset)
 
@@ -211,7 +211,7 @@ def api_intake_list_datasets(ctx, coll):
         genquery.AS_LIST, ctx
     )
     for row in iter:
-        log.write(ctx, 'DATASET DATA: ' + row[1])
+        log.debug(ctx, 'DATASET DATA: {}', row[1])
         dataset = get_dataset_details(ctx, row[0], row[1])
         datasets.append(dataset)
 
@@ -609,85 +609,63 @@ def api_intake_dataset_get_details(ctx, coll, dataset_id):
 
 
 def coll_objects(ctx, level, coll):
-    """Recursive function to pass entire folder/file structure in such that frontend
+    """Pass entire folder/file structure in such that frontend
     can do something useful with it including errors/warnings on object level
 
+    The tree is retrieved with a fixed number of queries: one for all
+    subcollections, two for all data objects and batched lookups of the
+    errors/warnings of the scan process.
+
     :param ctx:   Combined type of a callback and rei struct
     :param level: Level in hierarchy (tree)
     :param coll:  Collection to collect
 
     :returns: Tree of collections and files
     """
-    # First get the sub collections
-    counter = 0
-    files = {}
-
-    # COLLECTIONS
-    iter = genquery.row_iterator(
-        "COLL_NAME, COLL_ID",
-        "COLL_PARENT_NAME = '{}'".format(coll),
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        # files(pathutil.basename(row[0]))
-        node = {}
-        node['name'] = pathutil.basename(row[0])
-        node['isFolder'] = True
-        node['parent_id'] = level
-        warnings = []
-        errors = []
-        # Per collection add errors/warnings from scan process
-        iter2 = genquery.row_iterator(
-            "META_COLL_ATTR_VALUE, META_COLL_ATTR_NAME",
-            "META_COLL_ATTR_NAME in ('warning', 'error') AND COLL_ID = '{}'".format(row[1]),
-            genquery.AS_LIST, ctx
-        )
-        for row2 in iter2:
-            if row[1] == 'error':
-                errors.append(row2[0])
-            else:
-                warnings.append(row2[0])
-        node['errors'] = errors
-        node['warnings'] = warnings
-
-        files[level + "." + str(counter)] = node
-
-        files.update(coll_objects(ctx, level + "." + str(counter), row[0]))
-
-        counter += 1
-
-    # DATA OBJECTS
-    iter = genquery.row_iterator(
-        "DATA_NAME, DATA_ID",
-        "COLL_NAME = '{}'".format(coll),
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        node = {}
-        node['name'] = row[0]
-        node['isFolder'] = False
-        node['parent_id'] = level
-        # Per data object add errors/warnings from scan process
-        iter2 = genquery.row_iterator(
-            "META_DATA_ATTR_VALUE, META_DATA_ATTR_NAME",
-            "META_DATA_ATTR_NAME in ('warning', 'error') AND DATA_ID = '{}'".format(row[1]),
-            genquery.AS_LIST, ctx
-        )
-        warnings = []
-        errors = []
-        for row2 in iter2:
-            if row2[1] == 'error':
-                errors.append(row2[0])
-            else:
-                warnings.append(row2[0])
-        node['errors'] = errors
-        node['warnings'] = warnings
-
-        files[level + "." + str(counter)] = node
-
-        counter += 1
-
-    return files
+    # Subcollections and data objects of the entire tree, by parent collection.
+    colls = {}
+    for name, coll_id, parent in query.Query(ctx, "COLL_NAME, COLL_ID, COLL_PARENT_NAME",
+                                             "COLL_NAME like '{}/%'".format(coll)):
+        colls.setdefault(parent, []).append((name, coll_id))
+
+    datas = {}
+    for condition in ("COLL_NAME = '{}'", "COLL_NAME like '{}/%'"):
+        for name, data_id, parent in query.Query(ctx, "DATA_NAME, DATA_ID, COLL_NAME", condition.format(coll)):
+            datas.setdefault(parent, []).append((name, data_id))
+
+    # Errors/warnings from scan process.
+    coll_messages = query.lookup(ctx, 'COLL_ID', [x[1] for xs in colls.values() for x in xs],
+                                 "META_COLL_ATTR_VALUE, META_COLL_ATTR_NAME",
+                                 "META_COLL_ATTR_NAME in ('warning', 'error')")
+    data_messages = query.lookup(ctx, 'DATA_ID', [x[1] for xs in datas.values() for x in xs],
+                                 "META_DATA_ATTR_VALUE, META_DATA_ATTR_NAME",
+                                 "META_DATA_ATTR_NAME in ('warning', 'error')")
+
+    def node(name, is_folder, parent_id, messages):
+        return {'name':      name,
+                'isFolder':  is_folder,
+                'parent_id': parent_id,
+                'errors':    [value for value, attr in messages if attr == 'error'],
+                'warnings':  [value for value, attr in messages if attr != 'error']}
+
+    def collect(level, coll):
+        files   = {}
+        counter = 0
+
+        # COLLECTIONS
+        for name, coll_id in sorted(colls.get(coll, [])):
+            files[level + "." + str(counter)] = node(pathutil.basename(name), True, level, coll_messages[coll_id])
+            files.update(collect(level + "." + str(counter), name))
+            counter += 1
+
+        # DATA OBJECTS
+        for name, data_id in sorted(datas.get(coll, [])):
+            files[level + "." + str(counter)] = node(name, False, level, data_messages[data_id])
+            counter += 1
+
+        return files
+
+    return collect(level, coll)
 
 
 # Reporting / export functions
@@ -190,36 +190,36 @@ def vault_aggregated_info(ctx, study_id):
                 continue
 
     zone = user.zone(ctx)
-    result = genquery.row_iterator("DATA_NAME, COLL_NAME, DATA_SIZE, COLL_CREATE_TIME",
-                                   "COLL_NAME like '/{}/home/grp-vault-{}%'".format(zone, study_id),
-                                   genquery.AS_LIST, ctx)
-
-    for row in result:
-        coll_name = row[1]
-        data_size = int(row[2])
-        coll_create_time = int(row[3])
-
-        # Check whether the file is part of a dataset.
-        part_of_dataset = False
-        for dataset in dataset_paths:
-            if dataset in coll_name:
-                part_of_dataset = True
-                break
-
-        # File is part of dataset.
-        if part_of_dataset:
-            # version = datasets[dataset]['version']
-
-            if datasets[dataset]['version'].lower() == 'raw':
-                version = 'raw'
-            else:
-                version = 'processed'
+    # DATA_NAME is selected (though not used) so that rows of different files
+    # with the same size in one collection are not merged as duplicates.
+    batches = query.Query(ctx, "DATA_NAME, COLL_NAME, DATA_SIZE, COLL_CREATE_TIME",
+                          "COLL_NAME like '/{}/home/grp-vault-{}%'".format(zone, study_id),
+                          output=query.AS_COLUMNS)
+
+    # Process the (potentially large) result per batch of columns,
+    # instead of allocating a row for every file.
+    for _, coll_names, data_sizes, coll_create_times in batches:
+        for coll_name, data_size, coll_create_time in zip(coll_names, data_sizes, coll_create_times):
+            # Check whether the file is part of a dataset.
+            part_of_dataset = False
+            for dataset in dataset_paths:
+                if dataset in coll_name:
+                    part_of_dataset = True
+                    break
+
+            # File is part of dataset.
+            if part_of_dataset:
+                if datasets[dataset]['version'].lower() == 'raw':
+                    version = 'raw'
+                else:
+                    version = 'processed'
 
-            dataset_file_count[version] += 1
-            dataset_file_size[version] += data_size
+                data_size = int(data_size)
+                dataset_file_count[version] += 1
+                dataset_file_size[version] += data_size
 
-            if coll_create_time - last_month >= 0:
-                dataset_file_growth[version] += data_size
+                if int(coll_create_time) - last_month >= 0:
+                    dataset_file_growth[version] += data_size
 
     return {
         'total': {
@@ -26,7 +26,7 @@ def intake_dataset_treewalk_change_status(ctx, collection, status, timestamp, re
     if remove:
         avu.rmw_from_coll(ctx, collection, status, "%")
     else:
-        log.write(ctx, 'step1 . set_on_col')
+        log.debug(ctx, 'step1 . set_on_col')
         avu.set_on_coll(ctx, collection, status, timestamp)
 
     # 2. Change status on data objects located directly within the collection.
@@ -40,7 +40,7 @@ def intake_dataset_treewalk_change_status(ctx, collection, status, timestamp, re
         if remove:
             avu.rmw_from_data(ctx, "{}/{}".format(collection, row[0]), status, "%")
         else:
-            log.write(ctx, 'step2 . set_on_data')
+            log.debug(ctx, 'step2 . set_on_data')
             avu.set_on_data(ctx, "{}/{}".format(collection, row[0]), status, timestamp)
 
     # 3. Loop through subcollections.
@@ -43,12 +43,12 @@ def intake_scan_collection(ctx, root, scope, in_dataset):
             subscope = intake_extract_tokens_from_name(ctx, row[1], row[0], False, scope)
 
             if intake_tokens_identify_dataset(subscope):
-                log.write(ctx, "IS DATASET")
+                log.debug(ctx, "IS DATASET")
                 # We found a top-level dataset data object.
                 subscope["dataset_directory"] = row[1]
                 apply_dataset_metadata(ctx, path, subscope, False, True)
             else:
-                log.write(ctx, "IS NO DATASET")
+                log.debug(ctx, "IS NO DATASET")
                 apply_partial_metadata(ctx, subscope, path, False)
                 avu.set_on_data(ctx, path, "unrecognized", "Experiment type, wave or pseudocode missing from path")
 
@@ -304,7 +304,7 @@ def remove_dataset_metadata(ctx, path, is_collection):
     for _row in iter:
         for md_key in intake_metadata:
             if is_collection:
-                log.write(ctx, md_key + ' => ' + path)
+                log.debug(ctx, '{} => {}', md_key, path)
                 try:
                     avu.rmw_from_coll(ctx, path, md_key, '%')
                 except Exception as e:
@@ -630,10 +630,10 @@ def intake_check_file_count(ctx, dataset_parent, toplevels, is_collection_toplev
     """
     count = 0
     for path in objects:
-        log.write(ctx, path)
+        log.debug(ctx, path)
         if re.match(pattern_regex, path) is not None:
             count += 1
-            log.write(ctx, '##intake_check_file_count ' + str(count))
+            log.debug(ctx, '##intake_check_file_count {}', count)
 
     # count = count / 2
 
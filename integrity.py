@@ -1,160 +1,146 @@
 # -*- coding: utf-8 -*-
 """Functions for data integrity."""
 
-__copyright__ = 'Copyright (c) 2018-2019, Utrecht University'
+__copyright__ = 'Copyright (c) 2018-2020, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import base64
-import hashlib
-import os.path
+import csv
 import time
-from collections import namedtuple
-from enum import Enum
 
 import session_vars
 
+from integrity_disk import checkDataObject, Status
 from util import *
 
-__all__ = ['rule_integrity_check_vault']
+__all__ = ['rule_integrity_check_vault',
+           'rule_integrity_check_replicas_remote',
+           'rule_integrity_verify_vault',
+           'rule_integrity_verify_remote',
+           'rule_integrity_export_manifest',
+           'rule_integrity_checksum_backfill',
+           'rule_integrity_checksum_remote']
 
 
-DataObject = namedtuple('DataObject', ['id', 'name', 'size', 'checksum', 'coll_name', 'resc_path', 'resc_loc'])
-CHUNK_SIZE = 8192
+# Amount of replicas verified between updates of the verification cursor of a resource.
+VERIFY_BATCH_SIZE = 256
 
+# Every replica must be verified at least once in this period (seconds).
+VERIFY_CYCLE_MAX = 90 * 24 * 3600
 
-class Status(Enum):
-    OK = 0
-    NOT_EXISTING = 1        # File registered in iRODS but not found in vault
-    FILE_SIZE_MISMATCH = 2  # File sizes do not match between database and vault
-    CHECKSUM_MISMATCH = 3   # Checksums do not match between database and vault
-    ACCESS_DENIED = 4       # This script was denied access to the file
-    NO_CHECKSUM = 5         # iRODS has no checksum registered
+# Amount of replicas per range of DATA_IDs written to a manifest at once.
+MANIFEST_RANGE_SIZE = 10000
 
-    def __repr__(self):
-        return self.name
+# Checksum back-fill jobs that have not finished in this period (seconds) are scheduled again,
+# until they have been scheduled this many times.
+CHECKSUM_BACKFILL_JOB_TIMEOUT  = 24 * 3600
+CHECKSUM_BACKFILL_JOB_ATTEMPTS = 3
 
 
-def checkDataObject(file_path, file_size, file_checksum):
-    # Check if file exists in vault.
-    if not os.path.isfile(file_path):
-        return Status.NOT_EXISTING
+def vault_replicas(callback, rods_zone, first_id, last_id, resc_loc):
+    """Get the replicas of vault data objects within a range of DATA_IDs, stored on one resource host.
 
-    # Check if file size matches.
-    if int(file_size) != os.path.getsize(file_path):
-        return Status.FILE_SIZE_MISMATCH
+    :param callback:  Callback to rule Language
+    :param rods_zone: Zone name
+    :param first_id:  First DATA_ID
+    :param last_id:   Last DATA_ID
+    :param resc_loc:  Resource host (RESC_LOC)
 
-    # Check if checksum exists.
-    if not file_checksum:
-        return Status.NO_CHECKSUM
+    :returns: Rows with DATA_ID, DATA_REPL_NUM, DATA_SIZE, DATA_CHECKSUM, DATA_PATH, COLL_NAME and DATA_NAME
+    """
+    return query.Query(callback,
+                       "DATA_ID, DATA_REPL_NUM, DATA_SIZE, DATA_CHECKSUM, DATA_PATH, COLL_NAME, DATA_NAME",
+                       "COLL_NAME like '/{}/home/{}%' AND DATA_ID >= '{}' AND DATA_ID <= '{}' AND RESC_LOC = '{}'"
+                       .format(rods_zone, constants.IIVAULTPREFIX, first_id, last_id, resc_loc),
+                       output=query.AS_ROW)
 
-    # Open file and compute checksum.
-    try:
-        f = open(file_path, 'rb')
-    except OSError as e:
-        return Status.ACCESS_DENIED
-    else:
-        # Determine if checksum is md5 or sha256.
-        if file_checksum.startswith("sha2:"):
-            checksum = file_checksum[5:]
-            hsh = hashlib.sha256()
-        else:
-            checksum = file_checksum
-            hsh = hashlib.md5()
 
-        # Compute checksum.
-        while True:
-            chunk = f.read(CHUNK_SIZE)
-            if chunk:
-                hsh.update(chunk)
-            else:
-                break
+def check_replicas(replicas):
+    """Check the integrity of a list of replicas on the local disk.
 
-        # iRODS stores md5 hashes plain and the sha256 hash base64 encoded.
-        if hsh.name == 'md5':
-            computed_checksum = hsh.digest()
-        else:
-            computed_checksum = base64.b64encode(hsh.digest())
-        f.close()
+    :param replicas: Rows as returned by vault_replicas
 
-    # Check if checksum matches.
-    if checksum != computed_checksum:
-        return Status.CHECKSUM_MISMATCH
+    :returns: List of (replica, Status) tuples
+    """
+    return [(replica, checkDataObject(replica.DATA_PATH, replica.DATA_SIZE, replica.DATA_CHECKSUM))
+            for replica in replicas]
 
-    return Status.OK
 
+@rule.make(inputs=range(4), outputs=[])
+def rule_integrity_check_replicas_remote(ctx, rods_zone, first_id, last_id, resc_loc):
+    """Check integrity of the vault replicas within a range of DATA_IDs on this resource host.
 
-def checkDataObjectRemote(rule_args, callback, rei):
-    file_path = str(rule_args[0])
-    file_size = int(rule_args[1])
-    file_checksum = str(rule_args[2])
+    Called by checkVaultIntegrityBatch with remoteExec, once per host per batch.
+    Failures are logged per replica, followed by one summary line with a count per status.
+    The result of each replica is recorded on its data object, as with
+    scheduled verification (see record_verification).
 
-    status = checkDataObject(file_path, file_size, file_checksum)
+    :param ctx:       Combined type of a callback and rei struct
+    :param rods_zone: Zone name
+    :param first_id:  First DATA_ID
+    :param last_id:   Last DATA_ID
+    :param resc_loc:  Resource host (RESC_LOC) of this server
+    """
+    counts = {}
+    for replica, status in check_replicas(vault_replicas(ctx, rods_zone, first_id, last_id, resc_loc)):
+        counts[status.name] = counts.get(status.name, 0) + 1
+        if status != Status.OK:
+            log.write(ctx, "[INTEGRITY] {}: {}", replica.DATA_PATH, status.name)
+        record_verification(ctx, replica, status)
 
-    if status != Status.OK:
-        log.write(callback, "[INTEGRITY] %s: %s" % (file_path, str(status)))
-
-
-def checkDataObjectIntegrity(callback, data_id):
-    # Obtain all replicas of a data object.
-    iter = genquery.row_iterator(
-        "DATA_ID, DATA_NAME, DATA_SIZE, DATA_CHECKSUM, COLL_NAME, RESC_VAULT_PATH, RESC_LOC",
-        "DATA_ID = '%s'" % data_id,
-        genquery.AS_LIST, callback
-    )
-
-    # Loop through all replicas.
-    for row in iter:
-        data_object = DataObject._make([row[0], row[1], row[2],
-                                        row[3], row[4], row[5],
-                                        row[6]])
-
-        # Build file path to data object.
-        coll_name = os.path.join(*(data_object.coll_name.split(os.path.sep)[2:]))
-        file_path = data_object.resc_path + "/" + coll_name + "/" + data_object.name
-
-        # Check integrity on the resource.
-        remote_rule = "checkDataObjectRemote('%s', '%s', '%s')" % \
-                      (file_path.replace("'", "\\'"), data_object.size, data_object.checksum)
-        callback.remoteExec(
-            "%s" % data_object.resc_loc,
-            "",
-            remote_rule,
-            ""
-        )
+    log.write(ctx, "[INTEGRITY] DATA_ID {}-{} on {}: {}",
+              first_id, last_id, resc_loc, jsonutil.dump(counts, sort_keys=True))
 
 
 def checkVaultIntegrityBatch(callback, rods_zone, data_id, batch, pause):
-    """Check integrity of one batch of data objects in the vault."""
+    """Check integrity of one batch of data objects in the vault.
+
+    A batch consists of consecutive data objects, starting at data_id, until
+    a resource host holds `batch` replicas. The replicas on each host are
+    checked by that host with one remote call.
+
+    :param callback:  Callback to rule Language
+    :param rods_zone: Zone name
+    :param data_id:   First DATA_ID to check
+    :param batch:     Maximum amount of replicas per resource host
+    :param pause:     Pause between remote calls in seconds
+
+    :returns: First DATA_ID of the next batch, or 0 if all data has been checked
+    """
+    per_host = {}
+    last_id  = None
+    next_id  = 0
+
     # Go through data in the vault, ordered by DATA_ID.
-    iter = genquery.row_iterator(
-        "ORDER(DATA_ID)",
-        "DATA_ID >= '%d'" % (data_id),
-        genquery.AS_LIST, callback
-    )
-
-    # Check each data object in batch.
-    for row in iter:
-        data_id = int(row[0])
-        checkDataObjectIntegrity(callback, data_id)
-
-        # Sleep briefly between checks.
+    for row in query.Query(callback,
+                           "ORDER(DATA_ID), DATA_REPL_NUM, RESC_LOC",
+                           "COLL_NAME like '/{}/home/{}%' AND DATA_ID >= '{}'"
+                           .format(rods_zone, constants.IIVAULTPREFIX, data_id)):
+        # Never split the replicas of one data object over two batches.
+        if int(row[0]) != last_id and max(per_host.values() or [0]) >= batch:
+            next_id = int(row[0])
+            break
+
+        last_id = int(row[0])
+        per_host[row[2]] = per_host.get(row[2], 0) + 1
+
+    for resc_loc in sorted(per_host):
+        callback.remoteExec(resc_loc, "",
+                            "rule_integrity_check_replicas_remote('{}', '{}', '{}', '{}')"
+                            .format(rods_zone, data_id, last_id, resc_loc),
+                            "")
+
+        # Sleep briefly between hosts.
         time.sleep(pause)
 
-        # The next data object to check must have a higher DATA_ID.
-        data_id = data_id + 1
-    else:
-        # All done.
-        data_id = 0
-
-    return data_id
+    return next_id
 
 
 def rule_integrity_check_vault(rule_args, callback, rei):
     """Check integrity of all data objects in the vault.
 
     :param rule_args: [0] first DATA_ID to check
-                      [1] batch size, <= 256
-                      [2] pause between checks (float)
+                      [1] batch size: maximum amount of replicas per resource host
+                      [2] pause between remote calls (float)
                       [3] delay between batches in seconds
     :param callback:  Callback to rule Language
     :param rei:       The rei struct
@@ -174,3 +160,393 @@ def rule_integrity_check_vault(rule_args, callback, rei):
             "<PLUSET>%ds</PLUSET>" % delay,
             "rule_integrity_check_vault('%d', '%d', '%f', '%d')" % (data_id, batch, pause, delay),
             "")
+
+
+# Scheduled verification {{{
+
+# Vault replicas are verified in cycles per resource, in order of DATA_ID.
+# Each resource has a cursor (the last DATA_ID verified in the current
+# cycle), so that a run continues where the previous run stopped, and the
+# replicas after the cursor are always the least recently verified ones.
+# When the cursor reaches the end, a new cycle starts at the beginning.
+# The time and result of the last verification of each replica is kept in
+# metadata on its data object.
+
+
+def record_verification(ctx, replica, status):
+    """Record the time and result of the verification of a replica on its data object.
+
+    :param ctx:     Combined type of a callback and rei struct
+    :param replica: Row with DATA_REPL_NUM, COLL_NAME and DATA_NAME
+    :param status:  Status of the replica
+    """
+    path = replica.COLL_NAME + '/' + replica.DATA_NAME
+    try:
+        avu.rmw_from_data(ctx, path, constants.UUINTEGRITYVERIFIED, '%', replica.DATA_REPL_NUM)
+        msi.add_avu(ctx, '-d', path, constants.UUINTEGRITYVERIFIED,
+                    '{}:{}'.format(int(time.time()), status.name), replica.DATA_REPL_NUM)
+    except msi.Error as e:
+        log.warning(ctx, "Could not record integrity verification of <{}>: {}", path, e)
+
+
+def verify_replica(ctx, replica):
+    """Verify one replica on the local disk and record the result.
+
+    :param ctx:     Combined type of a callback and rei struct
+    :param replica: Row with DATA_ID, DATA_REPL_NUM, DATA_SIZE, DATA_CHECKSUM, DATA_PATH, COLL_NAME and DATA_NAME
+
+    :returns: Status of the replica
+    """
+    status = checkDataObject(replica.DATA_PATH, replica.DATA_SIZE, replica.DATA_CHECKSUM)
+    if status != Status.OK:
+        log.write(ctx, "[INTEGRITY] {}: {}", replica.DATA_PATH, status.name)
+
+    record_verification(ctx, replica, status)
+    return status
+
+
+def verify_resource(ctx, rods_zone, resource, bytes_per_second, deadline):
+    """Verify vault replicas on a resource, continuing at its cursor, within a budget.
+
+    :param ctx:              Combined type of a callback and rei struct
+    :param rods_zone:        Zone name
+    :param resource:         Resource name
+    :param bytes_per_second: Maximum average rate at which replicas are read (0 for unlimited)
+    :param deadline:         Time at which to stop verifying
+
+    :returns: Tuple of the amount of verified replicas and bytes
+    """
+    ledger = dict(query.Query(ctx, "META_RESC_ATTR_NAME, META_RESC_ATTR_VALUE",
+                              "RESC_NAME = '{}' AND META_RESC_ATTR_NAME in ('{}', '{}')"
+                              .format(resource, constants.UUINTEGRITYCURSOR, constants.UUINTEGRITYCYCLESTART)))
+    cursor = int(ledger.get(constants.UUINTEGRITYCURSOR, 0))
+    if constants.UUINTEGRITYCYCLESTART not in ledger:
+        ledger[constants.UUINTEGRITYCYCLESTART] = str(int(time.time()))
+        avu.set_on_resource(ctx, resource, constants.UUINTEGRITYCYCLESTART, ledger[constants.UUINTEGRITYCYCLESTART])
+
+    start = time.time()
+    count = 0
+    size  = 0
+    while time.time() < deadline:
+        replicas = list(query.Query(ctx,
+                                    "ORDER(DATA_ID), DATA_REPL_NUM, DATA_SIZE, DATA_CHECKSUM, DATA_PATH, COLL_NAME, DATA_NAME",
+                                    "COLL_NAME like '/{}/home/{}%' AND DATA_ID > '{}' AND RESC_NAME = '{}'"
+                                    .format(rods_zone, constants.IIVAULTPREFIX, cursor, resource),
+                                    limit=VERIFY_BATCH_SIZE, output=query.AS_ROW))
+        if not replicas:
+            # Cycle complete, the next run starts a new one.
+            now   = int(time.time())
+            began = int(ledger[constants.UUINTEGRITYCYCLESTART])
+            if now - began > VERIFY_CYCLE_MAX:
+                log.warning(ctx, "Integrity verification cycle of <{}> took {} days, increase its budget",
+                            resource, (now - began) // 86400)
+            log.write(ctx, "[INTEGRITY] Verification cycle of <{}> complete", resource)
+            avu.set_on_resource(ctx, resource, constants.UUINTEGRITYCYCLESTART, str(now))
+            avu.set_on_resource(ctx, resource, constants.UUINTEGRITYCURSOR, '0')
+            break
+
+        for replica in replicas:
+            if time.time() >= deadline:
+                break
+            verify_replica(ctx, replica)
+            count += 1
+            size  += int(replica.DATA_SIZE)
+            cursor = int(replica.DATA_ID)
+
+            # Throttle to the maximum average read rate.
+            if bytes_per_second:
+                ahead = float(size) / bytes_per_second - (time.time() - start)
+                if ahead > 0:
+                    time.sleep(min(ahead, max(0, deadline - time.time())))
+
+        # Never restart from zero: remember where we are after every batch.
+        avu.set_on_resource(ctx, resource, constants.UUINTEGRITYCURSOR, str(cursor))
+
+    return count, size
+
+
+@rule.make(inputs=range(4), outputs=[])
+def rule_integrity_verify_remote(ctx, rods_zone, resc_loc, bytes_per_second, max_seconds):
+    """Verify the least recently verified vault replicas on the resources of this host, within a budget.
+
+    The budget is divided over the resources on the host, which are verified
+    in turn, starting with the resource whose cycle started longest ago.
+    Time left by a resource is available to the resources after it.
+
+    :param ctx:              Combined type of a callback and rei struct
+    :param rods_zone:        Zone name
+    :param resc_loc:         Resource host (RESC_LOC) of this server
+    :param bytes_per_second: Maximum average rate at which replicas are read (0 for unlimited)
+    :param max_seconds:      Maximum duration of this run in seconds
+    """
+    deadline = time.time() + float(max_seconds)
+
+    # Resources that never started a cycle go first.
+    started   = dict(query.Query(ctx, "RESC_NAME, META_RESC_ATTR_VALUE",
+                                 "RESC_LOC = '{}' AND META_RESC_ATTR_NAME = '{}'"
+                                 .format(resc_loc, constants.UUINTEGRITYCYCLESTART)))
+    resources = sorted(query.Query(ctx, "RESC_NAME", "RESC_LOC = '{}'".format(resc_loc)),
+                       key=lambda resource: (int(started.get(resource, 0)), resource))
+
+    for i, resource in enumerate(resources):
+        now = time.time()
+        if now >= deadline:
+            break
+        share = now + (deadline - now) / (len(resources) - i)
+        count, size = verify_resource(ctx, rods_zone, resource, int(bytes_per_second), share)
+        log.write(ctx, "[INTEGRITY] Verified {} replicas ({} bytes) on <{}>", count, size, resource)
+
+
+@rule.make(inputs=range(2), outputs=[])
+def rule_integrity_verify_vault(ctx, bytes_per_second, max_seconds):
+    """Schedule verification of the least recently verified vault replicas on all resource hosts.
+
+    Each host verifies its own replicas, in parallel, within a read rate and wall-clock budget.
+
+    :param ctx:              Combined type of a callback and rei struct
+    :param bytes_per_second: Maximum average rate at which each host reads replicas (0 for unlimited)
+    :param max_seconds:      Maximum duration of the verification on each host in seconds
+    """
+    rods_zone = user.zone(ctx)
+    for resc_loc in list(query.Query(ctx, "RESC_LOC", "RESC_LOC != 'EMPTY_RESC_HOST'")):
+        ctx.delayExec("<PLUSET>1s</PLUSET>",
+                      "remoteExec('{}', '', \"rule_integrity_verify_remote('{}', '{}', '{}', '{}')\", '')"
+                      .format(resc_loc, rods_zone, resc_loc, int(bytes_per_second), int(max_seconds)),
+                      "")
+
+# }}}
+
+
+# Checksum back-fill {{{
+
+# Replicas without a catalog checksum (Status.NO_CHECKSUM) cannot be verified.
+# The back-fill goes through research and vault data objects in chunks,
+# ordered by DATA_ID. The replicas without checksum in a chunk are
+# checksummed by the host that stores them, by a configurable amount of
+# parallel jobs per host. The last DATA_ID scheduled is kept as a cursor on
+# the system collection, so that an interrupted back-fill continues where it
+# stopped. Jobs that do not finish (e.g. because their host is down) are
+# scheduled again after a timeout, a limited amount of times.
+
+
+def checksum_condition(rods_zone):
+    """Condition for data objects in research and vault groups."""
+    return ("COLL_NAME like '/{0}/home/{1}%' || like '/{0}/home/{2}%'"
+            .format(rods_zone, constants.IIGROUPPREFIX, constants.IIVAULTPREFIX))
+
+
+def checksum_backfill_job(resc_loc, first_id, last_id):
+    """Name of a checksum back-fill job, as registered on the system collection while it is unfinished."""
+    return '{}:{}-{}'.format(resc_loc, first_id, last_id)
+
+
+def checksum_backfill_schedule(ctx, rods_zone, job, attempt):
+    """Schedule a checksum back-fill job on its host, and register it on the system collection.
+
+    The job is registered with '<attempt>:<time scheduled>' as unit.
+
+    :param ctx:       Combined type of a callback and rei struct
+    :param rods_zone: Zone name
+    :param job:       Name of the job, see checksum_backfill_job
+    :param attempt:   Amount of times the job has been scheduled, including this time
+    """
+    resc_loc, ids = job.rsplit(':', 1)
+    first, last   = ids.split('-')
+    msi.add_avu(ctx, '-C', '/{}{}'.format(rods_zone, constants.UUSYSTEMCOLLECTION), constants.UUCHECKSUMBACKFILLJOB,
+                job, '{}:{}'.format(attempt, int(time.time())))
+    ctx.delayExec("<PLUSET>1s</PLUSET>",
+                  "remoteExec('{}', '', \"rule_integrity_checksum_remote('{}', '{}', '{}', '{}')\", '')"
+                  .format(resc_loc, rods_zone, first, last, resc_loc),
+                  "")
+
+
+def checksum_backfill_chunk(ctx, rods_zone, data_id, chunk_size, workers):
+    """Schedule checksumming of the replicas without checksum in one chunk of data objects.
+
+    A chunk consists of consecutive data objects after data_id, until it
+    holds `chunk_size` replicas. The replicas without checksum on each host
+    are divided over `workers` jobs on that host, by DATA_ID range.
+    Every job is registered on the system collection until it is finished.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param rods_zone:  Zone name
+    :param data_id:    Last DATA_ID of the previous chunk
+    :param chunk_size: Amount of replicas per chunk
+    :param workers:    Amount of parallel jobs per resource host
+
+    :returns: Tuple of the last DATA_ID of this chunk (0 if all data objects have been scheduled)
+              and the amount of jobs scheduled
+    """
+    per_host = {}
+    jobs     = 0
+    count    = 0
+    last_id  = 0
+
+    for row in query.Query(ctx, "ORDER(DATA_ID), DATA_CHECKSUM, RESC_LOC",
+                           "{} AND DATA_ID > '{}'".format(checksum_condition(rods_zone), data_id)):
+        # Never split the replicas of one data object over two chunks.
+        if int(row[0]) != last_id and count >= chunk_size:
+            break
+
+        last_id = int(row[0])
+        count  += 1
+        if not row[1]:
+            ids = per_host.setdefault(row[2], [])
+            if not ids or ids[-1] != last_id:
+                ids.append(last_id)
+
+    for resc_loc, ids in sorted(per_host.items()):
+        size = -(-len(ids) // workers)
+        for i in range(0, len(ids), size):
+            first, last = ids[i], ids[min(i + size, len(ids)) - 1]
+            checksum_backfill_schedule(ctx, rods_zone, checksum_backfill_job(resc_loc, first, last), 1)
+            jobs += 1
+
+    return last_id, jobs
+
+
+@rule.make(inputs=range(3), outputs=[])
+def rule_integrity_checksum_backfill(ctx, chunk_size, workers, delay):
+    """Checksum research and vault replicas without catalog checksum, one chunk at a time.
+
+    Each run checks whether the jobs of the previous chunk have finished.
+    If so, the cursor is moved past that chunk and the jobs of the next chunk
+    are scheduled. Chunks without replicas to checksum are passed at once.
+    Either way, the next run is scheduled after a delay.
+
+    Jobs that have not finished within CHECKSUM_BACKFILL_JOB_TIMEOUT are
+    scheduled again, up to CHECKSUM_BACKFILL_JOB_ATTEMPTS times. After that,
+    they are given up on and their replicas are left without checksum.
+    Checksums are computed with the hash scheme configured on the server
+    (default_hash_scheme: MD5 or SHA256).
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param chunk_size: Amount of replicas per chunk
+    :param workers:    Amount of parallel jobs per resource host
+    :param delay:      Delay between runs in seconds
+    """
+    rods_zone = user.zone(ctx)
+    system    = '/{}{}'.format(rods_zone, constants.UUSYSTEMCOLLECTION)
+    state     = {}
+    for attr, value, unit in query.Query(ctx, "META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE, META_COLL_ATTR_UNITS",
+                                         "COLL_NAME = '{}' AND META_COLL_ATTR_NAME in ('{}', '{}', '{}')"
+                                         .format(system, constants.UUCHECKSUMBACKFILLCURSOR,
+                                                 constants.UUCHECKSUMBACKFILLCHUNK, constants.UUCHECKSUMBACKFILLJOB)):
+        state.setdefault(attr, []).append(value if attr != constants.UUCHECKSUMBACKFILLJOB else (value, unit))
+
+    rerun = ("rule_integrity_checksum_backfill('{}', '{}', '{}')"
+             .format(int(chunk_size), int(workers), int(delay)))
+
+    pending = []
+    for job, unit in state.get(constants.UUCHECKSUMBACKFILLJOB, []):
+        try:
+            attempt, scheduled = map(int, unit.split(':'))
+        except ValueError:
+            # Registered without schedule time.
+            attempt, scheduled = 1, 0
+
+        if time.time() - scheduled < CHECKSUM_BACKFILL_JOB_TIMEOUT:
+            pending.append(job)
+            continue
+
+        avu.rmw_from_coll(ctx, system, constants.UUCHECKSUMBACKFILLJOB, job, '%')
+        if attempt < CHECKSUM_BACKFILL_JOB_ATTEMPTS:
+            log.warning(ctx, "[CHECKSUM] Job {} did not finish, scheduling it again", job)
+            checksum_backfill_schedule(ctx, rods_zone, job, attempt + 1)
+            pending.append(job)
+        else:
+            log.error(ctx, "[CHECKSUM] Job {} did not finish after {} attempts, its replicas are left without checksum",
+                      job, attempt)
+
+    if pending:
+        log.write(ctx, "[CHECKSUM] Checksum back-fill waiting for {} jobs: {}", len(pending), ', '.join(sorted(pending)))
+        ctx.delayExec("<PLUSET>{}s</PLUSET>".format(int(delay)), rerun, "")
+        return
+
+    # All jobs of the chunk in progress have finished.
+    cursor = state.get(constants.UUCHECKSUMBACKFILLCURSOR, ['0'])[0]
+    if constants.UUCHECKSUMBACKFILLCHUNK in state:
+        cursor = state[constants.UUCHECKSUMBACKFILLCHUNK][0]
+        avu.set_on_coll(ctx, system, constants.UUCHECKSUMBACKFILLCURSOR, cursor)
+        avu.rmw_from_coll(ctx, system, constants.UUCHECKSUMBACKFILLCHUNK, '%')
+
+    while True:
+        last_id, jobs = checksum_backfill_chunk(ctx, rods_zone, int(cursor), int(chunk_size), max(1, int(workers)))
+        if last_id == 0 or jobs:
+            break
+        # No replicas to checksum in this chunk, there is nothing to wait for.
+        cursor = last_id
+
+    if last_id == 0:
+        log.write(ctx, "[CHECKSUM] Checksum back-fill complete")
+    else:
+        avu.set_on_coll(ctx, system, constants.UUCHECKSUMBACKFILLCHUNK, str(last_id))
+        log.write(ctx, "[CHECKSUM] Checksum back-fill scheduled up to DATA_ID {}", last_id)
+        ctx.delayExec("<PLUSET>{}s</PLUSET>".format(int(delay)), rerun, "")
+
+
+@rule.make(inputs=range(4), outputs=[])
+def rule_integrity_checksum_remote(ctx, rods_zone, first_id, last_id, resc_loc):
+    """Checksum the research and vault replicas without checksum within a range of DATA_IDs on this host.
+
+    The job is unregistered when it has finished, see checksum_backfill_chunk.
+
+    :param ctx:       Combined type of a callback and rei struct
+    :param rods_zone: Zone name
+    :param first_id:  First DATA_ID
+    :param last_id:   Last DATA_ID
+    :param resc_loc:  Resource host (RESC_LOC) of this server
+    """
+    count  = 0
+    failed = 0
+    for replica in list(query.Query(ctx, "DATA_ID, DATA_REPL_NUM, DATA_CHECKSUM, COLL_NAME, DATA_NAME",
+                                    "{} AND DATA_ID >= '{}' AND DATA_ID <= '{}' AND RESC_LOC = '{}'"
+                                    .format(checksum_condition(rods_zone), first_id, last_id, resc_loc),
+                                    output=query.AS_ROW)):
+        if replica.DATA_CHECKSUM:
+            continue
+
+        path = replica.COLL_NAME + '/' + replica.DATA_NAME
+        try:
+            msi.data_obj_chksum(ctx, path, 'replNum=' + replica.DATA_REPL_NUM, '')
+            count += 1
+        except msi.Error as e:
+            log.warning(ctx, "Could not checksum replica {} of <{}>: {}", replica.DATA_REPL_NUM, path, e)
+            failed += 1
+
+    log.write(ctx, "[CHECKSUM] DATA_ID {}-{} on {}: {} replicas checksummed, {} failed",
+              first_id, last_id, resc_loc, count, failed)
+
+    avu.rmw_from_coll(ctx, '/{}{}'.format(rods_zone, constants.UUSYSTEMCOLLECTION),
+                      constants.UUCHECKSUMBACKFILLJOB, checksum_backfill_job(resc_loc, first_id, last_id), '%')
+
+# }}}
+
+
+@rule.make(inputs=range(2), outputs=[])
+def rule_integrity_export_manifest(ctx, resource, manifest):
+    """Export a manifest of the vault replicas on a resource as a CSV file, for tools/integrity-audit.py.
+
+    Each line holds the physical path, size and checksum of one replica.
+    Replicas are queried and written in ranges of DATA_IDs. The file is
+    written on the server that runs the rule.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param resource: Resource name
+    :param manifest: Path of the manifest file
+    """
+    count = 0
+    after = None
+    with open(manifest, 'w') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        while True:
+            replicas, after, _ = query.page(ctx, ["DATA_PATH", "DATA_SIZE", "DATA_CHECKSUM"],
+                                            "COLL_NAME like '/{}/home/{}%' AND RESC_NAME = '{}'"
+                                            .format(user.zone(ctx), constants.IIVAULTPREFIX, resource),
+                                            'DATA_ID', 'DATA_REPL_NUM', after=after, limit=MANIFEST_RANGE_SIZE)
+            writer.writerows((x.DATA_PATH, x.DATA_SIZE, x.DATA_CHECKSUM) for x in replicas)
+            count += len(replicas)
+            if after is None:
+                break
+
+    log.write(ctx, "[INTEGRITY] Exported manifest of {} replicas on <{}> to {}", count, resource, manifest)
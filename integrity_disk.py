@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Integrity checks of replicas on disk.
+
+This module has no iRODS dependencies, so that it can also be used outside
+of iRODS, by tools/integrity-audit.py on resource servers.
+"""
+
+__copyright__ = 'Copyright (c) 2018-2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import base64
+import hashlib
+import os
+from enum import Enum
+
+# Hashing large files is I/O bound: read in large chunks to keep the number
+# of system calls (and Python overhead per call) low.
+CHUNK_SIZE = 1024 * 1024
+
+
+class Status(Enum):
+    OK = 0
+    NOT_EXISTING = 1        # File registered in iRODS but not found in vault
+    FILE_SIZE_MISMATCH = 2  # File sizes do not match between database and vault
+    CHECKSUM_MISMATCH = 3   # Checksums do not match between database and vault
+    ACCESS_DENIED = 4       # This script was denied access to the file
+    NO_CHECKSUM = 5         # iRODS has no checksum registered
+
+    def __repr__(self):
+        return self.name
+
+
+def hash_file(file_path, hsh, chunk_size=CHUNK_SIZE):
+    """Feed the contents of a file to a hash object.
+
+    Where available (Python 3), the kernel is advised that the file is read
+    sequentially, and that its pages are not needed in the page cache afterwards.
+
+    :param file_path:  Path of the file
+    :param hsh:        hashlib hash object
+    :param chunk_size: Amount of bytes to read at once
+
+    :returns: The hash object
+    """
+    with open(file_path, 'rb', 0) as f:
+        advise = getattr(os, 'posix_fadvise', None)
+        if advise:
+            advise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                hsh.update(chunk)
+            else:
+                break
+
+        if advise:
+            advise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+    return hsh
+
+
+def checkDataObject(file_path, file_size, file_checksum, chunk_size=CHUNK_SIZE):
+    # Check if file exists in vault.
+    if not os.path.isfile(file_path):
+        return Status.NOT_EXISTING
+
+    # Check if file size matches.
+    if int(file_size) != os.path.getsize(file_path):
+        return Status.FILE_SIZE_MISMATCH
+
+    # Check if checksum exists.
+    if not file_checksum:
+        return Status.NO_CHECKSUM
+
+    # Determine if checksum is md5 or sha256.
+    sha2 = file_checksum.startswith("sha2:")
+    if sha2:
+        checksum = file_checksum[5:]
+        hsh = hashlib.sha256()
+    else:
+        checksum = file_checksum
+        hsh = hashlib.md5()
+
+    # Open file and compute checksum.
+    try:
+        hash_file(file_path, hsh, chunk_size)
+    except (IOError, OSError):
+        return Status.ACCESS_DENIED
+
+    # iRODS stores md5 hashes plain and the sha256 hash base64 encoded.
+    if sha2:
+        computed_checksum = base64.b64encode(hsh.digest()).decode('ascii')
+    else:
+        computed_checksum = hsh.hexdigest()
+
+    # Check if checksum matches.
+    if checksum != computed_checksum:
+        return Status.CHECKSUM_MISMATCH
+
+    return Status.OK
@@ -38,7 +38,7 @@ def send(ctx, to, actor, subject, body):
         return api.Error('not_allowed', 'Only rodsadmin can send mail')
 
     if '@' not in to:
-        log.write(ctx, '[EMAIL] Ignoring invalid destination <{}>'.format(to))
+        log.warning(ctx, '[EMAIL] Ignoring invalid destination <{}>'.format(to))
         return  # Silently ignore obviously invalid destinations (mimic old behavior).
 
     log.write(ctx, '[EMAIL] Sending mail for <{}> to <{}>, subject <{}>'.format(actor, to, subject))
@@ -61,7 +61,7 @@ def send(ctx, to, actor, subject, body):
         port = int(port or (465 if proto == 'smtps' else 587))
 
     except Exception as e:
-        log.write(ctx, '[EMAIL] Configuration error: ' + str(e))
+        log.error(ctx, '[EMAIL] Configuration error: ' + str(e))
         return api.Error('internal', 'Mail configuration error')
 
     try:
@@ -72,14 +72,14 @@ def send(ctx, to, actor, subject, body):
             smtp.starttls()
 
     except Exception as e:
-        log.write(ctx, '[EMAIL] Could not connect to mail server at {}://{}:{}: {}'.format(proto, host, port, e))
+        log.error(ctx, '[EMAIL] Could not connect to mail server at {}://{}:{}: {}'.format(proto, host, port, e))
         return api.Error('internal', 'Mail configuration error')
 
     try:
         smtp.login(cfg['username'], cfg['password'])
 
     except Exception as e:
-        log.write(ctx, '[EMAIL] Could not login to mail server with configured credentials')
+        log.error(ctx, '[EMAIL] Could not login to mail server with configured credentials')
         return api.Error('internal', 'Mail configuration error')
 
     fmt_addr = '{} <{}>'.format
@@ -94,7 +94,7 @@ def send(ctx, to, actor, subject, body):
     try:
         smtp.sendmail(cfg['from'], [to], msg.as_string())
     except Exception as e:
-        log.write(ctx, '[EMAIL] Could not send mail: {}'.format(e))
+        log.error(ctx, '[EMAIL] Could not send mail: {}'.format(e))
         return api.Error('internal', 'Mail configuration error')
 
     try:
@@ -278,11 +278,11 @@ def ingest_metadata_research(ctx, path):
     try:
         metadata = jsonutil.read(ctx, path)
     except error.UUError as e:
-        log.write(ctx, 'ingest_metadata_research failed: Could not read {} as JSON'.format(path))
+        log.error(ctx, 'ingest_metadata_research failed: Could not read {} as JSON'.format(path))
         return
 
     if not is_json_metadata_valid(ctx, path, metadata, ignore_required=True):
-        log.write(ctx, 'ingest_metadata_research failed: {} is invalid'.format(path))
+        log.error(ctx, 'ingest_metadata_research failed: {} is invalid'.format(path))
         return
 
     # Remove any remaining legacy XML-style AVUs.
@@ -328,7 +328,7 @@ def ingest_metadata_vault(ctx, path):
     try:
         metadata = jsonutil.read(ctx, path)
     except error.UUError as e:
-        log.write(ctx, 'ingest_metadata_vault failed: Could not read {} as JSON'.format(path))
+        log.error(ctx, 'ingest_metadata_vault failed: Could not read {} as JSON'.format(path))
         return
 
     # Remove any remaining legacy XML-style AVUs.
@@ -372,7 +372,7 @@ def rule_meta_datamanager_vault_ingest(rule_args, callback, rei):
     def set_result(msg_short, msg_long):
         rule_args[1:3] = msg_short, msg_long
         if msg_short != 'Success':
-            log.write(callback, 'rule_meta_datamanager_vault_ingest failed: {}'.format(msg_long))
+            log.error(callback, 'rule_meta_datamanager_vault_ingest failed: {}'.format(msg_long))
         return
 
     # Parse path to JSON object.
@@ -518,4 +518,4 @@ def copy_user_metadata(ctx, source, target):
 
         log.write(ctx, "rule_copy_user_metadata: copied user metadata from <{}> to <{}>".format(source, target))
     except Exception:
-        log.write(ctx, "rule_copy_user_metadata: failed to copy user metadata from <{}> to <{}>".format(source, target))
+        log.error(ctx, "rule_copy_user_metadata: failed to copy user metadata from <{}> to <{}>".format(source, target))
@@ -221,7 +221,7 @@ def api_meta_form_load(ctx, coll):
                         return api.Error('validation', 'The metadata file is not compliant with the schema.',
                                          data={'errors': errors})
                 except Exception as e:
-                    log.write(ctx, 'Unknown error while validating <{}> against schema id <{}>: {}'
+                    log.error(ctx, 'Unknown error while validating <{}> against schema id <{}>: {}'
                               .format(meta_path, current_schema_id, str(e)))
                     return api.Error('internal', 'The metadata file is could not be validated due to an internal error.')
                 else:
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Offline execution of ruleset rules and APIs against a SQLite catalog.
+
+This package allows running Python rules and APIs of this ruleset without an
+iRODS server, for profiling and benchmarking purposes. It provides:
+
+- catalog:  a SQLite database with a subset of the iRODS catalog
+- sql:      GenQuery to SQL translation
+- callback: an offline rule engine callback implementing the used microservices
+- shim:     replacements for the irods_types, session_vars and genquery modules
+- zone:     a generator for synthetic zones of configurable size
+- run:      a command line tool to run a rule or API against a catalog
+
+Example:
+
+    import offline
+    offline.install()
+
+    session = offline.Session(offline.catalog.Catalog('zone.db'), user='researcher0')
+    print(session.api('api_browse_folder', coll='/tempZone/home/research-group0'))
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import importlib
+import json
+import os
+import sys
+
+OFFLINE_DIR = os.path.dirname(os.path.abspath(__file__))
+RULESET_DIR = os.path.dirname(OFFLINE_DIR)
+SHIM_DIR    = os.path.join(OFFLINE_DIR, 'shim')
+
+# Ruleset modules containing rules, as imported by the ruleset's __init__.py.
+MODULES = ['batch', 'browse', 'folder', 'group', 'integrity', 'json_datacite41', 'json_landing_page',
+           'mail', 'meta', 'meta_form', 'provenance', 'research', 'resources', 'schema',
+           'schema_transformation', 'schema_transformations', 'vault', 'vault_xml_to_json',
+           'datacite', 'epic', 'publication', 'policies', 'revisions', 'datarequest', 'intake']
+
+
+def install():
+    """Make the ruleset and the offline irods module replacements importable."""
+    for path in (RULESET_DIR, SHIM_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+install()
+
+from . import callback  # noqa: E402
+from . import catalog   # noqa: E402
+
+
+class Session(object):
+    """A client session: runs rules and APIs as a given user.
+
+    :param catalog: Catalog to operate on
+    :param user:    Name of the client user
+    :param zone:    Zone of the client user (defaults to the catalog zone)
+    :param modules: Ruleset modules to look up rules in
+    """
+
+    def __init__(self, catalog, user='rods', zone=None, modules=MODULES):
+        self.catalog  = catalog
+        self.modules  = [importlib.import_module(m) for m in modules]
+        self.callback = callback.Callback(catalog, user, zone, resolve=self.find)
+        self.rei      = callback.Rei(user, self.callback.zone,
+                                     catalog.scalar('SELECT user_type_name FROM r_user_main'
+                                                    ' WHERE user_name = ? AND zone_name = ?',
+                                                    (user, self.callback.zone)) or 'rodsuser')
+        self.callback.rei = self.rei
+
+    @property
+    def ctx(self):
+        """A rule context, as passed to Python rules."""
+        from util import rule
+        return rule.Context(self.callback, self.rei)
+
+    def find(self, name):
+        """Find a rule by name, returns None if it does not exist."""
+        for m in self.modules:
+            f = getattr(m, name, None)
+            if callable(f):
+                return f
+        return None
+
+    def _get(self, name):
+        f = self.find(name)
+        if f is None:
+            raise KeyError('No rule or API named <{}>'.format(name))
+        return f
+
+    def rule(self, name, *args):
+        """Call a rule, returns the (modified) rule arguments."""
+        rule_args = list(args)
+        self._get(name)(rule_args, self.callback, self.rei)
+        return rule_args
+
+    def api(self, name, **kwargs):
+        """Call an API function, returns its decoded JSON result."""
+        out = self.callback.output['stdout']
+        del out[:]
+        self._get(name)([json.dumps(kwargs)], self.callback, self.rei)
+        return json.loads(''.join(out))
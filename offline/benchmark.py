@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite for the most frequently used APIs, run against an offline catalog.
+
+For every scenario, the wall time, the number of GenQuery executions,
+msiGetMoreRows round-trips, rows transferred from the catalog and peak memory
+are reported. Results are written as JSON, and can be compared with the
+results of an earlier run to catch regressions in query counts (e.g. N+1
+query patterns) between releases.
+
+Usage:
+
+    python -m offline.benchmark zone.db --output results.json
+    python -m offline.benchmark --objects 100000 --compare previous.json
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from . import catalog as icat
+from . import Session
+from . import zone
+
+# Counters (from Callback.stats) reported per scenario.
+COUNTERS = ['genquery_executions', 'msiGetMoreRows', 'rows_transferred']
+
+
+class Scenario(object):
+    """A benchmarked API call.
+
+    :param name: Scenario name
+    :param api:  API function name
+    :param user: Function (catalog => user name) determining the client user
+    :param args: Function (catalog => dict) determining the API arguments
+    """
+
+    def __init__(self, name, api, user, args):
+        self.name = name
+        self.api  = api
+        self.user = user
+        self.args = args
+
+
+def _research_user(cat):
+    return 'researcher0-0'
+
+
+def _intake_user(cat):
+    return cat.scalar("SELECT user_name FROM r_user_main WHERE user_name LIKE 'intake-researcher%'"
+                      ' ORDER BY user_name LIMIT 1')
+
+
+def _largest_research_coll(cat):
+    return cat.scalar('SELECT c.coll_name FROM r_coll_main c JOIN r_data_main d ON d.coll_id = c.coll_id'
+                      ' WHERE c.coll_name LIKE ? GROUP BY c.coll_name ORDER BY COUNT(*) DESC LIMIT 1',
+                      ('/{}/home/research-group0/%'.format(cat.zone),))
+
+
+def _last_page(cat):
+    coll  = _largest_research_coll(cat)
+    count = cat.scalar('SELECT COUNT(DISTINCT d.data_id) FROM r_data_main d JOIN r_coll_main c ON c.coll_id = d.coll_id'
+                       ' WHERE c.coll_name = ?', (coll,))
+    return {'coll': coll, 'offset': max(0, count - 10), 'limit': 10}
+
+
+def _vault_package(cat):
+    return cat.scalar('SELECT coll_name FROM r_coll_main WHERE parent_coll_name = ? ORDER BY coll_name LIMIT 1',
+                      ('/{}/home/vault-group0'.format(cat.zone),))
+
+
+def _intake_dataset(cat):
+    root, dataset_id = cat.execute("SELECT c.parent_coll_name, m.meta_attr_value FROM r_coll_main c"
+                                   ' JOIN r_objt_metamap mm ON mm.object_id = c.coll_id'
+                                   ' JOIN r_meta_main m ON m.meta_id = mm.meta_id'
+                                   " WHERE m.meta_attr_name = 'dataset_toplevel'"
+                                   ' ORDER BY c.coll_name LIMIT 1').fetchone()
+    return {'coll': root, 'dataset_id': dataset_id}
+
+
+SCENARIOS = [
+    Scenario('browse_folder', 'api_browse_folder', _research_user,
+             lambda cat: {'coll': _largest_research_coll(cat), 'offset': 0, 'limit': 10}),
+    Scenario('browse_folder_last_page', 'api_browse_folder', _research_user, _last_page),
+    Scenario('search_filename', 'api_search', _research_user,
+             lambda cat: {'search_string': 'file1', 'search_type': 'filename', 'offset': 0, 'limit': 10}),
+    Scenario('meta_form_load', 'api_meta_form_load', _research_user,
+             lambda cat: {'coll': '/{}/home/research-group0'.format(cat.zone)}),
+    Scenario('vault_system_metadata', 'api_vault_system_metadata', _research_user,
+             lambda cat: {'coll': _vault_package(cat)}),
+    Scenario('revisions_search_on_filename', 'api_revisions_search_on_filename', _research_user,
+             lambda cat: {'searchString': 'file1', 'offset': 0, 'limit': 10}),
+    Scenario('group_data', 'api_group_data', _research_user,
+             lambda cat: {}),
+    Scenario('intake_dataset_get_details', 'api_intake_dataset_get_details', _intake_user,
+             _intake_dataset),
+    Scenario('batch_folder_page', 'api_batch', _research_user,
+             lambda cat: {'calls': [{'fn': 'api_browse_folder',
+                                     'args': {'coll': _largest_research_coll(cat), 'offset': 0, 'limit': 10}},
+                                    {'fn': 'api_meta_form_load',
+                                     'args': {'coll': '/{}/home/research-group0'.format(cat.zone)}},
+                                    {'fn': 'api_group_data', 'args': {}}]}),
+]
+
+
+class PeakMemory(object):
+    """Measures peak memory usage (in KiB) of a block of code.
+
+    Uses tracemalloc where available (Python 3), otherwise the resident set
+    size high water mark on Linux, which can be reset via /proc.
+    On other platforms, the process-wide maximum RSS is reported.
+    """
+
+    def __enter__(self):
+        gc.collect()
+        self.peak = None
+        try:
+            import tracemalloc
+            tracemalloc.start()
+            self.mode = 'tracemalloc'
+        except ImportError:
+            try:
+                with open('/proc/self/clear_refs', 'w') as f:
+                    f.write('5')
+                self.base = self._proc_status('VmRSS')
+                self.mode = 'vmhwm'
+            except (IOError, OSError):
+                self.mode = 'maxrss'
+        return self
+
+    @staticmethod
+    def _proc_status(key):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1])
+
+    def __exit__(self, *exc):
+        if self.mode == 'tracemalloc':
+            import tracemalloc
+            self.peak = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+        elif self.mode == 'vmhwm':
+            self.peak = self._proc_status('VmHWM') - self.base
+        else:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_scenario(cat, scenario, repeat=5):
+    """Run a scenario a number of times.
+
+    Query counts are taken from the first run. Memory is measured on a separate run.
+
+    :returns: Dict with results
+    """
+    session = Session(cat, user=scenario.user(cat))
+    args    = scenario.args(cat)
+
+    times = []
+    for i in range(repeat):
+        session.callback.reset_stats()
+        start  = time.time()
+        result = session.api(scenario.api, **args)
+        times.append(time.time() - start)
+        if i == 0:
+            stats = dict(session.callback.stats)
+
+    with PeakMemory() as mem:
+        session.api(scenario.api, **args)
+
+    times.sort()
+    return OrderedDict([('api',    scenario.api),
+                        ('args',   args),
+                        ('status', result.get('status')),
+                        ('wall_time_ms', OrderedDict([('min',    round(times[0] * 1000, 3)),
+                                                      ('median', round(times[len(times) // 2] * 1000, 3)),
+                                                      ('max',    round(times[-1] * 1000, 3))])),
+                        ('peak_memory_kib', mem.peak),
+                        ('peak_memory_mode', mem.mode)]
+                       + [(c, stats.get(c, 0)) for c in COUNTERS]
+                       + [('msi_calls', OrderedDict(sorted((k, v) for k, v in stats.items() if k not in COUNTERS)))])
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(cat, scenarios=SCENARIOS, repeat=5, only=None):
+    """Run benchmark scenarios on a catalog, returns a JSON-serializable report."""
+    results = OrderedDict()
+    for s in scenarios:
+        if only and s.name not in only:
+            continue
+        results[s.name] = run_scenario(cat, s, repeat)
+
+    return OrderedDict([('meta', OrderedDict([('time',     time.strftime('%Y-%m-%dT%H:%M:%S')),
+                                              ('revision', _git_revision()),
+                                              ('python',   platform.python_version()),
+                                              ('repeat',   repeat),
+                                              ('data_objects', cat.scalar('SELECT COUNT(DISTINCT data_id)'
+                                                                          ' FROM r_data_main')),
+                                              ('collections',  cat.scalar('SELECT COUNT(*) FROM r_coll_main'))])),
+                        ('results', results)])
+
+
+def compare(old, new, tolerance=0.0):
+    """Compare query counters of two reports.
+
+    :returns: List of (scenario, counter, old value, new value) for every counter that increased
+    """
+    regressions = []
+    for name, r in new['results'].items():
+        if name not in old['results']:
+            continue
+        for c in COUNTERS:
+            before, after = old['results'][name].get(c, 0), r.get(c, 0)
+            if after > before * (1 + tolerance):
+                regressions.append((name, c, before, after))
+    return regressions
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description='Benchmark API calls against an offline catalog.')
+    p.add_argument('database', nargs='?', help='SQLite database file (see offline.zone),'
+                                               ' a temporary zone is generated when omitted')
+    p.add_argument('--objects', type=int, default=10000, help='size of the generated zone')
+    p.add_argument('--groups',  type=int, default=5, help='research groups in the generated zone')
+    p.add_argument('--repeat',  type=int, default=5)
+    p.add_argument('--scenario', action='append', help='only run the given scenario(s)')
+    p.add_argument('--output',  help='write results to this JSON file')
+    p.add_argument('--compare', help='compare query counters with an earlier JSON result file')
+    p.add_argument('--tolerance', type=float, default=0.0,
+                   help='allowed relative increase of counters when comparing')
+    a = p.parse_args(args)
+
+    if a.database:
+        cat = icat.Catalog(a.database)
+    else:
+        cat = icat.Catalog(os.path.join(tempfile.mkdtemp(), 'zone.db'))
+        zone.generate(cat, objects=a.objects, groups=a.groups)
+
+    report = run(cat, repeat=a.repeat, only=a.scenario)
+
+    for name, r in report['results'].items():
+        sys.stderr.write('{:32} {:>6} {:10.1f}ms {:6} queries {:5} more-rows {:8} rows {:8} KiB\n'
+                         .format(name, r['status'], r['wall_time_ms']['median'], r['genquery_executions'],
+                                 r['msiGetMoreRows'], r['rows_transferred'], r['peak_memory_kib']))
+
+    if a.output:
+        with open(a.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if a.compare:
+        with open(a.compare) as f:
+            regressions = compare(json.load(f), report, a.tolerance)
+        for r in regressions:
+            sys.stderr.write('REGRESSION {}: {} increased from {} to {}\n'.format(*r))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,700 @@
+# -*- coding: utf-8 -*-
+"""Offline stand-in for the iRODS rule engine callback and rei.
+
+The Callback implements the microservices used by this ruleset on top of an
+offline Catalog. GenQuery microservices follow the iRODS server semantics,
+including batching via maxRows and continueInx, and the agent's statement
+table limit. Permissions are checked by msiCheckAccess only; other
+microservices do not enforce ACLs.
+
+Failing microservices raise RuntimeError, as the Python rule engine does.
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import base64
+import hashlib
+import itertools
+import time
+from collections import defaultdict
+
+import irods_types
+
+from . import catalog as icat
+from . import sql
+
+# Maximum amount of concurrently open GenQuery statements per agent.
+MAX_NUMBER_OF_CONCURRENT_STATEMENTS = 50
+
+# Error codes, see irods: lib/core/include/rodsErrorTable.h
+OVERWRITE_WITHOUT_FORCE_FLAG            = -312000
+OBJ_PATH_DOES_NOT_EXIST                 = -358000
+CAT_STATEMENT_TABLE_FULL                = -806000
+CAT_SUCCESS_BUT_WITH_NO_INFO            = -807000
+CAT_NO_ROWS_FOUND                       = -808000
+CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME   = -809000
+CAT_UNKNOWN_COLLECTION                  = -814000
+CAT_UNKNOWN_FILE                        = -817000
+CAT_INVALID_ARGUMENT                    = -816000
+NO_RULE_OR_MSI_FUNCTION_FOUND_ERR       = -1090000
+ACTION_FAILED_ERR                       = -1097000
+SYS_DELETE_DISALLOWED                   = -1101000
+
+
+class IrodsError(RuntimeError):
+    """A microservice failure, carrying its iRODS error code."""
+
+    def __init__(self, code, message):
+        super(IrodsError, self).__init__('[{}] {}'.format(code, message))
+        self.code = code
+
+
+def _result(*args):
+    return {'status': True, 'code': 0, 'arguments': list(args)}
+
+
+def _options(s):
+    """Parse a microservice option string (k=v++++k2=v2) into a dict."""
+    return dict((kv.partition('=')[0], kv.partition('=')[2]) for kv in s.split('++++') if kv)
+
+
+def _checksum(content):
+    return 'sha2:' + base64.b64encode(hashlib.sha256(content).digest()).decode('ascii')
+
+
+def _bytes(data):
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+def _str(x):
+    return '' if x is None else str(x)
+
+
+class _Statement(object):
+    """An open GenQuery statement: a snapshot of the result rows and a read position."""
+
+    __slots__ = ('rows', 'pos')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.pos  = 0
+
+
+class Rei(object):
+    """Rule execution info: carries the session variables of the client."""
+
+    def __init__(self, user_name, zone, user_type='rodsuser'):
+        client = {'user_name':  user_name,
+                  'irods_zone': zone,
+                  'user_type':  user_type}
+        self.session_vars = {'client_user': client,
+                             'proxy_user':  dict(client)}
+
+
+class Callback(object):
+    """Offline rule engine callback.
+
+    :param catalog:          Catalog to operate on
+    :param user:             Name of the client user
+    :param zone:             Zone of the client user (defaults to the catalog zone)
+    :param default_resource: Resource on which new data objects are created
+    :param resolve:          Optional function (name => Python rule or None) used to
+                             call Python rules and APIs through the callback
+    """
+
+    def __init__(self, catalog, user='rods', zone=None, default_resource='irodsResc', resolve=None):
+        self.catalog          = catalog
+        self.user             = user
+        self.zone             = zone or catalog.zone
+        self.default_resource = default_resource
+        self.resolve          = resolve
+        self.rei              = None
+
+        self.statements = {}
+        self.handles    = {}
+        self.output     = defaultdict(list)
+        self.delayed    = []
+        self.remote     = []
+        self.stats      = defaultdict(int)
+
+        self._fds = itertools.count(3)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        if name in RULES:
+            handler = RULES[name]
+            return lambda *args: self._call(name, handler, args)
+
+        f = self.resolve(name) if self.resolve is not None else None
+        if f is None:
+            def missing(*args):
+                raise IrodsError(NO_RULE_OR_MSI_FUNCTION_FOUND_ERR,
+                                 'No rule or microservice named <{}> available offline'.format(name))
+            return missing
+
+        def python_rule(*args):
+            self.stats[name] += 1
+            rule_args = list(args)
+            f(rule_args, self, self.rei)
+            return _result(*rule_args)
+        return python_rule
+
+    def _call(self, name, handler, args):
+        self.stats[name] += 1
+        return handler(self, *args)
+
+    def reset_stats(self):
+        self.stats.clear()
+
+    # GenQuery {{{
+
+    def _select(self, select, condition, options=0):
+        """Run a query on behalf of a rule language foreach loop, returns all rows."""
+        sql_, args, _ = sql.translate(select, condition, options)
+        rows = [tuple(_str(x) for x in r) for r in self.catalog.execute(sql_, args)]
+        self.stats['genquery_executions'] += 1
+        self.stats['rows_transferred']    += len(rows)
+        return rows
+
+    def _fill(self, gqi, gqo, idx, stmt):
+        """Fill a GenQueryOut with the next batch of rows of a statement."""
+        n     = gqi.maxRows
+        batch = stmt.rows[stmt.pos:stmt.pos + n] if n > 0 else []
+        stmt.pos += len(batch)
+
+        gqo.rowCnt    = len(batch)
+        gqo.sqlResult = [irods_types.SqlResult(c) for c in zip(*batch)] if batch \
+            else [irods_types.SqlResult(()) for _ in range(gqo.attriCnt)]
+
+        self.stats['rows_transferred'] += len(batch)
+
+        # As in iRODS, the statement stays open when a full batch was returned,
+        # even if no more rows are available.
+        if n > 0 and len(batch) == n and not gqi.options & sql.AUTO_CLOSE:
+            self.statements[idx] = stmt
+            gqo.continueInx = idx
+        else:
+            self.statements.pop(idx, None)
+            gqo.continueInx = 0
+        return gqo
+
+    def msiMakeGenQuery(self, select, condition, gqi):
+        self.stats['msiMakeGenQuery'] += 1
+        sql.parse_select(select)
+        sql.parse_conditions(condition)
+        gqi.selectInp  = select
+        gqi.sqlCondInp = condition
+        gqi.maxRows    = sql.MAX_SQL_ROWS
+        return _result(select, condition, gqi)
+
+    def msiExecGenQuery(self, gqi, gqo):
+        self.stats['msiExecGenQuery'] += 1
+        self.stats['genquery_executions'] += 1
+
+        idx = next((i for i in range(1, MAX_NUMBER_OF_CONCURRENT_STATEMENTS + 1)
+                    if i not in self.statements), None)
+        if idx is None:
+            raise IrodsError(CAT_STATEMENT_TABLE_FULL, 'CAT_STATEMENT_TABLE_FULL')
+
+        sql_, args, count_sql = sql.translate(gqi.selectInp, gqi.sqlCondInp, gqi.options)
+
+        gqo.attriCnt      = len(sql.parse_select(gqi.selectInp))
+        gqo.totalRowCount = 0
+        if gqi.options & sql.RETURN_TOTAL_ROW_COUNT:
+            gqo.totalRowCount = self.catalog.scalar(count_sql, args)
+
+        if gqi.maxRows > 0:
+            # Results are snapshotted, as with a PostgreSQL cursor.
+            cur  = self.catalog.execute(sql_ + ' LIMIT -1 OFFSET ?', args + [gqi.rowOffset])
+            rows = [tuple(_str(x) for x in r) for r in cur]
+        else:
+            rows = []
+
+        self._fill(gqi, gqo, idx, _Statement(rows))
+        return _result(gqi, gqo)
+
+    def msiGetMoreRows(self, gqi, gqo, cti):
+        self.stats['msiGetMoreRows'] += 1
+        idx  = gqo.continueInx
+        stmt = self.statements.get(idx) if idx > 0 else None
+        if stmt is None:
+            gqo.rowCnt      = 0
+            gqo.continueInx = 0
+            gqo.sqlResult   = []
+            return _result(gqi, gqo, 0)
+        self._fill(gqi, gqo, idx, stmt)
+        return _result(gqi, gqo, gqo.continueInx)
+
+    def msiCloseGenQuery(self, gqi, gqo):
+        self.stats['msiCloseGenQuery'] += 1
+        self.statements.pop(gqo.continueInx, None)
+        gqo.continueInx = 0
+        return _result(gqi, gqo)
+
+    def msiGetContInxFromGenQueryOut(self, gqo, cti):
+        return _result(gqo, gqo.continueInx)
+
+    # }}}
+    # Metadata {{{
+
+    def _object_id(self, path, object_type):
+        object_type = object_type.replace('-c', '-C').replace('-r', '-R')
+        oid = self.catalog.object_id(path, object_type)
+        if oid is None:
+            raise IrodsError(CAT_UNKNOWN_FILE if object_type == '-d' else CAT_UNKNOWN_COLLECTION,
+                             'Object <{}> of type {} does not exist'.format(path, object_type))
+        return oid
+
+    def msiString2KeyValPair(self, s, kvp):
+        self.stats['msiString2KeyValPair'] += 1
+        kvp = irods_types.KeyValPair()
+        for item in s.split('%'):
+            if item:
+                k, _, v = item.partition('=')
+                kvp.add(k, v)
+        return _result(s, kvp)
+
+    def msiAddKeyVal(self, kvp, key, value):
+        self.stats['msiAddKeyVal'] += 1
+        if not isinstance(kvp, irods_types.KeyValPair):
+            kvp = irods_types.KeyValPair()
+        kvp.add(key, value)
+        return _result(kvp, key, value)
+
+    def msiSetKeyValuePairsToObj(self, kvp, path, object_type):
+        self.stats['msiSetKeyValuePairsToObj'] += 1
+        oid = self._object_id(path, object_type)
+        for k, v in zip(kvp.key, kvp.value):
+            self.catalog.remove_avus(oid, k)
+            self.catalog.add_avu(oid, k, v)
+        return _result(kvp, path, object_type)
+
+    def msiAssociateKeyValuePairsToObj(self, kvp, path, object_type):
+        self.stats['msiAssociateKeyValuePairsToObj'] += 1
+        oid = self._object_id(path, object_type)
+        for k, v in zip(kvp.key, kvp.value):
+            if self.catalog.scalar('SELECT 1 FROM r_objt_metamap mm JOIN r_meta_main m ON m.meta_id = mm.meta_id'
+                                   " WHERE mm.object_id = ? AND m.meta_attr_name = ? AND m.meta_attr_value = ?"
+                                   " AND m.meta_attr_unit = ''", (oid, k, v)):
+                raise IrodsError(CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME,
+                                 'AVU <{}={}> already exists on <{}>'.format(k, v, path))
+            self.catalog.add_avu(oid, k, v)
+        return _result(kvp, path, object_type)
+
+    def msiRemoveKeyValuePairsFromObj(self, kvp, path, object_type):
+        self.stats['msiRemoveKeyValuePairsFromObj'] += 1
+        oid = self._object_id(path, object_type)
+        for k, v in zip(kvp.key, kvp.value):
+            self.catalog.remove_avus(oid, k, v)
+        return _result(kvp, path, object_type)
+
+    def msi_add_avu(self, object_type, path, a, v, u):
+        self.stats['msi_add_avu'] += 1
+        self.catalog.add_avu(self._object_id(path, object_type), a, v, u)
+        return _result(object_type, path, a, v, u)
+
+    def msi_rmw_avu(self, object_type, path, a, v, u):
+        self.stats['msi_rmw_avu'] += 1
+        self.catalog.remove_avus(self._object_id(path, object_type), a, v, u or None, wildcards=True)
+        return _result(object_type, path, a, v, u)
+
+    def msiSudoObjMetaAdd(self, path, object_type, a, v, u, policy_kv):
+        self.stats['msiSudoObjMetaAdd'] += 1
+        oid = self._object_id(path, object_type)
+        if self.catalog.scalar('SELECT 1 FROM r_objt_metamap mm JOIN r_meta_main m ON m.meta_id = mm.meta_id'
+                               ' WHERE mm.object_id = ? AND m.meta_attr_name = ? AND m.meta_attr_value = ?'
+                               ' AND m.meta_attr_unit = ?', (oid, a, v, u)):
+            raise IrodsError(CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME,
+                             'AVU <{}={}> already exists on <{}>'.format(a, v, path))
+        self.catalog.add_avu(oid, a, v, u)
+        return _result(path, object_type, a, v, u, policy_kv)
+
+    def msiSudoObjMetaRemove(self, path, object_type, wildcards, a, v, u, policy_kv):
+        self.stats['msiSudoObjMetaRemove'] += 1
+        # Like the catalog, fail when no AVU was removed.
+        if not self.catalog.remove_avus(self._object_id(path, object_type), a, v, u,
+                                        wildcards=wildcards not in ('', '0')):
+            raise IrodsError(CAT_SUCCESS_BUT_WITH_NO_INFO,
+                             'AVU <{}={}> does not exist on <{}>'.format(a, v, path))
+        return _result(path, object_type, wildcards, a, v, u, policy_kv)
+
+    # }}}
+    # Access control {{{
+
+    def _set_acl(self, recursive, access, user, path):
+        if access.startswith('admin:'):
+            access = access[len('admin:'):]
+        name, _, zone = user.partition('#')
+
+        if self.catalog.coll_id(path) is None:
+            self.catalog.set_access(self._object_id(path, '-d'), name, access, zone or None)
+            return
+
+        if access in ('inherit', 'noinherit'):
+            value = '1' if access == 'inherit' else ''
+            self.catalog.execute('UPDATE r_coll_main SET coll_inheritance = ? WHERE coll_name = ?'
+                                 + (' OR coll_name LIKE ?' if recursive else ''),
+                                 (value, path, path + '/%') if recursive else (value, path))
+            return
+
+        ids = [self.catalog.coll_id(path)]
+        if recursive:
+            ids += [x for x, in self.catalog.execute('SELECT coll_id FROM r_coll_main WHERE coll_name LIKE ?',
+                                                     (path + '/%',))]
+            ids += [x for x, in self.catalog.execute('SELECT DISTINCT d.data_id FROM r_data_main d, r_coll_main c'
+                                                     ' WHERE d.coll_id = c.coll_id'
+                                                     ' AND (c.coll_name = ? OR c.coll_name LIKE ?)',
+                                                     (path, path + '/%'))]
+        for oid in ids:
+            self.catalog.set_access(oid, name, access, zone or None)
+
+    def msiSetACL(self, recursive, access, user, path):
+        self.stats['msiSetACL'] += 1
+        self._set_acl(recursive == 'recursive', access, user, path)
+        return _result(recursive, access, user, path)
+
+    def msiSudoObjAclSet(self, recursive, access, user, path, policy_kv):
+        self.stats['msiSudoObjAclSet'] += 1
+        self._set_acl(recursive in ('1', 'recursive'), access, user, path)
+        return _result(recursive, access, user, path, policy_kv)
+
+    def msiCheckAccess(self, path, level, out):
+        self.stats['msiCheckAccess'] += 1
+        oid = self.catalog.coll_id(path)
+        if oid is None:
+            oid = self._object_id(path, '-d')
+        have = self.catalog.access_level(oid, self.user, self.zone)
+        want = icat.ACCESS_IDS[icat.ACCESS_ALIASES.get(level, level)]
+        return _result(path, level, b'\x01' if have >= want else b'\x00')
+
+    # }}}
+    # Collections and data objects {{{
+
+    def _require_coll(self, path):
+        cid = self.catalog.coll_id(path)
+        if cid is None:
+            raise IrodsError(CAT_UNKNOWN_COLLECTION, 'Collection <{}> does not exist'.format(path))
+        return cid
+
+    def _inherit_acls(self, parent, oid):
+        """Copy ACLs from a parent collection with the inheritance flag set."""
+        if self.catalog.scalar('SELECT coll_inheritance FROM r_coll_main WHERE coll_name = ?', (parent,)) == '1':
+            self.catalog.execute('INSERT OR REPLACE INTO r_objt_access'
+                                 ' SELECT ?, a.user_id, a.access_type_id, a.create_ts, a.modify_ts'
+                                 ' FROM r_objt_access a, r_coll_main c'
+                                 ' WHERE a.object_id = c.coll_id AND c.coll_name = ?', (oid, parent))
+
+    def _create(self, path, options):
+        """Create (or truncate) a data object, returns its id."""
+        coll = path.rsplit('/', 1)[0]
+        self._require_coll(coll)
+        did = self.catalog.data_id(path)
+        if did is not None:
+            if 'forceFlag' not in options:
+                raise IrodsError(OVERWRITE_WITHOUT_FORCE_FLAG, 'Data object <{}> exists'.format(path))
+            self.catalog.write_content(did, b'')
+            return did
+        did = self.catalog.add_data_object(path, owner=self.user,
+                                           resource=options.get('destRescName') or self.default_resource)
+        self._inherit_acls(coll, did)
+        return did
+
+    def msiDataObjCreate(self, path, options, fd):
+        self.stats['msiDataObjCreate'] += 1
+        did = self._create(path, _options(options))
+        fd  = next(self._fds)
+        self.handles[fd] = {'data_id': did, 'path': path, 'content': b'', 'pos': 0, 'dirty': True}
+        return _result(path, options, fd)
+
+    def msiDataObjOpen(self, options, fd):
+        self.stats['msiDataObjOpen'] += 1
+        path = _options(options).get('objPath', options)
+        did  = self.catalog.data_id(path)
+        if did is None:
+            raise IrodsError(OBJ_PATH_DOES_NOT_EXIST, 'Data object <{}> does not exist'.format(path))
+        fd = next(self._fds)
+        self.handles[fd] = {'data_id': did, 'path': path, 'content': self.catalog.read_content(did),
+                            'pos': 0, 'dirty': False}
+        return _result(options, fd)
+
+    def _handle(self, fd):
+        try:
+            return self.handles[int(fd)]
+        except (KeyError, ValueError):
+            raise IrodsError(CAT_INVALID_ARGUMENT, 'Invalid file descriptor <{}>'.format(fd))
+
+    def msiDataObjRead(self, fd, length, buf):
+        self.stats['msiDataObjRead'] += 1
+        h    = self._handle(fd)
+        data = h['content'][h['pos']:h['pos'] + int(length)]
+        h['pos'] += len(data)
+        return _result(fd, length, irods_types.BytesBuf(data))
+
+    def msiDataObjWrite(self, fd, data, length):
+        self.stats['msiDataObjWrite'] += 1
+        h    = self._handle(fd)
+        data = _bytes(data.buf[:data.len] if isinstance(data, irods_types.BytesBuf) else data)
+        h['content']  = h['content'][:h['pos']] + data + h['content'][h['pos'] + len(data):]
+        h['pos']     += len(data)
+        h['dirty']    = True
+        return _result(fd, data, len(data))
+
+    def msiDataObjClose(self, fd, status):
+        self.stats['msiDataObjClose'] += 1
+        h = self.handles.pop(int(fd), None)
+        if h is None:
+            raise IrodsError(CAT_INVALID_ARGUMENT, 'Invalid file descriptor <{}>'.format(fd))
+        if h['dirty']:
+            self.catalog.write_content(h['data_id'], h['content'])
+        return _result(fd, 0)
+
+    def msiDataObjCopy(self, src, dst, options, status):
+        self.stats['msiDataObjCopy'] += 1
+        opts = _options(options)
+        sid  = self.catalog.data_id(src)
+        if sid is None:
+            raise IrodsError(OBJ_PATH_DOES_NOT_EXIST, 'Data object <{}> does not exist'.format(src))
+
+        did     = self._create(dst, opts)
+        content = self.catalog.read_content(sid)
+        size, checksum = self.catalog.execute('SELECT data_size, data_checksum FROM r_data_main'
+                                              ' WHERE data_id = ? ORDER BY data_repl_num', (sid,)).fetchone()
+        if content or not size:
+            self.catalog.write_content(did, content)
+        if 'verifyChksum' in opts:
+            checksum = checksum or _checksum(content)
+        self.catalog.execute('UPDATE r_data_main SET data_size = ?, data_checksum = ? WHERE data_id = ?',
+                             (size, checksum if 'verifyChksum' in opts else '', did))
+        return _result(src, dst, options, 0)
+
+    def msiDataObjChksum(self, path, options, out):
+        self.stats['msiDataObjChksum'] += 1
+        did = self.catalog.data_id(path)
+        if did is None:
+            raise IrodsError(OBJ_PATH_DOES_NOT_EXIST, 'Data object <{}> does not exist'.format(path))
+        checksum = self.catalog.scalar('SELECT data_checksum FROM r_data_main WHERE data_id = ?'
+                                       ' ORDER BY data_repl_num', (did,))
+        if not checksum or 'forceChksum' in _options(options):
+            checksum = _checksum(self.catalog.read_content(did))
+            self.catalog.execute('UPDATE r_data_main SET data_checksum = ? WHERE data_id = ?', (checksum, did))
+        return _result(path, options, checksum)
+
+    def _unlink(self, did):
+        for table, column in [('r_data_main', 'data_id'), ('offline_content', 'data_id'),
+                              ('r_objt_metamap', 'object_id'), ('r_objt_access', 'object_id')]:
+            self.catalog.execute('DELETE FROM {} WHERE {} = ?'.format(table, column), (did,))
+
+    def msiDataObjUnlink(self, options, status):
+        self.stats['msiDataObjUnlink'] += 1
+        path = _options(options).get('objPath', options)
+        did  = self.catalog.data_id(path)
+        if did is None:
+            raise IrodsError(OBJ_PATH_DOES_NOT_EXIST, 'Data object <{}> does not exist'.format(path))
+        self._unlink(did)
+        return _result(options, 0)
+
+    def msiDataObjRename(self, src, dst, object_type, status):
+        self.stats['msiDataObjRename'] += 1
+        dst_coll, dst_name = dst.rsplit('/', 1)
+        dst_cid = self._require_coll(dst_coll)
+
+        if str(object_type) == '1':
+            self._require_coll(src)
+            if self.catalog.coll_id(dst) is not None:
+                raise IrodsError(CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME, 'Collection <{}> exists'.format(dst))
+            self.catalog.execute('UPDATE r_coll_main SET parent_coll_name = ? || substr(parent_coll_name, ?)'
+                                 ' WHERE parent_coll_name = ? OR parent_coll_name LIKE ?',
+                                 (dst, len(src) + 1, src, src + '/%'))
+            self.catalog.execute('UPDATE r_coll_main SET coll_name = ? || substr(coll_name, ?)'
+                                 ' WHERE coll_name = ? OR coll_name LIKE ?',
+                                 (dst, len(src) + 1, src, src + '/%'))
+            self.catalog.execute('UPDATE r_coll_main SET parent_coll_name = ? WHERE coll_name = ?',
+                                 (dst_coll, dst))
+        else:
+            did = self.catalog.data_id(src)
+            if did is None:
+                raise IrodsError(OBJ_PATH_DOES_NOT_EXIST, 'Data object <{}> does not exist'.format(src))
+            if self.catalog.data_id(dst) is not None:
+                raise IrodsError(OVERWRITE_WITHOUT_FORCE_FLAG, 'Data object <{}> exists'.format(dst))
+            self.catalog.execute('UPDATE r_data_main SET coll_id = ?, data_name = ? WHERE data_id = ?',
+                                 (dst_cid, dst_name, did))
+        return _result(src, dst, object_type, 0)
+
+    def msiCollCreate(self, path, parents, status):
+        self.stats['msiCollCreate'] += 1
+        if self.catalog.coll_id(path) is not None:
+            if str(parents) == '1':
+                return _result(path, parents, 0)
+            raise IrodsError(CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME, 'Collection <{}> exists'.format(path))
+
+        parent = path.rsplit('/', 1)[0]
+        if self.catalog.coll_id(parent) is None:
+            if str(parents) != '1':
+                raise IrodsError(CAT_UNKNOWN_COLLECTION, 'Collection <{}> does not exist'.format(parent))
+            self.msiCollCreate(parent, parents, status)
+
+        cid = self.catalog.add_collection(path, owner=self.user, parents=False)
+        self._inherit_acls(parent, cid)
+        if self.catalog.scalar('SELECT coll_inheritance FROM r_coll_main WHERE coll_name = ?', (parent,)) == '1':
+            self.catalog.execute("UPDATE r_coll_main SET coll_inheritance = '1' WHERE coll_id = ?", (cid,))
+        return _result(path, parents, 0)
+
+    def msiRmColl(self, path, options, status):
+        self.stats['msiRmColl'] += 1
+        self._require_coll(path)
+        ids = [x for x, in self.catalog.execute('SELECT DISTINCT d.data_id FROM r_data_main d, r_coll_main c'
+                                                ' WHERE d.coll_id = c.coll_id'
+                                                ' AND (c.coll_name = ? OR c.coll_name LIKE ?)',
+                                                (path, path + '/%'))]
+        for did in ids:
+            self._unlink(did)
+        for cid, in list(self.catalog.execute('SELECT coll_id FROM r_coll_main WHERE coll_name = ? OR coll_name LIKE ?',
+                                              (path, path + '/%'))):
+            for table, column in [('r_coll_main', 'coll_id'),
+                                  ('r_objt_metamap', 'object_id'),
+                                  ('r_objt_access', 'object_id')]:
+                self.catalog.execute('DELETE FROM {} WHERE {} = ?'.format(table, column), (cid,))
+        return _result(path, options, 0)
+
+    def msiGetObjType(self, path, out):
+        self.stats['msiGetObjType'] += 1
+        if self.catalog.coll_id(path) is not None:
+            return _result(path, '-c')
+        if self.catalog.data_id(path) is not None:
+            return _result(path, '-d')
+        raise IrodsError(OBJ_PATH_DOES_NOT_EXIST, 'Object <{}> does not exist'.format(path))
+
+    def msiSplitPath(self, path, coll, name):
+        coll, _, name = path.rpartition('/')
+        return _result(path, coll, name)
+
+    # }}}
+    # Miscellaneous {{{
+
+    def msiGetIcatTime(self, out, time_type):
+        self.stats['msiGetIcatTime'] += 1
+        t = icat.timestamp() if time_type == 'unix' else time.strftime('%Y-%m-%d.%H:%M:%S')
+        return _result(t, time_type)
+
+    def msiBytesBufToStr(self, buf, out):
+        return _result(buf, ''.join(buf.buf[:buf.len]))
+
+    def writeLine(self, stream, text):
+        self.output[stream].append('{}\n'.format(text))
+        return _result(stream, text)
+
+    def writeString(self, stream, text):
+        self.output[stream].append(text)
+        return _result(stream, text)
+
+    def delayExec(self, conditions, body, recovery):
+        self.stats['delayExec'] += 1
+        self.delayed.append((conditions, body))
+        return _result(conditions, body, recovery)
+
+    def remoteExec(self, host, hints, body, recovery):
+        self.stats['remoteExec'] += 1
+        self.remote.append((host, body))
+        return _result(host, hints, body, recovery)
+
+    def msiExit(self, code, message):
+        raise IrodsError(int(code) if str(code).lstrip('-').isdigit() else ACTION_FAILED_ERR, message)
+
+    def msiOprDisallowed(self):
+        raise IrodsError(SYS_DELETE_DISALLOWED, 'Operation disallowed')
+
+    def msiDeleteDisallowed(self):
+        raise IrodsError(SYS_DELETE_DISALLOWED, 'Deletion disallowed')
+
+    # }}}
+
+
+# Rule language rules {{{
+
+# Offline implementations of rule language rules that are called from Python.
+# These issue the same queries as their rule language counterparts.
+RULES = {}
+
+
+def rule_language(f):
+    RULES[f.__name__] = f
+    return f
+
+
+@rule_language
+def uuGroupGetCategory(cb, group_name, category, subcategory):
+    category = subcategory = ''
+    for attr, value in cb._select('META_USER_ATTR_NAME, META_USER_ATTR_VALUE',
+                                  "USER_GROUP_NAME = '{}' AND META_USER_ATTR_NAME LIKE '%category'"
+                                  .format(group_name)):
+        if attr == 'category':
+            category = value
+        elif attr == 'subcategory':
+            subcategory = value
+    return _result(group_name, category, subcategory)
+
+
+@rule_language
+def uuGroupGetDescription(cb, group_name, description):
+    description = ''
+    for value, in cb._select('META_USER_ATTR_VALUE',
+                             "USER_GROUP_NAME = '{}' AND META_USER_ATTR_NAME = 'description'".format(group_name)):
+        if value != '.':
+            description = value
+    return _result(group_name, description)
+
+
+@rule_language
+def uuGetBaseGroup(cb, group_name, base_group):
+    base_group = ''
+    if group_name.startswith(('read-', 'vault-')):
+        base_name = group_name.split('-', 1)[1]
+        for name, in cb._select('USER_GROUP_NAME', "USER_GROUP_NAME LIKE '%-{}'".format(base_name)):
+            if name in ('intake-' + base_name, 'research-' + base_name):
+                base_group = name
+                break
+    return _result(group_name, base_group or group_name)
+
+
+@rule_language
+def uuGroupGetMemberType(cb, group_name, user_name, member_type):
+    name, _, zone = user_name.partition('#')
+    full_name = '{}#{}'.format(name, zone or cb.zone)
+
+    managers = [v for v, in cb._select('META_USER_ATTR_VALUE',
+                                       "USER_GROUP_NAME = '{}' AND META_USER_ATTR_NAME = 'manager'"
+                                       .format(group_name))]
+    members  = ['{}#{}'.format(*r) for r in cb._select('USER_NAME, USER_ZONE',
+                                                       "USER_GROUP_NAME = '{}' AND USER_TYPE != 'rodsgroup'"
+                                                       .format(group_name))]
+    readers  = []
+    if group_name.startswith(('research-', 'intake-')):
+        readers = ['{}#{}'.format(*r) for r in cb._select('USER_NAME, USER_ZONE',
+                                                          "USER_GROUP_NAME = 'read-{}' AND USER_TYPE != 'rodsgroup'"
+                                                          .format(group_name.split('-', 1)[1]))]
+
+    if full_name in managers:
+        member_type = 'manager'
+    elif full_name in members:
+        member_type = 'normal'
+    elif full_name in readers:
+        member_type = 'reader'
+    else:
+        member_type = 'none'
+    return _result(group_name, user_name, member_type)
+
+
+@rule_language
+def iiCopyACLsFromParent(cb, path, recursive):
+    parent = path.rsplit('/', 1)[0]
+    oid    = cb.catalog.coll_id(path) or cb.catalog.data_id(path)
+    cb.catalog.execute('INSERT OR REPLACE INTO r_objt_access'
+                       ' SELECT ?, a.user_id, a.access_type_id, a.create_ts, a.modify_ts'
+                       ' FROM r_objt_access a, r_coll_main c'
+                       ' WHERE a.object_id = c.coll_id AND c.coll_name = ?', (oid, parent))
+    return _result(path, recursive)
+
+# }}}
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""SQLite-backed subset of the iRODS catalog (ICAT) used by the offline engine.
+
+Table and column names follow the iRODS PostgreSQL schema closely, so that
+GenQuery column mappings read the same as those in the iRODS server sources.
+Only the tables needed by the ruleset are present.
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS r_user_main (
+    user_id        INTEGER PRIMARY KEY,
+    user_name      TEXT NOT NULL,
+    user_type_name TEXT NOT NULL,
+    zone_name      TEXT NOT NULL,
+    user_info      TEXT NOT NULL DEFAULT '',
+    r_comment      TEXT NOT NULL DEFAULT '',
+    create_ts      TEXT NOT NULL,
+    modify_ts      TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_main1 ON r_user_main (user_name, zone_name);
+
+CREATE TABLE IF NOT EXISTS r_user_group (
+    group_user_id INTEGER NOT NULL,
+    user_id       INTEGER NOT NULL,
+    create_ts     TEXT NOT NULL,
+    modify_ts     TEXT NOT NULL,
+    PRIMARY KEY (group_user_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_user_group1 ON r_user_group (user_id);
+
+CREATE TABLE IF NOT EXISTS r_resc_main (
+    resc_id         INTEGER PRIMARY KEY,
+    resc_name       TEXT NOT NULL,
+    zone_name       TEXT NOT NULL,
+    resc_type_name  TEXT NOT NULL DEFAULT 'unixfilesystem',
+    resc_class_name TEXT NOT NULL DEFAULT 'cache',
+    resc_net        TEXT NOT NULL DEFAULT 'localhost',
+    resc_def_path   TEXT NOT NULL DEFAULT '',
+    resc_parent     TEXT NOT NULL DEFAULT '',
+    resc_status     TEXT NOT NULL DEFAULT '',
+    create_ts       TEXT NOT NULL,
+    modify_ts       TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resc_main1 ON r_resc_main (resc_name);
+
+CREATE TABLE IF NOT EXISTS r_coll_main (
+    coll_id          INTEGER PRIMARY KEY,
+    parent_coll_name TEXT NOT NULL,
+    coll_name        TEXT NOT NULL,
+    coll_owner_name  TEXT NOT NULL,
+    coll_owner_zone  TEXT NOT NULL,
+    coll_inheritance TEXT NOT NULL DEFAULT '',
+    coll_type        TEXT NOT NULL DEFAULT '',
+    create_ts        TEXT NOT NULL,
+    modify_ts        TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_coll_main1 ON r_coll_main (coll_name);
+CREATE INDEX IF NOT EXISTS idx_coll_main2 ON r_coll_main (parent_coll_name);
+
+CREATE TABLE IF NOT EXISTS r_data_main (
+    data_id         INTEGER NOT NULL,
+    coll_id         INTEGER NOT NULL,
+    data_name       TEXT NOT NULL,
+    data_repl_num   INTEGER NOT NULL DEFAULT 0,
+    data_version    TEXT NOT NULL DEFAULT '',
+    data_type_name  TEXT NOT NULL DEFAULT 'generic',
+    data_size       INTEGER NOT NULL DEFAULT 0,
+    resc_id         INTEGER NOT NULL,
+    resc_name       TEXT NOT NULL,
+    resc_hier       TEXT NOT NULL,
+    data_path       TEXT NOT NULL DEFAULT '',
+    data_owner_name TEXT NOT NULL,
+    data_owner_zone TEXT NOT NULL,
+    data_is_dirty   INTEGER NOT NULL DEFAULT 1,
+    data_status     TEXT NOT NULL DEFAULT '',
+    data_checksum   TEXT NOT NULL DEFAULT '',
+    data_mode       TEXT NOT NULL DEFAULT '',
+    create_ts       TEXT NOT NULL,
+    modify_ts       TEXT NOT NULL,
+    PRIMARY KEY (data_id, data_repl_num)
+);
+CREATE INDEX IF NOT EXISTS idx_data_main1 ON r_data_main (coll_id, data_name);
+CREATE INDEX IF NOT EXISTS idx_data_main2 ON r_data_main (data_name);
+
+CREATE TABLE IF NOT EXISTS r_meta_main (
+    meta_id         INTEGER PRIMARY KEY,
+    meta_attr_name  TEXT NOT NULL,
+    meta_attr_value TEXT NOT NULL,
+    meta_attr_unit  TEXT NOT NULL DEFAULT '',
+    create_ts       TEXT NOT NULL,
+    modify_ts       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_meta_main1 ON r_meta_main (meta_attr_name, meta_attr_value, meta_attr_unit);
+
+CREATE TABLE IF NOT EXISTS r_objt_metamap (
+    object_id INTEGER NOT NULL,
+    meta_id   INTEGER NOT NULL,
+    create_ts TEXT NOT NULL,
+    modify_ts TEXT NOT NULL,
+    PRIMARY KEY (object_id, meta_id)
+);
+CREATE INDEX IF NOT EXISTS idx_objt_metamap1 ON r_objt_metamap (meta_id);
+
+CREATE TABLE IF NOT EXISTS r_objt_access (
+    object_id      INTEGER NOT NULL,
+    user_id        INTEGER NOT NULL,
+    access_type_id INTEGER NOT NULL,
+    create_ts      TEXT NOT NULL,
+    modify_ts      TEXT NOT NULL,
+    PRIMARY KEY (object_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_objt_access1 ON r_objt_access (user_id);
+
+CREATE TABLE IF NOT EXISTS r_tokn_main (
+    token_namespace TEXT NOT NULL,
+    token_id        INTEGER NOT NULL,
+    token_name      TEXT NOT NULL,
+    PRIMARY KEY (token_namespace, token_id)
+);
+
+CREATE TABLE IF NOT EXISTS offline_content (
+    data_id INTEGER PRIMARY KEY,
+    content BLOB NOT NULL
+);
+"""
+
+# Access level tokens, see iRODS: server/icat/src/icatSysTables.sql.pp
+ACCESS_TYPES = [(1000, 'null'),
+                (1010, 'execute'),
+                (1020, 'read annotation'),
+                (1030, 'read system metadata'),
+                (1040, 'read metadata'),
+                (1050, 'read object'),
+                (1060, 'write annotation'),
+                (1070, 'create metadata'),
+                (1080, 'modify metadata'),
+                (1090, 'delete metadata'),
+                (1100, 'administer object'),
+                (1110, 'create object'),
+                (1120, 'modify object'),
+                (1130, 'delete object'),
+                (1140, 'create token'),
+                (1150, 'delete token'),
+                (1160, 'curate'),
+                (1200, 'own')]
+
+ACCESS_IDS = dict((name, i) for i, name in ACCESS_TYPES)
+
+# Short access names as accepted by msiSetACL / ichmod.
+ACCESS_ALIASES = {'read':  'read object',
+                  'write': 'modify object'}
+
+
+def timestamp(t=None):
+    """Format a unix time the way iRODS stores it in the catalog (11 zero-padded digits)."""
+    return '{:011d}'.format(int(time.time() if t is None else t))
+
+
+class Catalog(object):
+    """A SQLite database containing a subset of the iRODS catalog.
+
+    Object ids (users, resources, collections, data objects and AVUs) share
+    a single sequence, as they do in iRODS.
+
+    :param path: Path to the SQLite database file, or ':memory:'
+    :param zone: Name of the zone this catalog belongs to
+    """
+
+    def __init__(self, path=':memory:', zone='tempZone'):
+        self.path = path
+        self.zone = zone
+
+        # Autocommit mode: write statements must not reset open read cursors.
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.text_factory = str
+        self.db.execute('PRAGMA case_sensitive_like = ON')
+        self.db.execute('PRAGMA journal_mode = MEMORY')
+        self.db.execute('PRAGMA synchronous = OFF')
+        self.db.executescript(SCHEMA)
+
+        if not self.db.execute('SELECT COUNT(*) FROM r_tokn_main').fetchone()[0]:
+            self.db.executemany("INSERT INTO r_tokn_main VALUES ('access_type', ?, ?)", ACCESS_TYPES)
+
+        self._next_id = 10000
+        for table, column in [('r_user_main', 'user_id'),
+                              ('r_resc_main', 'resc_id'),
+                              ('r_coll_main', 'coll_id'),
+                              ('r_data_main', 'data_id'),
+                              ('r_meta_main', 'meta_id')]:
+            x = self.db.execute('SELECT MAX({}) FROM {}'.format(column, table)).fetchone()[0]
+            if x is not None and x >= self._next_id:
+                self._next_id = x + 1
+
+    def next_id(self):
+        """Allocate an object id."""
+        self._next_id += 1
+        return self._next_id - 1
+
+    def execute(self, sql, args=()):
+        return self.db.execute(sql, args)
+
+    def scalar(self, sql, args=()):
+        """Execute a query and return the first column of the first row, or None."""
+        row = self.db.execute(sql, args).fetchone()
+        return None if row is None else row[0]
+
+    def begin(self):
+        self.db.execute('BEGIN')
+
+    def commit(self):
+        self.db.execute('COMMIT')
+
+    def close(self):
+        self.db.close()
+
+    # Users and groups {{{
+
+    def user_id(self, name, zone=None):
+        return self.scalar('SELECT user_id FROM r_user_main WHERE user_name = ? AND zone_name = ?',
+                           (name, zone or self.zone))
+
+    def add_user(self, name, user_type='rodsuser', zone=None, info=''):
+        """Add a user (or group) and its self-membership row, returns the user id."""
+        ts  = timestamp()
+        uid = self.next_id()
+        self.db.execute('INSERT INTO r_user_main VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (uid, name, user_type, zone or self.zone, info, '', ts, ts))
+        self.db.execute('INSERT INTO r_user_group VALUES (?, ?, ?, ?)', (uid, uid, ts, ts))
+        return uid
+
+    def add_group(self, name, zone=None):
+        return self.add_user(name, 'rodsgroup', zone)
+
+    def add_member(self, group_name, user_name, zone=None):
+        ts = timestamp()
+        self.db.execute('INSERT OR IGNORE INTO r_user_group VALUES (?, ?, ?, ?)',
+                        (self.user_id(group_name, zone), self.user_id(user_name, zone), ts, ts))
+
+    def remove_member(self, group_name, user_name, zone=None):
+        self.db.execute('DELETE FROM r_user_group WHERE group_user_id = ? AND user_id = ?',
+                        (self.user_id(group_name, zone), self.user_id(user_name, zone)))
+
+    # }}}
+    # Resources {{{
+
+    def resc_id(self, name):
+        return self.scalar('SELECT resc_id FROM r_resc_main WHERE resc_name = ?', (name,))
+
+    def add_resource(self, name, host='localhost', vault_path=None, resc_type='unixfilesystem'):
+        ts  = timestamp()
+        rid = self.next_id()
+        self.db.execute('INSERT INTO r_resc_main VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (rid, name, self.zone, resc_type, 'cache', host,
+                         vault_path or '/var/lib/irods/{}'.format(name), '', '', ts, ts))
+        return rid
+
+    # }}}
+    # Collections and data objects {{{
+
+    def coll_id(self, path):
+        return self.scalar('SELECT coll_id FROM r_coll_main WHERE coll_name = ?', (path,))
+
+    def add_collection(self, path, owner='rods', t=None, inherit=False, parents=True):
+        """Add a collection, returns its id. Existing collections are left as-is."""
+        cid = self.coll_id(path)
+        if cid is not None:
+            return cid
+
+        parent = path.rsplit('/', 1)[0] or '/'
+        if path == '/':
+            parent = '/'
+        elif parents and self.coll_id(parent) is None:
+            self.add_collection(parent, owner, t)
+
+        ts  = timestamp(t)
+        cid = self.next_id()
+        self.db.execute('INSERT INTO r_coll_main VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (cid, parent, path, owner, self.zone, '1' if inherit else '', '', ts, ts))
+        self.set_access(cid, owner, 'own')
+        return cid
+
+    def add_data_object(self, path, size=0, owner='rods', resource='irodsResc',
+                        checksum='', t=None, content=None, replicas=1, data_id=None):
+        """Add a data object with one or more replicas, returns its id.
+
+        Additional replicas are placed on resources named <resource>Repl<n>
+        when those exist, and on the given resource otherwise.
+        """
+        coll, name = path.rsplit('/', 1)
+        cid = self.coll_id(coll)
+        if cid is None:
+            cid = self.add_collection(coll, owner, t)
+
+        if content is not None:
+            size = len(content)
+
+        did = self.next_id() if data_id is None else data_id
+        ts  = timestamp(t)
+        for repl in range(replicas):
+            resc = resource if repl == 0 else '{}Repl{}'.format(resource, repl)
+            rid  = self.resc_id(resc)
+            if rid is None:
+                resc, rid = resource, self.resc_id(resource)
+            self.db.execute('INSERT INTO r_data_main VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (did, cid, name, repl, '', 'generic', size, rid, resc, resc,
+                             '/var/lib/irods/{}{}'.format(resc, path), owner, self.zone,
+                             1, '', checksum, '', ts, ts))
+        if content is not None:
+            self.db.execute('INSERT OR REPLACE INTO offline_content VALUES (?, ?)', (did, sqlite3.Binary(content)))
+        self.set_access(did, owner, 'own')
+        return did
+
+    def data_id(self, path):
+        coll, name = path.rsplit('/', 1)
+        return self.scalar('SELECT d.data_id FROM r_data_main d JOIN r_coll_main c ON c.coll_id = d.coll_id'
+                           ' WHERE c.coll_name = ? AND d.data_name = ?', (coll, name))
+
+    def object_id(self, path, object_type):
+        """Get the id of an object given its type as used by imeta (-d, -C, -u, -R)."""
+        if object_type == '-d':
+            return self.data_id(path)
+        elif object_type == '-C':
+            return self.coll_id(path)
+        elif object_type == '-u':
+            name, _, zone = path.partition('#')
+            return self.user_id(name, zone or None)
+        elif object_type == '-R':
+            return self.resc_id(path)
+        raise ValueError('Unknown object type <{}>'.format(object_type))
+
+    def read_content(self, data_id):
+        x = self.scalar('SELECT content FROM offline_content WHERE data_id = ?', (data_id,))
+        return b'' if x is None else bytes(x)
+
+    def write_content(self, data_id, content):
+        self.db.execute('INSERT OR REPLACE INTO offline_content VALUES (?, ?)', (data_id, sqlite3.Binary(content)))
+        self.db.execute('UPDATE r_data_main SET data_size = ?, data_checksum = \'\', modify_ts = ? WHERE data_id = ?',
+                        (len(content), timestamp(), data_id))
+
+    # }}}
+    # Metadata and ACLs {{{
+
+    def add_avu(self, object_id, attr, value, unit='', t=None):
+        """Associate an AVU with an object, reusing an identical existing AVU if present."""
+        ts  = timestamp(t)
+        mid = self.scalar('SELECT meta_id FROM r_meta_main WHERE meta_attr_name = ?'
+                          ' AND meta_attr_value = ? AND meta_attr_unit = ?', (attr, value, unit))
+        if mid is None:
+            mid = self.next_id()
+            self.db.execute('INSERT INTO r_meta_main VALUES (?, ?, ?, ?, ?, ?)', (mid, attr, value, unit, ts, ts))
+        self.db.execute('INSERT OR IGNORE INTO r_objt_metamap VALUES (?, ?, ?, ?)', (object_id, mid, ts, ts))
+        return mid
+
+    def remove_avus(self, object_id, attr, value=None, unit=None, wildcards=False):
+        """Remove AVUs matching the given attribute (and value/unit) from an object.
+
+        :returns: Number of AVUs removed
+        """
+        op   = 'LIKE' if wildcards else '='
+        sql  = ('DELETE FROM r_objt_metamap WHERE object_id = ? AND meta_id IN'
+                ' (SELECT meta_id FROM r_meta_main WHERE meta_attr_name {} ?'.format(op))
+        args = [object_id, attr]
+        if value is not None:
+            sql += ' AND meta_attr_value {} ?'.format(op)
+            args.append(value)
+        if unit is not None:
+            sql += ' AND meta_attr_unit {} ?'.format(op)
+            args.append(unit)
+        return self.db.execute(sql + ')', args).rowcount
+
+    def set_access(self, object_id, user_name, access, zone=None):
+        """Set (or with access 'null', remove) an ACL entry on an object."""
+        access = ACCESS_ALIASES.get(access, access)
+        uid    = self.user_id(user_name, zone)
+        if uid is None:
+            raise KeyError('No such user <{}>'.format(user_name))
+        if access == 'null':
+            self.db.execute('DELETE FROM r_objt_access WHERE object_id = ? AND user_id = ?', (object_id, uid))
+        else:
+            ts = timestamp()
+            self.db.execute('INSERT OR REPLACE INTO r_objt_access VALUES (?, ?, ?, ?, ?)',
+                            (object_id, uid, ACCESS_IDS[access], ts, ts))
+
+    def access_level(self, object_id, user_name, zone=None):
+        """Get the highest access level a user has on an object, through any of its groups."""
+        return self.scalar('SELECT MAX(a.access_type_id) FROM r_objt_access a'
+                           ' JOIN r_user_group g ON g.group_user_id = a.user_id'
+                           ' JOIN r_user_main u ON u.user_id = g.user_id'
+                           ' WHERE a.object_id = ? AND u.user_name = ? AND u.zone_name = ?',
+                           (object_id, user_name, zone or self.zone)) or ACCESS_IDS['null']
+
+    # }}}
+
+
+def base(users=(), groups=(), members=(), resources=('irodsResc',), hosts=None):
+    """Create an in-memory catalog with the users, groups and resources that rules need, e.g. for unit tests.
+
+    The catalog always has the rodsadmin 'rods'.
+
+    :param users:     Names of rodsusers
+    :param groups:    Names of groups
+    :param members:   List of (group name, user name) memberships
+    :param resources: Names of resources
+    :param hosts:     Host per resource name (default: localhost)
+
+    :returns: Catalog
+    """
+    cat = Catalog()
+    cat.add_user('rods', 'rodsadmin')
+    for name in users:
+        cat.add_user(name)
+    for name in groups:
+        cat.add_group(name)
+    for group, name in members:
+        cat.add_member(group, name)
+    for name in resources:
+        cat.add_resource(name, host=(hosts or {}).get(name, 'localhost'))
+    return cat
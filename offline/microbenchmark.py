@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmarks for CPU-bound ruleset functions that do not access the catalog.
+
+Usage:
+
+    python -m offline.microbenchmark
+    python -m offline.microbenchmark --benchmark deletion_candidates --output results.json
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from collections import OrderedDict
+
+# Importable as the offline package installed the ruleset path.
+import revisions
+
+
+def deletion_candidates(sizes=(10, 100, 1000, 10000), cases=('A', 'B', 'Simple'), seed=1):
+    """Time revisions.get_deletion_candidates for files with various amounts of revisions.
+
+    Revisions have random modification times within the last 20 weeks, as
+    with files that are saved very often.
+
+    :returns: Dict of 'case/revisions' => time per call in milliseconds
+    """
+    rnd    = random.Random(seed)
+    now    = 1600000000
+    result = OrderedDict()
+
+    for case in cases:
+        buckets = revisions.revision_bucket_list(None, case)
+        for n in sizes:
+            times = sorted((now - rnd.randint(0, 20 * 7 * 86400) for _ in range(n)), reverse=True)
+            revs  = [[str(n - i), t] for i, t in enumerate(times)]
+
+            timer  = timeit.Timer(lambda: revisions.get_deletion_candidates(None, buckets, revs, now))
+            number = max(1, 10000 // n)
+            best   = min(timer.repeat(repeat=3, number=number)) / number
+            result['{}/{}'.format(case, n)] = round(best * 1000, 4)
+
+    return result
+
+
+BENCHMARKS = OrderedDict([('deletion_candidates', deletion_candidates)])
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description='Run microbenchmarks of CPU-bound ruleset functions.')
+    p.add_argument('--benchmark', action='append', choices=list(BENCHMARKS), help='only run the given benchmark(s)')
+    p.add_argument('--output', help='write results to this JSON file')
+    a = p.parse_args(args)
+
+    report = OrderedDict()
+    for name, f in BENCHMARKS.items():
+        if a.benchmark and name not in a.benchmark:
+            continue
+        report[name] = f()
+        for k, v in report[name].items():
+            sys.stderr.write('{:24} {:16} {:12.4f}ms\n'.format(name, k, v))
+
+    if a.output:
+        with open(a.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
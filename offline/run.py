@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Run a rule or API against an offline catalog.
+
+Examples:
+
+    python -m offline.run zone.db --user researcher0-0 api_browse_folder '{"coll": "/tempZone/home/research-group0"}'
+    python -m offline.run zone.db --profile rule rule_revisions_clean_up 1 2
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+from . import catalog
+from . import Session
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description='Run a rule or API against an offline catalog.')
+    p.add_argument('database', help='SQLite database file (see offline.zone)')
+    p.add_argument('--user', default='rods', help='client user name')
+    p.add_argument('--profile', action='store_true', help='print cProfile statistics')
+    p.add_argument('--log', action='store_true', help='print the server log')
+    p.add_argument('name', help='API name, or "rule" followed by a rule name')
+    p.add_argument('args', nargs='*', help='JSON API parameters, or rule arguments')
+    a = p.parse_args(args)
+
+    session = Session(catalog.Catalog(a.database), user=a.user)
+    if a.name == 'rule':
+        call = lambda: session.rule(a.args[0], *a.args[1:])  # noqa: E731
+    else:
+        call = lambda: session.api(a.name, **json.loads(a.args[0] if a.args else '{}'))  # noqa: E731
+
+    profile = cProfile.Profile() if a.profile else None
+    start   = time.time()
+    result  = call() if profile is None else profile.runcall(call)
+    elapsed = time.time() - start
+
+    print(json.dumps(result, indent=4))
+    if a.log:
+        sys.stderr.write(''.join(session.callback.output['serverLog']))
+    sys.stderr.write('{:.3f}s {}\n'.format(elapsed, json.dumps(dict(session.callback.stats), sort_keys=True)))
+    if profile is not None:
+        pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(30)
+
+
+if __name__ == '__main__':
+    main()
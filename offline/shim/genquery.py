@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Offline replacement for the genquery module shipped with the Python rule engine.
+
+Implements the row_iterator and paged_iterator interfaces on top of the
+GenQuery microservices of the callback.
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import irods_types
+
+AS_DICT = 0
+AS_LIST = 1
+
+MAX_SQL_ROWS = 256
+
+
+class row_iterator(object):
+    def __init__(self, columns, conditions, row_return, callback):
+        self.columns    = [c.strip() for c in columns.split(',')] if isinstance(columns, str) else columns
+        self.conditions = conditions
+        self.row_return = row_return
+        self.callback   = callback
+
+    def __iter__(self):
+        cb  = self.callback
+        gqi = cb.msiMakeGenQuery(', '.join(self.columns), self.conditions, irods_types.GenQueryInp())['arguments'][2]
+        gqo = cb.msiExecGenQuery(gqi, irods_types.GenQueryOut())['arguments'][1]
+
+        try:
+            while True:
+                for r in range(gqo.rowCnt):
+                    row = [gqo.sqlResult[c].row(r) for c in range(len(self.columns))]
+                    yield dict(zip(self.columns, row)) if self.row_return == AS_DICT else row
+                if gqo.continueInx <= 0:
+                    break
+                gqo = cb.msiGetMoreRows(gqi, gqo, 0)['arguments'][1]
+        finally:
+            if gqo.continueInx > 0:
+                cb.msiCloseGenQuery(gqi, gqo)
+
+
+def paged_iterator(columns, conditions, row_return, callback, page_size=MAX_SQL_ROWS):
+    """Yield lists of at most page_size rows."""
+    page = []
+    for row in row_iterator(columns, conditions, row_return, callback):
+        page.append(row)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
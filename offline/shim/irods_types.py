@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Offline replacement for the irods_types module of the Python rule engine.
+
+Only the types and attributes used by this ruleset are provided.
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+
+class c_string(str):
+    pass
+
+
+class char_array(str):
+    pass
+
+
+class int_array(list):
+    pass
+
+
+class c_string_array(list):
+    pass
+
+
+class BytesBuf(object):
+    def __init__(self, data=b''):
+        self.buf = data
+        self.len = len(data)
+
+    def get_bytes(self):
+        return self.buf
+
+
+class KeyValPair(object):
+    def __init__(self):
+        self.key   = []
+        self.value = []
+
+    @property
+    def len(self):
+        return len(self.key)
+
+    def add(self, key, value):
+        # Like addKeyVal in iRODS, the value of an existing key is replaced.
+        if key in self.key:
+            self.value[self.key.index(key)] = value
+        else:
+            self.key.append(key)
+            self.value.append(value)
+
+
+class InxIvalPair(object):
+    def __init__(self):
+        self.inx   = []
+        self.value = []
+
+
+class InxValPair(object):
+    def __init__(self):
+        self.inx   = []
+        self.value = []
+
+
+class SqlResult(object):
+    """One result column of a GenQueryOut."""
+
+    __slots__ = ('values', 'len')
+
+    def __init__(self, values):
+        self.values = values
+        self.len    = len(values)
+
+    def row(self, i):
+        return self.values[i]
+
+
+class GenQueryInp(object):
+    def __init__(self):
+        self.selectInp   = ''
+        self.sqlCondInp  = ''
+        self.maxRows     = 0
+        self.continueInx = 0
+        self.rowOffset   = 0
+        self.options     = 0
+        self.condInput   = KeyValPair()
+
+
+class GenQueryOut(object):
+    def __init__(self):
+        self.rowCnt        = 0
+        self.attriCnt      = 0
+        self.continueInx   = 0
+        self.totalRowCount = 0
+        self.sqlResult     = []
+
+
+class ExecCmdOut(object):
+    def __init__(self):
+        self.stdoutBuf = BytesBuf()
+        self.stderrBuf = BytesBuf()
+        self.status    = 0
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""Offline replacement for the session_vars module of the Python rule engine."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import copy
+
+
+def get_map(rei):
+    """Get the session variables of a rei as a (nested) dict."""
+    return copy.deepcopy(rei.session_vars)
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""Translation of GenQuery select/condition strings to SQL on the offline catalog.
+
+The translation mimics the iRODS general query code: tables are added to the
+query based on the columns that are referenced, and are joined the way
+iRODS joins them. Supported are the select functions ORDER, ORDER_ASC,
+ORDER_DESC, SUM, COUNT, MIN, MAX and AVG, and the condition operators =, !=,
+<>, <, <=, >, >=, [not] like, [not] in, between, and '||' alternatives.
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import re
+
+# Default amount of rows per batch, see irods: lib/core/include/rodsGenQuery.h
+MAX_SQL_ROWS = 256
+
+# Option flags, see irods: lib/core/include/rodsGenQuery.h
+RETURN_TOTAL_ROW_COUNT = 0x020
+NO_DISTINCT            = 0x040
+AUTO_CLOSE             = 0x100
+UPPER_CASE_WHERE       = 0x200
+
+
+class GenQueryError(Exception):
+    """Raised for select or condition strings that cannot be translated."""
+
+
+# Tables {{{
+
+# Entity => SQL table expression.
+TABLES = {'u':   'r_user_main u',
+          'ug':  'r_user_group ug',
+          'g':   'r_user_main g',
+          'r':   'r_resc_main r',
+          'c':   'r_coll_main c',
+          'd':   'r_data_main d',
+          'da':  'r_objt_access da',
+          'dat': 'r_tokn_main dat',
+          'ca':  'r_objt_access ca',
+          'cat': 'r_tokn_main cat'}
+
+# Metadata entities: prefix => (owning entity, owning entity id column).
+META = {'md': ('d', 'd.data_id'),
+        'mc': ('c', 'c.coll_id'),
+        'mu': ('u', 'u.user_id'),
+        'mr': ('r', 'r.resc_id')}
+
+for _m in META:
+    TABLES['m' + _m] = 'r_objt_metamap m{}'.format(_m)
+    TABLES[_m]       = 'r_meta_main {}'.format(_m)
+
+# }}}
+# Columns {{{
+
+
+def _cols(entity, prefix, spec):
+    return dict((prefix + name, (entity, '{}.{}'.format(entity, col), num))
+                for name, col, num in spec)
+
+
+COLUMNS = {}
+
+COLUMNS.update(_cols('u', 'USER_', [('ID',          'user_id',        True),
+                                    ('NAME',        'user_name',      False),
+                                    ('TYPE',        'user_type_name', False),
+                                    ('ZONE',        'zone_name',      False),
+                                    ('INFO',        'user_info',      False),
+                                    ('COMMENT',     'r_comment',      False),
+                                    ('CREATE_TIME', 'create_ts',      False),
+                                    ('MODIFY_TIME', 'modify_ts',      False)]))
+
+COLUMNS.update(_cols('g', 'USER_GROUP_', [('ID',   'user_id',   True),
+                                          ('NAME', 'user_name', False)]))
+
+COLUMNS.update(_cols('r', 'RESC_', [('ID',          'resc_id',         True),
+                                    ('NAME',        'resc_name',       False),
+                                    ('ZONE_NAME',   'zone_name',       False),
+                                    ('TYPE_NAME',   'resc_type_name',  False),
+                                    ('CLASS_NAME',  'resc_class_name', False),
+                                    ('LOC',         'resc_net',        False),
+                                    ('VAULT_PATH',  'resc_def_path',   False),
+                                    ('PARENT',      'resc_parent',     False),
+                                    ('STATUS',      'resc_status',     False),
+                                    ('CREATE_TIME', 'create_ts',       False),
+                                    ('MODIFY_TIME', 'modify_ts',       False)]))
+
+COLUMNS.update(_cols('c', 'COLL_', [('ID',          'coll_id',          True),
+                                    ('NAME',        'coll_name',        False),
+                                    ('PARENT_NAME', 'parent_coll_name', False),
+                                    ('OWNER_NAME',  'coll_owner_name',  False),
+                                    ('OWNER_ZONE',  'coll_owner_zone',  False),
+                                    ('INHERITANCE', 'coll_inheritance', False),
+                                    ('TYPE',        'coll_type',        False),
+                                    ('CREATE_TIME', 'create_ts',        False),
+                                    ('MODIFY_TIME', 'modify_ts',        False)]))
+
+COLUMNS.update(_cols('d', 'DATA_', [('ID',          'data_id',         True),
+                                    ('COLL_ID',     'coll_id',         True),
+                                    ('NAME',        'data_name',       False),
+                                    ('REPL_NUM',    'data_repl_num',   True),
+                                    ('VERSION',     'data_version',    False),
+                                    ('TYPE_NAME',   'data_type_name',  False),
+                                    ('SIZE',        'data_size',       True),
+                                    ('RESC_ID',     'resc_id',         True),
+                                    ('RESC_NAME',   'resc_name',       False),
+                                    ('RESC_HIER',   'resc_hier',       False),
+                                    ('PATH',        'data_path',       False),
+                                    ('OWNER_NAME',  'data_owner_name', False),
+                                    ('OWNER_ZONE',  'data_owner_zone', False),
+                                    ('REPL_STATUS', 'data_is_dirty',   True),
+                                    ('STATUS',      'data_status',     False),
+                                    ('CHECKSUM',    'data_checksum',   False),
+                                    ('MODE',        'data_mode',       False),
+                                    ('CREATE_TIME', 'create_ts',       False),
+                                    ('MODIFY_TIME', 'modify_ts',       False)]))
+
+for _e, _p in [('da', 'DATA_ACCESS_'), ('ca', 'COLL_ACCESS_')]:
+    COLUMNS[_p + 'TYPE']    = (_e, _e + '.access_type_id', True)
+    COLUMNS[_p + 'NAME']    = (_e, _e + 't.token_name',    False)
+    COLUMNS[_p + 'USER_ID'] = (_e, _e + '.user_id',        True)
+COLUMNS['DATA_ACCESS_DATA_ID'] = ('da', 'da.object_id', True)
+COLUMNS['COLL_ACCESS_COLL_ID'] = ('ca', 'ca.object_id', True)
+
+for _m, _p in [('md', 'DATA'), ('mc', 'COLL'), ('mu', 'USER'), ('mr', 'RESC')]:
+    COLUMNS.update(_cols(_m, 'META_{}_'.format(_p), [('ATTR_ID',     'meta_id',         True),
+                                                     ('ATTR_NAME',   'meta_attr_name',  False),
+                                                     ('ATTR_VALUE',  'meta_attr_value', False),
+                                                     ('ATTR_UNITS',  'meta_attr_unit',  False),
+                                                     ('CREATE_TIME', 'create_ts',       False),
+                                                     ('MODIFY_TIME', 'modify_ts',       False)]))
+
+# }}}
+
+ORDER_FUNCTIONS     = {'ORDER': 'ASC', 'ORDER_ASC': 'ASC', 'ORDER_DESC': 'DESC'}
+AGGREGATE_FUNCTIONS = ('SUM', 'COUNT', 'MIN', 'MAX', 'AVG')
+
+
+def column(name):
+    try:
+        return COLUMNS[name.strip().upper()]
+    except KeyError:
+        raise GenQueryError('Unknown GenQuery column <{}>'.format(name.strip()))
+
+
+def parse_select(select):
+    """Parse a GenQuery select string.
+
+    :param select: Comma-separated list of (optionally function-wrapped) column names
+
+    :returns: List of (column name, function name or None) tuples
+    """
+    result = []
+    for item in select.split(','):
+        item = item.strip()
+        m = re.match(r'^(\w+)\s*\(\s*(\w+)\s*\)$', item)
+        if m:
+            fn = m.group(1).upper()
+            if fn not in ORDER_FUNCTIONS and fn not in AGGREGATE_FUNCTIONS:
+                raise GenQueryError('Unknown GenQuery function <{}>'.format(m.group(1)))
+            result.append((m.group(2).upper(), fn))
+        else:
+            result.append((item.upper(), None))
+        column(result[-1][0])
+    return result
+
+
+# Condition parsing {{{
+
+TOKEN = re.compile(r"""\s*(?:('[^']*')|(\|\||&&|<=|>=|<>|!=|=|<|>|\(|\)|,)|([^\s'()<>=!,|&]+))""")
+
+
+def tokenize(condition):
+    tokens = []
+    pos    = 0
+    condition = condition.rstrip()
+    while pos < len(condition):
+        m = TOKEN.match(condition, pos)
+        if m is None or m.end() == pos:
+            raise GenQueryError('Could not parse condition <{}> at position {}'.format(condition, pos))
+        quoted, op, word = m.groups()
+        if quoted is not None:
+            tokens.append(('str', quoted[1:-1]))
+        elif op is not None:
+            tokens.append(('op', op))
+        else:
+            tokens.append(('word', word))
+        pos = m.end()
+    return tokens
+
+
+class _Parser(object):
+    """Recursive descent parser for GenQuery conditions."""
+
+    def __init__(self, condition):
+        self.condition = condition
+        self.tokens    = tokenize(condition)
+        self.i         = 0
+
+    def peek(self, kind=None, value=None):
+        if self.i >= len(self.tokens):
+            return None
+        t = self.tokens[self.i]
+        if kind is not None and t[0] != kind:
+            return None
+        if value is not None and t[1].upper() != value:
+            return None
+        return t
+
+    def take(self, kind=None, value=None):
+        t = self.peek(kind, value)
+        if t is None:
+            raise GenQueryError('Could not parse condition <{}>: expected {} near token {}'
+                                .format(self.condition, value or kind, self.i))
+        self.i += 1
+        return t
+
+    def value(self):
+        t = self.peek()
+        if t is None or t[0] == 'op':
+            self.take('str')
+        self.i += 1
+        return t[1]
+
+    def predicate(self):
+        negate = bool(self.peek('word', 'NOT'))
+        if negate:
+            self.i += 1
+        if self.peek('word', 'LIKE'):
+            self.i += 1
+            return ('NOT LIKE' if negate else 'LIKE', [self.value()])
+        if self.peek('word', 'IN'):
+            self.i += 1
+            self.take('op', '(')
+            values = [self.value()]
+            while self.peek('op', ','):
+                self.i += 1
+                values.append(self.value())
+            self.take('op', ')')
+            return ('NOT IN' if negate else 'IN', values)
+        if negate:
+            raise GenQueryError('Could not parse condition <{}>: expected LIKE or IN after NOT'.format(self.condition))
+        if self.peek('word', 'BETWEEN'):
+            self.i += 1
+            return ('BETWEEN', [self.value(), self.value()])
+        op = self.take('op')[1]
+        if op not in ('=', '!=', '<>', '<', '<=', '>', '>='):
+            raise GenQueryError('Could not parse condition <{}>: unexpected <{}>'.format(self.condition, op))
+        return ('<>' if op == '!=' else op, [self.value()])
+
+    def parse(self):
+        """Returns a list of (column name, [(operator, values), ...]) tuples (OR-ed predicates)."""
+        conditions = []
+        while self.peek() is not None:
+            if conditions:
+                if self.peek('word', 'AND') or self.peek('op', '&&') or self.peek('op', ','):
+                    self.i += 1
+            col = self.take('word')[1].upper()
+            column(col)
+            preds = [self.predicate()]
+            while self.peek('op', '||'):
+                self.i += 1
+                preds.append(self.predicate())
+            conditions.append((col, preds))
+        return conditions
+
+
+def parse_conditions(condition):
+    return _Parser(condition).parse() if condition.strip() else []
+
+# }}}
+
+
+def _bind(value, numeric):
+    if numeric:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _requirements(entities):
+    """Complete a set of entities with the tables needed to join them, returns join conditions."""
+    joins = []
+    for m, (owner, owner_id) in META.items():
+        if m in entities:
+            entities.update([owner, 'm' + m])
+            joins += ['m{0}.object_id = {1}'.format(m, owner_id),
+                      'm{0}.meta_id = {0}.meta_id'.format(m)]
+
+    if 'g' in entities:
+        entities.update(['u', 'ug'])
+        joins += ['ug.user_id = u.user_id', 'ug.group_user_id = g.user_id']
+
+    if 'c' in entities and 'r' in entities:
+        entities.add('d')
+
+    # Users are related to objects through the access table.
+    if 'u' in entities:
+        if 'd' in entities:
+            entities.add('da')
+            joins.append('da.user_id = u.user_id')
+        elif 'c' in entities:
+            entities.add('ca')
+            joins.append('ca.user_id = u.user_id')
+
+    if 'd' in entities and 'c' in entities:
+        joins.append('d.coll_id = c.coll_id')
+    if 'd' in entities and 'r' in entities:
+        joins.append('d.resc_id = r.resc_id')
+
+    for a, obj_id in [('da', 'd.data_id'), ('ca', 'c.coll_id')]:
+        if a in entities:
+            entities.update([a[0], a + 't'])
+            joins += ['{}.object_id = {}'.format(a, obj_id),
+                      "{0}t.token_namespace = 'access_type'".format(a),
+                      '{0}t.token_id = {0}.access_type_id'.format(a)]
+    return joins
+
+
+def translate(select, condition, options=0):
+    """Translate a GenQuery to SQL.
+
+    :param select:    GenQuery select string
+    :param condition: GenQuery condition string
+    :param options:   GenQuery option flags
+
+    :returns: Tuple of (SQL string, list of arguments, SQL string for the total row count)
+    """
+    columns    = parse_select(select)
+    conditions = parse_conditions(condition)
+
+    entities = set(column(c)[0] for c, _ in columns)
+    entities.update(column(c)[0] for c, _ in conditions)
+    joins = _requirements(entities)
+
+    exprs     = []
+    group_by  = []
+    order_by  = []
+    has_aggr  = False
+    for name, fn in columns:
+        expr = column(name)[1]
+        if fn in AGGREGATE_FUNCTIONS:
+            exprs.append('{}({})'.format(fn, expr))
+            has_aggr = True
+        else:
+            exprs.append(expr)
+            group_by.append(expr)
+            if fn in ORDER_FUNCTIONS:
+                order_by.append('{} {}'.format(expr, ORDER_FUNCTIONS[fn]))
+
+    # Without explicit ordering, iRODS orders on all selected columns.
+    order_by += [x for x, (_, fn) in zip(exprs, columns) if fn not in ORDER_FUNCTIONS and fn not in AGGREGATE_FUNCTIONS]
+
+    where = list(joins)
+    args  = []
+    for name, preds in conditions:
+        _, expr, numeric = column(name)
+        if options & UPPER_CASE_WHERE:
+            expr = 'UPPER({})'.format(expr)
+        alternatives = []
+        for op, values in preds:
+            values = [_bind(v, numeric) for v in values]
+            if op in ('IN', 'NOT IN'):
+                alternatives.append('{} {} ({})'.format(expr, op, ', '.join('?' * len(values))))
+            elif op == 'BETWEEN':
+                alternatives.append('{} BETWEEN ? AND ?'.format(expr))
+            elif op in ('LIKE', 'NOT LIKE'):
+                alternatives.append("{} {} ? ESCAPE '\\'".format(expr, op))
+            else:
+                alternatives.append('{} {} ?'.format(expr, op))
+            args += values
+        where.append(alternatives[0] if len(alternatives) == 1 else '({})'.format(' OR '.join(alternatives)))
+
+    sql = 'SELECT {}{} FROM {}'.format('' if options & NO_DISTINCT else 'DISTINCT ',
+                                       ', '.join(exprs),
+                                       ', '.join(TABLES[e] for e in sorted(entities)))
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    if has_aggr and group_by:
+        sql += ' GROUP BY ' + ', '.join(group_by)
+
+    count_sql = 'SELECT COUNT(*) FROM ({})'.format(sql)
+
+    if order_by:
+        sql += ' ORDER BY ' + ', '.join(order_by)
+
+    return sql, args, count_sql
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""Synthetic zone generator for the offline catalog.
+
+Generates a Yoda zone with research groups (with research, vault, read and
+datamanager groups), research folder trees, vault data packages, revisions
+in the revision store, intake studies and metadata schemas. Generation is
+deterministic for a given seed.
+
+Usage: python -m offline.zone [-h] [--objects N] [--groups N] ... zone.db
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+from . import catalog as icat
+
+CATEGORIES = ['default-1', 'science', 'humanities']
+
+SCHEMA_ID = 'https://yoda.uu.nl/schemas/default-1/metadata.json'
+
+EXPERIMENT_TYPES = ['pci', 'echo', 'facehouse', 'infprogap', 'peabody', 'cyberball']
+WAVES            = ['20w', '30w', '0m', '5m', '10m', '3y']
+
+
+class Builder(object):
+    """Buffers catalog rows and inserts them in bulk.
+
+    Collection and user ids are cached, so that objects can be added without
+    querying the catalog.
+    """
+
+    FLUSH_ROWS = 50000
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.zone    = catalog.zone
+        self.colls   = {}
+        self.users   = {}
+        self.rescs   = {}
+        self.avus    = {}
+        self.rows    = dict((t, []) for t in ['r_coll_main', 'r_data_main', 'r_meta_main',
+                                              'r_objt_metamap', 'r_objt_access', 'offline_content'])
+        self.pending = 0
+
+    def _add(self, table, row):
+        self.rows[table].append(row)
+        self.pending += 1
+        if self.pending >= self.FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        self.catalog.begin()
+        for table, rows in self.rows.items():
+            if rows:
+                self.catalog.db.executemany('INSERT OR IGNORE INTO {} VALUES ({})'
+                                            .format(table, ', '.join('?' * len(rows[0]))), rows)
+                del rows[:]
+        self.catalog.commit()
+        self.pending = 0
+
+    def user(self, name, user_type='rodsuser'):
+        if name not in self.users:
+            self.users[name] = self.catalog.user_id(name) or self.catalog.add_user(name, user_type)
+        return self.users[name]
+
+    def group(self, name, members=(), **avus):
+        gid = self.user(name, 'rodsgroup')
+        for m in members:
+            self.catalog.add_member(name, m)
+        for k, v in sorted(avus.items()):
+            for x in v if isinstance(v, list) else [v]:
+                self.avu(gid, k, x)
+        return gid
+
+    def resource(self, name, host, tier=None):
+        rid = self.catalog.resc_id(name) or self.catalog.add_resource(name, host)
+        self.rescs[name] = rid
+        if tier is not None:
+            self.avu(rid, 'org_storage_tier', tier)
+        return rid
+
+    def acl(self, oid, user, access, t):
+        ts = icat.timestamp(t)
+        self._add('r_objt_access', (oid, self.users[user], icat.ACCESS_IDS[access], ts, ts))
+
+    def coll(self, path, owner='rods', acls=(), t=None, inherit=False):
+        if path in self.colls:
+            return self.colls[path]
+        parent = path.rsplit('/', 1)[0] or '/'
+        if path != '/' and parent not in self.colls:
+            self.coll(parent, owner, acls, t, inherit)
+        t   = t or time.time()
+        ts  = icat.timestamp(t)
+        cid = self.catalog.next_id()
+        self.colls[path] = cid
+        self._add('r_coll_main', (cid, parent, path, owner, self.zone, '1' if inherit else '', '', ts, ts))
+        self.acl(cid, owner, 'own', t)
+        for user, access in acls:
+            self.acl(cid, user, access, t)
+        return cid
+
+    def data(self, path, size, owner='rods', acls=(), t=None, checksum='', content=None,
+             resources=('irodsResc',)):
+        coll, name = path.rsplit('/', 1)
+        cid = self.colls[coll]
+        did = self.catalog.next_id()
+        t   = t or time.time()
+        ts  = icat.timestamp(t)
+        if content is not None:
+            size     = len(content)
+            checksum = 'sha2:' + base64.b64encode(hashlib.sha256(content).digest()).decode('ascii')
+            self._add('offline_content', (did, content))
+        for repl, resc in enumerate(resources):
+            self._add('r_data_main', (did, cid, name, repl, '', 'generic', size, self.rescs[resc], resc, resc,
+                                      '/var/lib/irods/{}{}'.format(resc, path), owner, self.zone,
+                                      1, '', checksum, '', ts, ts))
+        self.acl(did, owner, 'own', t)
+        for user, access in acls:
+            self.acl(did, user, access, t)
+        return did
+
+    def avu(self, oid, attr, value, unit='', t=None):
+        key = (attr, value, unit)
+        ts  = icat.timestamp(t)
+        if key not in self.avus:
+            mid = self.catalog.scalar('SELECT meta_id FROM r_meta_main WHERE meta_attr_name = ?'
+                                      ' AND meta_attr_value = ? AND meta_attr_unit = ?', key)
+            if mid is None:
+                mid = self.catalog.next_id()
+                self._add('r_meta_main', (mid, attr, value, unit, ts, ts))
+            self.avus[key] = mid
+        self._add('r_objt_metamap', (oid, self.avus[key], ts, ts))
+
+
+def _metadata(title, rng):
+    return {'links': [{'rel': 'describedby', 'href': SCHEMA_ID}],
+            'Title': title,
+            'Description': 'Synthetic data package {}'.format(title),
+            'Discipline': ['Natural Sciences - Mathematics (1.1)'],
+            'Language': 'en - English',
+            'Collected': {'Start_Date': '2019-01-01', 'End_Date': '2019-12-31'},
+            'Tag': ['synthetic', 'test'],
+            'Retention_Period': 10,
+            'Data_Type': 'Dataset',
+            'Data_Classification': 'Public',
+            'Data_Access_Restriction': rng.choice(['Open - freely retrievable',
+                                                   'Restricted - available upon request']),
+            'License': 'Creative Commons Attribution 4.0 International Public License',
+            'Creator': [{'Name': {'Given_Name': 'Test', 'Family_Name': 'Researcher'},
+                         'Affiliation': ['Utrecht University']}]}
+
+
+def _iso8601(t):
+    return time.strftime('%Y%m%dT%H%M%S+0000', time.gmtime(t))
+
+
+def generate(catalog, objects=10000, groups=5, users_per_group=4, fanout=4, depth=3,
+             vault_fraction=0.2, revision_fraction=0.3, max_revisions=5,
+             intake_studies=1, replicas=1, seed=1, now=None):
+    """Generate a synthetic zone in an (empty) catalog.
+
+    :param catalog:           Catalog to fill
+    :param objects:           Approximate amount of research and vault data objects
+    :param groups:            Amount of research groups
+    :param users_per_group:   Amount of members per research group (the first is manager)
+    :param fanout:            Amount of subcollections per research collection
+    :param depth:             Depth of research folder trees
+    :param vault_fraction:    Fraction of the data objects that is stored in vault packages
+    :param revision_fraction: Fraction of research data objects that has revisions
+    :param max_revisions:     Maximum amount of revisions per data object
+    :param intake_studies:    Amount of intake studies
+    :param replicas:          Amount of replicas per data object
+    :param seed:              Random seed
+    :param now:               Current time (unix timestamp) of the zone
+
+    :returns: Dict with the amount of generated objects per kind
+    """
+    rng  = random.Random(seed)
+    now  = int(now or time.time())
+    zone = catalog.zone
+    b    = Builder(catalog)
+    counts = dict.fromkeys(['collections', 'data_objects', 'revisions', 'vault_packages'], 0)
+
+    def rand_time(days):
+        return now - rng.randint(0, days * 86400)
+
+    def rand_size():
+        return int(rng.lognormvariate(10, 2.5))
+
+    def rand_checksum():
+        return 'sha2:' + base64.b64encode(hashlib.sha256(str(rng.random()).encode()).digest()).decode('ascii')
+
+    # Users, groups and resources.
+    b.user('rods', 'rodsadmin')
+    b.group('rodsadmin', ['rods'])
+    b.group('public', ['rods'])
+    b.resource('irodsResc', 'icat.yoda.test', 'Standard')
+    resources = ['irodsResc']
+    for i in range(1, replicas):
+        name = 'irodsRescRepl{}'.format(i)
+        b.resource(name, 'resc{}.yoda.test'.format(i), 'Archive')
+        resources.append(name)
+
+    for category in CATEGORIES:
+        b.user('datamanager-' + category)
+        b.group('datamanager-' + category, ['datamanager-' + category],
+                category=category, subcategory=category, description='.')
+
+    home = '/{}/home'.format(zone)
+    b.coll(home)
+    b.coll('/{}/yoda/revisions'.format(zone))
+    b.coll('/{}/yoda/schemas'.format(zone))
+
+    # Schemas from this ruleset.
+    schema_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schemas')
+    for name in sorted(os.listdir(schema_dir)) + ['default']:
+        coll = '/{}/yoda/schemas/{}'.format(zone, name)
+        b.coll(coll, acls=[('public', 'read object')])
+        for f in ['metadata.json', 'uischema.json']:
+            with open(os.path.join(schema_dir, 'default-1' if name == 'default' else name, f), 'rb') as fd:
+                b.data('{}/{}'.format(coll, f), 0, content=fd.read(), acls=[('public', 'read object')],
+                       resources=resources)
+
+    per_group = max(1, objects // groups)
+    leaves    = fanout ** depth
+
+    for g in range(groups):
+        base     = 'group{}'.format(g)
+        category = CATEGORIES[g % len(CATEGORIES)]
+        users    = ['researcher{}-{}'.format(g, u) for u in range(users_per_group)]
+        for u in users:
+            b.user(u)
+        research = 'research-' + base
+        vault    = 'vault-' + base
+        b.group(research, users, category=category, subcategory=category,
+                description='Research group {}'.format(g), data_classification='unspecified',
+                manager=['{}#{}'.format(users[0], zone)])
+        b.group(vault)
+        b.user('viewer{}'.format(g))
+        b.group('read-' + base, ['viewer{}'.format(g)])
+
+        # Research area.
+        t = rand_time(1000)
+        acls = [(research, 'own'), ('read-' + base, 'read object')]
+        root = '{}/{}'.format(home, research)
+        b.coll(root, acls=acls, t=t, inherit=True)
+        b.data(root + '/yoda-metadata.json', 0, users[0], acls, t,
+               content=json.dumps(_metadata(research, rng), indent=4).encode(), resources=resources)
+        paths = [root]
+        for d in range(depth):
+            paths = ['{}/{}dir{}'.format(p, 'sub' * d, i) for p in paths for i in range(fanout)]
+            for p in paths:
+                b.coll(p, acls=acls, t=rand_time(1000), inherit=True)
+                counts['collections'] += 1
+
+        revision_root = '/{}/yoda/revisions/{}'.format(zone, research)
+        b.coll(revision_root, acls=[(research, 'own')], inherit=True)
+
+        n_research = int(per_group * (1 - vault_fraction))
+        for n in range(n_research):
+            coll  = paths[n % leaves]
+            name  = 'file{}.dat'.format(n)
+            owner = rng.choice(users)
+            t     = rand_time(1000)
+            size  = rand_size()
+            path  = '{}/{}'.format(coll, name)
+            did   = b.data(path, size, owner, acls, t, rand_checksum(), resources=resources)
+            counts['data_objects'] += 1
+
+            if rng.random() < revision_fraction:
+                rev_coll = '{}/{}'.format(revision_root, b.colls[coll])
+                b.coll(rev_coll, acls=[(research, 'own')], t=t, inherit=True)
+                rt = t
+                for r in range(rng.randint(1, max_revisions)):
+                    rt = rt - rng.randint(60, 200 * 86400)
+                    rsize = rand_size()
+                    rev = b.data('{}/{}_{}{}'.format(rev_coll, name, _iso8601(rt), owner), rsize,
+                                 'rods', [(research, 'own')], rt, rand_checksum(), resources=resources)
+                    for k, v in [('original_path', path), ('original_coll_name', coll),
+                                 ('original_data_name', name), ('original_data_owner_name', owner),
+                                 ('original_data_id', str(did)), ('original_coll_id', str(b.colls[coll])),
+                                 ('original_modify_time', icat.timestamp(rt)),
+                                 ('original_group_name', research), ('original_filesize', str(rsize))]:
+                        b.avu(rev, 'org_' + k, v, t=rt)
+                    b.avu(b.colls[revision_root], 'org_revision_index', path,
+                          '{}:{}:{}'.format(rev, icat.timestamp(rt), rsize), t=rt)
+                    counts['revisions'] += 1
+                b.avu(b.colls[revision_root], 'org_revision_name_index', name, path, t=rt)
+
+        # Vault area.
+        vroot = '{}/{}'.format(home, vault)
+        vacls = [(vault, 'read object'), ('datamanager-' + category, 'read object')]
+        b.coll(vroot, acls=vacls)
+        n_vault    = per_group - n_research
+        n_packages = max(1, n_vault // 50) if n_vault else 0
+        for p in range(n_packages):
+            t   = rand_time(700)
+            pkg = '{}/package{}[{}]'.format(vroot, p, t)
+            pid = b.coll(pkg, acls=vacls, t=t)
+            b.coll(pkg + '/original', acls=vacls, t=t)
+            b.data('{}/yoda-metadata[{}].json'.format(pkg, t), 0, 'rods', vacls, t,
+                   content=json.dumps(_metadata('package{}'.format(p), rng), indent=4).encode(),
+                   resources=resources)
+            for n in range(n_vault // n_packages):
+                b.data('{}/original/file{}.dat'.format(pkg, n), rand_size(), 'rods', vacls, t,
+                       rand_checksum(), resources=resources)
+                counts['data_objects'] += 1
+            published = rng.random() < 0.3
+            b.avu(pid, 'org_vault_status', 'PUBLISHED' if published else 'UNPUBLISHED', t=t)
+            b.avu(pid, 'org_action_log', json.dumps([str(t), 'secured in vault', 'rods']), t=t)
+            if published:
+                doi = '10.5072/YODA-{}-{}'.format(g, p)
+                b.avu(pid, 'org_publication_yodaDOI', doi, t=t)
+                b.avu(pid, 'org_publication_landingPageUrl', 'https://public.yoda.test/{}.html'.format(doi), t=t)
+                b.avu(pid, 'org_publication_lastModifiedDateTime',
+                      time.strftime('%Y-%m-%dT%H:%M:%S.000000', time.gmtime(t)), t=t)
+            counts['vault_packages'] += 1
+
+    # Intake studies.
+    for s in range(intake_studies):
+        study = 'study{}'.format(s)
+        user  = 'intake-researcher{}'.format(s)
+        b.user(user)
+        intake, dm = 'grp-intake-' + study, 'grp-datamanager-' + study
+        b.group(intake, [user], category='intake', subcategory=study, description='.')
+        b.group(dm, [user], category='intake', subcategory=study, description='.')
+        acls = [(intake, 'own'), (dm, 'read object')]
+        root = '{}/{}'.format(home, intake)
+        b.coll(root, acls=acls)
+        for d in range(10):
+            wave, exp = WAVES[d % len(WAVES)], EXPERIMENT_TYPES[d % len(EXPERIMENT_TYPES)]
+            pseudo = 'B{:05d}'.format(d)
+            dset   = '{}/{}_{}_{}'.format(root, pseudo, wave, exp)
+            did    = '\t'.join([wave, exp, pseudo, 'Raw', dset])
+            cid    = b.coll(dset, acls=acls)
+            b.avu(cid, 'dataset_toplevel', did)
+            b.avu(cid, 'comment', '{}:{}:Synthetic dataset'.format(user, now))
+            if d % 3 == 0:
+                b.avu(cid, 'dataset_warning', 'Experiment type has no version')
+            for sub in range(2):
+                sub_coll = '{}/session{}'.format(dset, sub)
+                sid = b.coll(sub_coll, acls=acls)
+                if sub:
+                    b.avu(sid, 'warning', 'Unrecognized subfolder')
+                for n in range(5):
+                    oid = b.data('{}/{}_{}_{}_{}.dat'.format(sub_coll, pseudo, wave, exp, n), rand_size(),
+                                 user, acls, rand_time(100), resources=resources)
+                    for k, v in [('dataset_id', did), ('wave', wave), ('experiment_type', exp),
+                                 ('pseudocode', pseudo), ('scanned', '{}:{}'.format(user, now))]:
+                        b.avu(oid, k, v)
+
+    b.flush()
+    return counts
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description='Generate a synthetic Yoda zone in an offline catalog.')
+    p.add_argument('database', help='SQLite database file to create')
+    p.add_argument('--zone',              default='tempZone')
+    p.add_argument('--objects',           type=int,   default=10000)
+    p.add_argument('--groups',            type=int,   default=5)
+    p.add_argument('--users-per-group',   type=int,   default=4)
+    p.add_argument('--fanout',            type=int,   default=4)
+    p.add_argument('--depth',             type=int,   default=3)
+    p.add_argument('--vault-fraction',    type=float, default=0.2)
+    p.add_argument('--revision-fraction', type=float, default=0.3)
+    p.add_argument('--max-revisions',     type=int,   default=5)
+    p.add_argument('--intake-studies',    type=int,   default=1)
+    p.add_argument('--replicas',          type=int,   default=1)
+    p.add_argument('--seed',              type=int,   default=1)
+    a = p.parse_args(args)
+
+    if os.path.exists(a.database):
+        sys.exit('{} already exists'.format(a.database))
+
+    start  = time.time()
+    counts = generate(icat.Catalog(a.database, a.zone),
+                      objects=a.objects, groups=a.groups, users_per_group=a.users_per_group,
+                      fanout=a.fanout, depth=a.depth, vault_fraction=a.vault_fraction,
+                      revision_fraction=a.revision_fraction, max_revisions=a.max_revisions,
+                      intake_studies=a.intake_studies, replicas=a.replicas, seed=a.seed)
+    print(json.dumps(dict(counts, seconds=round(time.time() - start, 1))))
+
+
+if __name__ == '__main__':
+    main()
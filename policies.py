@@ -14,6 +14,7 @@ import policies_datapackage_status
 import policies_datarequest_status
 import policies_folder_status
 import policies_intake
+import resources
 from util import *
 
 
@@ -32,7 +33,7 @@ from util import *
 
 def can_coll_create(ctx, actor, coll):
     """Disallow creating collections in locked folders."""
-    log.debug(ctx, 'check coll create <{}>'.format(coll))
+    log.debug(ctx, 'check coll create <{}>', coll)
 
     if pathutil.info(coll).space is pathutil.Space.RESEARCH:
         if folder.is_locked(ctx, pathutil.dirname(coll)) and not user.is_admin(ctx, actor):
@@ -47,7 +48,7 @@ def can_coll_create(ctx, actor, coll):
 
 def can_coll_delete(ctx, actor, coll):
     """Disallow deleting collections in locked folders and collections containing locked folders."""
-    log.debug(ctx, 'check coll delete <{}>'.format(coll))
+    log.debug(ctx, 'check coll delete <{}>', coll)
 
     if re.match(r'^/[^/]+/home/[^/]+$', coll) and not user.is_admin(ctx, actor):
         return policy.fail('Cannot delete or move collections directly under /home')
@@ -64,14 +65,14 @@ def can_coll_delete(ctx, actor, coll):
 
 
 def can_coll_move(ctx, actor, src, dst):
-    log.debug(ctx, 'check coll move <{}> -> <{}>'.format(src, dst))
+    log.debug(ctx, 'check coll move <{}> -> <{}>', src, dst)
 
     return policy.all(can_coll_delete(ctx, actor, src),
                       can_coll_create(ctx, actor, dst))
 
 
 def can_data_create(ctx, actor, path):
-    log.debug(ctx, 'check data create <{}>'.format(path))
+    log.debug(ctx, 'check data create <{}>', path)
 
     if pathutil.info(path).space is pathutil.Space.RESEARCH:
         if folder.is_locked(ctx, pathutil.dirname(path)):
@@ -93,7 +94,7 @@ def can_data_create(ctx, actor, path):
 
 
 def can_data_write(ctx, actor, path):
-    log.debug(ctx, 'check data write <{}>'.format(path))
+    log.debug(ctx, 'check data write <{}>', path)
 
     # Disallow writing to locked objects in research folders.
     if pathutil.info(path).space is pathutil.Space.RESEARCH:
@@ -124,12 +125,12 @@ def can_data_delete(ctx, actor, path):
 
 
 def can_data_copy(ctx, actor, src, dst):
-    log.debug(ctx, 'check data copy <{}> -> <{}>'.format(src, dst))
+    log.debug(ctx, 'check data copy <{}> -> <{}>', src, dst)
     return can_data_create(ctx, actor, dst)
 
 
 def can_data_move(ctx, actor, src, dst):
-    log.debug(ctx, 'check data move <{}> -> <{}>'.format(src, dst))
+    log.debug(ctx, 'check data move <{}> -> <{}>', src, dst)
     return policy.all(can_data_delete(ctx, actor, src),
                       can_data_create(ctx, actor, dst))
 
@@ -178,10 +179,22 @@ def py_acPreprocForDataObjOpen(ctx):
 @policy.require()
 def py_acDataDeletePolicy(ctx):
     log._debug(ctx, 'py_acDataDeletePolicy')
-    return (policy.succeed()
-            if can_data_delete(ctx, user.user_and_zone(ctx),
-                               str(session_vars.get_map(ctx.rei)['data_object']['object_path']))
-            else ctx.msiDeleteDisallowed())
+    path = str(session_vars.get_map(ctx.rei)['data_object']['object_path'])
+    if not can_data_delete(ctx, user.user_and_zone(ctx), path):
+        return ctx.msiDeleteDisallowed()
+
+    # Called per replica before any is removed: remember all replicas,
+    # they are subtracted by acPostProcForDelete once they are removed.
+    resources.storage_usage_remember(ctx, path)
+    return policy.succeed()
+
+
+@rule.make()
+def py_acPostProcForDelete(ctx):
+    log._debug(ctx, 'py_acPostProcForDelete')
+    # Called once per unlink, which may remove several replicas.
+    resources.storage_usage_forget(ctx, str(session_vars.get_map(ctx.rei)['data_object']['object_path']),
+                                   removed_only=True)
 
 
 @policy.require()
@@ -209,7 +222,9 @@ def py_acPostProcForPut(ctx):
     x = can_data_create(ctx, user.user_and_zone(ctx), path)
 
     if not x:
-        data_object.remove(ctx, path)
+        remove_rejected(ctx, path)
+    else:
+        account_created(ctx, path)
 
     return x
 
@@ -223,11 +238,32 @@ def py_acPostProcForCopy(ctx):
     x = can_data_create(ctx, user.user_and_zone(ctx), path)
 
     if not x:
-        data_object.remove(ctx, path)
+        remove_rejected(ctx, path)
+    else:
+        account_created(ctx, path)
 
     return x
 
 
+def account_created(ctx, path):
+    """Account a created or overwritten data object in the storage counters, once it is authorized."""
+    # The replicas of an overwritten data object were remembered by the API pre PEP.
+    resources.storage_usage_forget(ctx, path)
+    resources.storage_usage_add_data(ctx, path)
+
+
+def remove_rejected(ctx, path):
+    """Remove a data object whose creation was rejected.
+
+    The new replicas were never added to the storage counters, so the
+    removal is not accounted. The replicas of an overwritten data object
+    are gone as well, and are subtracted.
+    """
+    with resources.storage_usage_suspended(path):
+        data_object.remove(ctx, path)
+    resources.storage_usage_forget(ctx, path)
+
+
 # Disabled: caught by acPreprocForCollCreate
 # @policy.require()
 # def pep_api_coll_create_pre(ctx, instance_name, rs_comm, coll_create_inp):
@@ -242,13 +278,21 @@ def py_acPostProcForCopy(ctx):
 #     return can_coll_delete(ctx, user.user_and_zone(ctx),
 #                            str(rm_coll_inp.collName))
 
-# Disabled: caught by acPostProcForPut
-# @policy.require()
-# def pep_api_data_obj_put_pre(ctx, instance_name, rs_comm, data_obj_inp, data_obj_inp_bbuf, portal_opr_out):
-#     # Matches data object creation/overwrite via iput.
-#     log._debug(ctx, 'pep_api_data_obj_put_pre')
-#     return can_data_create(ctx, user.user_and_zone(ctx),
-#                            str(data_obj_inp.objPath))
+
+def is_overwrite(data_obj_inp):
+    """Check whether a data object input has the force flag set (i.e. overwrites an existing data object)."""
+    options = data_obj_inp.condInput
+    return 'forceFlag' in [str(options.key[i]) for i in range(options.len)]
+
+
+@rule.make()
+def pep_api_data_obj_put_pre(ctx, instance_name, rs_comm, data_obj_inp, data_obj_inp_bbuf, portal_opr_out):
+    log._debug(ctx, 'pep_api_data_obj_put_pre')
+    # Matches data object creation/overwrite via iput.
+    # Authorization is caught by acPostProcForPut, which also accounts the new replicas in the storage counters.
+    # Remember the replicas of an overwritten data object, they are subtracted there.
+    if is_overwrite(data_obj_inp):
+        resources.storage_usage_remember(ctx, str(data_obj_inp.objPath))
 
 
 @policy.require()
@@ -273,12 +317,13 @@ def pep_api_data_obj_create_and_stat_pre(ctx, instance_name, rs_comm, data_obj_i
                            str(data_obj_inp.objPath))
 
 
-# Disabled: caught by acPostProcForCopy
-# @policy.require()
-# def pep_api_data_obj_copy_pre(ctx, instance_name, rs_comm, data_obj_copy_inp, trans_stat):
-#     log._debug(ctx, 'pep_api_data_obj_copy_pre')
-#     return can_data_create(ctx, user.user_and_zone(ctx),
-#                            str(data_obj_copy_inp.destDataObjInp.objPath))
+@rule.make()
+def pep_api_data_obj_copy_pre(ctx, instance_name, rs_comm, data_obj_copy_inp, trans_stat):
+    log._debug(ctx, 'pep_api_data_obj_copy_pre')
+    # Authorization is caught by acPostProcForCopy, see pep_api_data_obj_put_pre.
+    if is_overwrite(data_obj_copy_inp.destDataObjInp):
+        resources.storage_usage_remember(ctx, str(data_obj_copy_inp.destDataObjInp.objPath))
+
 
 # Disabled: caught by acPreProcForObjRename
 # @policy.require()
@@ -389,6 +434,13 @@ def py_acPreProcForModifyAVUMetadata(ctx, option, obj_type, obj_name, attr, valu
         # Datarequest status change. Validate.
         return policies_datarequest_status.can_set_datarequest_status(ctx, obj_name, value)
 
+    elif attr.startswith(constants.UUMETADATASTORAGEUSAGE):
+        # Running storage counters are maintained by policies, with sudo microservices.
+        if not user.is_admin(ctx, actor):
+            return policy.fail('Storage counters can only be changed by rodsadmin')
+
+        return policy.succeed()
+
     else:
         # Allow metadata operations in general if they do not affect reserved
         # attributes.
@@ -511,7 +563,7 @@ def pep_resource_modified_post(ctx, instance_name, _ctx, out):
     except Exception as e:
         # The rules on metadata are run synchronously and could fail.
         # Log errors, but continue with revisions.
-        log.write(ctx, 'rule_meta_modified_post failed: ' + str(e))
+        log.error(ctx, 'rule_meta_modified_post failed: ' + str(e))
 
     ctx.uuResourceModifiedPostRevision(instance_name, zone, path)
 
@@ -28,7 +28,7 @@ def rule_provenance_log_action(ctx, actor, coll, action):
         avu.associate_to_coll(ctx, coll, constants.UUPROVENANCELOG, json.dumps(log_item))
         log.write(ctx, "rule_provenance_log_action: <{}> has <{}> (<{}>)".format(actor, action, coll))
     except Exception:
-        log.write(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(action))
+        log.error(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(action))
 
 
 def log_action(ctx, actor, coll, action):
@@ -44,7 +44,7 @@ def log_action(ctx, actor, coll, action):
         avu.associate_to_coll(ctx, coll, constants.UUPROVENANCELOG, json.dumps(log_item))
         log.write(ctx, "rule_provenance_log_action: <{}> has <{}> (<{}>)".format(actor, action, coll))
     except Exception:
-        log.write(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(action))
+        log.error(ctx, "rule_provenance_log_action: failed to log action <{}> to provenance".format(action))
 
 
 @rule.make()
@@ -79,7 +79,7 @@ def provenance_copy_log(ctx, source, target):
 
         log.write(ctx, "rule_copy_provenance_log: copied provenance log from <{}> to <{}>".format(source, target))
     except Exception:
-        log.write(ctx, "rule_copy_provenance_log: failed to copy provenance log from <{}> to <{}>".format(source, target))
+        log.error(ctx, "rule_copy_provenance_log: failed to copy provenance log from <{}> to <{}>".format(source, target))
 
 
 def get_provenance_log(ctx, coll):
@@ -60,7 +60,7 @@ def get_publication_config(ctx):
         # Difference between attrs wanted and found
         for key in attr2keys:
             if key not in found_attrs:
-                log.write(ctx, 'Missing config key ' + key)
+                log.error(ctx, 'Missing config key ' + key)
 
     return configKeys
 
@@ -355,10 +355,10 @@ def post_metadata_to_datacite(ctx, publication_config, publication_state):
         publication_state["dataCiteMetadataPosted"] = "yes"
     elif httpCode in [401, 403, 500, 503, 504]:
         # Unauthorized, Forbidden, Precondition failed, Internal Server Error
-        log.write(ctx, "post_metadata_to_datacite: httpCode " + str(httpCode) + " received. Will be retried later")
+        log.warning(ctx, "post_metadata_to_datacite: httpCode " + str(httpCode) + " received. Will be retried later")
         publication_state["status"] = "Retry"
     else:
-        log.write(ctx, "post_metadata_to_datacite: httpCode " + str(httpCode) + " received. Unrecoverable error.")
+        log.error(ctx, "post_metadata_to_datacite: httpCode " + str(httpCode) + " received. Unrecoverable error.")
         publication_state["status"] = "Unrecoverable"
 
 
@@ -372,14 +372,14 @@ def remove_metadata_from_datacite(ctx, publication_config, publication_state):
         publication_state["dataCiteMetadataPosted"] = "yes"
     elif httpCode in [401, 403, 412, 500, 503, 504]:
         # Unauthorized, Forbidden, Precondition failed, Internal Server Error
-        log.write(ctx, "remove metadata from datacite: httpCode " + str(httpCode) + " received. Will be retried later")
+        log.warning(ctx, "remove metadata from datacite: httpCode " + str(httpCode) + " received. Will be retried later")
         publication_state["status"] = "Retry"
     elif httpCode == 404:
         # Invalid DOI
-        log.write(ctx, "remove metadata from datacite: 404 Not Found - Invalid DOI")
+        log.error(ctx, "remove metadata from datacite: 404 Not Found - Invalid DOI")
         publication_state["status"] = "Unrecoverable"
     else:
-        log.write(ctx, "remove metadata from datacite: httpCode " + str(httpCode) + " received. Unrecoverable error.")
+        log.error(ctx, "remove metadata from datacite: httpCode " + str(httpCode) + " received. Unrecoverable error.")
         publication_state["status"] = "Unrecoverable"
 
 
@@ -399,13 +399,13 @@ def mint_doi(ctx, publication_config, publication_state):
         publication_state["DOIMinted"] = "yes"
     elif httpCode in [401, 403, 412, 500, 503, 504]:
         # Unauthorized, Forbidden, Precondition failed, Internal Server Error
-        log.write(ctx, "mint_doi: httpCode " + str(httpCode) + " received. Could be retried later")
+        log.warning(ctx, "mint_doi: httpCode " + str(httpCode) + " received. Could be retried later")
         publication_state["status"] = "Retry"
     elif httpCode == 400:
-        log.write(ctx, "mint_doi: 400 Bad Request - request body must be exactly two lines: DOI and URL; wrong domain, wrong prefix")
+        log.error(ctx, "mint_doi: 400 Bad Request - request body must be exactly two lines: DOI and URL; wrong domain, wrong prefix")
         publication_state["status"] = "Unrecoverable"
     else:
-        log.write(ctx, "mint_doi: httpCode " + str(httpCode) + " received. Unrecoverable error.")
+        log.error(ctx, "mint_doi: httpCode " + str(httpCode) + " received. Unrecoverable error.")
         publication_state["status"] = "Unrecoverable"
 
 
@@ -478,7 +478,7 @@ def copy_landingpage_to_public_host(ctx, publication_config, publication_state):
         publication_state["landingPageUploaded"] = "yes"
     else:
         publication_state["status"] = "Retry"
-        log.write(ctx, "copy_landingpage_to_public: " + str(error))
+        log.error(ctx, "copy_landingpage_to_public: " + str(error))
 
 
 def copy_metadata_to_moai(ctx, publication_config, publication_state):
@@ -501,7 +501,7 @@ def copy_metadata_to_moai(ctx, publication_config, publication_state):
         publication_state["oaiUploaded"] = "yes"
     else:
         publication_state["status"] = "Retry"
-        log.write(ctx, "copy_metadata_to_public: " + error)
+        log.error(ctx, "copy_metadata_to_public: " + error)
 
 
 def set_access_restrictions(ctx, vault_package, publication_state):
@@ -4,6 +4,9 @@
 __copyright__ = 'Copyright (c) 2018-2020, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import contextlib
+import csv
+import time
 from datetime import datetime
 
 import meta_form
@@ -12,6 +15,7 @@ from util import *
 __all__ = ['api_resource_groups_dm',
            'api_resource_monthly_stats_dm',
            'api_resource_monthly_category_stats_export_dm',
+           'api_resource_category_stats_export_csv_dm',
            'api_resource_monthly_stats',
            'api_resource_resource_and_tier_data',
            'api_resource_tier',
@@ -21,7 +25,12 @@ __all__ = ['api_resource_groups_dm',
            'api_resource_user_research_groups',
            'api_resource_user_is_datamanager',
            'api_resource_full_year_group_data',
-           'rule_resource_store_monthly_storage_statistics']
+           'api_resource_storage_usage',
+           'rule_resource_store_monthly_storage_statistics',
+           'rule_resource_storage_statistics_export_csv',
+           'rule_resource_storage_usage_add_replica',
+           'rule_resource_storage_usage_sudo_allowed',
+           'rule_resource_storage_usage_reconcile']
 
 
 @api.make()
@@ -66,32 +75,45 @@ def api_resource_full_year_group_data(ctx, group_name, current_month):
 
     allStorage = []  # list of all month-tier combinations present including their storage size
 
-    # per month gather month/tier/storage information from metadata:
-    # metadata-attr-name = constants.UUMETADATASTORAGEMONTH + '01'...'12'
-    # metadata-attr-val = [category,tier,storage] ... only tier and storage required within this code
-    for counter in range(0, 11):
-        referenceMonth = current_month - counter
-        if referenceMonth < 1:
-            referenceMonth = referenceMonth + 12
+    # Per month gather tier/storage information of the group from the storage statistics series.
+    today = datetime.today()
+    year  = today.year if current_month <= today.month else today.year - 1
+    for month in storage_series_months_back(year, current_month, 11):
+        series = storage_series_read(ctx, month)
+        for group, tier, storage in zip(series['group'], series['tier'], series['storage']):
+            if group == group_name:
+                key = 'month=' + str(int(month[-2:])) + '-tier=' + tier
+                allStorage.append({key: storage})
 
-        metadataAttrNameRefMonth = constants.UUMETADATASTORAGEMONTH + '%0*d' % (2, referenceMonth)
+    return allStorage
 
-        iter = genquery.row_iterator(
-            "META_USER_ATTR_VALUE, USER_NAME, USER_GROUP_NAME",
-            "META_USER_ATTR_NAME = '" + metadataAttrNameRefMonth + "' AND USER_NAME = '" + group_name + "'",
-            genquery.AS_LIST, ctx
-        )
 
-        for row in iter:
-            data = jsonutil.parse(row[0])
+@api.make()
+def api_resource_storage_usage(ctx, group_name):
+    """Get the current storage usage of a group per space and tier, from its running storage counters.
 
-            tierName = data[1]
-            data_size = data[2]  # no construction for summation required in this case
+    :param ctx:        Combined type of a callback and rei struct
+    :param group_name: Group to get storage usage for
 
-            key = 'month=' + str(referenceMonth) + '-tier=' + tierName
-            allStorage.append({key: data_size})
+    :returns: Dict with per space ('home', 'vault', 'revisions') a dict of tier => storage in bytes,
+              and the time of the last reconciliation of the counters ('reconciled')
+    """
+    # Check permissions for this function
+    member_type = meta_form.user_member_type(ctx, group_name, user.full_name(ctx))
+    if member_type not in ['reader', 'normal', 'manager']:
+        category = meta_form.group_category(ctx, group_name)
+        if not meta_form.user_is_datamanager(ctx, category, user.full_name(ctx)):
+            if user.user_type(ctx) != 'rodsadmin':
+                return api.Error('not_allowed', 'Insufficient permissions')
 
-    return allStorage
+    counters, reconciled = storage_usage_counters(ctx, '/{}/home/{}'.format(user.zone(ctx), group_name))
+
+    usage = {'home': {}, 'vault': {}, 'revisions': {}, 'reconciled': reconciled}
+    for (space, tier), size in counters.items():
+        if space in usage:
+            usage[space][tier] = max(0, size)
+
+    return usage
 
 
 @api.make()
@@ -170,6 +192,8 @@ def api_resource_resource_and_tier_data(ctx):
 
     resourceList = list()
 
+    resource_tiers = get_resource_tiers(ctx)
+
     iter = genquery.row_iterator(
         "RESC_ID, RESC_NAME",
         "",
@@ -179,7 +203,7 @@ def api_resource_resource_and_tier_data(ctx):
     for row in iter:
         resourceId = row[0]
         resourceName = row[1]
-        tierName = get_tier_by_resource_name(ctx, resourceName)
+        tierName = resource_tiers.get(resourceName, constants.UUDEFAULTRESOURCETIER)
         resourceList.append({'name': resourceName,
                              'id': resourceId,
                              'tier': tierName})
@@ -232,47 +256,40 @@ def api_resource_monthly_category_stats_export_dm(ctx):
     :returns: API status
     """
     datamanager = user.full_name(ctx)
-    categories = get_categories_datamanager(ctx, datamanager)
+    categories = set(get_categories_datamanager(ctx, datamanager))
     allStorage = []
 
-    # Select a full year by not limiting constants.UUMETADATASTORAGEMONTH to a perticular month. But only on its presence.
-    # There always is a maximum of one year of history of storage data
-    for category in categories:
-        groupToSubcategory = {}
+    # A full year of history, up to and including the current month.
+    for month, group, category, subcategory, tier, storage \
+            in storage_series_rows(ctx, storage_series_months_back(datetime.today().year, datetime.today().month, 12),
+                                   categories):
+        allStorage.append({'category': category,
+                           'subcategory': subcategory,
+                           'groupname': group,
+                           'tier': tier,
+                           'month': str(int(month[-2:])),
+                           'storage': str(storage)})
 
-        iter = genquery.row_iterator(
-            "META_USER_ATTR_VALUE, META_USER_ATTR_NAME, USER_NAME, USER_GROUP_NAME",
-            "META_USER_ATTR_VALUE like '[\"" + category + "\",%' AND META_USER_ATTR_NAME like  '" + constants.UUMETADATASTORAGEMONTH + "%'",
-            genquery.AS_LIST, ctx
-        )
+    return allStorage
 
-        for row in iter:
-            attrValue = row[0]
-            month = row[1]
-            month = str(int(month[-2:]))  # the month storage data is about, is taken from the attr_name of the AVU
-            groupName = row[3]
 
-            # Determine subcategory on groupName
-            try:
-                subcategory = groupToSubcategory[groupName]
-            except KeyError:
-                catInfo = get_group_category_info(ctx, groupName)
-                subcategory = catInfo['subcategory']
-                groupToSubcategory[groupName] = subcategory
+@api.make()
+def api_resource_category_stats_export_csv_dm(ctx, start_month=None, end_month=None):
+    """Export storage statistics of the categories a user is datamanager of as CSV.
 
-            temp = jsonutil.parse(attrValue)
-            category = temp[0]
-            tier = temp[1]
-            storage = int(float(temp[2]))
+    :param ctx:         Combined type of a callback and rei struct
+    :param start_month: First month to export ('YYYY-MM'), defaults to a year before the end month
+    :param end_month:   Last month to export ('YYYY-MM'), defaults to the current month
 
-            allStorage.append({'category': category,
-                               'subcategory': subcategory,
-                               'groupname': groupName,
-                               'tier': tier,
-                               'month': month,
-                               'storage': str(storage)})
+    :returns: CSV text with one line per month, group and tier
+    """
+    try:
+        months = storage_series_month_range(start_month, end_month)
+    except ValueError:
+        return api.Error('invalid_month', 'Months must be given as YYYY-MM')
 
-    return allStorage
+    categories = get_categories_datamanager(ctx, user.full_name(ctx))
+    return ''.join(storage_statistics_csv(ctx, months, set(categories)))
 
 
 def get_group_category_info(ctx, groupName):
@@ -315,35 +332,13 @@ def getMonthlyCategoryStorageStatistics(ctx, categories):
 
     :returns: Storage stats of last month for a list of categories
     """
-    month = '%0*d' % (2, datetime.now().month)
-    metadataName = constants.UUMETADATASTORAGEMONTH + month
-
     storageDict = {}
 
-    for category in categories:
-        iter = genquery.row_iterator(
-            "META_USER_ATTR_VALUE, META_USER_ATTR_NAME, USER_NAME, USER_GROUP_NAME",
-            "META_USER_ATTR_VALUE like '[\"" + category + "\",%' AND META_USER_ATTR_NAME = '" + metadataName + "'",
-            genquery.AS_LIST, ctx
-        )
-        for row in iter:
-            # hier wordt door alle groepen gezocht, geordend van een category.
-            # per tier moet worden gesommeerd om totale hoeveelheid storage op een tier te verkrijgen.
-            attrValue = row[0]
-
-            temp = jsonutil.parse(attrValue)
-            category = temp[0]
-            tier = temp[1]
-            storage = int(float(temp[2]))
-
-            try:
-                storageDict[category][tier] = storageDict[category][tier] + storage
-            except KeyError:
-                # if key error, can be either category or category/tier combination is missing
-                try:
-                    storageDict[category][tier] = storage
-                except KeyError:
-                    storageDict[category] = {tier: storage}
+    # Storage is summed up per category and tier over all groups in the series of the current month.
+    for _, _, category, _, tier, storage in storage_series_rows(ctx, [datetime.now().strftime('%Y-%m')],
+                                                                set(categories)):
+        storageDict.setdefault(category, {})
+        storageDict[category][tier] = storageDict[category].get(tier, 0) + storage
 
     # prepare for json output, convert storageDict into dict with keys
     allStorage = []
@@ -366,30 +361,22 @@ def get_groups_on_categories(ctx, categories):
     :returns: All groups belonging to all given categories
     """
     groups = []
-    metadataAttrNameRefMonth = constants.UUMETADATASTORAGEMONTH + '%0*d' % (2, datetime.now().month)
-
-    for category in categories:
-        iter = genquery.row_iterator(
-            "USER_NAME",
-            "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'category' AND META_USER_ATTR_VALUE = '" + category + "' ",
-            genquery.AS_LIST, ctx
-        )
-
-        for row in iter:
-            groupName = row[0]
-            if groupName.startswith('research-'):
-                iter2 = genquery.row_iterator(
-                    "META_USER_ATTR_VALUE, USER_NAME, USER_GROUP_NAME",
-                    "META_USER_ATTR_NAME = '" + metadataAttrNameRefMonth + "' AND USER_NAME = '" + groupName + "'",
-                    genquery.AS_LIST, ctx
-                )
-
-                data_size = 0
-                for row in iter2:
-                    data = row[0]
-                    temp = jsonutil.parse(data)
-                    data_size = data_size + int(float(temp[2]))  # no construction for summation required in this case
-                groups.append([groupName, data_size])
+
+    # Research groups of all categories, in order of the given categories.
+    category_groups = query.lookup(ctx, 'META_USER_ATTR_VALUE', categories, 'USER_NAME',
+                                   "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'category'")
+    group_names = [groupName for category in categories
+                   for groupName in category_groups[category]
+                   if groupName.startswith('research-')]
+
+    # Storage of all these groups in the current month.
+    storage = {}
+    series  = storage_series_read(ctx, datetime.now().strftime('%Y-%m'))
+    for group, size in zip(series['group'], series['storage']):
+        storage[group] = storage.get(group, 0) + size
+
+    for groupName in group_names:
+        groups.append([groupName, storage.get(groupName, 0)])
 
     return groups
 
@@ -460,107 +447,528 @@ def rule_resource_store_monthly_storage_statistics(ctx):
 
     :returns: Storage data for each group of each category
     """
-    zone = user.zone(ctx)
+    month = datetime.today().strftime('%Y-%m')
 
-    # Get storage month with leading 0
-    dt = datetime.today()
-    md_storage_month = constants.UUMETADATASTORAGEMONTH + dt.strftime("%m")
+    # Convert statistics of previous months still stored as group metadata.
+    storage_statistics_migrate(ctx)
 
-    # Delete previous data for that month. Could be one year ago as this is circular buffer containing max 1 year
-    iter = genquery.row_iterator(
-        "META_USER_ATTR_VALUE, USER_GROUP_NAME",
-        "META_USER_ATTR_NAME = '" + md_storage_month + "'",
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        avu.rm_from_group(ctx, row[1], md_storage_month, row[0])
-
-    # Get all categories
-    categories = []
-    iter = genquery.row_iterator(
-        "META_USER_ATTR_VALUE",
-        "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'category'",
-        genquery.AS_LIST, ctx
-    )
-    for row in iter:
-        categories.append(row[0])
+    # Category and subcategory of each group
+    group_categories = {}
+    for group, attr, value in query.Query(ctx, "USER_NAME, META_USER_ATTR_NAME, META_USER_ATTR_VALUE",
+                                          "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME in ('category', 'subcategory')"):
+        group_categories.setdefault(group, {})[attr] = value
 
     # Get all tiers - Standard must be present
     tiers = get_all_tiers(ctx)
 
-    # List of resources and their corresponding tiers (for easy access further)
-    resource_tiers = {}
-    for resource in get_resources(ctx):
-        resource_tiers[resource] = get_tier_by_resource_name(ctx, resource)
-
-    # Steps to be taken per group
-    steps = ['research', 'vault']
-
-    # Loop through all categories
-    for category in categories:
-        groups = get_groups_on_category(ctx, category)
-
-        for group in groups:
-            # Per group collect totals for category and tier
-
-            # Loop though all tiers and set storage to 0
-            tier_storage = {}
-            for tier in tiers:
-                tier_storage[tier] = 0
-
-            # per group handle research and vault
-            for step in steps:
-                if step == 'research':
-                    path = '/' + zone + '/home/' + group
-                else:
-                    path = '/' + zone + '/home/vault/' + group.replace('research-', 'vault-', 1)
-
-                # Per group two statements are required to gather all data
-                # 1) data in folder itself
-                # 2) data in all subfolders of the folder
-
-                for folder in ['self', 'subfolders']:
-                    if folder == 'self':
-                        whereClause = "COLL_NAME = '" + path + "'"
-                    else:
-                        whereClause = "COLL_NAME like '" + path + "%'"
-
-                    iter = genquery.row_iterator(
-                        "SUM(DATA_SIZE), RESC_NAME",
-                        whereClause,
-                        genquery.AS_LIST, ctx
-                    )
-
-                    for row in iter:
-                        # sum up for this tier
-                        the_tier = resource_tiers[row[1]]
-                        tier_storage[the_tier] += int(row[0])
-
-            # 3) Revision erea
-            revision_path = '/' + zone + '/' + constants.UUREVISIONCOLLECTION + '/' + group
-            whereClause = "COLL_NAME like '" + revision_path + "%'"
-            iter = genquery.row_iterator(
-                "SUM(DATA_SIZE), RESC_NAME",
-                whereClause,
-                genquery.AS_LIST, ctx
-            )
-            for row in iter:
-                # sum up for this tier
-                the_tier = resource_tiers[row[1]]
-                tier_storage[the_tier] += int(row[0])
-
-            # Write total storages as metadata on current group for any tier
-            key = md_storage_month
-            # val = [category, tier, storage]
-            for tier in tiers:
-                # constructed this way to be backwards compatible (not using json.dump)
-                val = "[\"" + category + "\", \"" + tier + "\", " + str(tier_storage[tier]) + "]"
-                # write as metadata (kv-pair) to current group
-                avu.associate_to_group(ctx, group, key, val)
+    storage = get_storage_per_group(ctx, get_resource_tiers(ctx))
+
+    # Store total storages of each group with a category for any tier
+    rows = []
+    for group, info in sorted(group_categories.items()):
+        if 'category' not in info:
+            continue
+
+        tier_storage = {}
+        for (_, tier), size in storage.get(group, {}).items():
+            tier_storage[tier] = tier_storage.get(tier, 0) + size
+
+        rows += [(group, info['category'], info.get('subcategory', ''), tier, tier_storage.get(tier, 0))
+                 for tier in tiers]
+
+    storage_series_write(ctx, month, rows)
 
     return 'ok'
 
 
+# Storage statistics series {{{
+
+# Monthly storage statistics are stored as one data object per month
+# ('YYYY-MM.json') in the storage statistics collection, holding one array
+# per column. Months are never removed, so the full history is kept.
+
+STORAGE_SERIES_COLUMNS = ['group', 'category', 'subcategory', 'tier', 'storage']
+
+
+def storage_series_path(ctx, month):
+    """Get the path of the storage statistics data object of a month ('YYYY-MM')."""
+    return '/{}{}/{}.json'.format(user.zone(ctx), constants.UUSTORAGESTATISTICSCOLLECTION, month)
+
+
+def storage_series_write(ctx, month, rows):
+    """Store the storage statistics of a month, replacing existing statistics of that month.
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param month: Month of the statistics ('YYYY-MM')
+    :param rows:  List of (group, category, subcategory, tier, storage) tuples
+    """
+    coll = pathutil.chop(storage_series_path(ctx, month))[0]
+    if not collection.exists(ctx, coll):
+        collection.create(ctx, coll)
+        # Storage statistics were readable by all users as group metadata, keep it that way.
+        msi.set_acl(ctx, 'default', 'read', 'public', coll)
+        msi.set_acl(ctx, 'default', 'inherit', '', coll)
+
+    series = dict((column, list(values)) for column, values in zip(STORAGE_SERIES_COLUMNS, zip(*rows) or [()] * 5))
+    series['month'] = month
+    jsonutil.write(ctx, storage_series_path(ctx, month), series, separators=(',', ':'))
+
+
+def storage_series_read(ctx, month):
+    """Read the storage statistics of a month.
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param month: Month of the statistics ('YYYY-MM')
+
+    :returns: Dict with per column (see STORAGE_SERIES_COLUMNS) a list of values, empty if the month has no statistics
+    """
+    try:
+        series = jsonutil.read(ctx, storage_series_path(ctx, month))
+    except error.UUFileNotExistError:
+        return dict((column, []) for column in STORAGE_SERIES_COLUMNS)
+
+    return dict((column, series[column]) for column in STORAGE_SERIES_COLUMNS)
+
+
+def storage_series_rows(ctx, months, categories=None):
+    """Generate the storage statistics of a list of months, one month in memory at a time.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param months:     List of months ('YYYY-MM')
+    :param categories: Only generate statistics of groups in these categories (optional)
+
+    :returns: Generator of (month, group, category, subcategory, tier, storage) tuples
+    """
+    for month in months:
+        series = storage_series_read(ctx, month)
+        for row in zip(*[series[column] for column in STORAGE_SERIES_COLUMNS]):
+            if categories is None or row[1] in categories:
+                yield (month,) + row
+
+
+def storage_series_months_back(year, month, count):
+    """List a number of months, going back from (and including) the given month.
+
+    :param year:  Year of the most recent month
+    :param month: Most recent month (1-12)
+    :param count: Number of months
+
+    :returns: List of months ('YYYY-MM'), most recent first
+    """
+    months = []
+    for n in range(year * 12 + month - 1, year * 12 + month - 1 - count, -1):
+        months.append('{:04d}-{:02d}'.format(n // 12, n % 12 + 1))
+    return months
+
+
+def storage_series_month_range(start=None, end=None):
+    """List all months from a start month up to and including an end month ('YYYY-MM').
+
+    The end month defaults to the current month, the start month to a year before the end month.
+    Raises a ValueError for invalid months.
+    """
+    end = datetime.strptime(end, '%Y-%m') if end else datetime.today()
+    if start:
+        start = datetime.strptime(start, '%Y-%m')
+        count = (end.year - start.year) * 12 + end.month - start.month + 1
+    else:
+        count = 12
+
+    return list(reversed(storage_series_months_back(end.year, end.month, count)))
+
+
+def storage_statistics_csv(ctx, months, categories=None):
+    """Generate storage statistics as CSV lines, one month in memory at a time.
+
+    :param ctx:        Combined type of a callback and rei struct
+    :param months:     List of months ('YYYY-MM')
+    :param categories: Only export statistics of groups in these categories (optional)
+
+    :returns: Generator of CSV lines, starting with a header
+    """
+    class Line(object):
+        def write(self, text):
+            self.text = text
+
+    line   = Line()
+    writer = csv.writer(line, lineterminator='\n')
+
+    writer.writerow(['month'] + STORAGE_SERIES_COLUMNS)
+    yield line.text
+    for row in storage_series_rows(ctx, months, categories):
+        writer.writerow(row)
+        yield line.text
+
+
+def storage_statistics_migrate(ctx):
+    """Convert storage statistics stored as group metadata (one year circular buffer) to storage statistics series.
+
+    Months are assigned to the most recent year in which they do not lie in the future.
+    Months that already have a series are not overwritten.
+
+    :param ctx: Combined type of a callback and rei struct
+    """
+    today  = datetime.today()
+    months = {}
+    for group, attr, value in query.Query(ctx, "USER_NAME, META_USER_ATTR_NAME, META_USER_ATTR_VALUE",
+                                          "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME like '"
+                                          + constants.UUMETADATASTORAGEMONTH + "%'"):
+        month = int(attr[-2:])
+        month = '{:04d}-{:02d}'.format(today.year if month <= today.month else today.year - 1, month)
+        category, tier, storage = jsonutil.parse(value)
+        months.setdefault(month, {}).setdefault(group, []).append((category, tier, int(float(storage))))
+
+    if not months:
+        return
+
+    subcategories = dict(query.Query(ctx, "USER_NAME, META_USER_ATTR_VALUE",
+                                     "USER_TYPE = 'rodsgroup' AND META_USER_ATTR_NAME = 'subcategory'"))
+
+    for month, groups in sorted(months.items()):
+        if not data_object.exists(ctx, storage_series_path(ctx, month)):
+            storage_series_write(ctx, month, [(name, group_category, subcategories.get(name, ''), group_tier, group_storage)
+                                              for name, values in sorted(groups.items())
+                                              for group_category, group_tier, group_storage in values])
+        log.write(ctx, 'Converted storage statistics of {} groups for {} to series', len(groups), month)
+
+    for group in set(group for groups in months.values() for group in groups):
+        avu.rmw_from_group(ctx, group, constants.UUMETADATASTORAGEMONTH + '%', '%')
+
+
+@rule.make(inputs=range(2), outputs=[])
+def rule_resource_storage_statistics_export_csv(ctx, start_month, end_month):
+    """Stream storage statistics of all categories as CSV to stdout.
+
+    :param ctx:         Combined type of a callback and rei struct
+    :param start_month: First month to export ('YYYY-MM'), empty for a year before the end month
+    :param end_month:   Last month to export ('YYYY-MM'), empty for the current month
+    """
+    for text in storage_statistics_csv(ctx, storage_series_month_range(start_month, end_month)):
+        ctx.writeString('stdout', text)
+
+# }}}
+
+
+def get_storage_per_group(ctx, resource_tiers):
+    """Get the storage of all groups per space and tier, using zone-wide aggregations.
+
+    Data is attributed to groups by path, see storage_group_and_space.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param resource_tiers: Dict of resource name => tier name (see get_resource_tiers)
+
+    :returns: Dict of group name => dict of (space, tier) => storage in bytes
+    """
+    zone    = user.zone(ctx)
+    storage = {}
+
+    for root in ['/' + zone + '/home/', '/' + zone + constants.UUREVISIONCOLLECTION + '/']:
+        for coll_names, resources, sizes in query.Query(ctx, "COLL_NAME, RESC_NAME, SUM(DATA_SIZE)",
+                                                        "COLL_NAME like '" + root + "%'", output=query.AS_COLUMNS):
+            for coll_name, resource, size in zip(coll_names, resources, sizes):
+                key = storage_group_and_space(zone, coll_name)
+                if key is None:
+                    continue
+                group, space = key
+                tier = resource_tiers.get(resource, constants.UUDEFAULTRESOURCETIER)
+
+                group_storage = storage.setdefault(group, {})
+                group_storage[space, tier] = group_storage.get((space, tier), 0) + int(size)
+
+    return storage
+
+
+def storage_group_and_space(zone, coll_name):
+    """Determine to which group and space the data in a collection is accounted.
+
+    Data in the home collection and in the revision store of a group belongs
+    to that group, data in a vault group belongs to the corresponding research group.
+
+    :param zone:      Zone name
+    :param coll_name: Collection name
+
+    :returns: Tuple of group name and space ('home', 'vault' or 'revisions'), or None
+    """
+    for root, space in [('/' + zone + '/home/', 'home'),
+                        ('/' + zone + constants.UUREVISIONCOLLECTION + '/', 'revisions')]:
+        if coll_name.startswith(root):
+            group = coll_name[len(root):].split('/', 1)[0]
+            if group.startswith(constants.IIVAULTPREFIX):
+                return constants.IIGROUPPREFIX + group[len(constants.IIVAULTPREFIX):], 'vault'
+            return (group, space) if group else None
+
+
+# Attempts to update a running storage counter when it is updated concurrently.
+STORAGE_USAGE_UPDATE_ATTEMPTS = 10
+
+
+def storage_usage_add(ctx, path, replicas):
+    """Add data object replicas to the running storage counters of the group they belong to.
+
+    The counters are AVUs on the home collection of the group, one per
+    space and tier, see api_resource_storage_usage. They are reserved for
+    rodsadmin, so policies change them with sudo microservices
+    (see rule_resource_storage_usage_sudo_allowed). Drift, e.g. on
+    collection moves, is corrected by rule_resource_storage_usage_reconcile.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param path:     Path of the data object
+    :param replicas: List of (resource name, size) tuples, negative sizes for removed replicas
+    """
+    zone = user.zone(ctx)
+    key  = storage_group_and_space(zone, pathutil.chop(path)[0])
+    if key is None:
+        return
+
+    group, space = key
+    coll  = '/{}/home/{}'.format(zone, group)
+
+    # Only look up the tiers of the resources of these replicas, this runs on every put, copy and delete.
+    tiers = query.lookup(ctx, 'RESC_NAME', set(resource for resource, _ in replicas), 'META_RESC_ATTR_VALUE',
+                         "META_RESC_ATTR_NAME = '" + constants.UURESOURCETIERATTRNAME + "'")
+
+    deltas = {}
+    for resource, size in replicas:
+        attr = constants.UUMETADATASTORAGEUSAGE + space + '_' + (tiers[resource] or [constants.UUDEFAULTRESOURCETIER])[0]
+        deltas[attr] = deltas.get(attr, 0) + int(size)
+
+    for attr, delta in deltas.items():
+        # Counters must never make the operation that is accounted fail.
+        if delta != 0 and not storage_usage_update(ctx, coll, attr, delta):
+            log.warning(ctx, 'Could not update storage counter {} of <{}> for <{}>', attr, coll, path)
+
+
+def storage_usage_update(ctx, coll, attr, delta):
+    """Add a change to a running storage counter, without losing concurrent changes.
+
+    The current value of the counter is removed before the new value is
+    added. Removing a value that a concurrent update removed first fails,
+    in which case the change is added to the value of that update instead.
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param coll:  Home collection of the group
+    :param attr:  Attribute name of the counter
+    :param delta: Change in bytes
+
+    :returns: Boolean indicating whether the counter was updated
+    """
+    for _ in range(STORAGE_USAGE_UPDATE_ATTEMPTS):
+        value = query.Query(ctx, "META_COLL_ATTR_VALUE", "COLL_NAME = '{}' AND META_COLL_ATTR_NAME = '{}'"
+                                                         .format(coll, attr)).first()
+        if value is not None:
+            try:
+                msi.sudo_obj_meta_remove(ctx, coll, '-C', '', attr, value, '', '')
+            except msi.Error:
+                continue
+
+        try:
+            msi.sudo_obj_meta_add(ctx, coll, '-C', attr, str(int(value or 0) + delta), '', '')
+            return True
+        except msi.Error as e:
+            # A counter created concurrently with the same value is retried, a removed value is lost.
+            if value is not None:
+                log.warning(ctx, 'Could not store storage counter {} of <{}>: {}', attr, coll, e)
+                return False
+
+    return False
+
+
+def storage_usage_counters(ctx, coll):
+    """Get the running storage counters of a group.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param coll: Home collection of the group
+
+    :returns: Tuple of a dict of (space, tier) => storage in bytes,
+              and the time of the last reconciliation of the counters (None if never reconciled)
+    """
+    counters   = {}
+    reconciled = None
+    for attr, value in query.Query(ctx, "META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+                                   "COLL_NAME = '{}' AND META_COLL_ATTR_NAME like '{}%'"
+                                   .format(coll, constants.UUMETADATASTORAGEUSAGE)):
+        if attr == constants.UUMETADATASTORAGEUSAGERECONCILED:
+            reconciled = int(value)
+        else:
+            # Concurrently created counters are added up.
+            key = tuple(attr[len(constants.UUMETADATASTORAGEUSAGE):].split('_', 1))
+            counters[key] = counters.get(key, 0) + int(value)
+
+    return counters, reconciled
+
+
+@rule.make(inputs=[0, 1], outputs=[2])
+def rule_resource_storage_usage_sudo_allowed(ctx, coll, attr):
+    """Check whether the client may change a running storage counter with sudo microservices.
+
+    Called by the sudo policies in iiSudoPolicies.r. Policies account data
+    on behalf of the client, which must be a member of the group (or rodsadmin).
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param coll: Collection on which the counter is changed
+    :param attr: Attribute name of the counter
+
+    :returns: 'true' if the change is allowed, 'false' otherwise
+    """
+    home  = '/{}/home/'.format(user.zone(ctx))
+    group = coll[len(home):]
+    if not coll.startswith(home) or group == '' or '/' in group \
+            or not attr.startswith(constants.UUMETADATASTORAGEUSAGE) \
+            or attr == constants.UUMETADATASTORAGEUSAGERECONCILED:
+        return 'false'
+
+    return 'true' if user.is_admin(ctx) or user.is_member_of(ctx, group) else 'false'
+
+
+def storage_usage_replicas(ctx, path, resource=None):
+    """Get the replicas of a data object, as accounted in the storage counters.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param path:     Path of the data object
+    :param resource: Only get the replica on this resource
+
+    :returns: List of (replica number, resource name, size) tuples
+    """
+    coll, name = pathutil.chop(path)
+    where = "COLL_NAME = '{}' AND DATA_NAME = '{}'".format(coll, name)
+    if resource is not None:
+        where += " AND RESC_NAME = '{}'".format(resource)
+
+    # Include the replica number, so that identical replicas are not collapsed into one row.
+    return [(repl_num, resc, int(size))
+            for resc, size, repl_num in query.Query(ctx, "RESC_NAME, DATA_SIZE, DATA_REPL_NUM", where)]
+
+
+def storage_usage_add_data(ctx, path, resource=None):
+    """Add the replicas of a data object to the storage counters.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param path:     Path of the data object
+    :param resource: Only account the replica on this resource
+    """
+    replicas = [(resc, size) for _, resc, size in storage_usage_replicas(ctx, path, resource)]
+    if replicas:
+        storage_usage_add(ctx, path, replicas)
+
+
+# Replicas of data objects that are being removed or overwritten, per path (see storage_usage_remember).
+# Policies of one operation run in the same agent process.
+_remembered = {}
+
+# Paths of data objects whose removal is not accounted (see storage_usage_suspended).
+_suspended = set()
+
+
+def storage_usage_remember(ctx, path):
+    """Remember the replicas of a data object before it is removed or overwritten.
+
+    The replicas are subtracted from the storage counters by
+    storage_usage_forget, once the operation succeeded.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param path: Path of the data object
+    """
+    if path not in _suspended:
+        _remembered[path] = storage_usage_replicas(ctx, path)
+
+
+def storage_usage_forget(ctx, path, removed_only=False):
+    """Subtract the remembered replicas of a data object from the storage counters.
+
+    :param ctx:          Combined type of a callback and rei struct
+    :param path:         Path of the data object
+    :param removed_only: Only subtract the replicas that no longer exist (e.g. after a removal)
+    """
+    if path in _suspended:
+        return
+
+    replicas = _remembered.pop(path, [])
+
+    if removed_only and replicas:
+        existing = set(repl_num for repl_num, _, _ in storage_usage_replicas(ctx, path))
+        replicas = [x for x in replicas if x[0] not in existing]
+
+    if replicas:
+        storage_usage_add(ctx, path, [(resc, -size) for _, resc, size in replicas])
+
+
+@contextlib.contextmanager
+def storage_usage_suspended(path):
+    """Do not account the removal of a data object within this context (e.g. of a rejected put).
+
+    :param path: Path of the data object
+    """
+    _suspended.add(path)
+    try:
+        yield
+    finally:
+        _suspended.discard(path)
+
+
+@rule.make()
+def rule_resource_storage_usage_add_replica(ctx, path, resource):
+    """Add a new replica of a data object to the storage counters (called after replication).
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param path:     Path of the data object
+    :param resource: Resource of the new replica
+    """
+    storage_usage_add_data(ctx, path, resource)
+
+
+@rule.make(inputs=[], outputs=[0])
+def rule_resource_storage_usage_reconcile(ctx):
+    """Correct drift of the running storage counters of all groups.
+
+    Counters are recalculated with zone-wide aggregations, and only rewritten
+    for groups whose counters differ. A change accounted while the
+    aggregations run may be counted twice until the next reconciliation.
+
+    :param ctx: Combined type of a callback and rei struct
+
+    :returns: Status message
+    """
+    zone = user.zone(ctx)
+
+    # Current counters of all groups, concurrently created counters are added up.
+    counters = {}
+    for coll, attr, value in query.Query(ctx, "COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+                                         "COLL_PARENT_NAME = '/{}/home' AND META_COLL_ATTR_NAME like '{}%'"
+                                         .format(zone, constants.UUMETADATASTORAGEUSAGE)):
+        if attr != constants.UUMETADATASTORAGEUSAGERECONCILED:
+            current = counters.setdefault(pathutil.basename(coll), {})
+            current[attr] = current.get(attr, 0) + int(value)
+
+    storage = get_storage_per_group(ctx, get_resource_tiers(ctx))
+
+    now     = str(int(time.time()))
+    drifted = 0
+    for group in set(counters) | set(storage):
+        coll = '/{}/home/{}'.format(zone, group)
+        if not collection.exists(ctx, coll):
+            continue
+
+        expected = dict((constants.UUMETADATASTORAGEUSAGE + space + '_' + tier, size)
+                        for (space, tier), size in storage.get(group, {}).items())
+        current  = counters.get(group, {})
+
+        try:
+            if dict((a, v) for a, v in current.items() if v != 0) != expected:
+                drifted += 1
+                log.write(ctx, 'Storage counters of <{}> drifted by {} bytes', coll,
+                          sum(current.values()) - sum(expected.values()))
+            for attr in set(current) - set(expected):
+                avu.rmw_from_coll(ctx, coll, attr, '%')
+            for attr, size in expected.items():
+                if current.get(attr) != size:
+                    avu.set_on_coll(ctx, coll, attr, str(size))
+            avu.set_on_coll(ctx, coll, constants.UUMETADATASTORAGEUSAGERECONCILED, now)
+        except msi.Error as e:
+            log.warning(ctx, 'Could not reconcile storage counters of <{}>: {}', coll, e)
+
+    return 'Storage counters reconciled, {} groups corrected.'.format(drifted)
+
+
 def resource_exists(ctx, resource_name):
     """Check whether given resource actually exists."""
     iter = genquery.row_iterator(
@@ -576,6 +984,19 @@ def resource_exists(ctx, resource_name):
     return False
 
 
+def get_resource_tiers(ctx):
+    """Get the tier names of all resources that have a tier.
+
+    Resources without tier belong to the default tier, see get_tier_by_resource_name.
+
+    :param ctx: Combined type of a callback and rei struct
+
+    :returns: Dict of resource name => tier name
+    """
+    return dict(query.Query(ctx, "RESC_NAME, META_RESC_ATTR_VALUE",
+                            "META_RESC_ATTR_NAME = '" + constants.UURESOURCETIERATTRNAME + "'"))
+
+
 def get_all_tiers(ctx):
     """List all tiers currently present including 'Standard'."""
     tiers = [constants.UUDEFAULTRESOURCETIER]
@@ -4,8 +4,13 @@
 __copyright__ = 'Copyright (c) 2019-2020, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import bisect
+import contextlib
+import fcntl
 import os
 import time
+import zlib
+from collections import OrderedDict
 
 import irods_types
 
@@ -17,7 +22,123 @@ from util.query import Query
 __all__ = ['api_revisions_restore',
            'api_revisions_search_on_filename',
            'api_revisions_list',
-           'rule_revisions_clean_up']
+           'rule_revision_batch',
+           'rule_revisions_clean_up',
+           'rule_revisions_clean_up_budgeted',
+           'rule_revisions_clean_up_report',
+           'rule_revisions_index_rebuild']
+
+
+# Amount of revisions processed at once by the revision cleanup:
+# modification times are looked up and obsolete revisions are removed per batch.
+CLEANUP_BATCH_SIZE = 1000
+
+# Data objects of this size or larger are left to the rule language batch job (uuRevisionBatch):
+# copying them from Python deadlocks in iRODS 4.2.7, see uuRevisionBatch in iiRevisions.r.
+REVISION_BATCH_MAX_SIZE = 32 * 1024 * 1024
+
+# Lock files limiting the amount of revision batch workers that copy from a resource at once.
+REVISION_BATCH_LOCK = '/tmp/irods-revision-batch-{}-{}.lock'
+
+
+@rule.make(inputs=range(4), outputs=range(4, 5))
+def rule_revision_batch(ctx, shard, shards, resourceConcurrency, maxBytesPerSecond):
+    """Create revisions for data objects scheduled for revision creation, in one shard.
+
+    Data objects marked with 'org_revision_scheduled' metadata are divided
+    over a number of shards by hash of their data id, so that several
+    workers (see tools/async-job.py) can process them in parallel.
+    Data objects of REVISION_BATCH_MAX_SIZE or larger are skipped, these
+    are processed by uuRevisionBatch.
+
+    :param ctx:                 Combined type of a callback and rei struct
+    :param shard:               Shard to process (0 <= shard < shards)
+    :param shards:              Amount of shards
+    :param resourceConcurrency: Maximum amount of workers copying from one resource at once (0 for unlimited)
+    :param maxBytesPerSecond:   Maximum amount of bytes per second copied by this worker (0 for unlimited)
+
+    :returns: String with status of the batch
+    """
+    shard, shards = int(shard), int(shards)
+    concurrency   = int(resourceConcurrency)
+    rate          = int(maxBytesPerSecond)
+
+    attr      = constants.UUORGMETADATAPREFIX + 'revision_scheduled'
+    errorattr = constants.UUORGMETADATAPREFIX + 'revision_failed'
+
+    # Collect the data objects of this shard first, as processing them changes the query result.
+    scheduled = OrderedDict()
+    for data_id, coll_name, data_name, size, resource in Query(ctx, "DATA_ID, COLL_NAME, DATA_NAME, DATA_SIZE, META_DATA_ATTR_VALUE",
+                                                               "META_DATA_ATTR_NAME = '{}' AND DATA_SIZE < '{}'"
+                                                               .format(attr, REVISION_BATCH_MAX_SIZE)):
+        if revision_batch_shard(data_id, shards) == shard:
+            scheduled[data_id] = (coll_name + '/' + data_name, int(size), resource)
+
+    failed = set(Query(ctx, "DATA_ID", "META_DATA_ATTR_NAME = '{}'".format(errorattr)))
+
+    counts  = dict.fromkeys(['ok', 'ignored', 'deduplicated', 'failed', 'copied', 'saved'], 0)
+    counter = 'shard {}'.format(shard)
+    start   = time.time()
+
+    for data_id, (path, size, resource) in scheduled.items():
+        with revision_batch_slot(resource, shard, concurrency):
+            try:
+                revision_id, deduplicated = revision_create(ctx, resource, data_id, path, constants.UUMAXREVISIONSIZE, counter)
+                failure = None
+            except Exception as e:
+                # Any failure is limited to this data object, the rest of the shard is processed.
+                failure = e
+
+        # Remove the schedule flag no matter if revision creation succeeded or not.
+        # rods should have been given own access via policy to allow AVU changes.
+        try:
+            avu.rm_from_data(ctx, path, attr, resource)
+        except msi.Error:
+            # The object's ACLs may have changed. Force the ACL and try one more time.
+            try:
+                msi.sudo_obj_acl_set(ctx, '', 'own', user.full_name(ctx), path, '')
+                avu.rm_from_data(ctx, path, attr, resource)
+            except msi.Error as e:
+                log.error(ctx, 'Scheduled revision creation of <{}>: could not remove schedule flag ({})', path, e)
+
+        if failure is not None:
+            log.error(ctx, 'Scheduled revision creation of <{}> failed ({})', path, failure)
+            counts['failed'] += 1
+            try:
+                avu.set_on_data(ctx, path, errorattr, 'true')
+            except msi.Error:
+                pass
+            continue
+
+        if deduplicated:
+            counts['deduplicated'] += 1
+            counts['saved']        += size
+        elif revision_id is not None:
+            log.write(ctx, 'Revision created for <{}> ID={}', path, revision_id)
+            counts['ok']     += 1
+            counts['copied'] += size
+        else:
+            counts['ignored'] += 1
+
+        # Revision creation OK. Remove any existing error indication attribute.
+        if data_id in failed:
+            try:
+                avu.rm_from_data(ctx, path, errorattr, 'true')
+            except msi.Error:
+                pass
+
+        # Keep the amount of copied bytes within the rate limit.
+        if rate:
+            delay = float(counts['copied']) / rate - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+    status = ('Batch revision job (shard {}/{}) finished. {}/{} successfully processed, of which {} resulted in new revisions'
+              ' ({} bytes) and {} were identical to their latest revision ({} bytes saved)'
+              .format(shard, shards, len(scheduled) - counts['failed'], len(scheduled),
+                      counts['ok'], counts['copied'], counts['deduplicated'], counts['saved']))
+    log.write(ctx, status)
+    return status
 
 
 @rule.make(inputs=range(2), outputs=range(2, 3))
@@ -30,6 +151,130 @@ def rule_revisions_clean_up(ctx, bucketcase, endOfCalendarDay):
 
     :returns: String with status of cleanup
     """
+    revision_store = revision_store_prepare(ctx)
+    buckets = revision_bucket_list(ctx, bucketcase)
+
+    result = revisions_clean_up(ctx, revision_store, buckets, end_of_day(ctx, endOfCalendarDay))
+    if result['error']:
+        return 'Something went wrong cleaning up revision store'
+
+    log.write(ctx, 'Revision cleanup: removed {} revisions of {} original paths', result['removed'], result['originals'])
+    return 'Successfully cleaned up the revision store'
+
+
+@rule.make(inputs=range(4), outputs=range(4, 5))
+def rule_revisions_clean_up_budgeted(ctx, bucketcase, endOfCalendarDay, maxSeconds, maxDeletions):
+    """Apply the chosen bucket strategy to the revision store, within a time and deletion budget.
+
+    When a budget is exhausted, the last processed original path is stored
+    as a checkpoint on the revision store, and the next run resumes from
+    there. Once the end of the revision store is reached, the checkpoint
+    is removed and the next run starts from the beginning.
+
+    :param ctx:              Combined type of a callback and rei struct
+    :param bucketcase:       Multiple ways of cleaning up revisions can be chosen.
+    :param endOfCalendarDay: If zero, system will determine end of current day in seconds since epoch (1970-01-01 00:00 UTC)
+    :param maxSeconds:       Maximum run time in seconds (0 for unlimited)
+    :param maxDeletions:     Maximum amount of revisions to remove (0 for unlimited)
+
+    :returns: String with status of cleanup
+    """
+    revision_store = revision_store_prepare(ctx)
+    buckets = revision_bucket_list(ctx, bucketcase)
+
+    checkpoint = Query(ctx, "META_COLL_ATTR_VALUE",
+                       "COLL_NAME = '" + revision_store + "'"
+                       " AND META_COLL_ATTR_NAME = '" + constants.UUREVISIONCLEANUPCHECKPOINT + "'").first()
+    after = jsonutil.parse(checkpoint)['after'] if checkpoint else None
+
+    result = revisions_clean_up(ctx, revision_store, buckets, end_of_day(ctx, endOfCalendarDay), after=after,
+                                time_budget=int(maxSeconds), deletion_budget=int(maxDeletions))
+    if result['error']:
+        return 'Something went wrong cleaning up revision store'
+
+    log.write(ctx, 'Revision cleanup: removed {} revisions of {} original paths', result['removed'], result['originals'])
+
+    if result['last'] is not None:
+        avu.set_on_coll(ctx, revision_store, constants.UUREVISIONCLEANUPCHECKPOINT,
+                        jsonutil.dump({'after': result['last'], 'time': int(time.time())}))
+        return 'Cleaned up part of the revision store, next run resumes after <{}>'.format(result['last'])
+
+    if checkpoint:
+        avu.rmw_from_coll(ctx, revision_store, constants.UUREVISIONCLEANUPCHECKPOINT, '%')
+    return 'Successfully cleaned up the revision store'
+
+
+@rule.make(inputs=range(3), outputs=range(3, 4))
+def rule_revisions_clean_up_report(ctx, bucketcase, endOfCalendarDay, reportPath):
+    """Report what the chosen bucket strategy would remove from the revision store, without removing anything.
+
+    The report is written as JSON to a data object. It contains the totals
+    per bucket and per group, including reclaimable bytes, and lists all
+    candidate revisions with their bucket.
+
+    :param ctx:              Combined type of a callback and rei struct
+    :param bucketcase:       Multiple ways of cleaning up revisions can be chosen.
+    :param endOfCalendarDay: If zero, system will determine end of current day in seconds since epoch (1970-01-01 00:00 UTC)
+    :param reportPath:       Path of the data object to write the report to
+
+    :returns: String with status of the report
+    """
+    zone = user.zone(ctx)
+    revision_store = '/' + zone + constants.UUREVISIONCOLLECTION
+    buckets = revision_bucket_list(ctx, bucketcase)
+    end_of_calendar_day = end_of_day(ctx, endOfCalendarDay)
+
+    result = revisions_clean_up(ctx, revision_store, buckets, end_of_calendar_day, dry_run=True)
+
+    report = OrderedDict([('bucketcase', bucketcase),
+                          ('end_of_calendar_day', end_of_calendar_day),
+                          ('originals', result['originals']),
+                          ('revisions', result['revisions']),
+                          ('candidates', len(result['candidates'])),
+                          ('reclaimable_bytes', result['bytes']),
+                          ('buckets', result['buckets']),
+                          ('groups', result['groups']),
+                          ('candidate_revisions', result['candidates'])])
+    data_object.write(ctx, reportPath, jsonutil.dump(report, indent=4, sort_keys=False))
+
+    return 'Found {} of {} revisions to remove ({} bytes), report written to <{}>'.format(
+        len(result['candidates']), result['revisions'], result['bytes'], reportPath)
+
+
+@rule.make(inputs=range(1), outputs=range(1, 2))
+def rule_revisions_index_rebuild(ctx, group):
+    """Rebuild the revision index of a group, or of all groups, from the revision store.
+
+    Needed once for revisions created before the revision index or its data names existed,
+    see revision_index_add.
+
+    :param ctx:   Combined type of a callback and rei struct
+    :param group: Name of the group to rebuild the revision index of (empty for all groups)
+
+    :returns: String with status of the rebuild
+    """
+    revision_store = revision_store_prepare(ctx)
+
+    if group:
+        group_stores = [revision_store + '/' + group]
+    else:
+        group_stores = list(Query(ctx, "COLL_NAME", "COLL_PARENT_NAME = '" + revision_store + "'"))
+
+    count = 0
+    for group_store in group_stores:
+        avu.rmw_from_coll(ctx, group_store, constants.UUREVISIONINDEX, '%', '%')
+        avu.rmw_from_coll(ctx, group_store, constants.UUREVISIONNAMEINDEX, '%', '%')
+        for original_path, revisions in get_revisions_per_original(ctx, group_store + '/'):
+            for data_id, modify_time, path, size in revisions:
+                revision_index_add(ctx, path, original_path, data_id, modify_time, size)
+            count += len(revisions)
+
+    log.write(ctx, 'Revision index: indexed {} revisions of {} groups', count, len(group_stores))
+    return 'Indexed {} revisions of {} groups'.format(count, len(group_stores))
+
+
+def revision_store_prepare(ctx):
+    """Make sure a rodsadmin has access to the entire revision store, returns its path."""
     zone = user.zone(ctx)
     revision_store = '/' + zone + constants.UUREVISIONCOLLECTION
 
@@ -37,35 +282,184 @@ def rule_revisions_clean_up(ctx, bucketcase, endOfCalendarDay):
         msi.set_acl(ctx, "recursive", "admin:own", user.full_name(ctx), revision_store)
         msi.set_acl(ctx, "recursive", "inherit", user.full_name(ctx), revision_store)
 
-    end_of_calender_day = int(endOfCalendarDay)
-    if end_of_calender_day == 0:
+    return revision_store
+
+
+def end_of_day(ctx, end_of_calendar_day):
+    """Get the upper time bound of the first bucket: the given timestamp or, if zero, the end of the current day."""
+    end_of_calendar_day = int(end_of_calendar_day)
+    if end_of_calendar_day == 0:
         end_of_calendar_day = calculate_end_of_calendar_day(ctx)
+    return end_of_calendar_day
 
-    # get definition of buckets
-    buckets = revision_bucket_list(ctx, bucketcase)
 
-    # step through entire revision store and per item apply the bucket strategy
-    iter = genquery.row_iterator(
-        "META_DATA_ATTR_VALUE",
-        "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + 'original_path' + "'"
-        " AND COLL_NAME like '" + revision_store + "%'",
-        genquery.AS_LIST, ctx
-    )
+def revisions_clean_up(ctx, revision_store, buckets, end_of_calendar_day, after=None,
+                       time_budget=0, deletion_budget=0, dry_run=False):
+    """Step through the revision store in one pass and per original path apply a bucket strategy.
 
-    for row in iter:
-        original_path = row[0]
-        # Get all related revisions
-        revisions = get_revision_list(ctx, original_path)
+    Obsolete revisions are removed in batches.
+
+    :param ctx:                 Combined type of a callback and rei struct
+    :param revision_store:      Path of the revision store
+    :param buckets:             List of buckets (see revision_bucket_list)
+    :param end_of_calendar_day: Upper time bound of the first bucket
+    :param after:               Only process original paths after this one
+    :param time_budget:         Stop after this amount of seconds (0 for unlimited)
+    :param deletion_budget:     Stop after removing this amount of revisions (0 for unlimited)
+    :param dry_run:             Do not remove anything, but collect candidates and statistics
+
+    :returns: Dict with the amount of original paths and revisions processed and removed,
+              whether an error occurred, and the last processed original path if a budget
+              was exhausted (None otherwise). For dry runs, also the reclaimable bytes,
+              statistics per bucket and per group, and a list of candidate revisions.
+    """
+    result = {'originals': 0, 'revisions': 0, 'removed': 0, 'bytes': 0, 'last': None, 'error': False}
+    if dry_run:
+        result['buckets']    = [OrderedDict([('timebox', b[0]), ('max_revisions', b[1]), ('start_index', b[2]),
+                                             ('candidates', 0), ('bytes', 0)]) for b in buckets]
+        result['groups']     = OrderedDict()
+        result['candidates'] = []
+
+    start    = time.time()
+    obsolete = []
+
+    for original_path, revisions in get_revisions_per_original(ctx, revision_store, after):
+        result['originals'] += 1
+        result['revisions'] += len(revisions)
 
         # Process the original path conform the bucket settings
-        candidates = get_deletion_candidates(ctx, buckets, revisions, end_of_calendar_day)
+        candidates = set(get_deletion_candidates(ctx, buckets, revisions, end_of_calendar_day))
+
+        if dry_run:
+            # Original paths look like /zone/home/group/...
+            parts = original_path.split('/')
+            group = result['groups'].setdefault(parts[3] if len(parts) > 3 else '',
+                                                OrderedDict([('revisions', 0), ('candidates', 0), ('bytes', 0)]))
+            group['revisions'] += len(revisions)
+            for revision in revisions:
+                if revision[0] in candidates:
+                    bucket = revision_bucket_index(buckets, revision[1], end_of_calendar_day)
+                    result['bytes'] += revision[3]
+                    result['buckets'][bucket]['candidates'] += 1
+                    result['buckets'][bucket]['bytes']      += revision[3]
+                    group['candidates'] += 1
+                    group['bytes']      += revision[3]
+                    result['candidates'].append(OrderedDict([('path', revision[2]),
+                                                             ('original_path', original_path),
+                                                             ('modify_time', revision[1]),
+                                                             ('size', revision[3]),
+                                                             ('bucket', bucket)]))
+        else:
+            obsolete += [(revision[0], revision[2], original_path) for revision in revisions if revision[0] in candidates]
+
+        if len(obsolete) >= CLEANUP_BATCH_SIZE:
+            if not revisions_remove(ctx, obsolete):
+                result['error'] = True
+                return result
+            result['removed'] += len(obsolete)
+            obsolete = []
+
+        if (time_budget and time.time() - start >= time_budget) \
+           or (deletion_budget and result['removed'] + len(obsolete) >= deletion_budget):
+            result['last'] = original_path
+            break
+
+    if not revisions_remove(ctx, obsolete):
+        result['error'] = True
+        return result
+    result['removed'] += len(obsolete)
+
+    return result
+
+
+def get_revisions_per_original(ctx, revision_store, after=None):
+    """Stream all revisions in the revision store, grouped per original path.
+
+    Revisions are retrieved in a single pass ordered on original path, their
+    modification times are looked up per batch of revisions.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param revision_store: Path of the revision store
+    :param after:          Only return original paths after this one (in the order of the catalog)
+
+    :returns: Generator of (original path, revisions) tuples, with revisions as a list
+              of [dataId, timestamp of modification, revision path, size] in descending
+              order (as in get_revision_list)
+    """
+    conditions = "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + "original_path" + "'" \
+                 " AND COLL_NAME like '" + revision_store + "%'"
+    skip_until = None
+    if after is not None and "'" in after:
+        # GenQuery string literals cannot contain quotes: select from the part of the
+        # path before the first quote, and skip the paths up to the checkpoint below.
+        conditions += " AND META_DATA_ATTR_VALUE >= '" + after.split("'")[0] + "'"
+        skip_until = after
+    elif after is not None:
+        conditions += " AND META_DATA_ATTR_VALUE > '" + after + "'"
+
+    batches = query.Query(ctx, "ORDER(META_DATA_ATTR_VALUE), DATA_ID, COLL_NAME, DATA_NAME, MAX(DATA_SIZE)",
+                          conditions, output=query.AS_COLUMNS)
+
+    def complete(groups):
+        """Add modification times to groups of revisions."""
+        modify_times = query.lookup(ctx, 'DATA_ID', [revision[0] for _, revisions in groups for revision in revisions],
+                                    'META_DATA_ATTR_VALUE',
+                                    "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + "original_modify_time" + "'")
+
+        for original_path, revisions in groups:
+            revisions.sort(key=lambda x: int(x[0]), reverse=True)
+            yield original_path, [[data_id, int(modify_times[data_id][-1]) if modify_times[data_id] else 0, path, int(size)]
+                                  for data_id, path, size in revisions]
+
+    groups = []  # Groups of revisions pending completion: [(original path, [(dataId, path, size)])]
+    pending = 0
+
+    for original_paths, data_ids, coll_names, data_names, sizes in batches:
+        for original_path, data_id, coll_name, data_name, size in zip(original_paths, data_ids, coll_names, data_names, sizes):
+            if skip_until is not None and original_path <= skip_until:
+                continue
+            if not groups or groups[-1][0] != original_path:
+                # Start of a new original path: complete the previous groups if the batch is full.
+                if pending >= CLEANUP_BATCH_SIZE:
+                    for group in complete(groups):
+                        yield group
+                    groups  = []
+                    pending = 0
+                groups.append((original_path, []))
+
+            groups[-1][1].append((data_id, coll_name + '/' + data_name, size))
+            pending += 1
+
+    for group in complete(groups):
+        yield group
+
+
+def revisions_remove(ctx, revisions):
+    """Remove a batch of revisions from the revision store and the revision index.
+
+    :param ctx:       Combined type of a callback and rei struct
+    :param revisions: List of (data id, path, original path) tuples of the revisions to remove
+
+    :returns: Boolean indicating if all revisions were removed
+    """
+    for data_id, path, original_path in revisions:
+        try:
+            msi.data_obj_unlink(ctx, path, irods_types.BytesBuf())
+        except msi.Error as e:
+            log.error(ctx, "revisions_remove: Error when deleting <{}>: {}", path, e)
+            return False
+
+        try:
+            revision_index_remove(ctx, path, original_path, data_id)
+        except msi.Error as e:
+            log.warning(ctx, "Could not remove <{}> from the revision index: {}", path, e)
 
-        # Delete the revisions that were found being obsolete
-        for revision_id in candidates:
-            if not revision_remove(ctx, revision_id):
-                return 'Something went wrong cleaning up revision store'
+    try:
+        revision_index_prune(ctx, [original_path for _, _, original_path in revisions])
+    except msi.Error as e:
+        log.warning(ctx, "Could not remove data names from the revision index: {}", e)
 
-    return 'Successfully cleaned up the revision store'
+    return True
 
 
 def revision_remove(ctx, revision_id):
@@ -92,16 +486,358 @@ def revision_remove(ctx, revision_id):
         # revision is found
         try:
             revision_path = row[0] + '/' + row[1]
+            original_path = Query(ctx, "META_DATA_ATTR_VALUE",
+                                  "DATA_ID = '{}' AND META_DATA_ATTR_NAME = '{}'"
+                                  .format(revision_id, constants.UUORGMETADATAPREFIX + 'original_path')).first()
             msi.data_obj_unlink(ctx, revision_path, irods_types.BytesBuf())
+            if original_path is not None:
+                revision_index_remove(ctx, revision_path, original_path, revision_id)
+                revision_index_prune(ctx, [original_path])
             return True
         except msi.Error as e:
-            log.write(ctx, "revision_remove('" + revision_id + "'): Error when deleting.")
+            log.error(ctx, "revision_remove('" + revision_id + "'): Error when deleting.")
             return False
 
-    log.write(ctx, "revision_remove('" + revision_id + "'): Revision ID not found or permission denied.")
+    log.warning(ctx, "revision_remove('" + revision_id + "'): Revision ID not found or permission denied.")
     return False
 
 
+def revision_index_coll(ctx, original_path):
+    """Get the path of the revision store of the group an original path belongs to, which holds its revision index.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param original_path: Path of a data object in a research group (/zone/home/group/...)
+
+    :returns: Path of the revision store of the group
+    """
+    return '/' + user.zone(ctx) + constants.UUREVISIONCOLLECTION + '/' + original_path.split('/')[3]
+
+
+def revision_index_get(ctx, original_path):
+    """Get the revisions of an original path from the revision index.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param original_path: Path of the original data object
+
+    :returns: List of (data id, modification time, size) tuples, ordered on data id
+    """
+    entries = []
+    for unit in query.lookup(ctx, 'META_COLL_ATTR_VALUE', [original_path], 'META_COLL_ATTR_UNITS',
+                             "COLL_NAME = '" + revision_index_coll(ctx, original_path) + "'"
+                             " AND META_COLL_ATTR_NAME = '" + constants.UUREVISIONINDEX + "'")[original_path]:
+        data_id, modify_time, size = unit.split(':')
+        entries.append((data_id, int(modify_time), int(size)))
+
+    return sorted(entries, key=lambda x: int(x[0]))
+
+
+def revision_index_add(ctx, revision_path, original_path, data_id, modify_time, size):
+    """Add a revision to the revision index.
+
+    The revision index of a group consists of metadata on the revision store
+    of the group, with per revision the original path as value and
+    'data id:modification time:size' as unit. Revisions are added by
+    iiRevisionCreate, and removed by the revision cleanup.
+
+    For searching on data name, the index has the data name as value and the
+    original path as unit once per original path.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param revision_path: Path of the revision (in <revision store>/<group>/<collection id>)
+    :param original_path: Path of the original data object
+    :param data_id:       Data id of the revision
+    :param modify_time:   Modification time of the original data object
+    :param size:          Size of the revision
+    """
+    group_store = pathutil.dirname(pathutil.dirname(revision_path))
+    msi.add_avu(ctx, '-C', group_store, constants.UUREVISIONINDEX,
+                original_path, '{}:{}:{}'.format(data_id, modify_time, size))
+
+    try:
+        msi.add_avu(ctx, '-C', group_store, constants.UUREVISIONNAMEINDEX, pathutil.basename(original_path), original_path)
+    except msi.Error:
+        # The original path was indexed before.
+        pass
+
+
+def revision_index_remove(ctx, revision_path, original_path, data_id):
+    """Remove a revision from the revision index.
+
+    Only the index entries of the original path are matched, rather than all
+    entries of the group. The data name of the original path is kept, see
+    revision_index_prune.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param revision_path: Path of the revision (in <revision store>/<group>/<collection id>)
+    :param original_path: Path of the original data object
+    :param data_id:       Data id of the revision
+    """
+    avu.rmw_from_coll(ctx, pathutil.dirname(pathutil.dirname(revision_path)), constants.UUREVISIONINDEX,
+                      original_path, data_id + ':%')
+
+
+def revision_index_prune(ctx, original_paths):
+    """Remove the data names of original paths without revisions from the revision index.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param original_paths: Iterable of original paths of removed revisions
+    """
+    revision_store = '/' + user.zone(ctx) + constants.UUREVISIONCOLLECTION
+    remaining = query.lookup(ctx, 'META_COLL_ATTR_VALUE', set(original_paths), 'META_COLL_ATTR_UNITS',
+                             "COLL_PARENT_NAME = '" + revision_store + "'"
+                             " AND META_COLL_ATTR_NAME = '" + constants.UUREVISIONINDEX + "'")
+
+    for original_path, entries in remaining.items():
+        if not entries:
+            avu.rmw_from_coll(ctx, revision_index_coll(ctx, original_path), constants.UUREVISIONNAMEINDEX,
+                              pathutil.basename(original_path), original_path)
+
+
+def revision_batch_shard(data_id, shards):
+    """Get the shard a data object scheduled for revision creation belongs to.
+
+    Data ids are hashed rather than taken modulo the amount of shards,
+    as data ids of consecutively created data objects often have a fixed
+    interval (e.g. because of the metadata created with each data object).
+
+    :param data_id: Data id of the data object
+    :param shards:  Amount of shards
+
+    :returns: Shard of the data object
+    """
+    return (zlib.crc32(str(data_id)) & 0xffffffff) % shards
+
+
+@contextlib.contextmanager
+def revision_batch_slot(resource, shard, concurrency):
+    """Limit the amount of revision batch workers copying from a resource at once.
+
+    Workers take one of a fixed amount of lock files per resource. If all
+    are taken, the worker waits for the lock file belonging to its shard.
+
+    :param resource:    Name of the resource
+    :param shard:       Shard of the worker
+    :param concurrency: Maximum amount of workers copying from the resource at once (0 for unlimited)
+    """
+    if not concurrency:
+        yield
+        return
+
+    f = None
+    for slot in range(concurrency):
+        f = open(REVISION_BATCH_LOCK.format(resource, slot), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except IOError:
+            f.close()
+            f = None
+
+    if f is None:
+        f = open(REVISION_BATCH_LOCK.format(resource, shard % concurrency), 'a')
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+    try:
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def revision_create(ctx, resource, data_id, path, max_size, counter):
+    """Create a revision of a data object, unless its content is identical to its latest revision.
+
+    Python implementation of iiRevisionCreateOrUpdate in iiRevisions.r,
+    for data objects smaller than REVISION_BATCH_MAX_SIZE.
+
+    :param ctx:      Combined type of a callback and rei struct
+    :param resource: Resource to retrieve the original from
+    :param data_id:  Data id of the data object to create a revision for
+    :param path:     Path of the data object to create a revision for
+    :param max_size: Maximum size of data objects to create revisions for
+    :param counter:  Unit of the deduplication counters of this worker
+
+    :returns: Tuple of the data id of the new or updated revision (None if no revision
+              was created), and whether the latest revision was updated instead
+    """
+    parent, basename = pathutil.chop(path)
+
+    original = Query(ctx, "DATA_ID, DATA_MODIFY_TIME, DATA_OWNER_NAME, DATA_SIZE, COLL_ID, DATA_REPL_NUM, DATA_CHECKSUM",
+                     "DATA_ID = '{}' AND DATA_RESC_HIER like '{}%'".format(data_id, resource),
+                     output=query.AS_ROW).first()
+    if original is None:
+        log.warning(ctx, 'DataObject <{}> was not found or path was collection', path)
+        return None, False
+
+    if int(original.DATA_SIZE) > max_size:
+        log.write(ctx, 'Files larger than {} bytes cannot store revisions', max_size)
+        return None, False
+
+    # All revisions are stored in a group with the same name as the research group in a system collection.
+    # When this collection is missing, no revisions will be created.
+    group = Query(ctx, "USER_NAME", "DATA_ID = '{}' AND USER_TYPE = 'rodsgroup' AND DATA_ACCESS_NAME = 'own'"
+                                    .format(original.DATA_ID)).first()
+    revision_store = '/' + user.zone(ctx) + constants.UUREVISIONCOLLECTION + '/' + (group or '')
+    if group is None or not collection.exists(ctx, revision_store):
+        log.warning(ctx, '<{}> does not exist or is inaccessible for current client', revision_store)
+        return None, False
+
+    # Allow rodsadmin to create subcollections.
+    try:
+        msi.set_acl(ctx, 'default', 'admin:own', user.full_name(ctx), revision_store)
+    except msi.Error:
+        pass
+
+    # Do not store the same content twice: compare with the latest revision of this data object.
+    latest = revision_latest(ctx, revision_store, path)
+    if latest is not None and latest[3] and latest[2] == int(original.DATA_SIZE):
+        checksum = original.DATA_CHECKSUM
+        if not checksum:
+            try:
+                checksum = msi.data_obj_chksum(ctx, path, 'replNum=' + original.DATA_REPL_NUM, '')['arguments'][2]
+            except msi.Error:
+                checksum = ''
+
+        if checksum == latest[3]:
+            revision_update(ctx, revision_store, path, latest[0], latest[1], original.DATA_MODIFY_TIME, original.DATA_SIZE, counter)
+            return latest[0], True
+
+    revision_coll = '{}/{}'.format(revision_store, original.COLL_ID)
+    revision_path = '{}/{}_{}{}'.format(revision_coll, basename, time.strftime('%Y%m%dT%H%M%S%z'), original.DATA_OWNER_NAME)
+
+    if collection.exists(ctx, revision_coll):
+        # Rods may not have own access yet.
+        try:
+            msi.set_acl(ctx, 'default', 'admin:own', user.full_name(ctx), revision_coll)
+        except msi.Error:
+            pass
+    else:
+        # Inheritance is enabled - ACLs are already good.
+        msi.coll_create(ctx, revision_coll, '1', irods_types.BytesBuf())
+
+    if revision_data_id(ctx, revision_path) is not None:
+        # Revision names contain a timestamp in seconds, only the first modification within a second can be stored.
+        log.warning(ctx, '<{}> already exists. This means that <{}> was changed multiple times within the same second.',
+                    revision_path, basename)
+        return None, False
+
+    msi.data_obj_copy(ctx, path, revision_path, 'verifyChksum=', irods_types.BytesBuf())
+    revision_id = revision_data_id(ctx, revision_path)
+
+    # Add original metadata to revision data object.
+    kvp = irods_types.KeyValPair()
+    for key, value in [('original_path',            path),
+                       ('original_coll_name',       parent),
+                       ('original_data_name',       basename),
+                       ('original_data_owner_name', original.DATA_OWNER_NAME),
+                       ('original_data_id',         original.DATA_ID),
+                       ('original_coll_id',         original.COLL_ID),
+                       ('original_modify_time',     original.DATA_MODIFY_TIME),
+                       ('original_group_name',      group),
+                       ('original_filesize',        original.DATA_SIZE)]:
+        kvp = msi.add_key_val(ctx, kvp, constants.UUORGMETADATAPREFIX + key, value)['arguments'][0]
+    msi.associate_key_value_pairs_to_obj(ctx, kvp, revision_path, '-d')
+
+    try:
+        revision_index_add(ctx, revision_path, path, revision_id, original.DATA_MODIFY_TIME, original.DATA_SIZE)
+    except msi.Error as e:
+        log.warning(ctx, 'Could not add <{}> to the revision index: {}', revision_path, e)
+
+    return revision_id, False
+
+
+def revision_data_id(ctx, revision_path):
+    """Get the data id of a revision.
+
+    Data names may contain quotes, which GenQuery string literals cannot,
+    so the revision is looked up with query.lookup.
+
+    :param ctx:           Combined type of a callback and rei struct
+    :param revision_path: Path of the revision
+
+    :returns: Data id of the revision, or None if it does not exist
+    """
+    coll_name, data_name = pathutil.chop(revision_path)
+    data_ids = query.lookup(ctx, 'DATA_NAME', [data_name], 'DATA_ID', "COLL_NAME = '{}'".format(coll_name))[data_name]
+    return data_ids[0] if data_ids else None
+
+
+def revision_latest(ctx, revision_store, path):
+    """Get the latest revision of a data object.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param revision_store: Revision store of the group of the data object
+    :param path:           Path of the data object
+
+    :returns: Tuple of data id, path, size and checksum of the latest revision, or None if there is none
+    """
+    latest = None
+    rows   = query.lookup(ctx, 'META_DATA_ATTR_VALUE', [path], "DATA_ID, COLL_NAME, DATA_NAME, DATA_SIZE, DATA_CHECKSUM",
+                          "META_DATA_ATTR_NAME = '{}' AND COLL_NAME like '{}/%'"
+                          .format(constants.UUORGMETADATAPREFIX + 'original_path', revision_store))[path]
+    for data_id, coll_name, data_name, size, checksum in rows:
+        # Revisions are created in order, so the latest revision has the highest data id.
+        if latest is None or int(data_id) > int(latest[0]) or (data_id == latest[0] and not latest[3]):
+            latest = (data_id, coll_name + '/' + data_name, int(size), checksum)
+
+    return latest
+
+
+def revision_update(ctx, revision_store, path, revision_id, revision_path, modify_time, size, counter):
+    """Update the latest revision of a data object that was modified without changing its content.
+
+    Python implementation of iiRevisionUpdate in iiRevisions.r.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param revision_store: Revision store of the group of the data object
+    :param path:           Path of the data object
+    :param revision_id:    Data id of the latest revision
+    :param revision_path:  Path of the latest revision
+    :param modify_time:    Modification time of the data object
+    :param size:           Size of the data object
+    :param counter:        Unit of the deduplication counters of this worker
+    """
+    avu.set_on_data(ctx, revision_path, constants.UUORGMETADATAPREFIX + 'original_modify_time', modify_time)
+
+    try:
+        revision_index_remove(ctx, revision_path, path, revision_id)
+        revision_index_add(ctx, revision_path, path, revision_id, modify_time, size)
+    except msi.Error as e:
+        log.warning(ctx, 'Could not update <{}> in the revision index: {}', revision_path, e)
+
+    # Count the deduplicated revisions and saved bytes per group.
+    # Every worker has its own counters (by unit), so that parallel workers do not overwrite each other's counts.
+    counters = dict(Query(ctx, "META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE",
+                          "COLL_NAME = '{}' AND META_COLL_ATTR_NAME in ('{}', '{}') AND META_COLL_ATTR_UNITS = '{}'"
+                          .format(revision_store, constants.UUREVISIONDEDUPCOUNT, constants.UUREVISIONDEDUPBYTES, counter)))
+    for attr, increment in [(constants.UUREVISIONDEDUPCOUNT, 1), (constants.UUREVISIONDEDUPBYTES, int(size))]:
+        avu.rmw_from_coll(ctx, revision_store, attr, '%', counter)
+        msi.add_avu(ctx, '-C', revision_store, attr, str(int(float(counters.get(attr, 0))) + increment), counter)
+
+    log.write(ctx, '<{}> is identical to revision ID={}, updated its modification time', path, revision_id)
+
+
+def revision_dedup_counters(ctx, revision_store):
+    """Get the amount of deduplicated revisions and saved bytes of a group.
+
+    Sums the counters of all workers that deduplicated revisions of the group.
+
+    :param ctx:            Combined type of a callback and rei struct
+    :param revision_store: Revision store of the group
+
+    :returns: Tuple of the amount of deduplicated revisions and the amount of bytes saved
+    """
+    totals = {constants.UUREVISIONDEDUPCOUNT: 0, constants.UUREVISIONDEDUPBYTES: 0}
+    # Select the unit as well, so that counters of different workers with the same value are not merged.
+    for attr, value, _ in Query(ctx, "META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE, META_COLL_ATTR_UNITS",
+                                "COLL_NAME = '{}' AND META_COLL_ATTR_NAME in ('{}', '{}')"
+                                .format(revision_store, constants.UUREVISIONDEDUPCOUNT, constants.UUREVISIONDEDUPBYTES),
+                                output=query.AS_LIST):
+        totals[attr] += int(float(value))
+
+    return totals[constants.UUREVISIONDEDUPCOUNT], totals[constants.UUREVISIONDEDUPBYTES]
+
+
 def revision_bucket_list(ctx, case):
     """Returns a bucket list definition containing timebox of a bucket, max number of entries and start index.
 
@@ -179,18 +915,15 @@ def get_revision_list(ctx, path):
         genquery.AS_LIST, ctx
     )
 
-    for row in iter:
-        # Get modification time
-        modify_time = 0
-        iter2 = genquery.row_iterator(
-            "META_DATA_ATTR_VALUE",
-            "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + "original_modify_time" + "' "
-            "AND DATA_ID = '" + row[0] + "'",
-            genquery.AS_LIST, ctx
-        )
-        for row2 in iter2:
-            modify_time = int(row2[0])
-        candidates.append([row[0], modify_time])
+    ids = [row[0] for row in iter]
+
+    # Get modification times of all revisions at once.
+    modify_times = query.lookup(ctx, 'DATA_ID', ids, 'META_DATA_ATTR_VALUE',
+                                "META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + "original_modify_time" + "'")
+
+    for data_id in ids:
+        times = modify_times[data_id]
+        candidates.append([data_id, int(times[-1]) if times else 0])
 
     return candidates
 
@@ -207,52 +940,75 @@ def get_deletion_candidates(ctx, buckets, revisions, initial_upper_time_bound):
     """
     deletion_candidates = []
 
-    # Set initial upper bound
-    t2 = initial_upper_time_bound
-
     # List of bucket index with per bucket a list of its revisions within that bucket
     # [[data_ids0],[data_ids1]]
-    bucket_revisions = []
-
-    for bucket in buckets:
-        t1 = t2
-        t2 = t1 - bucket[0]
-
-        revision_list = []
-        for revision in revisions:
-            if revision[1] <= t1 and revision[1] > t2:
-                # Link the bucket and the revision together so its clear which revisions belong into which bucket
-                revision_list.append(revision[0])  # append data-id
-        # Link the collected data_ids (revision_ids) to the corresponding bucket
-        bucket_revisions.append(revision_list)
+    bucket_revisions = [[] for _ in buckets]
+
+    # Assign each revision to its bucket by bisecting the bucket bounds (see revision_bucket_index),
+    # keeping the order of revisions within a bucket.
+    bounds = revision_bucket_bounds(buckets, initial_upper_time_bound)
+    lower, upper = bounds[0], bounds[-1]
+    n = len(buckets)
+    bisect_left = bisect.bisect_left
+    for revision in revisions:
+        t = revision[1]
+        if lower < t <= upper:
+            bucket_revisions[n - bisect_left(bounds, t)].append(revision[0])  # append data-id
 
     # Per bucket find the revision candidates for deletion
-    bucket_counter = 0
-    for rev_list in bucket_revisions:
-        bucket = buckets[bucket_counter]
-
+    for bucket, rev_list in zip(buckets, bucket_revisions):
         max_bucket_size = bucket[1]
         bucket_start_index = bucket[2]
 
         if len(rev_list) > max_bucket_size:
             nr_to_be_removed = len(rev_list) - max_bucket_size
 
-            count = 0
             if bucket_start_index >= 0:
-                while count < nr_to_be_removed:
-                    # Add revision to list of removal
-                    deletion_candidates.append(rev_list[bucket_start_index + count])
-                    count += 1
+                deletion_candidates += rev_list[bucket_start_index:bucket_start_index + nr_to_be_removed]
             else:
-                while count < nr_to_be_removed:
-                    deletion_candidates.append(rev_list[len(rev_list) + (bucket_start_index) - count])
-                    count += 1
-
-        bucket_counter += 1  # To keep conciding with strategy list
+                # Remove from the oldest revision (at the given start index from the end) backwards.
+                start = len(rev_list) + bucket_start_index
+                deletion_candidates += rev_list[start - nr_to_be_removed + 1:start + 1][::-1]
 
     return deletion_candidates
 
 
+def revision_bucket_bounds(buckets, initial_upper_time_bound):
+    """Get the time bounds of buckets, in ascending order.
+
+    Bucket i contains revisions with a modification time t where
+    bounds[-i - 2] < t <= bounds[-i - 1].
+
+    :param buckets:                  List of buckets
+    :param initial_upper_time_bound: Initial upper time bound for first bucket
+
+    :returns: List of len(buckets) + 1 time bounds
+    """
+    bounds = [initial_upper_time_bound]
+    for bucket in buckets:
+        bounds.append(bounds[-1] - bucket[0])
+    bounds.reverse()
+    return bounds
+
+
+def revision_bucket_index(buckets, modify_time, initial_upper_time_bound, bounds=None):
+    """Get the index of the bucket a revision belongs to, based on its modification time.
+
+    :param buckets:                  List of buckets
+    :param modify_time:              Modification time of the revision
+    :param initial_upper_time_bound: Initial upper time bound for first bucket
+    :param bounds:                   Bucket bounds, if already determined (see revision_bucket_bounds)
+
+    :returns: Index of the bucket, or None if the revision is not in any bucket
+    """
+    if bounds is None:
+        bounds = revision_bucket_bounds(buckets, initial_upper_time_bound)
+
+    # The amount of bounds below the modification time determines the bucket.
+    i = len(buckets) - bisect.bisect_left(bounds, modify_time)
+    return i if 0 <= i < len(buckets) else None
+
+
 def calculate_end_of_calendar_day(ctx):
     """Calculate the unix timestamp for the end of the current day (Same as start of next day).
 
@@ -272,6 +1028,9 @@ def calculate_end_of_calendar_day(ctx):
 def api_revisions_search_on_filename(ctx, searchString, offset=0, limit=10):
     """Search revisions of a file in a research folder and return list of corresponding revisions.
 
+    Data names are looked up in the revision index of the groups the client
+    has access to, see revision_index_add.
+
     :param ctx:          Combined type of a callback and rei struct
     :param searchString: String to search for as part of a file name
     :param offset:       Starting point in total resultset to start fetching
@@ -279,87 +1038,33 @@ def api_revisions_search_on_filename(ctx, searchString, offset=0, limit=10):
 
     :returns: Paginated revision search result
     """
-    zone = user.zone(ctx)
-
-    dict_org_paths = {}
-    multiple_counted = 0
-
     # Return nothing if in fact requested ALL
     if len(searchString) == 0:
         return {'total': 0,
-                'items': revisions}
-
-    originalDataNameKey = constants.UUORGMETADATAPREFIX + 'original_data_name'
-    originalPathKey = constants.UUORGMETADATAPREFIX + 'original_path'
-    startpath = '/' + zone + constants.UUREVISIONCOLLECTION
-
-    qdata = Query(ctx, ['COLL_NAME', 'META_DATA_ATTR_VALUE'],
-                  "META_DATA_ATTR_NAME = '" + originalDataNameKey + "' "
-                  "AND META_DATA_ATTR_VALUE like '" + searchString + "%' "
-                  "AND COLL_NAME like '" + startpath + "%' ",
-                  offset=offset, limit=limit, output=query.AS_DICT)
-
-    # step through results and enrich with wanted data
-    for rev in list(qdata):
-        rev_data = {}
-        rev_data['main_revision_coll'] = rev['COLL_NAME']
-        rev_data['main_original_dataname'] = rev['META_DATA_ATTR_VALUE']
-
-        # Situations in which a data_object including its parent folder is removed.
-        # And after a while gets reintroduced
-
-        # Hier de daadwerkelijke revisies ophalen
-        # Dit bepaalt het TOTAL REVISIONS
-        iter = genquery.row_iterator(
-            "DATA_ID",
-            "COLL_NAME = '" + rev_data['main_revision_coll'] + "' "
-            "AND META_DATA_ATTR_NAME = '" + originalDataNameKey + "' "
-            "AND META_DATA_ATTR_VALUE = '" + rev_data['main_original_dataname'] + "' ",  # *originalDataName
-            genquery.AS_DICT, ctx)
-
-        for row in iter:
-            # based on data id get original_coll_name
-            iter2 = genquery.row_iterator(
-                "META_DATA_ATTR_VALUE",
-                "DATA_ID = '" + row['DATA_ID'] + "' "
-                "AND META_DATA_ATTR_NAME = '" + constants.UUORGMETADATAPREFIX + 'original_path' + "' ",
-                genquery.AS_DICT, ctx)
-            for row2 in iter2:
-                rev_data['original_coll_name'] = row2['META_DATA_ATTR_VALUE']
-
-            rev_data['collection_exists'] = collection.exists(ctx, '/'.join(rev_data['original_coll_name'].split(os.path.sep)[:-1]))
-            rev_data['original_coll_name'] = '/'.join(rev_data['original_coll_name'].split(os.path.sep)[3:])
-
-            # Data is collected on the basis of ORG_COLL_NAME, duplicates can be present
-            try:
-                # This is a double entry and has to be corrected in the total returned to the frontend
-                detail = dict_org_paths[rev_data['original_coll_name']]
-                total = detail[0] + 1
-                dict_org_paths[rev_data['original_coll_name']] = [total, detail[1], detail[2]]
-                # Increment correction as the main total is based on the first query.
-                # This however can have multiple entries which require correction
-                multiple_counted += 1
-            except KeyError:
-                # [count, collect-exists, data-name]
-                dict_org_paths[rev_data['original_coll_name']] = [1, rev_data['collection_exists'], rev['META_DATA_ATTR_VALUE']]
-
-    # create a list from collected data in dict_org_paths
-    revisions = []
-    for key, value in dict_org_paths.items():
-        revisions.append({'main_original_dataname': value[2],
-                          'collection_exists': value[1],
-                          'original_coll_name': key,
-                          'revision_count': value[0]})
-
-    # Alas an extra Query is required to get the total number of rows
-    qtotalrows = Query(ctx, ['COLL_NAME', 'META_DATA_ATTR_VALUE'],
-                       "META_DATA_ATTR_NAME = '" + originalDataNameKey + "' "
-                       "AND META_DATA_ATTR_VALUE like '" + searchString + "%' "
-                       "AND COLL_NAME like '" + startpath + "%' ",
-                       offset=0, limit=None, output=query.AS_DICT)
-
-    # qtotalrows.total_rows() moet worden verminderd met het aantal ontdubbelde entries
-    return {'total': qtotalrows.total_rows() - multiple_counted,
+                'items': []}
+
+    revision_store = '/' + user.zone(ctx) + constants.UUREVISIONCOLLECTION
+
+    q = Query(ctx, "ORDER(META_COLL_ATTR_VALUE), ORDER(META_COLL_ATTR_UNITS)",
+              "COLL_PARENT_NAME = '" + revision_store + "'"
+              " AND META_COLL_ATTR_NAME = '" + constants.UUREVISIONNAMEINDEX + "'"
+              " AND META_COLL_ATTR_VALUE like '" + searchString + "%'",
+              offset=offset, limit=limit)
+    page = list(q)
+
+    paths    = [original_path for _, original_path in page]
+    counts   = query.lookup(ctx, 'META_COLL_ATTR_VALUE', paths, 'COUNT(META_COLL_ATTR_UNITS)',
+                            "COLL_PARENT_NAME = '" + revision_store + "'"
+                            " AND META_COLL_ATTR_NAME = '" + constants.UUREVISIONINDEX + "'")
+    existing = query.lookup(ctx, 'COLL_NAME', set(pathutil.dirname(x) for x in paths), 'COLL_ID')
+
+    revisions = [{'main_original_dataname': data_name,
+                  'collection_exists': bool(existing[pathutil.dirname(original_path)]),
+                  'original_coll_name': '/'.join(original_path.split('/')[3:]),
+                  'revision_count': int(counts[original_path][0]) if counts[original_path] else 0}
+                 for data_name, original_path in page]
+
+    return {'total': q.total_rows(),
             'items': revisions}
 
 
@@ -367,49 +1072,38 @@ def api_revisions_search_on_filename(ctx, searchString, offset=0, limit=10):
 def api_revisions_list(ctx, path):
     """Get list revisions of a file in a research folder.
 
+    Revisions are looked up in the revision index, see revision_index_add.
+
     :param ctx:  Combined type of a callback and rei struct
     :param path: Path to data object to find revisions for
 
     :returns: List revisions of a file in a research folder
     """
-    originalPathKey = ''
-    startpath = ''
-
-    zone = user.zone(ctx)
-
     revisions = []
-    originalPathKey = constants.UUORGMETADATAPREFIX + 'original_path'
-    startpath = '/' + zone + constants.UUREVISIONCOLLECTION
 
-    iter = genquery.row_iterator(
-        "DATA_ID, COLL_NAME, order(DATA_NAME)",
-        "META_DATA_ATTR_NAME = '" + originalPathKey + "' "
-        "AND META_DATA_ATTR_VALUE = '" + path + "' "
-        "AND COLL_NAME like '" + startpath + "%' ",
-        genquery.AS_LIST, ctx
-    )
+    data_ids = [entry[0] for entry in revision_index_get(ctx, path)]
+    metadata = query.lookup(ctx, 'DATA_ID', data_ids, 'DATA_NAME, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE')
 
-    for row in iter:
-        revisionPath = row[1] + '/' + row[2]
-
-        iter2 = genquery.row_iterator(
-            "META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE ",
-            "DATA_ID = '" + row[0] + "' ",
-            genquery.AS_LIST, ctx
-        )
+    for data_id, rows in metadata.items():
+        # Skip revisions that were removed from the revision store, but are still in the index.
+        if not rows:
+            continue
 
-        meta_data = {"data_id": row[0]}
-        for row2 in iter2:
-            meta_data[row2[0]] = row2[1]
+        meta_data = {"data_id": data_id}
+        for _, name, value in rows:
+            meta_data[name] = value
 
         meta_data["dezoned_coll_name"] = '/' + '/'.join(meta_data["org_original_coll_name"].split(os.path.sep)[3:])
 
         meta_data["org_original_modify_time"] = time.strftime('%Y/%m/%d %H:%M:%S',
                                                               time.localtime(int(meta_data["org_original_modify_time"])))
 
-        revisions.append(meta_data)
+        revisions.append((rows[0][0], meta_data))
+
+    # Order on revision data name, i.e. on time of revision creation.
+    revisions.sort(key=lambda x: x[0])
 
-    return {"revisions": revisions}
+    return {"revisions": [revision for _, revision in revisions]}
 
 
 @api.make()
@@ -93,8 +93,8 @@ def transform_research_xml(ctx, xml_path):
         try:
             schem = schema.get_schema_by_id(ctx, schema_id, xml_path)
         except Exception as e:
-            log.write(ctx, 'Warning: could not get JSON schema for XML <{}> with schema_id <{}>: {}'
-                      .format(xml_path, schema_id, str(e)))
+            log.warning(ctx, 'Could not get JSON schema for XML <{}> with schema_id <{}>: {}'
+                        .format(xml_path, schema_id, str(e)))
             # The result is unusable, as there will be no possible JSON → JSON
             # transformation that will make this a valid metadata file.
             raise e  # give up.
@@ -114,8 +114,8 @@ def transform_research_xml(ctx, xml_path):
             # This is not fatal - there may have been validation errors in the XML as well,
             # which should remain exactly the same in the new JSON situation.
             # print(errors)
-            log.write(ctx, 'Warning: Validation errors exist after transforming XML to JSON (<{}> with schema id <{}>), continuing'
-                      .format(xml_path, schema_id))
+            log.warning(ctx, 'Validation errors exist after transforming XML to JSON (<{}> with schema id <{}>), continuing'
+                        .format(xml_path, schema_id))
 
         jsonutil.write(ctx, json_path, metadata)
     except Exception as e:
@@ -4,33 +4,85 @@ from __future__ import print_function
 import os
 import sys
 import atexit
+import argparse
 
 # usage: ./async-data-replicate.py
-# usage: ./async-data-revision.py
+# usage: ./async-data-revision.py [--shards N [--shard N]] [--resource-concurrency N] [--max-bytes-per-second N]
 
 # This script handles both batch replication and batch creation of revisions,
 # depending on by which name it is called.
+#
+# With --shards, revisions are created by N parallel workers (rule_revision_batch),
+# each processing the scheduled data objects in one shard. Every worker has its own
+# lock file, so that a shard can be started or retried on its own with --shard, and
+# a hung worker does not keep the workers of other shards from running.
+# Data objects too large for the workers are processed by uuRevisionBatch afterwards.
 
-NAME          = os.path.basename(sys.argv[0])
-LOCKFILE_PATH = '/tmp/irods-{}.lock'.format(NAME)
+NAME                = os.path.basename(sys.argv[0])
+LOCKFILE_PATH       = '/tmp/irods-{}.lock'.format(NAME)
+SHARD_LOCKFILE_PATH = '/tmp/irods-{}-shard{{}}.lock'.format(NAME)
+TOOLS_PATH          = os.path.dirname(os.path.realpath(__file__))
 
-def lock_or_die():
-    """Prevent running multiple instances of this job simultaneously"""
-
-    # Create a lockfile for this job type, abort if it exists.
+def lock(path):
+    """Create a lock file, returns False if it exists"""
     try:
-        fd = os.open(LOCKFILE_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
     except OSError:
-        if os.path.exists(LOCKFILE_PATH):
-            print('error: Lock file {} exists'.format(LOCKFILE_PATH), file=sys.stderr)
-            exit(1)
+        if os.path.exists(path):
+            return False
         else:
             raise
     os.write(fd, str(os.getpid()))
     os.close(fd)
 
     # Remove lock no matter how we exit.
-    atexit.register(lambda: os.unlink(LOCKFILE_PATH))
+    atexit.register(lambda: os.path.exists(path) and os.unlink(path))
+    return True
+
+def lock_or_die(path=LOCKFILE_PATH):
+    """Prevent running multiple instances of this job (or shard worker) simultaneously"""
+
+    # Create a lockfile for this job type, abort if it exists.
+    if not lock(path):
+        print('error: Lock file {} exists'.format(path), file=sys.stderr)
+        exit(1)
+
+def run_shard(shard, shards, resource_concurrency, max_bytes_per_second):
+    """Run the revision batch worker of one shard, holding the lock of the shard"""
+    lock_or_die(SHARD_LOCKFILE_PATH.format(shard))
+
+    # The byte rate limit applies to all workers together.
+    # A rate of 0 means unlimited, so a limit lower than the amount of shards is rounded up.
+    rate = max(1, max_bytes_per_second // shards) if max_bytes_per_second else 0
+
+    return subprocess.call(['irule', '-r', 'irods_rule_engine_plugin-irods_rule_language-instance',
+                            '-F', os.path.join(TOOLS_PATH, 'revision-batch.r'),
+                            '*shard={}'.format(shard), '*shards={}'.format(shards),
+                            '*resourceConcurrency={}'.format(resource_concurrency),
+                            '*maxBytesPerSecond={}'.format(rate)])
+
+def run_shards(shards, resource_concurrency, max_bytes_per_second):
+    """Start one revision batch worker per shard, and wait for all of them to finish"""
+    workers = []
+    for shard in range(shards):
+        workers.append(subprocess.Popen([sys.executable, os.path.realpath(sys.argv[0]),
+                                         '--shards', str(shards), '--shard', str(shard),
+                                         '--resource-concurrency', str(resource_concurrency),
+                                         '--max-bytes-per-second', str(max_bytes_per_second)]))
+
+    for p in workers:
+        p.wait()
+
+parser = argparse.ArgumentParser(description='Run a batch job for scheduled replications or revisions.')
+parser.add_argument('--shards', type=int, default=0,
+                    help='create revisions with this amount of parallel workers')
+parser.add_argument('--shard', type=int, default=None,
+                    help='only run the worker of this shard (0 <= shard < shards)')
+parser.add_argument('--resource-concurrency', type=int, default=0,
+                    help='maximum amount of workers copying from one resource at once (default: unlimited)')
+parser.add_argument('--max-bytes-per-second', type=int, default=0,
+                    help='maximum amount of bytes per second copied by all workers together (default: unlimited)')
+args = parser.parse_args()
 
 if 'replicate' in NAME:
     rule_name = 'uuReplicateBatch'
@@ -40,8 +92,18 @@ else:
     print('bad command "{}"'.format(NAME), file=sys.stderr)
     exit(1)
 
-lock_or_die()
-
 import subprocess
 
+if args.shard is not None:
+    if rule_name != 'uuRevisionBatch' or not 0 <= args.shard < args.shards:
+        print('error: --shard requires revisions and 0 <= shard < --shards', file=sys.stderr)
+        exit(1)
+    exit(run_shard(args.shard, args.shards, args.resource_concurrency, args.max_bytes_per_second))
+
+# Shard workers take their own lock, see run_shard.
+if args.shards and rule_name == 'uuRevisionBatch':
+    run_shards(args.shards, args.resource_concurrency, args.max_bytes_per_second)
+
+lock_or_die()
+
 subprocess.call(['irule', '-r', 'irods_rule_engine_plugin-irods_rule_language-instance', rule_name, 'null', 'ruleExecOut'])
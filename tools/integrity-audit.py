@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Verify the integrity of replicas on a resource server, outside of iRODS.
+
+Reads a manifest (CSV with physical path, size and checksum per replica,
+as exported by integrity-manifest.r), verifies the files with a pool of
+processes, and writes one JSON line per file to a report.
+
+Usage:
+
+    irule -F integrity-manifest.r '*resource="irodsResc"' '*manifest="/var/lib/irods/manifest.csv"'
+    ./integrity-audit.py /var/lib/irods/manifest.csv --report report.jsonl
+
+Requires Python 3: files are read with os.posix_fadvise, so that an audit
+does not evict the page cache of the resource server. Python 2 lacks
+posix_fadvise, the audit then works but floods the page cache.
+
+An interrupted audit is resumed with --resume: files already in the report
+are skipped, and new results are appended.
+
+The exit status is 0 when all files are OK, 1 otherwise.
+"""
+
+from __future__ import print_function
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Use the hash-and-compare logic of the ruleset.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from integrity_disk import CHUNK_SIZE, Status, checkDataObject  # noqa: E402
+
+
+def read_manifest(f):
+    """Generate (path, size, checksum) tuples from a manifest, skipping an optional header."""
+    for row in csv.reader(f):
+        if len(row) < 3 or row[0] == 'path':
+            continue
+        yield row[0], row[1], row[2]
+
+
+def read_report(path):
+    """Get the status per path of the files in an existing report.
+
+    An incomplete last line (of an interrupted audit) is removed from the report.
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+
+    with open(path, 'r+') as f:
+        end = 0
+        for line in iter(f.readline, ''):
+            if not line.endswith('\n'):
+                break
+            try:
+                result = json.loads(line)
+                done[result['path']] = result['status']
+            except (ValueError, KeyError):
+                break
+            end = f.tell()
+        f.truncate(end)
+
+    return done
+
+
+def check(entry):
+    path, size, checksum = entry
+    start  = time.time()
+    status = checkDataObject(path, size, checksum, CHUNK_SIZE)
+    return {'path':     path,
+            'size':     int(size),
+            'checksum': checksum,
+            'status':   status.name,
+            'seconds':  round(time.time() - start, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify the integrity of replicas on disk, given a manifest.')
+    parser.add_argument('manifest', help='CSV file with path, size and checksum per line (- for stdin)')
+    parser.add_argument('--report', required=True, help='JSONL report file')
+    parser.add_argument('--resume', action='store_true', help='skip files already in the report, and append to it')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help='amount of files verified in parallel (default: amount of CPUs)')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'posix_fadvise'):
+        print('Warning: os.posix_fadvise is not available (Python 3 is required), '
+              'the audit will flood the page cache', file=sys.stderr)
+
+    done = read_report(args.report) if args.resume else {}
+
+    manifest = sys.stdin if args.manifest == '-' else open(args.manifest)
+    entries  = (entry for entry in read_manifest(manifest) if entry[0] not in done)
+
+    # The summary covers the complete audit, including resumed results.
+    counts = dict((status.name, 0) for status in Status)
+    for status in done.values():
+        counts[status] += 1
+
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        with open(args.report, 'a' if args.resume else 'w') as report:
+            for result in pool.imap_unordered(check, entries, chunksize=16):
+                report.write(json.dumps(result, sort_keys=True) + '\n')
+                report.flush()
+                counts[result['status']] += 1
+    finally:
+        pool.terminate()
+
+    print('Resumed {} files from report'.format(len(done)), file=sys.stderr)
+    for name in sorted(counts):
+        print('{}: {}'.format(name, counts[name]), file=sys.stderr)
+
+    return 0 if sum(counts.values()) == counts[Status.OK.name] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,15 @@
+# Checksum all research and vault replicas without catalog checksum.
+# Runs in the background, one chunk of data objects at a time, and
+# continues where it stopped when started again.
+backfill {
+	uuGetUserType("$userNameClient#$rodsZoneClient", *usertype);
+
+	if (*usertype != "rodsadmin") {
+		failmsg(-1, "This script needs to be run by a rodsadmin");
+	}
+
+	rule_integrity_checksum_backfill(*chunkSize, *workers, *delay);
+}
+
+input *chunkSize="1000", *workers="4", *delay="10"
+output ruleExecOut
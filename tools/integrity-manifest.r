@@ -0,0 +1,16 @@
+# Export a manifest of the vault replicas on a resource, for integrity-audit.py, e.g.:
+# irule -F integrity-manifest.r '*resource="irodsResc"' '*manifest="/var/lib/irods/manifest.csv"'
+#
+# The manifest is written on the server that executes the rule.
+export {
+	uuGetUserType("$userNameClient#$rodsZoneClient", *usertype);
+
+	if (*usertype != "rodsadmin") {
+		failmsg(-1, "This script needs to be run by a rodsadmin");
+	}
+
+	rule_integrity_export_manifest(*resource, *manifest);
+}
+
+input *resource="", *manifest=""
+output ruleExecOut
@@ -0,0 +1,15 @@
+# Run periodically (e.g. nightly) to verify the least recently verified vault replicas.
+# Every vault replica should be verified at least once per quarter,
+# choose the budget per host accordingly.
+verify {
+	uuGetUserType("$userNameClient#$rodsZoneClient", *usertype);
+
+	if (*usertype != "rodsadmin") {
+		failmsg(-1, "This script needs to be run by a rodsadmin");
+	}
+
+	rule_integrity_verify_vault(*bytesPerSecond, *maxSeconds);
+}
+
+input *bytesPerSecond="100000000", *maxSeconds="28800"
+output ruleExecOut
@@ -0,0 +1,10 @@
+# Create revisions for the scheduled data objects in one shard.
+# Started per shard by async-data-revision.py --shards.
+batch {
+        *status = "";
+        rule_revision_batch(str(*shard), str(*shards), str(*resourceConcurrency), str(*maxBytesPerSecond), *status);
+        writeLine("stdout", *status);
+}
+
+input *shard=0, *shards=1, *resourceConcurrency=0, *maxBytesPerSecond=0
+output ruleExecOut
@@ -0,0 +1,11 @@
+# Clean up part of the revision store, within a time and deletion budget.
+# Subsequent runs resume where the previous run stopped.
+cleanup {
+        writeLine("stdout", 'START cleaning up revision store');
+        *status = "";
+        rule_revisions_clean_up_budgeted(*bucketcase, str(*endOfCalendarDay), str(*maxSeconds), str(*maxDeletions), *status);
+        writeLine("stdout", *status);
+}
+
+input *endOfCalendarDay=0, *bucketcase="B", *maxSeconds=3600, *maxDeletions=0
+output ruleExecOut
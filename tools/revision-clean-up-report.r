@@ -0,0 +1,9 @@
+# Report which revisions a bucket case would remove, without removing anything.
+report {
+        *status = "";
+        rule_revisions_clean_up_report(*bucketcase, str(*endOfCalendarDay), *reportPath, *status);
+        writeLine("stdout", *status);
+}
+
+input *endOfCalendarDay=0, *bucketcase="B", *reportPath=""
+output ruleExecOut
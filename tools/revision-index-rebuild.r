@@ -0,0 +1,9 @@
+# Rebuild the revision index of a group, or of all groups if no group is given.
+rebuild {
+        *status = "";
+        rule_revisions_index_rebuild(*group, *status);
+        writeLine("stdout", *status);
+}
+
+input *group=""
+output ruleExecOut
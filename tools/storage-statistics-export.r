@@ -0,0 +1,13 @@
+# Export storage statistics of all categories as CSV, e.g.:
+# irule -F storage-statistics-export.r '*start="2019-01"' '*end="2020-12"' > storage.csv
+run {
+	uuGetUserType("$userNameClient#$rodsZoneClient", *usertype);
+
+	if (*usertype != "rodsadmin") {
+		failmsg(-1, "This script needs to be run by a rodsadmin");
+	}
+
+	rule_resource_storage_statistics_export_csv(*start, *end);
+}
+input *start="", *end=""
+output ruleExecOut
@@ -0,0 +1,18 @@
+# Run periodically (e.g. nightly) to correct drift of the running storage counters
+run {
+	uuGetUserType("$userNameClient#$rodsZoneClient", *usertype);
+
+	if (*usertype != "rodsadmin") {
+		failmsg(-1, "This script needs to be run by a rodsadmin");
+	}
+
+	# Retrieve current timestamp.
+	msiGetIcatTime(*timestamp, "human");
+	writeLine('stdout', '[' ++ *timestamp ++ '] Reconciling storage counters');
+
+	rule_resource_storage_usage_reconcile(*result);
+
+	writeLine('stdout', *result);
+}
+input null
+output ruleExecOut
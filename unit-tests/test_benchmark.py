@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the offline benchmark suite."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import sys
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from offline import benchmark, catalog, zone  # noqa: E402
+
+
+class BenchmarkTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cat = catalog.Catalog()
+        zone.generate(cls.cat, objects=300, groups=2, seed=5)
+
+    def test_all_scenarios_succeed(self):
+        report = benchmark.run(self.cat, repeat=1)
+        self.assertEqual(list(report['results']), [s.name for s in benchmark.SCENARIOS])
+        for name, r in report['results'].items():
+            self.assertEqual(r['status'], 'ok', name)
+            self.assertGreater(r['genquery_executions'], 0, name)
+
+    def test_compare(self):
+        old = {'results': {'x': {'genquery_executions': 3, 'msiGetMoreRows': 1, 'rows_transferred': 10}}}
+        new = {'results': {'x': {'genquery_executions': 5, 'msiGetMoreRows': 1, 'rows_transferred': 10}}}
+        self.assertEqual(benchmark.compare(old, new), [('x', 'genquery_executions', 3, 5)])
+        self.assertEqual(benchmark.compare(old, new, tolerance=1.0), [])
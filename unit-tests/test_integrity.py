@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for vault integrity checks."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import base64
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402
+from offline import catalog  # noqa: E402
+
+import integrity  # noqa: E402
+
+VAULT     = '/tempZone/home/vault-a/pkg'
+AUDIT     = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools', 'integrity-audit.py')
+RESOURCES = ['irodsResc', 'irodsRescRepl1']
+HOSTS     = {'irodsResc': 'host-a', 'irodsRescRepl1': 'host-b'}
+
+
+def make_vault(directory, objects=10):
+    """Create vault data objects with two replicas on two hosts, backed by files in a directory."""
+    cat = catalog.base(resources=RESOURCES, hosts=HOSTS)
+    cat.add_data_object('/tempZone/home/research-a/f', size=1)
+
+    for i in range(objects):
+        content  = 'content {}'.format(i).encode()
+        checksum = ('sha2:' + base64.b64encode(hashlib.sha256(content).digest()).decode() if i % 2
+                    else hashlib.md5(content).hexdigest())
+        did = cat.add_data_object('{}/f{}'.format(VAULT, i), size=len(content), checksum=checksum, replicas=2)
+        for repl in range(2):
+            path = os.path.join(directory, '{}-{}'.format(did, repl))
+            with open(path, 'wb') as f:
+                f.write(content)
+            cat.execute('UPDATE r_data_main SET data_path = ? WHERE data_id = ? AND data_repl_num = ?',
+                        (path, did, repl))
+    return cat
+
+
+class VaultIntegrityTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cat       = make_vault(self.directory)
+        self.session   = offline.Session(self.cat)
+        self.ids       = [int(r[0]) for r in self.cat.execute('SELECT DISTINCT d.data_id FROM r_data_main d'
+                                                              ' JOIN r_coll_main c ON c.coll_id = d.coll_id'
+                                                              ' WHERE c.coll_name = ? ORDER BY d.data_id', (VAULT,))]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batches(self):
+        # Batches hold up to 3 replicas per host, one remote call per host per batch.
+        data_id, calls = 0, 0
+        while True:
+            data_id = integrity.checkVaultIntegrityBatch(self.session.callback, 'tempZone', data_id, 3, 0)
+            calls  += 1
+            if data_id == 0:
+                break
+            self.assertIn(data_id, self.ids)
+        self.assertEqual(calls, 4)
+        self.assertEqual([host for host, _ in self.session.callback.remote], ['host-a', 'host-b'] * 4)
+        self.assertEqual(self.session.callback.remote[0][1],
+                         "rule_integrity_check_replicas_remote('tempZone', '0', '{}', 'host-a')".format(self.ids[2]))
+
+    def test_remote_check(self):
+        first, last = self.ids[0], self.ids[-1]
+        os.remove(os.path.join(self.directory, '{}-0'.format(self.ids[1])))
+        with open(os.path.join(self.directory, '{}-0'.format(self.ids[2])), 'r+b') as f:
+            f.write(b'C')
+        with open(os.path.join(self.directory, '{}-0'.format(self.ids[3])), 'ab') as f:
+            f.write(b'extra')
+
+        replicas = integrity.vault_replicas(self.session.callback, 'tempZone', first, last, 'host-a')
+        results  = integrity.check_replicas(replicas)
+        self.assertEqual([(int(r.DATA_ID), status) for r, status in results if status != integrity.Status.OK],
+                         [(self.ids[1], integrity.Status.NOT_EXISTING),
+                          (self.ids[2], integrity.Status.CHECKSUM_MISMATCH),
+                          (self.ids[3], integrity.Status.FILE_SIZE_MISMATCH)])
+
+        self.session.rule('rule_integrity_check_replicas_remote', 'tempZone', str(first), str(last), 'host-b')
+        log = ''.join(self.session.callback.output['serverLog'])
+        self.assertIn('[INTEGRITY] DATA_ID {}-{} on host-b: {{"OK": 10}}'.format(first, last), log)
+
+        # The result of every replica is recorded on its data object.
+        self.session.rule('rule_integrity_check_replicas_remote', 'tempZone', str(first), str(last), 'host-a')
+        verified = dict(((int(did), unit), value.split(':')[1]) for did, value, unit in
+                        self.cat.execute("SELECT mm.object_id, m.meta_attr_value, m.meta_attr_unit FROM r_meta_main m"
+                                         " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                                         " WHERE m.meta_attr_name = 'org_integrity_verified'"))
+        self.assertEqual(len(verified), 20)
+        self.assertEqual(sorted((did, status) for (did, unit), status in verified.items() if status != 'OK'),
+                         [(self.ids[1], 'NOT_EXISTING'), (self.ids[2], 'CHECKSUM_MISMATCH'),
+                          (self.ids[3], 'FILE_SIZE_MISMATCH')])
+
+
+class FakeTime(object):
+    """Clock that only advances by sleeping."""
+
+    def __init__(self):
+        self.now = 1600000000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class VaultVerifyTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cat       = make_vault(self.directory)
+        self.session   = offline.Session(self.cat)
+        self.clock     = FakeTime()
+        integrity.time = self.clock
+
+    def tearDown(self):
+        integrity.time = time
+        integrity.VERIFY_BATCH_SIZE = 256
+        shutil.rmtree(self.directory)
+
+    def verified(self):
+        return sorted((int(did), value.split(':')[1], unit) for did, value, unit in
+                      self.cat.execute("SELECT mm.object_id, m.meta_attr_value, m.meta_attr_unit FROM r_meta_main m"
+                                       " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                                       " WHERE m.meta_attr_name = 'org_integrity_verified'"))
+
+    def cursor(self, resource='irodsResc'):
+        return self.cat.scalar("SELECT m.meta_attr_value FROM r_meta_main m"
+                               " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                               " WHERE mm.object_id = ? AND m.meta_attr_name = 'org_integrity_cursor'",
+                               (self.cat.resc_id(resource),))
+
+    def test_budget_and_resume(self):
+        integrity.VERIFY_BATCH_SIZE = 2
+        ctx = self.session.ctx
+
+        # Each replica is 9 bytes: at 9 bytes per second, 4.5 seconds allow verifying 5 replicas.
+        self.assertEqual(integrity.verify_resource(ctx, 'tempZone', 'irodsResc', 9, self.clock.now + 4.5), (5, 45))
+        first = [did for did, _, _ in self.verified()]
+        self.assertEqual(len(first), 5)
+        self.assertEqual(self.cursor(), str(first[-1]))
+
+        # The next run continues at the cursor, completes the cycle and starts over.
+        os.remove(os.path.join(self.directory, '{}-0'.format(first[-1] + 1)))
+        self.assertEqual(integrity.verify_resource(ctx, 'tempZone', 'irodsResc', 0, self.clock.now + 100), (5, 45))
+        self.assertEqual([x[1:] for x in self.verified()], [('OK', '0')] * 5 + [('NOT_EXISTING', '0')] + [('OK', '0')] * 4)
+        self.assertEqual(self.cursor(), '0')
+
+        # Verifying again replaces the previous result.
+        integrity.verify_resource(ctx, 'tempZone', 'irodsResc', 0, self.clock.now + 100)
+        self.assertEqual(len(self.verified()), 10)
+
+    def test_schedule(self):
+        self.session.rule('rule_integrity_verify_vault', '1000', '60')
+        self.assertEqual([body for _, body in self.session.callback.delayed],
+                         ["remoteExec('host-a', '', \"rule_integrity_verify_remote('tempZone', 'host-a', '1000', '60')\", '')",
+                          "remoteExec('host-b', '', \"rule_integrity_verify_remote('tempZone', 'host-b', '1000', '60')\", '')"])
+
+        self.session.rule('rule_integrity_verify_remote', 'tempZone', 'host-b', '0', '60')
+        self.assertEqual([x[1:] for x in self.verified()], [('OK', '1')] * 10)
+        self.assertEqual(self.cursor('irodsRescRepl1'), '0')
+
+    def test_shared_host(self):
+        # Resources on the same host share the budget, the resource whose cycle started longest ago goes first.
+        self.cat.execute("UPDATE r_resc_main SET resc_net = 'host-a'")
+        self.cat.add_avu(self.cat.resc_id('irodsResc'), 'org_integrity_cycle_start', str(int(self.clock.now)))
+        self.cat.add_avu(self.cat.resc_id('irodsRescRepl1'), 'org_integrity_cycle_start', str(int(self.clock.now) - 10))
+
+        # Each replica is 9 bytes: at 9 bytes per second, 4 seconds allow verifying 2 replicas per resource.
+        self.session.rule('rule_integrity_verify_remote', 'tempZone', 'host-a', '9', '4')
+        self.assertEqual(sorted(unit for _, _, unit in self.verified()), ['0', '0', '1', '1'])
+        log = ''.join(self.session.callback.output['serverLog'])
+        self.assertLess(log.index('on <irodsRescRepl1>'), log.index('on <irodsResc>'))
+
+
+class DiskAuditTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cat       = make_vault(self.directory)
+        self.session   = offline.Session(self.cat)
+        self.manifest  = os.path.join(self.directory, 'manifest.csv')
+        self.report    = os.path.join(self.directory, 'report.jsonl')
+
+        self.session.rule('rule_integrity_export_manifest', 'irodsResc', self.manifest)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def audit(self, *args):
+        return subprocess.call([sys.executable, AUDIT, self.manifest, '--report', self.report, '--processes', '2'] + list(args),
+                               stderr=open(os.devnull, 'w'))
+
+    def results(self):
+        with open(self.report) as f:
+            return dict((r['path'], r['status']) for r in map(json.loads, f))
+
+    def test_manifest(self):
+        with open(self.manifest) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertTrue(all(line.startswith(self.directory) and line.endswith('-0,9,' + line.split(',')[2])
+                            for line in lines))
+
+        # Exporting in smaller ranges of DATA_IDs gives the same manifest.
+        range_size = integrity.MANIFEST_RANGE_SIZE
+        try:
+            integrity.MANIFEST_RANGE_SIZE = 3
+            self.session.rule('rule_integrity_export_manifest', 'irodsResc', self.manifest + '.3')
+        finally:
+            integrity.MANIFEST_RANGE_SIZE = range_size
+        with open(self.manifest + '.3') as f:
+            self.assertEqual(f.read().splitlines(), lines)
+
+    def test_audit_and_resume(self):
+        self.assertEqual(self.audit(), 0)
+        results = self.results()
+        self.assertEqual(len(results), 10)
+        self.assertEqual(set(results.values()), {'OK'})
+
+        # An interrupted audit leaves a partial last line, resuming only audits the missing files.
+        with open(self.report) as f:
+            lines = f.readlines()
+        with open(self.report, 'w') as f:
+            f.writelines(lines[:4])
+            f.write(lines[4][:10])
+        missing = [json.loads(line)['path'] for line in lines[4:]]
+        os.remove(missing[-1])
+        os.remove(json.loads(lines[0])['path'])
+
+        self.assertEqual(self.audit('--resume'), 1)
+        results = self.results()
+        self.assertEqual(len(results), 10)
+        self.assertEqual([path for path, status in results.items() if status != 'OK'], [missing[-1]])
+
+
+class ChecksumBackfillTest(TestCase):
+
+    def setUp(self):
+        self.cat = catalog.base(resources=RESOURCES, hosts=HOSTS)
+        self.cat.add_collection('/tempZone/yoda')
+        self.cat.add_data_object('/tempZone/home/grp-other/f', content=b'other')
+        self.cat.add_data_object('/tempZone/home/research-a/done', content=b'done', checksum='sha2:xyz')
+        for i in range(4):
+            self.cat.add_data_object('/tempZone/home/research-a/f{}'.format(i), content=b'r', replicas=2)
+            self.cat.add_data_object('{}/f{}'.format(VAULT, i), content=b'v')
+        self.session = offline.Session(self.cat)
+
+    def missing(self):
+        return self.cat.scalar("SELECT COUNT(*) FROM r_data_main WHERE data_checksum = ''")
+
+    def jobs(self):
+        return self.cat.execute("SELECT m.meta_attr_value FROM r_meta_main m JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                                " WHERE m.meta_attr_name = 'org_checksum_backfill_job'").fetchall()
+
+    def cursor(self):
+        return self.cat.scalar("SELECT m.meta_attr_value FROM r_meta_main m JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                               " WHERE m.meta_attr_name = 'org_checksum_backfill_cursor'")
+
+    def run_jobs(self, jobs):
+        for job in jobs:
+            self.session.rule('rule_integrity_checksum_remote', *job.split('"')[1].split("'")[1::2])
+
+    def test_backfill(self):
+        # Chunks of 5 replicas: the replicas of one data object are never split over two chunks.
+        self.session.rule('rule_integrity_checksum_backfill', '5', '2', '60')
+        jobs = [body for _, body in self.session.callback.delayed]
+        self.assertEqual(len(jobs), 5)
+        self.assertEqual([job.split("'")[1] for job in jobs[:4]], ['host-a', 'host-a', 'host-b', 'host-b'])
+        self.assertEqual(jobs[-1], "rule_integrity_checksum_backfill('5', '2', '60')")
+        self.assertEqual(len(self.jobs()), 4)
+
+        # No new chunk is scheduled, and the cursor does not move, until all jobs of the chunk have finished.
+        self.run_jobs(jobs[:3])
+        self.session.callback.delayed = []
+        self.session.rule('rule_integrity_checksum_backfill', '5', '2', '60')
+        self.assertEqual([body for _, body in self.session.callback.delayed], jobs[-1:])
+        self.assertIsNone(self.cursor())
+
+        # Each job checksums the replicas without checksum on its host.
+        self.run_jobs(jobs[3:4])
+        self.assertEqual(self.missing(), 1 + 7)
+        self.assertEqual(self.jobs(), [])
+
+        # Runs continue at the cursor, until all data objects have been scheduled.
+        runs = 2
+        while self.session.callback.delayed:
+            self.session.callback.delayed = []
+            self.session.rule('rule_integrity_checksum_backfill', '5', '2', '60')
+            self.run_jobs([job for _, job in self.session.callback.delayed[:-1]])
+            runs += 1
+        self.assertEqual(runs, 5)
+        self.assertEqual(self.missing(), 1)
+        self.assertIsNotNone(self.cursor())
+        self.assertIn('[CHECKSUM] Checksum back-fill complete', ''.join(self.session.callback.output['serverLog']))
+
+    def test_backfill_checksummed(self):
+        # Chunks without replicas to checksum are passed at once.
+        last = self.cat.data_id('{}/f3'.format(VAULT))
+        self.cat.execute("UPDATE r_data_main SET data_checksum = 'sha2:xyz' WHERE data_id != ?", (last,))
+        self.session.rule('rule_integrity_checksum_backfill', '5', '2', '60')
+        jobs = [body for _, body in self.session.callback.delayed]
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(self.jobs(), [('host-a:{0}-{0}'.format(last),)])
+
+    def test_backfill_stale(self):
+        self.session.rule('rule_integrity_checksum_backfill', '5', '2', '60')
+        first = self.jobs()
+        self.assertEqual(len(first), 4)
+
+        # Jobs that did not finish in time are scheduled again, a limited amount of times.
+        for attempt in range(1, integrity.CHECKSUM_BACKFILL_JOB_ATTEMPTS + 1):
+            self.cat.execute("UPDATE r_meta_main SET meta_attr_unit = '{}:0'"
+                             " WHERE meta_attr_name = 'org_checksum_backfill_job'".format(attempt))
+            self.session.callback.delayed = []
+            self.session.rule('rule_integrity_checksum_backfill', '5', '2', '60')
+            jobs = [body for _, body in self.session.callback.delayed]
+            if attempt < integrity.CHECKSUM_BACKFILL_JOB_ATTEMPTS:
+                self.assertEqual(len(jobs), 5)
+                self.assertEqual(len(self.jobs()), 4)
+
+        # After that, the next chunk is scheduled.
+        self.assertIn('did not finish after {} attempts'.format(integrity.CHECKSUM_BACKFILL_JOB_ATTEMPTS),
+                      ''.join(self.session.callback.output['serverLog']))
+        self.assertTrue(self.jobs())
+        self.assertFalse(set(self.jobs()) & set(first))
+        self.assertEqual(self.missing(), 1 + 12)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the logging facilities."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import sys
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402,F401
+from offline import callback, catalog  # noqa: E402
+
+from util import config, log  # noqa: E402
+
+
+class Lazy(object):
+    """Counts how often it is formatted."""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, spec):
+        self.formatted += 1
+        return 'lazy'
+
+
+class LogTest(TestCase):
+
+    def setUp(self):
+        self.cb = callback.Callback(catalog.Catalog(), 'rods')
+        self.saved = dict(config._items)
+        config._items.update(log_level='info', log_levels=[], log_rate_limit=0)
+        log._levels.clear()
+        log._recent.clear()
+
+    def tearDown(self):
+        config._items.clear()
+        config._items.update(self.saved)
+        log._levels.clear()
+        log._recent.clear()
+
+    def lines(self):
+        return [x.rstrip('\n') for x in self.cb.output['serverLog']]
+
+    def test_levels_and_lazy_formatting(self):
+        x = Lazy()
+        log.debug(self.cb, 'not written: {}', x)
+        log.write(self.cb, 'written: {} {{literal}}', x)
+        log.write(self.cb, 'no arguments: {}')
+        log.warning(self.cb, 'careful')
+        self.assertEqual(x.formatted, 1)
+        self.assertEqual(self.lines(), ['test_levels_and_lazy_formatting: written: lazy {literal}',
+                                        'test_levels_and_lazy_formatting: no arguments: {}',
+                                        'test_levels_and_lazy_formatting: WARNING: careful'])
+
+    def test_module_levels(self):
+        config._items.update(log_levels=['test_log=debug'])
+        log.debug(self.cb, 'debug')
+        log._debug(self.cb, 'internal {}', 1)
+        self.assertEqual(self.lines(), ['test_module_levels: DEBUG: debug', 'DEBUG: internal 1'])
+
+        config._items.update(log_levels=['test_log=error'])
+        log._levels.clear()
+        log.warning(self.cb, 'warning')
+        log.error(self.cb, 'error')
+        self.assertEqual(self.lines()[2:], ['test_module_levels: ERROR: error'])
+
+    def test_rate_limit(self):
+        config._items.update(log_rate_limit=3)
+        for i in range(10):
+            log.write(self.cb, 'same')
+        log.write(self.cb, 'other')
+        self.assertEqual(self.lines(), ['test_rate_limit: same'] * 3 + ['test_rate_limit: other'])
+
+        # A new window reports the amount of suppressed messages.
+        log._recent['test_rate_limit: same'][0] -= log.RATE_LIMIT_WINDOW
+        log.write(self.cb, 'same')
+        self.assertEqual(self.lines()[-1], 'test_rate_limit: same (7 identical messages suppressed)')
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the offline GenQuery engine."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import sys
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402
+from offline import callback, catalog, zone  # noqa: E402
+
+from util import avu, data_object, instrumentation, query, rule  # noqa: E402
+
+
+def make_catalog():
+    cat = catalog.base(users=['alice'], groups=['research-a'], members=[('research-a', 'alice')])
+    cat.add_collection('/tempZone/home/research-a', t=100)
+    for i in range(600):
+        did = cat.add_data_object('/tempZone/home/research-a/f{:03d}'.format(i), size=i, t=1000 + i)
+        cat.set_access(did, 'research-a', 'own')
+        if i % 2:
+            cat.add_avu(did, 'parity', 'odd')
+    cat.add_avu(cat.user_id('research-a'), 'category', 'science')
+    return cat
+
+
+class OfflineTest(TestCase):
+
+    def setUp(self):
+        self.cat = make_catalog()
+        self.cb  = callback.Callback(self.cat, 'alice')
+        self.cb.rei = callback.Rei('alice', 'tempZone')
+
+    def test_query_batches(self):
+        rows = list(query.Query(self.cb, 'DATA_NAME', "COLL_NAME = '/tempZone/home/research-a'"))
+        self.assertEqual(len(rows), 600)
+        self.assertEqual(rows[:2], ['f000', 'f001'])
+        self.assertEqual(self.cb.stats['msiGetMoreRows'], 2)
+        self.assertEqual(self.cb.statements, {})
+
+    def test_query_offset_limit_total(self):
+        q = query.Query(self.cb, 'ORDER_DESC(DATA_NAME)', "DATA_NAME like 'f1%'", offset=10, limit=5)
+        self.assertEqual(list(q), ['f189', 'f188', 'f187', 'f186', 'f185'])
+        self.assertEqual(q.total_rows(), 100)
+
+    def test_query_aggregates_and_meta(self):
+        self.assertEqual(query.Query(self.cb, 'SUM(DATA_SIZE)', "META_DATA_ATTR_VALUE = 'odd'").first(),
+                         str(sum(range(1, 600, 2))))
+        self.assertEqual(query.Query(self.cb, 'COUNT(DATA_ID), COLL_NAME', "DATA_SIZE >= '590'").first(),
+                         ('10', '/tempZone/home/research-a'))
+        self.assertEqual(query.Query(self.cb, 'META_USER_ATTR_VALUE', "USER_GROUP_NAME = 'research-a'").first(),
+                         'science')
+        self.assertEqual(query.Query(self.cb, 'USER_NAME', "DATA_NAME = 'f001' AND DATA_ACCESS_NAME = 'own'"
+                                                           " AND USER_TYPE = 'rodsgroup'").first(), 'research-a')
+
+    def test_case_insensitive_and_in(self):
+        self.assertEqual(list(query.Query(self.cb, 'DATA_NAME', "DATA_NAME in ('F001', 'F002')",
+                                          case_sensitive=False)), ['f001', 'f002'])
+
+    def test_statement_table_full(self):
+        queries = [iter(query.Query(self.cb, 'DATA_NAME')) for _ in range(callback.MAX_NUMBER_OF_CONCURRENT_STATEMENTS)]
+        for q in queries:
+            next(q)
+        with self.assertRaises(RuntimeError):
+            query.Query(self.cb, 'DATA_NAME').first()
+
+    def test_avu_and_data_object(self):
+        path = '/tempZone/home/research-a/new.txt'
+        data_object.write(self.cb, path, 'hello')
+        self.assertEqual(data_object.read(self.cb, path), 'hello')
+        avu.set_on_data(self.cb, path, 'a', '1')
+        avu.set_on_data(self.cb, path, 'a', '2')
+        self.assertEqual(list(avu.of_data(self.cb, path)), [avu.Avu('a', '2', '')])
+        avu.rmw_from_data(self.cb, path, 'a', '%')
+        self.assertEqual(list(avu.of_data(self.cb, path)), [])
+        data_object.copy(self.cb, path, path + '.copy')
+        self.assertEqual(data_object.read(self.cb, path + '.copy'), 'hello')
+
+        # Key-value pairs hold one value per key, like in iRODS.
+        kvp = self.cb.msiString2KeyValPair('b=1%c=1%b=2', 0)['arguments'][1]
+        kvp = self.cb.msiAddKeyVal(kvp, 'c', '2')['arguments'][0]
+        self.cb.msiAssociateKeyValuePairsToObj(kvp, path, '-d')
+        self.assertEqual(sorted(avu.of_data(self.cb, path)), [avu.Avu('b', '2', ''), avu.Avu('c', '2', '')])
+
+    def test_zone_generator(self):
+        cat    = catalog.Catalog()
+        counts = zone.generate(cat, objects=200, groups=2, seed=3)
+        self.assertEqual(counts['data_objects'], 200)
+        session = offline.Session(cat, user='researcher0-0')
+        result  = session.api('api_browse_folder', coll='/tempZone/home/research-group0', limit=3)
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(len(result['data']['items']), 3)
+
+    def test_instrumentation(self):
+        start = instrumentation.snapshot()
+        self.assertEqual(len(list(query.Query(self.cb, 'DATA_NAME', "COLL_NAME = '/tempZone/home/research-a'"))), 600)
+        next(iter(query.Query(self.cb, 'DATA_NAME')))
+        data_object.write(self.cb, '/tempZone/home/research-a/new.txt', 'hello')
+        stats = instrumentation.since(start)
+        self.assertEqual(stats['query']['count'], 2)
+        self.assertEqual(stats['fetch']['count'], 2)
+        self.assertEqual(stats['close']['count'], 1)
+        self.assertEqual(stats['rows'], 601)
+        self.assertEqual(stats['rows_unused'], 255)
+        self.assertEqual(stats['rows_discarded'], 1)
+        self.assertEqual(stats['msi']['msiDataObjCreate']['count'], 1)
+
+    def test_query_close(self):
+        # Queries that know how many rows they need close without an extra round-trip.
+        start = instrumentation.snapshot()
+        self.assertEqual(query.Query(self.cb, 'DATA_NAME', limit=300).first(), 'f000')
+        self.assertEqual(len(list(query.Query(self.cb, 'DATA_NAME', limit=300))), 300)
+        self.assertEqual(len(list(query.Query(self.cb, 'DATA_NAME', offset=590, limit=20))), 10)
+        stats = instrumentation.since(start)
+        self.assertEqual(stats['query']['count'], 3)
+        self.assertEqual(stats['fetch']['count'], 1)
+        self.assertNotIn('close', stats)
+        self.assertNotIn('rows_unused', stats)
+        self.assertEqual(self.cb.stats['rows_transferred'], 311)
+        self.assertEqual(self.cb.statements, {})
+
+    def test_request_cache(self):
+        ctx  = rule.Context(self.cb, self.cb.rei)
+        path = '/tempZone/home/research-a/f001'
+
+        def parity():
+            return query.Query(ctx, 'META_DATA_ATTR_VALUE', "COLL_NAME = '/tempZone/home/research-a'"
+                                                            " AND DATA_NAME = 'f001'", cache=True).first()
+
+        self.assertEqual(parity(), 'odd')
+        self.assertEqual(parity(), 'odd')
+        self.assertEqual(self.cb.stats['genquery_executions'], 1)
+
+        # Writes to other objects keep the result, writes to the object itself drop it.
+        avu.set_on_data(ctx, '/tempZone/home/research-a/f002', 'parity', 'even')
+        self.assertEqual(parity(), 'odd')
+        self.assertEqual(self.cb.stats['genquery_executions'], 1)
+        avu.set_on_data(ctx, path, 'parity', 'changed')
+        self.assertEqual(parity(), 'changed')
+        self.assertEqual(self.cb.stats['genquery_executions'], 2)
+
+    def test_lookup(self):
+        keys = ['f{:03d}'.format(i) for i in range(0, 600, 3)] + ['missing']
+        with_query = {k: list(query.Query(self.cb, 'META_DATA_ATTR_VALUE', "DATA_NAME = '{}'".format(k))) for k in keys}
+        self.cb.reset_stats()
+        result = query.lookup(self.cb, 'DATA_NAME', keys, 'META_DATA_ATTR_VALUE')
+        self.assertEqual(dict(result), with_query)
+        self.assertEqual(list(result), keys)
+        self.assertEqual(self.cb.stats['genquery_executions'], 2)
+        self.assertEqual(query.lookup(self.cb, 'DATA_NAME', ['f001'], 'DATA_SIZE, DATA_NAME', output=query.AS_DICT),
+                         {'f001': [{'DATA_SIZE': '1', 'DATA_NAME': 'f001'}]})
+
+    def test_lookup_quoted(self):
+        coll = '/tempZone/home/research-a'
+        for name in ["f001's", "f001's copy", "100%_'x"]:
+            self.cat.add_data_object('{}/{}'.format(coll, name), size=len(name))
+        keys   = ["f001's", "f001'", "100%_'x", 'f001', 'f002']
+        result = query.lookup(self.cb, 'DATA_NAME', keys, 'DATA_SIZE', "COLL_NAME = '{}'".format(coll))
+        self.assertEqual(dict(result), {"f001's": ['6'], "f001'": [], "100%_'x": ['7'], 'f001': ['1'], 'f002': ['2']})
+
+    def test_output_rows_and_columns(self):
+        self.assertEqual(query.field_names(['ORDER(DATA_NAME)', 'DATA_SIZE', 'MAX(DATA_SIZE)']),
+                         ['DATA_NAME', 'DATA_SIZE', 'MAX_DATA_SIZE'])
+
+        row = query.Query(self.cb, 'ORDER_DESC(DATA_NAME), SUM(DATA_SIZE)', output=query.AS_ROW).first()
+        self.assertEqual((row.DATA_NAME, row.DATA_SIZE), ('f599', '599'))
+
+        batches = list(query.Query(self.cb, 'DATA_NAME, DATA_SIZE', "COLL_NAME = '/tempZone/home/research-a'",
+                                   offset=10, limit=400, output=query.AS_COLUMNS))
+        self.assertEqual([len(names) for names, sizes in batches], [256, 144])
+        self.assertEqual(batches[0][0][0], 'f010')
+        self.assertEqual(sum(int(x) for _, sizes in batches for x in sizes), sum(range(10, 410)))
+        self.assertEqual(self.cb.statements, {})
+
+    def test_api_batch(self):
+        session = offline.Session(self.cat, user='alice')
+        coll    = '/tempZone/home/research-a'
+        result  = session.api('api_batch', calls=[{'fn': 'api_browse_folder', 'args': {'coll': coll, 'limit': 2}},
+                                                  {'fn': 'api_browse_folder', 'args': {'coll': coll, 'foo': 1}},
+                                                  {'fn': 'api_nonexistent'}])
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual([x['fn'] for x in result['data']], ['api_browse_folder'] * 2 + ['api_nonexistent'])
+        self.assertEqual([x['status'] for x in result['data']], ['ok', 'error_badrequest', 'error_badrequest'])
+        self.assertEqual(result['data'][0]['data'], session.api('api_browse_folder', coll=coll, limit=2)['data'])
+        self.assertTrue(all(x['time'] >= 0 for x in result['data']))
+        self.assertEqual(session.api('api_batch', calls=[{'fn': 'api_batch', 'args': {'calls': []}}])['data'][0]['status'],
+                         'error_badrequest')
+        self.assertEqual(session.api('api_batch', calls={})['status'], 'error_badrequest')
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for keyset (cursor) pagination of the browse APIs."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import sys
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402
+from offline import catalog  # noqa: E402
+
+from util import query  # noqa: E402
+
+COLL = '/tempZone/home/research-a'
+
+
+def make_catalog():
+    cat = catalog.base(users=['alice'], groups=['research-a'], members=[('research-a', 'alice')])
+    cat.set_access(cat.add_collection(COLL, t=100), 'research-a', 'own')
+    for i in range(3):
+        cat.set_access(cat.add_collection('{}/sub{}'.format(COLL, i), t=200 - i), 'research-a', 'own')
+    # Many equal sizes and modify times, to test ordering on the tiebreaker.
+    for i in range(50):
+        did = cat.add_data_object('{}/f{:02d}'.format(COLL, (i * 7) % 50), size=i % 4, t=1000 + i % 5)
+        cat.set_access(did, 'research-a', 'own')
+    return cat
+
+
+class PaginationTest(TestCase):
+
+    def setUp(self):
+        self.session = offline.Session(make_catalog(), user='alice')
+
+    def pages(self, api, limit, **kwargs):
+        items, cursor, totals = [], '', []
+        while cursor is not None:
+            result = self.session.api(api, cursor=cursor, limit=limit, **kwargs)
+            self.assertEqual(result['status'], 'ok')
+            items += result['data']['items']
+            totals.append(result['data']['total'])
+            cursor = result['data']['next_cursor']
+        return items, totals
+
+    def test_browse_folder(self):
+        for sort_on, key in [('name', 'name'), ('modified', 'modify_time'), ('size', 'size')]:
+            for sort_order in ['asc', 'desc']:
+                full = self.session.api('api_browse_folder', coll=COLL, sort_on=sort_on, sort_order=sort_order,
+                                        offset=0, limit=1000)['data']
+                items, totals = self.pages('api_browse_folder', 7, coll=COLL, sort_on=sort_on, sort_order=sort_order)
+
+                self.assertEqual(len(items), 53)
+                self.assertEqual(sorted(items), sorted(full['items']))
+                self.assertEqual(set(totals), set([full['total']]))
+
+                datas = [x[key] for x in items if x['type'] == 'data']
+                self.assertEqual(datas, sorted(datas, reverse=sort_order == 'desc'))
+
+    def test_browse_without_count(self):
+        result = self.session.api('api_browse_folder', coll=COLL, cursor='', limit=5, count=False)
+        self.assertIsNone(result['data']['total'])
+        self.assertEqual(len(result['data']['items']), 5)
+
+    def test_invalid_cursor(self):
+        result = self.session.api('api_browse_folder', coll=COLL, cursor='garbage')
+        self.assertEqual(result['status'], 'error_badrequest')
+
+        # Tiebreakers are IDs, a quote cannot be from a genuine cursor.
+        cursor = query.encode_cursor({'phase': 1, 'after': {'key': 'f01', 'id': "1' OR DATA_ID > '0"}, 'total': 53})
+        result = self.session.api('api_browse_folder', coll=COLL, cursor=cursor)
+        self.assertEqual(result['status'], 'error_badrequest')
+
+    def test_mixed_case(self):
+        coll = COLL + '/mixed'
+        cat  = self.session.catalog
+        cat.set_access(cat.add_collection(coll), 'research-a', 'own')
+        for name in ['Bfile', 'afile', 'Cfile', 'dfile']:
+            cat.set_access(cat.add_data_object('{}/{}'.format(coll, name)), 'research-a', 'own')
+
+        for limit in [1, 2, 3]:
+            for sort_order in ['asc', 'desc']:
+                items, _ = self.pages('api_browse_folder', limit, coll=coll, sort_on='name', sort_order=sort_order)
+                self.assertEqual([x['name'].split('/')[-1] for x in items],
+                                 sorted(['Bfile', 'Cfile', 'afile', 'dfile'], reverse=sort_order == 'desc'))
+
+    def test_quotes(self):
+        # Keys with quotes at page boundaries cannot be used in GenQuery literals.
+        coll  = COLL + '/quotes'
+        cat   = self.session.catalog
+        names = ["'a", 'a', "b'", "b'a", "b'a'b", 'b!', 'b(', 'b', "c'", 'c']
+        cat.set_access(cat.add_collection(coll), 'research-a', 'own')
+        cat.set_access(cat.add_collection(coll + "/sub'"), 'research-a', 'own')
+        cat.set_access(cat.add_collection(coll + '/sub'), 'research-a', 'own')
+        for name in names:
+            cat.set_access(cat.add_data_object('{}/{}'.format(coll, name)), 'research-a', 'own')
+
+        for limit in [1, 2, 3]:
+            for sort_order in ['asc', 'desc']:
+                items, _ = self.pages('api_browse_folder', limit, coll=coll, sort_on='name', sort_order=sort_order)
+                self.assertEqual([x['name'].split('/')[-1] for x in items],
+                                 sorted(["sub'", 'sub'], reverse=sort_order == 'desc')
+                                 + sorted(names, reverse=sort_order == 'desc'))
+
+    def test_equal_keys(self):
+        # Every page costs the same, also within a long run of equal sort keys.
+        coll = COLL + '/equal'
+        cat  = self.session.catalog
+        cat.set_access(cat.add_collection(coll), 'research-a', 'own')
+        for i in range(300):
+            cat.set_access(cat.add_data_object('{}/f{:03d}'.format(coll, i), size=1), 'research-a', 'own')
+
+        stats, cursor, names = self.session.callback.stats, '', []
+        while cursor is not None:
+            stats.clear()
+            result = self.session.api('api_browse_folder', coll=coll, sort_on='size', cursor=cursor, limit=10, count=False)
+            self.assertLessEqual(stats['rows_transferred'], 11 * 2)
+            names  += [x['name'] for x in result['data']['items']]
+            cursor  = result['data']['next_cursor']
+        self.assertEqual(len(set(names)), 300)
+
+    def test_search(self):
+        full = self.session.api('api_search', search_string='F0', search_type='filename',
+                                offset=0, limit=1000)['data']
+        self.assertEqual(full['total'], 10)
+        page = self.session.api('api_search', search_string='F0', search_type='filename', offset=3, limit=3)['data']
+        self.assertEqual(page['items'], full['items'][3:6])
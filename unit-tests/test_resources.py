@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for resource and storage statistics."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import sys
+from datetime import datetime
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402
+from offline import catalog  # noqa: E402
+from offline.callback import IrodsError  # noqa: E402
+
+import resources  # noqa: E402
+
+TODAY = datetime.today()
+MONTH = TODAY.strftime('%Y-%m')
+
+# Statistics of the month before the current month, as stored in group metadata.
+PREVIOUS_MONTH = '{:04d}-{:02d}'.format(TODAY.year - (TODAY.month == 1), (TODAY.month - 2) % 12 + 1)
+PREVIOUS_ATTR  = 'org_storage_data_month' + PREVIOUS_MONTH[-2:]
+
+
+class DataObjInp(object):
+    """Input of a data object API call, as passed to dynamic PEPs."""
+
+    def __init__(self, path, **options):
+        # Importable once the offline package is installed.
+        import irods_types
+
+        self.objPath   = path
+        self.condInput = irods_types.KeyValPair()
+        for key, value in options.items():
+            self.condInput.add(key, value)
+
+
+def make_catalog():
+    cat = catalog.base(groups=['public'], resources=['irodsResc', 'archiveResc'])
+    cat.add_avu(cat.resc_id('archiveResc'), 'org_storage_tier', 'Archive')
+
+    for group, category in [('research-a', 'science'), ('research-ab', 'science'), ('datamanager-science', 'science'),
+                            ('grp-nocategory', '')]:
+        cat.add_group(group)
+        if category:
+            cat.add_avu(cat.user_id(group), 'category', category)
+    cat.add_avu(cat.user_id('research-a'), 'subcategory', 'physics')
+    cat.add_member('datamanager-science', 'rods')
+    cat.add_user('researcher', 'rodsuser')
+    cat.add_member('research-a', 'researcher')
+
+    cat.add_data_object('/tempZone/home/research-a/f1', size=1)
+    cat.add_data_object('/tempZone/home/research-a/dir/f2', size=2)
+    cat.add_data_object('/tempZone/home/research-a/dir/f3', size=4, resource='archiveResc')
+    cat.add_data_object('/tempZone/home/vault-a/pkg/f1', size=8)
+    cat.add_data_object('/tempZone/home/vault-a/pkg/f2', size=16, resource='archiveResc')
+    cat.add_data_object('/tempZone/yoda/revisions/research-a/dir/f2_1_rods', size=32)
+    cat.add_data_object('/tempZone/home/research-ab/f1', size=64)
+    cat.add_data_object('/tempZone/home/datamanager-science/f1', size=128)
+    cat.add_data_object('/tempZone/home/grp-nocategory/f1', size=256)
+
+    # Statistics from before storage statistics series.
+    cat.add_avu(cat.user_id('research-a'), PREVIOUS_ATTR, '["science", "Standard", 999]')
+    cat.add_avu(cat.user_id('research-ab'), PREVIOUS_ATTR, '["science", "Archive", 5]')
+    return cat
+
+
+class StorageStatisticsTest(TestCase):
+
+    def setUp(self):
+        self.cat     = make_catalog()
+        self.session = offline.Session(self.cat)
+        self.session.rule('rule_resource_store_monthly_storage_statistics')
+
+    def test_monthly_storage_statistics(self):
+        series = resources.storage_series_read(self.session.ctx, MONTH)
+        self.assertEqual(set(zip(*[series[c] for c in resources.STORAGE_SERIES_COLUMNS])),
+                         {('research-a', 'science', 'physics', 'Standard', 1 + 2 + 8 + 32),
+                          ('research-a', 'science', 'physics', 'Archive', 4 + 16),
+                          ('research-ab', 'science', '', 'Standard', 64),
+                          ('research-ab', 'science', '', 'Archive', 0),
+                          ('datamanager-science', 'science', '', 'Standard', 128),
+                          ('datamanager-science', 'science', '', 'Archive', 0)})
+
+        # Statistics stored as group metadata are converted.
+        series = resources.storage_series_read(self.session.ctx, PREVIOUS_MONTH)
+        self.assertEqual(series['storage'], [999, 5])
+        self.assertEqual(self.cat.scalar("SELECT COUNT(*) FROM r_meta_main WHERE meta_attr_name LIKE 'org_storage_data_month%'"
+                                         " AND meta_id IN (SELECT meta_id FROM r_objt_metamap)"), 0)
+
+    def test_readers(self):
+        self.assertEqual(sorted((x['tier'], x['storage']) for x in self.session.api('api_resource_monthly_stats')['data']),
+                         [('Archive', '20'), ('Standard', '235')])
+        self.assertEqual(self.session.api('api_resource_groups_dm')['data'], [['research-a', 63], ['research-ab', 64]])
+
+        year = self.session.api('api_resource_full_year_group_data', group_name='research-a', current_month=TODAY.month)
+        self.assertEqual(year['data'], [{'month={}-tier=Standard'.format(TODAY.month): 43},
+                                        {'month={}-tier=Archive'.format(TODAY.month): 20},
+                                        {'month={}-tier=Standard'.format(int(PREVIOUS_MONTH[-2:])): 999}])
+
+        export = self.session.api('api_resource_monthly_category_stats_export_dm')['data']
+        self.assertEqual(len(export), 8)
+        self.assertIn({'category': 'science', 'subcategory': 'physics', 'groupname': 'research-a', 'tier': 'Archive',
+                       'month': str(TODAY.month), 'storage': '20'}, export)
+
+        csv = self.session.api('api_resource_category_stats_export_csv_dm', start_month=PREVIOUS_MONTH)['data']
+        self.assertEqual(csv.splitlines()[:3], ['month,group,category,subcategory,tier,storage',
+                                                PREVIOUS_MONTH + ',research-a,science,physics,Standard,999',
+                                                PREVIOUS_MONTH + ',research-ab,science,,Archive,5'])
+        self.assertEqual(len(csv.splitlines()), 9)
+        self.assertEqual(self.session.api('api_resource_category_stats_export_csv_dm', end_month='2020-13')['status'],
+                         'error_invalid_month')
+
+
+class StorageUsageTest(TestCase):
+
+    def setUp(self):
+        self.cat     = make_catalog()
+        self.session = offline.Session(self.cat)
+
+    def usage(self, group='research-a'):
+        result = self.session.api('api_resource_storage_usage', group_name=group)
+        self.assertEqual(result['status'], 'ok')
+        return dict((space, tiers) for space, tiers in result['data'].items() if space != 'reconciled')
+
+    def test_reconcile(self):
+        self.assertEqual(self.usage(), {'home': {}, 'vault': {}, 'revisions': {}})
+        self.assertEqual(self.session.rule('rule_resource_storage_usage_reconcile', '')[0],
+                         'Storage counters reconciled, 4 groups corrected.')
+        self.assertEqual(self.usage(), {'home': {'Standard': 3, 'Archive': 4},
+                                        'vault': {'Standard': 8, 'Archive': 16},
+                                        'revisions': {'Standard': 32}})
+        self.assertEqual(self.usage('research-ab'), {'home': {'Standard': 64}, 'vault': {}, 'revisions': {}})
+        self.assertIsNotNone(self.session.api('api_resource_storage_usage', group_name='research-a')['data']['reconciled'])
+
+        # Only drifted counters are corrected.
+        self.cat.add_data_object('/tempZone/home/vault-a/pkg/f3', size=100)
+        self.assertEqual(self.session.rule('rule_resource_storage_usage_reconcile', '')[0],
+                         'Storage counters reconciled, 1 groups corrected.')
+        self.assertEqual(self.usage()['vault'], {'Standard': 108, 'Archive': 16})
+
+    def test_policies(self):
+        self.session.rule('rule_resource_storage_usage_reconcile', '')
+        self.session.callback.reset_stats()
+
+        path = '/tempZone/home/research-a/dir/new'
+        self.cat.add_data_object(path, size=1000, resource='archiveResc')
+        self.session.rei.session_vars['data_object'] = {'object_path': path}
+        self.session.rule('py_acPostProcForPut')
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 1004})
+
+        self.cat.add_data_object('/tempZone/yoda/revisions/research-a/dir/new_1_rods', size=1000)
+        self.session.rule('rule_resource_storage_usage_add_replica',
+                          '/tempZone/yoda/revisions/research-a/dir/new_1_rods', 'irodsResc')
+        self.assertEqual(self.usage()['revisions'], {'Standard': 1032})
+
+        self.session.rei.session_vars['data_object'] = {'object_path': '/tempZone/home/research-a/dir/f2',
+                                                        'resource_hierarchy': 'irodsResc',
+                                                        'size': 2}
+        self.session.rule('py_acDataDeletePolicy')
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 1004})
+
+        # Removed replicas are subtracted after removal.
+        self.cat.execute('DELETE FROM r_data_main WHERE data_id = ?', (self.cat.data_id('/tempZone/home/research-a/dir/f2'),))
+        self.session.rule('py_acPostProcForDelete')
+        self.assertEqual(self.usage()['home'], {'Standard': 1, 'Archive': 1004})
+
+        # Equal changes are all counted in a single counter, and corrected on reconciliation.
+        for _ in range(2):
+            self.session.rule('rule_resource_storage_usage_add_replica', path, 'archiveResc')
+        self.assertEqual(self.usage()['home'], {'Standard': 1, 'Archive': 3004})
+        self.assertEqual(self.counters('org_storage_usage_home_Archive'), ['3004'])
+        self.assertEqual(self.session.rule('rule_resource_storage_usage_reconcile', '')[0],
+                         'Storage counters reconciled, 1 groups corrected.')
+        self.assertEqual(self.usage()['home'], {'Standard': 1, 'Archive': 1004})
+
+        # Only the tier of the accounted resource is looked up, then the counter is updated.
+        self.session.callback.reset_stats()
+        resources.storage_usage_add(self.session.ctx, path, [('archiveResc', 1)])
+        self.assertEqual(self.session.callback.stats['genquery_executions'], 2)
+        self.assertEqual(self.usage()['home'], {'Standard': 1, 'Archive': 1005})
+
+    def counters(self, attr):
+        return [v for v, in self.cat.execute("SELECT m.meta_attr_value FROM r_meta_main m"
+                                             " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                                             " WHERE mm.object_id = ? AND m.meta_attr_name = ?",
+                                             (self.cat.coll_id('/tempZone/home/research-a'), attr))]
+
+    def test_delete_replicas(self):
+        self.session.rule('rule_resource_storage_usage_reconcile', '')
+
+        # A forced unlink removes all replicas, but acPostProcForDelete only describes the first.
+        path = '/tempZone/home/research-a/dir/replicated'
+        self.cat.add_data_object(path, size=100, replicas=2)
+        self.session.rule('rule_resource_storage_usage_add_replica', path, 'irodsResc')
+        self.assertEqual(self.usage()['home'], {'Standard': 203, 'Archive': 4})
+
+        self.session.rei.session_vars['data_object'] = {'object_path': path, 'resource_hierarchy': 'irodsResc', 'size': 100}
+        for _ in range(2):
+            self.session.rule('py_acDataDeletePolicy')
+        self.assertEqual(self.usage()['home'], {'Standard': 203, 'Archive': 4})
+        self.cat.execute('DELETE FROM r_data_main WHERE data_id = ?', (self.cat.data_id(path),))
+        self.session.rule('py_acPostProcForDelete')
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 4})
+
+    def unlink_with_policies(self, session):
+        """Run the delete policies around unlinks, as iRODS does."""
+        unlink = session.callback.msiDataObjUnlink
+
+        def with_policies(options, status):
+            session.rei.session_vars['data_object'] = {'object_path': options.split('++++')[0][len('objPath='):]}
+            session.rule('py_acDataDeletePolicy')
+            result = unlink(options, status)
+            session.rule('py_acPostProcForDelete')
+            return result
+        session.callback.msiDataObjUnlink = with_policies
+
+    def test_rejected_put(self):
+        self.session.rule('rule_resource_storage_usage_reconcile', '')
+        self.cat.add_avu(self.cat.coll_id('/tempZone/home/research-a/dir'), 'org_lock', '/tempZone/home/research-a/dir')
+        researcher = offline.Session(self.cat, user='researcher')
+        self.unlink_with_policies(researcher)
+
+        # A rejected new data object is removed without changing the counters.
+        path = '/tempZone/home/research-a/dir/new'
+        self.cat.add_data_object(path, size=1000)
+        researcher.rei.session_vars['data_object'] = {'object_path': path}
+        with self.assertRaises(IrodsError):
+            researcher.rule('py_acPostProcForPut')
+        self.assertIsNone(self.cat.data_id(path))
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 4})
+
+        # A rejected overwrite removes the data object, its old replicas are subtracted once.
+        path = '/tempZone/home/research-a/dir/f3'
+        researcher.rule('pep_api_data_obj_put_pre', 'api_instance', None, DataObjInp(path, forceFlag=''), None, None)
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 4})
+        self.cat.execute('UPDATE r_data_main SET data_size = 40 WHERE data_id = ?', (self.cat.data_id(path),))
+        researcher.rei.session_vars['data_object'] = {'object_path': path}
+        with self.assertRaises(IrodsError):
+            researcher.rule('py_acPostProcForPut')
+        self.assertIsNone(self.cat.data_id(path))
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 0})
+
+    def test_overwrite(self):
+        self.session.rule('rule_resource_storage_usage_reconcile', '')
+
+        # The replicas of an overwritten data object are subtracted once the overwrite is authorized.
+        path = '/tempZone/home/research-a/dir/f3'
+        inp  = DataObjInp(path, forceFlag='')
+        self.session.rule('pep_api_data_obj_put_pre', 'api_instance', None, inp, None, None)
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 4})
+        self.cat.execute('UPDATE r_data_main SET data_size = 40 WHERE data_id = ?', (self.cat.data_id(path),))
+        self.session.rei.session_vars['data_object'] = {'object_path': path}
+        self.session.rule('py_acPostProcForPut')
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 40})
+
+        # A new data object is only added.
+        self.session.rule('pep_api_data_obj_put_pre', 'api_instance', None, DataObjInp(path + '.new'), None, None)
+        self.assertEqual(self.usage()['home'], {'Standard': 3, 'Archive': 40})
+
+    def test_concurrent_update(self):
+        self.session.rule('rule_resource_storage_usage_reconcile', '')
+        remove = self.session.callback.msiSudoObjMetaRemove
+        coll   = '/tempZone/home/research-a'
+
+        def concurrent(*args):
+            # Another update changes the counter between reading and removing its value.
+            self.session.callback.msiSudoObjMetaRemove = remove
+            remove(coll, '-C', '', 'org_storage_usage_home_Standard', '3', '', '')
+            self.cat.add_avu(self.cat.coll_id(coll), 'org_storage_usage_home_Standard', '103')
+            return remove(*args)
+        self.session.callback.msiSudoObjMetaRemove = concurrent
+
+        resources.storage_usage_add(self.session.ctx, coll + '/f4', [('irodsResc', 1000)])
+        self.assertEqual(self.counters('org_storage_usage_home_Standard'), ['1103'])
+
+    def test_reserved(self):
+        # Only rodsadmin can change storage counters directly.
+        researcher = offline.Session(self.cat, user='researcher')
+        args = ('add', '-C', '/tempZone/home/research-a', 'org_storage_usage_home_Standard', '1', '')
+        with self.assertRaises(IrodsError):
+            researcher.rule('py_acPreProcForModifyAVUMetadata', *args)
+        self.session.rule('py_acPreProcForModifyAVUMetadata', *args)
+
+        self.assertEqual(researcher.rule('rule_resource_storage_usage_sudo_allowed', '/tempZone/home/research-a',
+                                         'org_storage_usage_home_Standard', '')[2], 'true')
+        self.assertEqual(researcher.rule('rule_resource_storage_usage_sudo_allowed', '/tempZone/home/research-ab',
+                                         'org_storage_usage_home_Standard', '')[2], 'false')
+        self.assertEqual(researcher.rule('rule_resource_storage_usage_sudo_allowed', '/tempZone/home/research-a',
+                                         'org_storage_usage_reconciled', '')[2], 'false')
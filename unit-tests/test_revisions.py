@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for revision management."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import random
+import sys
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402
+from offline import catalog  # noqa: E402
+
+import revisions  # noqa: E402
+from util import avu, data_object, jsonutil  # noqa: E402
+
+STORE = '/tempZone/yoda/revisions'
+NOW   = 1600000000
+HOURS = 3600
+
+
+def make_catalog(originals=20, seed=1, name='file{}.txt'):
+    """Create a revision store with a random amount of revisions per original path."""
+    rnd = random.Random(seed)
+    cat = catalog.base()
+    for o in range(originals):
+        original = '/tempZone/home/research-a/dir/' + name.format(o)
+        for r in range(rnd.randint(0, 40)):
+            t   = NOW - rnd.randint(0, 24 * 7 * 20) * HOURS
+            did = cat.add_data_object('{}/research-a/dir/{}_{}_rods'.format(STORE, name.format(o), r), size=rnd.randint(1, 1000), t=t)
+            cat.add_avu(did, 'org_original_path', original)
+            cat.add_avu(did, 'org_original_coll_name', '/tempZone/home/research-a/dir')
+            cat.add_avu(did, 'org_original_data_name', name.format(o))
+            cat.add_avu(did, 'org_original_modify_time', str(t))
+    return cat
+
+
+def revision_index(cat):
+    """Get the revision index of research-a from the catalog, as a set of (original path, data id) tuples."""
+    return set((value, unit.split(':')[0]) for value, unit in
+               cat.execute("SELECT m.meta_attr_value, m.meta_attr_unit FROM r_meta_main m"
+                           " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                           " WHERE mm.object_id = ? AND m.meta_attr_name = 'org_revision_index'",
+                           (cat.coll_id(STORE + '/research-a'),)))
+
+
+def name_index(cat):
+    """Get the data names in the revision index of research-a from the catalog, as a set of (data name, original path) tuples."""
+    return set(cat.execute("SELECT m.meta_attr_value, m.meta_attr_unit FROM r_meta_main m"
+                           " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                           " WHERE mm.object_id = ? AND m.meta_attr_name = 'org_revision_name_index'",
+                           (cat.coll_id(STORE + '/research-a'),)))
+
+
+class RevisionCleanupTest(TestCase):
+
+    def revision_paths(self, cat):
+        return set(r[0] for r in cat.execute("SELECT c.coll_name || '/' || d.data_name FROM r_data_main d"
+                                             " JOIN r_coll_main c ON c.coll_id = d.coll_id"
+                                             " WHERE c.coll_name LIKE ?", (STORE + '%',)))
+
+    def tearDown(self):
+        revisions.CLEANUP_BATCH_SIZE = 1000
+
+    def test_clean_up(self):
+        # Small batch sizes split original paths and removals over several batches.
+        for case, batch_size in [('A', 1000), ('B', 7), ('Simple', 1)]:
+            revisions.CLEANUP_BATCH_SIZE = batch_size
+            cat     = make_catalog()
+            session = offline.Session(cat)
+            ctx     = session.ctx
+            buckets = revisions.revision_bucket_list(ctx, case)
+
+            # Expected result, determined per original path.
+            grouped  = list(revisions.get_revisions_per_original(ctx, STORE))
+            expected = self.revision_paths(cat)
+            for original, revs in grouped:
+                self.assertEqual([r[:2] for r in revs], revisions.get_revision_list(ctx, original))
+                candidates = revisions.get_deletion_candidates(ctx, buckets, revs, NOW)
+                expected  -= set(r[2] for r in revs if r[0] in candidates)
+
+            session.callback.reset_stats()
+            self.assertEqual(session.rule('rule_revisions_clean_up', case, str(NOW), '')[2],
+                             'Successfully cleaned up the revision store')
+            self.assertEqual(self.revision_paths(cat), expected)
+            self.assertLess(len(expected), sum(len(revs) for _, revs in grouped))
+            if batch_size == 1000:
+                self.assertLess(session.callback.stats['genquery_executions'], 10)
+
+    def clean_up_all(self, case, name='file{}.txt'):
+        cat = make_catalog(name=name)
+        offline.Session(cat).rule('rule_revisions_clean_up', case, str(NOW), '')
+        return self.revision_paths(cat)
+
+    def test_clean_up_budgeted(self):
+        self.clean_up_budgeted('file{}.txt')
+
+    def test_clean_up_budgeted_quoted(self):
+        # The checkpoint of a run contains a quote.
+        self.clean_up_budgeted("john's file{}.txt")
+
+    def clean_up_budgeted(self, name):
+        expected = self.clean_up_all('B', name)
+        cat      = make_catalog(name=name)
+        session  = offline.Session(cat)
+        before   = len(self.revision_paths(cat))
+
+        runs = 0
+        while True:
+            runs += 1
+            remaining = len(self.revision_paths(cat))
+            status    = session.rule('rule_revisions_clean_up_budgeted', 'B', str(NOW), '0', '3', '')[4]
+            if status == 'Successfully cleaned up the revision store':
+                break
+            self.assertIn('next run resumes after', status)
+            self.assertLessEqual(remaining - len(self.revision_paths(cat)), 3 + 40)
+            self.assertEqual(len(list(avu.of_coll(session.ctx, STORE))), 1)
+
+        self.assertGreater(runs, 2)
+        self.assertEqual(self.revision_paths(cat), expected)
+        self.assertEqual(list(avu.of_coll(session.ctx, STORE)), [])
+        self.assertLess(len(expected), before)
+
+    def test_clean_up_report(self):
+        expected = self.clean_up_all('A')
+        cat      = make_catalog()
+        cat.add_collection('/tempZone/home/rods')
+        session  = offline.Session(cat)
+        before   = self.revision_paths(cat)
+
+        status = session.rule('rule_revisions_clean_up_report', 'A', str(NOW), '/tempZone/home/rods/report.json', '')[3]
+        report = jsonutil.parse(data_object.read(session.ctx, '/tempZone/home/rods/report.json'))
+
+        self.assertTrue(status.startswith('Found {} of {} revisions'.format(report['candidates'], len(before))))
+        self.assertEqual(self.revision_paths(cat), before)
+        self.assertEqual(set(x['path'] for x in report['candidate_revisions']), before - expected)
+        self.assertEqual(report['reclaimable_bytes'], sum(x['size'] for x in report['candidate_revisions']))
+        self.assertEqual(sum(b['candidates'] for b in report['buckets']), report['candidates'])
+        self.assertEqual(list(report['groups']), ['research-a'])
+        self.assertEqual(report['groups']['research-a']['bytes'], report['reclaimable_bytes'])
+
+
+class RevisionIndexTest(TestCase):
+
+    def setUp(self):
+        self.cat     = make_catalog()
+        self.session = offline.Session(self.cat)
+        self.assertEqual(self.session.rule('rule_revisions_index_rebuild', '', '')[1],
+                         'Indexed {} revisions of 1 groups'.format(len(self.revisions())))
+
+    def revisions(self):
+        return set((value, str(did)) for value, did in
+                   self.cat.execute("SELECT m.meta_attr_value, mm.object_id FROM r_meta_main m"
+                                    " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                                    " WHERE m.meta_attr_name = 'org_original_path'"))
+
+    def names(self):
+        return set((path.rsplit('/', 1)[1], path) for path, _ in self.revisions())
+
+    def test_rebuild(self):
+        self.assertEqual(revision_index(self.cat), self.revisions())
+        self.assertEqual(name_index(self.cat), self.names())
+
+        # Rebuilding does not duplicate entries.
+        self.session.rule('rule_revisions_index_rebuild', 'research-a', '')
+        self.assertEqual(revision_index(self.cat), self.revisions())
+
+        original = '/tempZone/home/research-a/dir/file1.txt'
+        entries  = revisions.revision_index_get(self.session.ctx, original)
+        self.assertEqual([[e[0], e[1]] for e in entries[::-1]], revisions.get_revision_list(self.session.ctx, original))
+
+    def test_clean_up(self):
+        before = self.revisions()
+        self.session.rule('rule_revisions_clean_up', 'B', str(NOW), '')
+        self.assertLess(len(self.revisions()), len(before))
+        self.assertEqual(revision_index(self.cat), self.revisions())
+        self.assertEqual(name_index(self.cat), self.names())
+
+    def test_remove(self):
+        original = '/tempZone/home/research-a/dir/file3.txt'
+        did      = sorted(did for path, did in self.revisions() if path == original)[0]
+        self.assertTrue(revisions.revision_remove(self.session.ctx, did))
+        self.assertNotIn((original, did), revision_index(self.cat))
+        self.assertEqual(revision_index(self.cat), self.revisions())
+
+        # The data name is removed with the last revision.
+        self.assertIn(('file3.txt', original), name_index(self.cat))
+        for did in sorted(did for path, did in self.revisions() if path == original):
+            self.assertTrue(revisions.revision_remove(self.session.ctx, did))
+        self.assertNotIn(('file3.txt', original), name_index(self.cat))
+        self.assertEqual(name_index(self.cat), self.names())
+
+    def test_list(self):
+        original = '/tempZone/home/research-a/dir/file3.txt'
+        expected = sorted(did for path, did in self.revisions() if path == original)
+
+        self.session.callback.reset_stats()
+        result = self.session.api('api_revisions_list', path=original)
+        self.assertEqual(result['status'], 'ok')
+        self.assertLessEqual(self.session.callback.stats['genquery_executions'], 2)
+
+        items = result['data']['revisions']
+        self.assertEqual(sorted(x['data_id'] for x in items), expected)
+        self.assertEqual([x['org_original_path'] for x in items], [original] * len(expected))
+        self.assertEqual(set(x['dezoned_coll_name'] for x in items), set(['/research-a/dir']))
+        self.assertEqual(self.session.api('api_revisions_list', path=original + '.x')['data'], {'revisions': []})
+
+    def test_search(self):
+        self.cat.add_collection('/tempZone/home/research-a/dir')
+        counts = {}
+        for path, _ in self.revisions():
+            counts[path] = counts.get(path, 0) + 1
+        expected = sorted(path for path in counts if path.rsplit('/', 1)[1].startswith('file1'))
+
+        self.session.callback.reset_stats()
+        result = self.session.api('api_revisions_search_on_filename', searchString='file1', offset=1, limit=3)
+        self.assertEqual(result['status'], 'ok')
+        # Only the rows of the page are transferred, the total is counted by the catalog.
+        self.assertLessEqual(self.session.callback.stats['rows_transferred'], 3 * 3)
+        self.assertEqual(result['data']['total'], len(expected))
+        self.assertEqual([x['original_coll_name'] for x in result['data']['items']],
+                         ['/'.join(path.split('/')[3:]) for path in expected[1:4]])
+        self.assertEqual([x['revision_count'] for x in result['data']['items']],
+                         [counts[path] for path in expected[1:4]])
+        self.assertTrue(all(x['collection_exists'] for x in result['data']['items']))
+
+        # Wildcards match the data name only, not other components of the path.
+        self.assertEqual(self.session.api('api_revisions_search_on_filename', searchString='f_le1%txt')['data']['total'],
+                         len(expected))
+        self.assertEqual(self.session.api('api_revisions_search_on_filename', searchString='dir')['data']['total'], 0)
+        self.assertEqual(self.session.api('api_revisions_search_on_filename', searchString='')['data'],
+                         {'total': 0, 'items': []})
+
+    def test_quoted_paths(self):
+        self.cat     = make_catalog(name="john's file{}.txt")
+        self.session = offline.Session(self.cat)
+        self.session.rule('rule_revisions_index_rebuild', '', '')
+        self.cat.add_collection('/tempZone/home/research-a/dir')
+
+        before = self.revisions()
+        self.assertEqual(self.session.rule('rule_revisions_clean_up', 'B', str(NOW), '')[2],
+                         'Successfully cleaned up the revision store')
+        self.assertLess(len(self.revisions()), len(before))
+        self.assertEqual(revision_index(self.cat), self.revisions())
+        self.assertEqual(name_index(self.cat), self.names())
+
+        counts = {}
+        for path, _ in self.revisions():
+            counts[path] = counts.get(path, 0) + 1
+        result = self.session.api('api_revisions_search_on_filename', searchString='john', limit=100)
+        self.assertEqual(result['data']['total'], len(counts))
+        self.assertEqual(sorted((x['original_coll_name'], x['revision_count']) for x in result['data']['items']),
+                         sorted(('/'.join(path.split('/')[3:]), n) for path, n in counts.items()))
+
+
+class RevisionBatchTest(TestCase):
+
+    def setUp(self):
+        self.cat = catalog.base(groups=['research-a'])
+        self.cat.add_collection(STORE + '/research-a')
+        self.cat.add_collection('/tempZone/home/research-a/dir')
+        self.session = offline.Session(self.cat)
+        self.paths   = ['/tempZone/home/research-a/dir/file{}.txt'.format(i) for i in range(30)]
+        for path in self.paths:
+            data_object.write(self.session.ctx, path, 'content of ' + path)
+            self.cat.set_access(self.cat.data_id(path), 'research-a', 'own')
+
+    def schedule(self, paths):
+        for path in paths:
+            avu.set_on_data(self.session.ctx, path, 'org_revision_scheduled', 'irodsResc')
+
+    def run_batch(self, shards):
+        for shard in range(shards):
+            status = self.session.rule('rule_revision_batch', str(shard), str(shards), '2', '0', '')[4]
+            self.assertTrue(status.startswith('Batch revision job (shard {}/{}) finished'.format(shard, shards)))
+
+    def revisions(self):
+        """Get the revisions of all data objects, in the revision index."""
+        return [revisions.revision_index_get(self.session.ctx, path) for path in self.paths]
+
+    def test_shards(self):
+        self.assertEqual(set(revisions.revision_batch_shard(i, 3) for i in range(100)), set([0, 1, 2]))
+
+        self.schedule(self.paths)
+        self.run_batch(3)
+        self.assertEqual([len(x) for x in self.revisions()], [1] * len(self.paths))
+        self.assertEqual(self.cat.scalar("SELECT COUNT(*) FROM r_meta_main WHERE meta_attr_name = 'org_revision_scheduled'"
+                                         " AND meta_id IN (SELECT meta_id FROM r_objt_metamap)"), 0)
+
+        revision = revisions.revision_latest(self.session.ctx, STORE + '/research-a', self.paths[0])
+        self.assertEqual(data_object.read(self.session.ctx, revision[1]), 'content of ' + self.paths[0])
+        self.assertEqual(dict(x[:2] for x in avu.of_data(self.session.ctx, revision[1]))['org_original_path'], self.paths[0])
+
+    def test_deduplication(self):
+        self.schedule(self.paths)
+        self.run_batch(1)
+
+        # Unchanged data objects update their latest revision, changed data objects get a new revision.
+        # Revision names contain the time of creation, avoid a name clash within the same second.
+        self.cat.execute("UPDATE r_data_main SET data_name = data_name || '.old' WHERE data_name LIKE 'file0.txt_%'")
+        data_object.write(self.session.ctx, self.paths[0], 'changed')
+        self.schedule(self.paths[:5])
+        self.run_batch(2)
+
+        counts = [len(x) for x in self.revisions()]
+        self.assertEqual(counts, [2] + [1] * (len(self.paths) - 1))
+        self.assertEqual(revisions.revision_dedup_counters(self.session.ctx, STORE + '/research-a'),
+                         (4, sum(len('content of ' + p) for p in self.paths[1:5])))
+
+        # Every shard has its own counters.
+        counters = [x for x in avu.of_coll(self.session.ctx, STORE + '/research-a')
+                    if x.attr == 'org_revision_dedup_count']
+        self.assertEqual(sorted(x.unit for x in counters),
+                         sorted(set('shard {}'.format(revisions.revision_batch_shard(self.cat.data_id(p), 2))
+                                    for p in self.paths[1:5])))
+        self.assertEqual(sum(int(x.value) for x in counters), 4)
+
+    def test_quoted_names(self):
+        quoted = ["/tempZone/home/research-a/dir/john's.txt", "/tempZone/home/research-a/dir/john's.txt.bak"]
+        for path in quoted:
+            data_object.write(self.session.ctx, path, 'content of ' + path)
+            self.cat.set_access(self.cat.data_id(path), 'research-a', 'own')
+        self.paths += quoted
+
+        self.schedule(self.paths)
+        self.run_batch(2)
+        self.assertEqual([len(x) for x in self.revisions()], [1] * len(self.paths))
+
+        # Unchanged data objects with quotes in their name are deduplicated.
+        self.schedule(quoted)
+        self.run_batch(2)
+        self.assertEqual([len(x) for x in self.revisions()], [1] * len(self.paths))
+        self.assertEqual(revisions.revision_dedup_counters(self.session.ctx, STORE + '/research-a')[0], 2)
+
+    def test_large_objects(self):
+        self.cat.execute("UPDATE r_data_main SET data_size = ? WHERE data_id = ?",
+                         (revisions.REVISION_BATCH_MAX_SIZE, self.cat.data_id(self.paths[0])))
+        self.schedule(self.paths[:2])
+        self.run_batch(1)
+        self.assertEqual([len(x) for x in self.revisions()][:2], [0, 1])
+        self.assertEqual(list(avu.of_data(self.session.ctx, self.paths[0])), [('org_revision_scheduled', 'irodsResc', '')])
+
+
+def reference_deletion_candidates(buckets, revisions, initial_upper_time_bound):
+    """Original O(buckets x revisions) implementation of revisions.get_deletion_candidates."""
+    deletion_candidates = []
+    t2 = initial_upper_time_bound
+    bucket_revisions = []
+    for bucket in buckets:
+        t1 = t2
+        t2 = t1 - bucket[0]
+        bucket_revisions.append([r[0] for r in revisions if r[1] <= t1 and r[1] > t2])
+
+    for bucket, rev_list in zip(buckets, bucket_revisions):
+        if len(rev_list) > bucket[1]:
+            for count in range(len(rev_list) - bucket[1]):
+                if bucket[2] >= 0:
+                    deletion_candidates.append(rev_list[bucket[2] + count])
+                else:
+                    deletion_candidates.append(rev_list[len(rev_list) + bucket[2] - count])
+    return deletion_candidates
+
+
+class DeletionCandidatesTest(TestCase):
+
+    def test_same_as_reference(self):
+        rnd = random.Random(42)
+        for case in ['A', 'B', 'Simple']:
+            buckets = revisions.revision_bucket_list(None, case)
+            bounds  = revisions.revision_bucket_bounds(buckets, NOW)
+            for _ in range(300):
+                # Random modification times, including exact bucket bounds and times outside all buckets.
+                times = [rnd.choice([rnd.randint(bounds[0] - 10 * HOURS, NOW + 10 * HOURS),
+                                     rnd.choice(bounds) + rnd.choice([-1, 0, 1])])
+                         for _ in range(rnd.choice([0, 1, 5, 50, 500]))]
+                revs = [[str(100000 - i), t] for i, t in enumerate(sorted(times, reverse=rnd.random() < 0.8))]
+                self.assertEqual(revisions.get_deletion_candidates(None, buckets, revs, NOW),
+                                 reference_deletion_candidates(buckets, revs, NOW))
+
+    def test_bucket_index(self):
+        buckets = revisions.revision_bucket_list(None, 'B')
+        oldest  = revisions.revision_bucket_bounds(buckets, NOW)[0]
+        self.assertEqual(revisions.revision_bucket_index(buckets, NOW, NOW), 0)
+        self.assertEqual(revisions.revision_bucket_index(buckets, NOW - 12 * HOURS + 1, NOW), 0)
+        self.assertEqual(revisions.revision_bucket_index(buckets, NOW - 12 * HOURS, NOW), 1)
+        self.assertEqual(revisions.revision_bucket_index(buckets, oldest + 1, NOW), len(buckets) - 1)
+        self.assertIsNone(revisions.revision_bucket_index(buckets, oldest, NOW))
+        self.assertIsNone(revisions.revision_bucket_index(buckets, NOW + 1, NOW))
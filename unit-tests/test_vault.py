@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for copying research folders to the vault."""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import os
+import sys
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import offline  # noqa: E402
+from offline import catalog  # noqa: E402
+from offline.callback import IrodsError  # noqa: E402
+
+import vault  # noqa: E402
+
+FOLDER = '/tempZone/home/research-a/pkg'
+TARGET = '/tempZone/home/vault-a/pkg[1600000000]'
+
+CONTENTS = ['a', 'dir/b', 'dir/sub/c', 'dir/sub/d', 'dir_x/e', 'empty/']
+
+
+def make_folder():
+    """Create a research folder owned by a researcher, and a vault package."""
+    cat = catalog.base(users=['researcher'])
+    cat.add_collection('/tempZone/home/research-a/pkg', owner='researcher')
+    cat.add_collection('/tempZone/home/research-a/pkgdir', owner='researcher')
+    cat.add_data_object('/tempZone/home/research-a/pkgdir/x', owner='researcher', content=b'sibling')
+    cat.add_collection(TARGET)
+
+    for path in CONTENTS:
+        if path.endswith('/'):
+            cat.add_collection(FOLDER + '/' + path[:-1], owner='researcher')
+        else:
+            cat.add_data_object(FOLDER + '/' + path, owner='researcher', content=path.encode())
+    return cat
+
+
+class CopyFolderToVaultTest(TestCase):
+
+    def setUp(self):
+        self.cat     = make_folder()
+        self.session = offline.Session(self.cat)
+
+    def contents(self, coll):
+        colls = [c[len(coll) + 1:] + '/' for c, in self.cat.execute('SELECT coll_name FROM r_coll_main'
+                                                                    ' WHERE coll_name LIKE ?', (coll + '/%',))]
+        objs  = [(c + '/' + n)[len(coll) + 1:] for c, n in self.cat.execute('SELECT c.coll_name, d.data_name'
+                                                                            ' FROM r_data_main d JOIN r_coll_main c'
+                                                                            ' ON c.coll_id = d.coll_id'
+                                                                            ' WHERE c.coll_name = ? OR c.coll_name LIKE ?',
+                                                                            (coll, coll + '/%'))]
+        return sorted(colls + objs)
+
+    def access(self, path):
+        oid = self.cat.coll_id(path) or self.cat.data_id(path)
+        return self.cat.access_level(oid, 'rods')
+
+    def avus(self, path, attribute):
+        return [v for v, in self.cat.execute("SELECT m.meta_attr_value FROM r_meta_main m"
+                                             " JOIN r_objt_metamap mm ON mm.meta_id = m.meta_id"
+                                             " WHERE mm.object_id = ? AND m.meta_attr_name = ?",
+                                             (self.cat.coll_id(path), attribute))]
+
+    def test_listing(self):
+        collections, objects = vault.ingest_listing(self.session.ctx, FOLDER)
+        self.assertEqual(collections, ['dir', 'dir/sub', 'dir_x', 'empty'])
+        self.assertEqual(sorted(objects), ['a', 'dir/b', 'dir/sub/c', 'dir/sub/d', 'dir_x/e'])
+        self.assertEqual(objects['dir/sub/c'], [(9, '')])
+
+    def test_copy(self):
+        # Access that the admin had before is kept.
+        self.cat.set_access(self.cat.data_id(FOLDER + '/dir/b'), 'rods', 'own')
+        self.session.callback.reset_stats()
+
+        self.assertEqual(self.session.rule('rule_vault_copy_folder_to_vault', FOLDER, TARGET, '')[2], '0')
+        self.assertEqual(self.contents(TARGET + '/original'), sorted(['dir/', 'dir/sub/', 'dir_x/', 'empty/'] + CONTENTS[:-1]))
+        self.assertEqual(self.cat.read_content(self.cat.data_id(TARGET + '/original/dir/sub/c')), b'dir/sub/c')
+        self.assertEqual(self.cat.scalar("SELECT COUNT(*) FROM r_data_main d JOIN r_coll_main c ON c.coll_id = d.coll_id"
+                                         " WHERE c.coll_name LIKE ? AND d.data_checksum = ''", (TARGET + '/%',)), 0)
+        self.assertEqual(self.avus(TARGET + '/original', 'org_vault_status'), ['INCOMPLETE'])
+        self.assertEqual(self.avus(TARGET, 'org_vault_ingest_progress'), [])
+
+        # Read access is granted and revoked once for the whole folder, not per object.
+        stats = self.session.callback.stats
+        self.assertEqual(stats['msiCheckAccess'], 0)
+        self.assertEqual(stats['msiSetACL'], 3)
+        self.assertEqual(self.access(FOLDER + '/dir/b'), catalog.ACCESS_IDS['own'])
+        self.assertEqual(self.access(FOLDER + '/dir/sub/c'), catalog.ACCESS_IDS['null'])
+        self.assertEqual(self.access(FOLDER), catalog.ACCESS_IDS['null'])
+
+    def test_copy_status_parameter(self):
+        # Data objects are copied as the rule language does, with a plain status parameter.
+        copy   = self.session.callback.msiDataObjCopy
+        status = []
+
+        def record(src, dst, options, out):
+            status.append(out)
+            return copy(src, dst, options, out)
+        self.session.callback.msiDataObjCopy = record
+
+        self.assertEqual(self.session.rule('rule_vault_copy_folder_to_vault', FOLDER, TARGET, '')[2], '0')
+        self.assertEqual(status, [0] * 5)
+
+    def test_resume(self):
+        # Copying fails on a data object that already exists in the vault, access is revoked nonetheless.
+        self.cat.add_data_object(TARGET + '/original/dir/b', content=b'outdated')
+        self.assertEqual(self.session.rule('rule_vault_copy_folder_to_vault', FOLDER, TARGET, '')[2], '1')
+        self.assertEqual(self.access(FOLDER + '/a'), catalog.ACCESS_IDS['null'])
+        self.assertIn('Error copying {} to vault'.format(FOLDER), ''.join(self.session.callback.output['serverLog']))
+
+        # The folder is marked for retry, with its vault package.
+        self.assertEqual(self.avus(FOLDER, 'org_cronjob_copy_to_vault'), ['CRONJOB_RETRY'])
+        self.assertEqual(self.avus(FOLDER, 'org_copy_to_vault_params'), [TARGET])
+        self.assertEqual(self.avus(TARGET, 'org_vault_ingest_progress'), ['0/5'])
+
+        # Retrying only copies data objects that were not copied completely before.
+        self.session.callback.reset_stats()
+        self.assertEqual(self.session.rule('rule_vault_copy_folder_to_vault', FOLDER, TARGET, '')[2], '0')
+        self.assertEqual(self.session.callback.stats['msiDataObjCopy'], 4)
+        self.assertEqual(self.cat.read_content(self.cat.data_id(TARGET + '/original/dir/b')), b'dir/b')
+        self.assertEqual(self.contents(TARGET + '/original'), sorted(['dir/', 'dir/sub/', 'dir_x/', 'empty/'] + CONTENTS[:-1]))
+        self.assertEqual(self.avus(TARGET, 'org_vault_ingest_progress'), [])
+
+    def test_restore_access_failure(self):
+        # Revoking read access fails, after copying failed as well.
+        self.cat.set_access(self.cat.data_id(FOLDER + '/dir/b'), 'rods', 'own')
+        self.cat.add_data_object(TARGET + '/original/dir/b', content=b'outdated')
+        set_acl = self.session.callback.msiSetACL
+
+        def fail_revoke(recursive, access, user, path):
+            if recursive == 'recursive' and access == 'admin:null':
+                raise IrodsError(-818000, 'revoke failed')
+            return set_acl(recursive, access, user, path)
+        self.session.callback.msiSetACL = fail_revoke
+
+        self.assertEqual(self.session.rule('rule_vault_copy_folder_to_vault', FOLDER, TARGET, '')[2], '1')
+
+        # The copy error is reported, and access that the admin had before is restored nonetheless.
+        log = ''.join(self.session.callback.output['serverLog'])
+        self.assertIn('Error copying {} to vault'.format(FOLDER), log)
+        self.assertIn('Could not set null access on {}'.format(FOLDER), log)
+        self.assertEqual(self.access(FOLDER + '/dir/b'), catalog.ACCESS_IDS['own'])
+        self.assertEqual(self.avus(FOLDER, 'org_cronjob_copy_to_vault'), ['CRONJOB_RETRY'])
@@ -27,6 +27,8 @@ import user
 import group
 import avu
 import misc
+import instrumentation
+import cache
 import query
 import genquery  # temporary
 import config
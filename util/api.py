@@ -8,15 +8,21 @@ __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import inspect
+import time
 import traceback
 from collections import OrderedDict
 
+import instrumentation
 import jsonutil
 import log
 import rule
 from config import config
 from error import *
 
+# API functions created with make(), by name.
+# Values are functions taking a context and decoded arguments (see call()).
+_functions = {}
+
 
 class Result(object):
     """API result."""
@@ -86,7 +92,10 @@ def _api(f):
     instead.
 
     In development environments, the result may contain a 'debug_info' property
-    with additional information on errors, or timing information.
+    with additional information on errors, or timing information and the
+    number of queries and msi calls performed (see the instrumentation module).
+    Set the 'instrumentation_log' config option to also write these counts to
+    the log as one JSON line per API call.
 
     :param f: Python function to turn into a API function
 
@@ -102,6 +111,13 @@ def _api(f):
     # If the function accepts **kwargs, we do not forbid extra arguments.
     allow_extra = a_kw is not None
 
+    # Result shorthands.
+    def error_internal(debug_info=None):
+        return Error('internal', 'An internal error occurred', debug_info=debug_info)
+
+    def bad_request(debug_info=None):
+        return Error('badrequest', 'An internal error occurred', debug_info=debug_info)
+
     def wrapper(ctx, inp):
         """A function that receives a JSON string and calls a wrapped function with unpacked arguments.
 
@@ -113,13 +129,6 @@ def _api(f):
 
         :returns: Result of the JSON API call
         """
-        # Result shorthands.
-        def error_internal(debug_info=None):
-            return Error('internal', 'An internal error occurred', debug_info=debug_info)
-
-        def bad_request(debug_info=None):
-            return Error('badrequest', 'An internal error occurred', debug_info=debug_info)
-
         # Validate input string: is it a valid JSON object?
         try:
             data = jsonutil.parse(inp)
@@ -130,6 +139,16 @@ def _api(f):
                             .format(f.__name__))
             return bad_request('JSON parse error: {}'.format(e)).as_dict()
 
+        return run(ctx, data)
+
+    def run(ctx, data):
+        """Call the wrapped function with decoded arguments.
+
+        :param ctx:  Combined type of a callback and rei struct
+        :param data: Dict of arguments
+
+        :returns: Result of the API call, as a dict
+        """
         # Check that required arguments are present.
         for param in required:
             if param not in data:
@@ -149,25 +168,42 @@ def _api(f):
 
         # Try to run the function with the supplied arguments,
         # catching any error it throws.
+        # Time the request and count the queries and msi calls it performs.
+        t     = time.time()
+        start = instrumentation.snapshot()
+
+        def measure(status):
+            elapsed = time.time() - t
+            counts  = instrumentation.since(start)
+            log._debug(ctx, '{:4d}ms {}', int(elapsed * 1000), f.__name__)
+            if config.instrumentation_log:
+                record = OrderedDict([('api',    f.__name__),
+                                      ('status', status),
+                                      ('time',   round(elapsed * 1000, 3))] + sorted(counts.items()))
+                log._write(ctx, 'API stats: ' + jsonutil.dump(record, sort_keys=False))
+            return elapsed, counts
+
         try:
-            # Time the request.
-            import time
-            t = time.time()
             result = f(ctx, **data)
-            t = time.time() - t
-
-            log._debug(ctx, '%4dms %s' % (int(t * 1000), f.__name__))
 
             if type(result) is Error:
                 raise result  # Allow api.Errors to be either raised or returned.
 
             elif not isinstance(result, Result):
                 # No error / explicit status info implies 'OK' status.
-                result = Result(result, debug_info={'time': t})
+                result = Result(result)
+
+            elapsed, counts = measure(result.status)
+            if result.debug_info is None:
+                result.debug_info = {'time': elapsed, 'stats': counts}
+            elif type(result.debug_info) is dict:
+                result.debug_info.setdefault('time', elapsed)
+                result.debug_info.setdefault('stats', counts)
 
             return result.as_dict()
         except Error as e:
             # A proper caught error with name and message.
+            measure(e.status)
             if e.debug_info is None:
                 log._write(ctx, 'Error: API rule <{}> failed with error <{}>'.format(f.__name__, e))
             else:
@@ -175,13 +211,32 @@ def _api(f):
             return e.as_dict()
         except Exception as e:
             # An uncaught error. Log a trace to aid debugging.
+            measure('error_internal')
             log._write(ctx, 'Error: API rule <{}> failed with uncaught error (trace follows below this line)\n{}'
                             .format(f.__name__, traceback.format_exc()))
             return error_internal(traceback.format_exc()).as_dict()
 
+    wrapper.run = run
     return wrapper
 
 
+def call(ctx, name, data):
+    """Call an API function by name, with decoded arguments.
+
+    This allows running several API calls within one rule invocation, sharing
+    the context (and with it the request cache, see util.cache).
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param name: Name of the API function, e.g. 'api_browse_folder'
+    :param data: Dict of arguments
+
+    :raises KeyError: No API function with this name exists
+
+    :returns: Result of the API call, as a dict
+    """
+    return _functions[name](ctx, data)
+
+
 def make():
     """Create API functions callable as iRODS rules.
 
@@ -211,6 +266,7 @@ def make():
     def deco(f):
         # The "base" API function, that does handling of arguments and errors.
         base = _api(f)
+        _functions[f.__name__] = base.run
 
         # The JSON-in, JSON-out rule.
         return rule.make(inputs=[0], outputs=[],
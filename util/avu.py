@@ -9,6 +9,7 @@ from collections import namedtuple
 
 import irods_types
 
+import cache
 import msi
 import pathutil
 from query import Query
@@ -44,72 +45,85 @@ def set_on_data(ctx, path, a, v):
     """Set key/value metadata on a data object."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.set_key_value_pairs_to_obj(ctx, x['arguments'][1], path, '-d')
+    cache.invalidate(ctx, path)
 
 
 def set_on_coll(ctx, coll, a, v):
     """Set key/value metadata on a collection."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.set_key_value_pairs_to_obj(ctx, x['arguments'][1], coll, '-C')
+    cache.invalidate(ctx, coll)
 
 
 def set_on_resource(ctx, resource, a, v):
     """Set key/value metadata on a resource."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.set_key_value_pairs_to_obj(ctx, x['arguments'][1], resource, '-R')
+    cache.invalidate(ctx, resource)
 
 
 def associate_to_data(ctx, path, a, v):
     """Associate key/value metadata to a data object."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.associate_key_value_pairs_to_obj(ctx, x['arguments'][1], path, '-d')
+    cache.invalidate(ctx, path)
 
 
 def associate_to_coll(ctx, coll, a, v):
     """Associate key/value metadata on a collection."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.associate_key_value_pairs_to_obj(ctx, x['arguments'][1], coll, '-C')
+    cache.invalidate(ctx, coll)
 
 
 def associate_to_group(ctx, group, a, v):
     """Associate key/value metadata on a group."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.associate_key_value_pairs_to_obj(ctx, x['arguments'][1], group, '-u')
+    cache.invalidate(ctx, group)
 
 
 def associate_to_resource(ctx, resource, a, v):
     """Associate key/value metadata on a group."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.associate_key_value_pairs_to_obj(ctx, x['arguments'][1], resource, '-R')
+    cache.invalidate(ctx, resource)
 
 
 def rm_from_coll(ctx, coll, a, v):
     """Remove key/value metadata from a collection."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.remove_key_value_pairs_from_obj(ctx, x['arguments'][1], coll, '-C')
+    cache.invalidate(ctx, coll)
 
 
 def rm_from_data(ctx, coll, a, v):
     """Remove key/value metadata from a data object."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.remove_key_value_pairs_from_obj(ctx, x['arguments'][1], coll, '-d')
+    cache.invalidate(ctx, coll)
 
 
 def rm_from_group(ctx, group, a, v):
     """Remove key/value metadata from a group."""
     x = msi.string_2_key_val_pair(ctx, '{}={}'.format(a, v), irods_types.BytesBuf())
     msi.remove_key_value_pairs_from_obj(ctx, x['arguments'][1], group, '-u')
+    cache.invalidate(ctx, group)
 
 
 def rmw_from_coll(ctx, obj, a, v, u=''):
     """Remove AVU from collection with wildcards."""
     msi.rmw_avu(ctx, '-C', obj, a, v, u)
+    cache.invalidate(ctx, obj)
 
 
 def rmw_from_data(ctx, obj, a, v, u=''):
     """Remove AVU from data object with wildcards."""
     msi.rmw_avu(ctx, '-d', obj, a, v, u)
+    cache.invalidate(ctx, obj)
 
 
 def rmw_from_group(ctx, group, a, v, u=''):
     """Remove AVU from group with wildcards."""
     msi.rmw_avu(ctx, '-u', group, a, v, u)
+    cache.invalidate(ctx, group)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Request-scoped memoization of catalog lookups.
+
+Results are stored on the rule.Context of the running rule or API call, so
+they never outlive a single request. Caching is opt-in: only queries created
+with Query(..., cache=True) and lookups wrapped in cache.get() are memoized.
+
+The write helpers in the avu, collection and data_object modules call
+invalidate() for the objects they modify, which drops every cached entry that
+may refer to that object.
+
+Example:
+
+    # Evaluated once per request, no matter how often it is called.
+    category = cache.get(ctx, ('group_category', grp),
+                         lambda: ctx.uuGroupGetCategory(grp, '', '')['arguments'][1])
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import re
+
+import rule
+
+# Columns that identify the object(s) a query is about.
+# Queries that contain none of these (e.g. those on IDs) cannot be linked to
+# an object name, and are dropped on any invalidation.
+_NAME_COLUMNS = ('COLL_NAME', 'COLL_PARENT_NAME', 'DATA_NAME',
+                 'USER_NAME', 'USER_GROUP_NAME', 'RESC_NAME')
+
+_name_condition = re.compile(r"\b({})\s*(?:=|like|in)\s*(\([^)]*\)|'[^']*')"
+                             .format('|'.join(_NAME_COLUMNS)), re.IGNORECASE)
+_literal = re.compile(r"'([^']*)'")
+
+
+def enabled(ctx):
+    """Check whether results can be cached for this callback (only rule.Context carries a cache)."""
+    return type(ctx) is rule.Context
+
+
+def get(ctx, key, f):
+    """Get a value from the request cache, calling f() to compute it if it is not yet cached.
+
+    :param ctx: Combined type of a callback and rei struct
+    :param key: Tuple identifying the value. The first item names the kind of value,
+                other items are matched against object names by invalidate()
+    :param f:   Function computing the value
+
+    :returns: Cached or computed value
+    """
+    if not enabled(ctx):
+        return f()
+
+    try:
+        return ctx.cache[key]
+    except KeyError:
+        value = ctx.cache[key] = f()
+        return value
+
+
+def _related(name, literal):
+    """Check whether a name used in a condition may refer to (a parent or child of) the given object."""
+    literal = literal.lower().split('%')[0]
+    if name.startswith('/') and literal.startswith('/'):
+        return name.startswith(literal) or literal.startswith(name)
+    return literal == name or literal == name.rsplit('/', 1)[-1]
+
+
+def _affected(name, key):
+    if key[0] != 'query':
+        return any(_related(name, str(x)) for x in key[1:])
+
+    conditions = [(column.upper(), x.lower())
+                  for column, match in _name_condition.findall(key[2])
+                  for x in _literal.findall(match)]
+    if not conditions:
+        return True
+
+    # A query on specific data objects is not affected by writes to other
+    # objects in the same collection.
+    parent, base = name.rsplit('/', 1) if '/' in name else ('', name)
+    data_names   = [x for column, x in conditions if column == 'DATA_NAME']
+    if data_names and base not in data_names and ('COLL_NAME', parent) in conditions \
+            and not any('%' in x for x in data_names):
+        return False
+
+    return any(_related(name, x) for _, x in conditions)
+
+
+def invalidate(ctx, name):
+    """Drop all cached entries that may refer to an object.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param name: Path of a collection or data object, or a user, group or resource name
+    """
+    if not enabled(ctx) or not ctx.cache:
+        return
+
+    name = name.lower()
+    for key in [k for k in ctx.cache if _affected(name, k)]:
+        del ctx.cache[key]
@@ -12,6 +12,7 @@ if sys.version_info > (2, 7):
 import genquery
 import irods_types
 
+import cache
 import msi
 from query import Query
 
@@ -126,6 +127,7 @@ def create(ctx, path):
                     path,
                     '',
                     irods_types.BytesBuf())
+    cache.invalidate(ctx, path)
 
 
 def remove(ctx, path):
@@ -141,6 +143,7 @@ def remove(ctx, path):
                 path,
                 '',
                 irods_types.BytesBuf())
+    cache.invalidate(ctx, path)
 
 
 def rename(ctx, path_org, path_target):
@@ -158,6 +161,8 @@ def rename(ctx, path_org, path_target):
                         path_target,
                         '1',
                         irods_types.BytesBuf())
+    cache.invalidate(ctx, path_org)
+    cache.invalidate(ctx, path_target)
 
 
 def id_from_name(ctx, coll_name):
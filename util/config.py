@@ -92,7 +92,11 @@ config = Config(environment=None,
                 epic_url=None,
                 epic_handle_prefix=None,
                 epic_key=None,
-                epic_certificate=None)
+                epic_certificate=None,
+                instrumentation_log=False,
+                log_level=None,
+                log_levels=[],
+                log_rate_limit=0)
 
 # }}}
 
@@ -20,6 +20,24 @@ UUSYSTEMCOLLECTION = '/yoda'
 UUREVISIONCOLLECTION = UUSYSTEMCOLLECTION + '/revisions'
 """iRODS path where all revisions will be stored."""
 
+UUREVISIONCLEANUPCHECKPOINT = UUORGMETADATAPREFIX + 'revision_cleanup_checkpoint'
+"""Metadata on the revision store for resuming a budgeted revision cleanup."""
+
+UUREVISIONINDEX = UUORGMETADATAPREFIX + 'revision_index'
+"""Metadata on the revision store of a group: original path => 'data id:modify time:size' per revision."""
+
+UUREVISIONNAMEINDEX = UUORGMETADATAPREFIX + 'revision_name_index'
+"""Metadata on the revision store of a group: data name => original path, once per original path in the revision index."""
+
+UUREVISIONDEDUPCOUNT = UUORGMETADATAPREFIX + 'revision_dedup_count'
+"""Metadata on the revision store of a group: amount of revisions not stored because they were identical to the latest revision.
+
+One counter per worker (by unit), summed on read.
+"""
+
+UUREVISIONDEDUPBYTES = UUORGMETADATAPREFIX + 'revision_dedup_bytes'
+"""Metadata on the revision store of a group: bytes saved by not storing identical revisions, one counter per worker (by unit)."""
+
 UUBLOCKLIST = ["._*", ".DS_Store"]
 """ List of file extensions not to be copied to revision"""
 
@@ -37,9 +55,43 @@ UURESOURCETIERATTRNAME = UUORGMETADATAPREFIX + 'storage_tier'
 UUMETADATASTORAGEMONTH = UUORGMETADATAPREFIX + 'storage_data_month'
 """Metadata for calculated storage month."""
 
+UUMETADATASTORAGEUSAGE = UUORGMETADATAPREFIX + 'storage_usage_'
+"""Metadata attribute prefix for running storage counters on group collections.
+
+Attribute names are completed with '<space>_<tier>', e.g. 'org_storage_usage_vault_Standard'.
+These attributes are reserved for rodsadmin.
+"""
+
+UUMETADATASTORAGEUSAGERECONCILED = UUORGMETADATAPREFIX + 'storage_usage_reconciled'
+"""Metadata for the time of the last reconciliation of the storage counters of a group."""
+
+UUINTEGRITYVERIFIED = UUORGMETADATAPREFIX + 'integrity_verified'
+"""Metadata on data objects for the last integrity verification of a replica.
+
+Value is '<timestamp>:<status>', unit is the replica number.
+"""
+
+UUINTEGRITYCURSOR = UUORGMETADATAPREFIX + 'integrity_cursor'
+"""Metadata on resources for the last DATA_ID verified in the current verification cycle."""
+
+UUINTEGRITYCYCLESTART = UUORGMETADATAPREFIX + 'integrity_cycle_start'
+"""Metadata on resources for the start time of the current verification cycle."""
+
+UUCHECKSUMBACKFILLCURSOR = UUORGMETADATAPREFIX + 'checksum_backfill_cursor'
+"""Metadata on the system collection for the last DATA_ID of the chunks completed by the checksum back-fill."""
+
+UUCHECKSUMBACKFILLCHUNK = UUORGMETADATAPREFIX + 'checksum_backfill_chunk'
+"""Metadata on the system collection for the last DATA_ID of the chunk in progress of the checksum back-fill."""
+
+UUCHECKSUMBACKFILLJOB = UUORGMETADATAPREFIX + 'checksum_backfill_job'
+"""Metadata on the system collection for each unfinished job of the checksum back-fill ('host:first id-last id')."""
+
 UUPROVENANCELOG = UUORGMETADATAPREFIX + 'action_log'
 """Provenance log item."""
 
+UUSTORAGESTATISTICSCOLLECTION = UUSYSTEMCOLLECTION + '/storage'
+"""iRODS path where monthly storage statistics are stored."""
+
 IILICENSECOLLECTION = UUSYSTEMCOLLECTION + '/licenses'
 """iRODS path where all licenses will be stored."""
 
@@ -79,6 +131,9 @@ IISTATUSATTRNAME      = UUORGMETADATAPREFIX + 'status'
 IIVAULTSTATUSATTRNAME = UUORGMETADATAPREFIX + 'vault_status'
 IICOPYPARAMSNAME      = UUORGMETADATAPREFIX + 'copy_to_vault_params'
 
+IIVAULTINGESTPROGRESS = UUORGMETADATAPREFIX + 'vault_ingest_progress'
+"""Metadata on a vault package while its folder is copied: '<data objects copied>/<total>'."""
+
 CRONJOB_STATE = {
     'PENDING':       'CRONJOB_PENDING',
     'PROCESSING':    'CRONJOB_PROCESSING',
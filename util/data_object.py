@@ -7,6 +7,7 @@ __license__   = 'GPLv3, see LICENSE'
 import genquery
 import irods_types
 
+import cache
 import constants
 import error
 import msi
@@ -57,6 +58,7 @@ def write(ctx, path, data):
 
     msi.data_obj_write(ctx, handle, data, 0)
     msi.data_obj_close(ctx, handle, 0)
+    cache.invalidate(ctx, path)
 
 
 def read(ctx, path, max_size=constants.IIDATA_MAX_SLURP_SIZE):
@@ -105,6 +107,7 @@ def copy(ctx, path_org, path_copy, force=True):
                       path_copy,
                       'verifyChksum={}'.format('++++forceFlag=' if force else ''),
                       irods_types.BytesBuf())
+    cache.invalidate(ctx, path_copy)
 
 
 def remove(ctx, path, force=True):
@@ -120,6 +123,7 @@ def remove(ctx, path, force=True):
     msi.data_obj_unlink(ctx,
                         'objPath={}{}'.format(path, '++++forceFlag=' if force else ''),
                         irods_types.BytesBuf())
+    cache.invalidate(ctx, path)
 
 
 def rename(ctx, path_org, path_target):
@@ -137,6 +141,8 @@ def rename(ctx, path_org, path_target):
                         path_target,
                         '0',
                         irods_types.BytesBuf())
+    cache.invalidate(ctx, path_org)
+    cache.invalidate(ctx, path_target)
 
 
 def name_from_id(ctx, data_id):
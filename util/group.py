@@ -4,6 +4,7 @@
 __copyright__ = 'Copyright (c) 2019-2020, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
+import cache
 import user
 from query import Query
 
@@ -53,6 +54,6 @@ def get_category(ctx, grp):
 
     :returns: Categroy of given group
     """
-    ret = ctx.uuGroupGetCategory(grp, '', '')
-    x = ret['arguments'][1]
+    x = cache.get(ctx, ('group_category', grp),
+                  lambda: ctx.uuGroupGetCategory(grp, '', '')['arguments'][1])
     return None if x == '' else x
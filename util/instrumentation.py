@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Lightweight instrumentation of GenQueries and microservice calls.
+
+Query and the msi wrappers record counts and cumulative time per category in
+agent-global counters. API functions take a snapshot of the counters before
+they run, and report the difference afterwards (see api._api).
+
+Categories:
+
+- query:          GenQuery executions (msiMakeGenQuery + msiExecGenQuery)
+- fetch:          batches fetched with msiGetMoreRows while iterating
+- close:          batches fetched with msiGetMoreRows to close a query
+- rows:           rows yielded to the caller
+- rows_discarded: rows fetched by closing a query, which are thrown away
+- rows_unused:    rows fetched in a batch but not yielded to the caller,
+                  because the query was abandoned or its limit was reached
+- msi.<name>:     calls of wrapped microservices (see msi.make())
+"""
+
+__copyright__ = 'Copyright (c) 2020, Utrecht University'
+__license__   = 'GPLv3, see LICENSE'
+
+import time
+from collections import defaultdict
+
+# Agent-global counters: category => number of events / cumulative seconds.
+# Rule execution within an agent is single-threaded.
+counts = defaultdict(int)
+times  = defaultdict(float)
+
+
+def count(category, n=1):
+    """Add n events to a category."""
+    counts[category] += n
+
+
+class timed(object):
+    """Context manager that counts one event and its duration in a category.
+
+    Example:
+
+        with instrumentation.timed('query'):
+            callback.msiExecGenQuery(...)
+    """
+
+    __slots__ = ('category', 'start')
+
+    def __init__(self, category):
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        counts[self.category] += 1
+        times[self.category]  += time.time() - self.start
+
+
+def snapshot():
+    """Return a copy of the current counters, to be passed to since()."""
+    return dict(counts), dict(times)
+
+
+def since(start):
+    """Summarize the counters that changed since a snapshot.
+
+    :param start: Snapshot as returned by snapshot()
+
+    :returns: Dict with per category either an event count, or a dict with
+              'count' and 'time' (in milliseconds) for timed categories.
+              Microservice calls are grouped under 'msi' by name.
+    """
+    start_counts, start_times = start
+    result = {}
+    msis   = {}
+
+    for category in sorted(counts):
+        n = counts[category] - start_counts.get(category, 0)
+        if n == 0:
+            continue
+
+        if category in times:
+            t = times[category] - start_times.get(category, 0.0)
+            value = {'count': n, 'time': round(t * 1000, 3)}
+        else:
+            value = n
+
+        if category.startswith('msi.'):
+            msis[category[4:]] = value
+        else:
+            result[category] = value
+
+    if msis:
+        result['msi'] = msis
+    return result
@@ -1,20 +1,144 @@
 # -*- coding: utf-8 -*-
-"""Logging facilities."""
+"""Logging facilities.
 
-__copyright__ = 'Copyright (c) 2019, Utrecht University'
+Messages are written to the iRODS server log, prefixed with the client user
+and the name of the calling function.
+
+Log levels can be configured per module with the 'log_level' and
+'log_levels' config options, e.g.:
+
+    log_level  = 'info'
+    log_levels = 'intake_scan=warning revisions=debug'
+
+Messages are formatted lazily: arguments are only formatted (with
+str.format) when the message is actually written, e.g.:
+
+    log.debug(ctx, 'Scanning <{}>', path)
+
+Identical messages can be rate-limited with the 'log_rate_limit' config
+option (maximum amount of identical messages per minute).
+"""
+
+__copyright__ = 'Copyright (c) 2019-2020, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-import inspect
+import sys
+import time
 
 import rule
 import user
 from config import config
 
+DEBUG   = 10
+INFO    = 20
+WARNING = 30
+ERROR   = 40
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+
+# Prefixes for messages of a level, 'write' messages have no prefix.
+_prefix = {DEBUG: 'DEBUG: ', INFO: '', WARNING: 'WARNING: ', ERROR: 'ERROR: '}
+
+# Window (in seconds) within which identical messages are rate-limited.
+RATE_LIMIT_WINDOW = 60
+
+# Maximum amount of distinct messages kept track of for rate-limiting.
+RATE_LIMIT_ENTRIES = 1000
+
+# Log level per module name, determined on first use (see _level()).
+_levels = {}
+
+# Rate-limited messages: (caller, text) => [window start time, message count].
+_recent = {}
+
+
+def _level(module):
+    """Get the configured log level for a module."""
+    try:
+        return _levels[module]
+    except KeyError:
+        pass
+
+    level = LEVELS.get(config.log_level or '',
+                       DEBUG if config.environment == 'development' else INFO)
+
+    # Match on the module name without package prefix, e.g. 'rules_uu.util.query' => 'util.query'.
+    for x in config.log_levels:
+        name, _, value = x.partition('=')
+        if (module == name or module.endswith('.' + name)) and value in LEVELS:
+            level = LEVELS[value]
+
+    _levels[module] = level
+    return level
+
+
+def _limited(key):
+    """Check whether a message is rate-limited.
 
-def write(ctx, text):
-    """Write a message to the log, including client name and originating rule/API name."""
-    caller = inspect.stack()[1][3]
-    _write(ctx, '{}: {}'.format(caller, text))
+    :returns: Tuple of whether the message should be suppressed, and the
+              amount of identical messages suppressed in the previous window
+    """
+    limit = config.log_rate_limit
+    if not limit:
+        return False, 0
+
+    now   = time.time()
+    entry = _recent.get(key)
+    if entry is None or now - entry[0] >= RATE_LIMIT_WINDOW:
+        suppressed = max(0, entry[1] - limit) if entry else 0
+        if entry is None and len(_recent) >= RATE_LIMIT_ENTRIES:
+            _recent.clear()
+        _recent[key] = [now, 1]
+        return False, suppressed
+
+    entry[1] += 1
+    return entry[1] > limit, 0
+
+
+def _log(ctx, level, text, args, with_caller=True):
+    # Frame 0 is this function, frame 1 the logging function, frame 2 its caller.
+    frame = sys._getframe(2)
+    if level < _level(frame.f_globals.get('__name__', '')):
+        return
+
+    if args:
+        text = text.format(*args)
+    text = _prefix[level] + str(text)
+
+    if with_caller:
+        text = '{}: {}'.format(frame.f_code.co_name, text)
+
+    suppress, suppressed = _limited(text)
+    if suppress:
+        return
+    if suppressed:
+        text += ' ({} identical messages suppressed)'.format(suppressed)
+
+    _write(ctx, text)
+
+
+def write(ctx, text, *args):
+    """Write a message to the log, including client name and originating rule/API name.
+
+    Messages are written at the INFO level: report failures with warning() or
+    error(), so that they are kept with a log level of 'warning'.
+    """
+    _log(ctx, INFO, text, args)
+
+
+def debug(ctx, text, *args):
+    """Write a debug message to the log (by default only in a development environment)."""
+    _log(ctx, DEBUG, text, args)
+
+
+def warning(ctx, text, *args):
+    """Write a warning to the log, including client name and originating rule/API name."""
+    _log(ctx, WARNING, text, args)
+
+
+def error(ctx, text, *args):
+    """Write an error to the log, including client name and originating rule/API name."""
+    _log(ctx, ERROR, text, args)
 
 
 def _write(ctx, text):
@@ -25,13 +149,6 @@ def _write(ctx, text):
         ctx.writeLine('serverLog', text)
 
 
-def debug(ctx, text):
-    """Write a log message if in a development environment."""
-    if config.environment == 'development':
-        write(ctx, 'DEBUG: {}'.format(text))
-
-
-def _debug(ctx, text):
-    """Write a log message if in a development environment."""
-    if config.environment == 'development':
-        _write(ctx, 'DEBUG: {}'.format(text))
+def _debug(ctx, text, *args):
+    """Write a debug message to the log, without the originating rule/API name."""
+    _log(ctx, DEBUG, text, args, with_caller=False)
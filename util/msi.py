@@ -10,6 +10,7 @@ __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
 import error
+import instrumentation
 
 
 class Error(error.UUError):
@@ -41,10 +42,11 @@ def make(name, error_text):
     return (_wrap('msi' + name, e), e)
 
 
-def _run(msi, exception, *args):
+def _run(callback, msi, exception, *args):
     """Run an MSI such that it throws an MSI-specific exception on failure."""
     try:
-        ret = msi(*args)
+        with instrumentation.timed('msi.' + msi):
+            ret = getattr(callback, msi)(*args)
     except RuntimeError as e:
         # msi failures may be raised as non-specific RuntimeErrors.
         # There is no result to save, but we can still convert this to a
@@ -68,12 +70,12 @@ def _wrap(msi, exception):
     e.g.:    callback.msiDataObjCreate(x, y, z)
     becomes: data_obj_create(callback, x, y, z)
 
-    :param msi:       MSI function to wrap
+    :param msi:       Name of the MSI function to wrap
     :param exception: Exeption to throw on failure
 
     :returns: MSI wrapper
     """
-    return lambda callback, *args: _run(getattr(callback, msi), exception, *args)
+    return lambda callback, *args: _run(callback, msi, exception, *args)
 
 
 def _make_exception(name, message):
@@ -97,6 +99,7 @@ data_obj_read,   DataObjReadError   = make('DataObjRead',   'Could not read data
 data_obj_write,  DataObjWriteError  = make('DataObjWrite',  'Could not write data object')
 data_obj_close,  DataObjCloseError  = make('DataObjClose',  'Could not close data object')
 data_obj_copy,   DataObjCopyError   = make('DataObjCopy',   'Could not copy data object')
+data_obj_chksum, DataObjChksumError = make('DataObjChksum', 'Could not checksum data object')
 data_obj_unlink, DataObjUnlinkError = make('DataObjUnlink', 'Could not remove data object')
 data_obj_rename, DataObjRenameError = make('DataObjRename', 'Could not rename data object')
 coll_create,     CollCreateError    = make('CollCreate',    'Could not create collection')
@@ -111,6 +114,8 @@ register_epic_pid, RegisterEpicPIDError = make('RegisterEpicPID', 'Could not reg
 string_2_key_val_pair, String2KeyValPairError = \
     make('String2KeyValPair', 'Could not create keyval pair')
 
+add_key_val, AddKeyValError = make('AddKeyVal', 'Could not add key/value pair')
+
 set_key_value_pairs_to_obj, SetKeyValuePairsToObjError = \
     make('SetKeyValuePairsToObj', 'Could not set metadata on object')
 
@@ -126,6 +131,8 @@ add_avu, AddAvuError = make('_add_avu', 'Could not add metadata to object')
 rmw_avu, RmwAvuError = make('_rmw_avu', 'Could not remove metadata to object')
 
 sudo_obj_acl_set, SudoObjAclSetError = make('SudoObjAclSet', 'Could not set ACLs as admin')
+sudo_obj_meta_add, SudoObjMetaAddError = make('SudoObjMetaAdd', 'Could not add metadata as admin')
+sudo_obj_meta_remove, SudoObjMetaRemoveError = make('SudoObjMetaRemove', 'Could not remove metadata as admin')
 
 # Add new msis here as needed.
 
@@ -4,13 +4,23 @@
 __copyright__ = 'Copyright (c) 2019, Utrecht University'
 __license__   = 'GPLv3, see LICENSE'
 
-from collections import OrderedDict
+import base64
+import json
+import re
+from collections import namedtuple, OrderedDict
 from enum import Enum
 
 import irods_types
 
+import cache as request_cache
+import instrumentation
+
 MAX_SQL_ROWS = 256
 
+# Maximum length of the value list of an 'in' condition generated by lookup().
+# iRODS parses condition values into buffers of MAX_NAME_LEN (1088) bytes.
+MAX_IN_LENGTH = 1000
+
 
 class Option(object):
     """iRODS QueryInp option flags - used internally.
@@ -31,22 +41,55 @@ class OutputType(Enum):
     """
     Represents query output type.
 
-    AS_DICT:  result rows are dicts of (column_name => value)
-    AS_LIST:  result rows are lists of cells (ordered by input column list)
-    AS_TUPLE: result rows are tuples of cells, or a single string if only one column is selected
+    AS_DICT:    result rows are dicts of (column_name => value)
+    AS_LIST:    result rows are lists of cells (ordered by input column list)
+    AS_TUPLE:   result rows are tuples of cells, or a single string if only one column is selected
+    AS_ROW:     result rows are namedtuples, with column names as field names
+    AS_COLUMNS: results are returned per batch of rows, as a list of value lists (one per column)
 
     Note that when using AS_DICT, operations on columns (MAX, COUNT, ORDER, etc.)
-    become part of the column name in the result.
+    become part of the column name in the result. When using AS_ROW, these
+    are removed from the field names (see field_names()).
+
+    AS_ROW and AS_COLUMNS are the cheapest output types when iterating over
+    many rows: AS_ROW avoids creating a dict per row, and AS_COLUMNS avoids
+    creating a container per row altogether.
     """
 
-    AS_DICT  = 0
-    AS_LIST  = 1
-    AS_TUPLE = 2
+    AS_DICT    = 0
+    AS_LIST    = 1
+    AS_TUPLE   = 2
+    AS_ROW     = 3
+    AS_COLUMNS = 4
+
+
+AS_DICT    = OutputType.AS_DICT
+AS_LIST    = OutputType.AS_LIST
+AS_TUPLE   = OutputType.AS_TUPLE
+AS_ROW     = OutputType.AS_ROW
+AS_COLUMNS = OutputType.AS_COLUMNS
+
+
+def field_names(columns):
+    """Get field names for columns, with ORDER etc. wrappers removed.
 
+    e.g. ['ORDER(DATA_NAME)', 'MAX(DATA_MODIFY_TIME)'] => ['DATA_NAME', 'DATA_MODIFY_TIME']
 
-AS_DICT  = OutputType.AS_DICT
-AS_LIST  = OutputType.AS_LIST
-AS_TUPLE = OutputType.AS_TUPLE
+    If the same column is selected more than once, the function name is kept
+    as a prefix for the aggregates, e.g. 'MAX_DATA_MODIFY_TIME'.
+
+    :param columns: List of SELECT column names
+
+    :returns: List of field names
+    """
+    plain = [re.sub(r'.*\((.*)\)', '\\1', c).strip() for c in columns]
+    return [p if plain.count(p) == 1 or p == c.strip() else re.sub(r'\W+', '_', c.strip()).strip('_')
+            for p, c in zip(plain, columns)]
+
+
+def row_type(columns):
+    """Create a namedtuple type for rows of a query on the given columns."""
+    return namedtuple('Row', field_names(columns))
 
 
 class Query(object):
@@ -55,11 +98,14 @@ class Query(object):
     :param callback:       iRODS callback
     :param columns:        a list of SELECT column names, or columns as a comma-separated string.
     :param condition:      (optional) where clause, as a string
-    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE
+    :param output:         (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE/AS_ROW/AS_COLUMNS
     :param offset:         (optional) starting row (0-based), can be used for pagination
     :param limit:          (optional) maximum amount of results, can be used for pagination
     :param case_sensitive: (optional) set this to False to make the entire where-clause case insensitive
     :param options:        (optional) other OR-ed options to pass to the query (see the Option type above)
+    :param cache:          (optional) set this to True to remember the results for the rest of the request
+    :param count:          (optional) set this to False if total_rows() is not needed, so that iRODS
+                           does not count all matching rows when executing the query
 
     Getting the total row count:
 
@@ -72,6 +118,19 @@ class Query(object):
       AS_TUPLE produces a tuple, similar to AS_LIST, with the exception that
       for queries on single columns, each result is returned as a string
       instead of a 1-element tuple.
+      AS_ROW produces namedtuples, with field names determined once per query
+      (see field_names()).
+      AS_COLUMNS produces one item per batch of (at most 256) rows: a list
+      with, for each column, the list of values in this batch.
+
+    Caching:
+
+      With cache=True, all results are fetched on first use and stored in the
+      rule.Context. Identical queries (same columns, conditions, output type,
+      offset, limit and options) in the same request are then answered without
+      a catalog round-trip. Writes through the avu, collection and
+      data_object modules invalidate cached results for the modified object
+      (see util.cache). Only use this for small result sets.
 
     Examples:
 
@@ -89,6 +148,15 @@ class Query(object):
         # ... or get data object paths
         datas = ['{}/{}'.format(x, y) for x, y in Query(callback, 'COLL_NAME, DATA_NAME')]
 
+        # Rows with named fields.
+        for x in Query(callback, 'ORDER(DATA_NAME), MAX(DATA_SIZE)', output=AS_ROW):
+            print('{}: {} bytes'.format(x.DATA_NAME, x.DATA_SIZE))
+
+        # Sum sizes per batch of rows.
+        total = 0
+        for names, sizes in Query(callback, 'DATA_NAME, DATA_SIZE', output=AS_COLUMNS):
+            total += sum(map(int, sizes))
+
         # Print the first 200-299 of data objects ordered descending by data
         # name, owned by a username containing 'r' or 'R', in a collection
         # under (case-insensitive) '/tempzone/'.
@@ -107,7 +175,9 @@ class Query(object):
                  offset=0,
                  limit=None,
                  case_sensitive=True,
-                 options=0):
+                 options=0,
+                 cache=False,
+                 count=True):
 
         self.callback = callback
 
@@ -124,8 +194,10 @@ class Query(object):
         self.offset     = offset
         self.limit      = limit
         self.options    = options
+        self.cache      = cache and request_cache.enabled(callback)
+        self.count      = count
 
-        assert self.output in (AS_TUPLE, AS_LIST, AS_DICT)
+        assert self.output in (AS_TUPLE, AS_LIST, AS_DICT, AS_ROW, AS_COLUMNS)
 
         if not case_sensitive:
             # Uppercase the entire condition string. Should cause no problems,
@@ -140,8 +212,12 @@ class Query(object):
         # Filled when calling total_rows() on the Query.
         self._total = None
 
-    def exec_if_not_yet_execed(self):
-        """Query execution is delayed until the first result or total row count is requested."""
+    def exec_if_not_yet_execed(self, rows=None):
+        """Query execution is delayed until the first result or total row count is requested.
+
+        :param rows: (optional) amount of rows that will be used, if less than the limit.
+                     When given, the total row count is not requested from iRODS.
+        """
         if self.gqi is not None:
             return
 
@@ -150,24 +226,29 @@ class Query(object):
                                                  irods_types.GenQueryInp())['arguments'][2]
         if self.offset > 0:
             self.gqi.rowOffset = self.offset
-        else:
+        elif self.count and rows is None:
             # If offset is 0, we can (relatively) cheaply let iRODS count rows.
             # - with non-zero offset, the query must be executed twice if the
             #   row count is needed (see total_rows()).
             self.options |= Option.RETURN_TOTAL_ROW_COUNT
 
-        if self.limit is not None and self.limit < MAX_SQL_ROWS - 1:
-            # We try to limit the amount of rows we pull in, however in order
-            # to close the query, 256 more rows will (if available) be fetched
-            # regardless.
-            self.gqi.maxRows = self.limit
+        if self.limit is not None:
+            rows = self.limit if rows is None else min(rows, self.limit)
+
+        if rows is not None and rows <= MAX_SQL_ROWS:
+            # All rows we need fit in the first batch: pull in no more rows
+            # than needed, and let iRODS close the query right after this
+            # batch, so that no extra round-trip is needed to close it.
+            self.gqi.maxRows  = rows
+            self.gqi.options |= Option.AUTO_CLOSE
 
         self.gqi.options |= self.options
 
         import log
-        log._debug(self.callback, self)
+        log._debug(self.callback, '{}', self)
 
-        self.gqo    = self.callback.msiExecGenQuery(self.gqi, irods_types.GenQueryOut())['arguments'][1]
+        with instrumentation.timed('query'):
+            self.gqo = self.callback.msiExecGenQuery(self.gqi, irods_types.GenQueryOut())['arguments'][1]
         self.cti    = self.gqo.continueInx
         self._total = None
 
@@ -199,38 +280,79 @@ class Query(object):
         return self._total
 
     def __iter__(self):
+        if not self.cache:
+            return self._iter()
+
+        key  = ('query', tuple(self.columns), self.conditions, self.output, self.offset, self.limit, self.options)
+        rows = request_cache.get(self.callback, key, lambda: list(self._iter()))
+
+        # Hand out copies of mutable rows, so callers cannot modify the cache.
+        if self.output == AS_LIST:
+            return (list(x) for x in rows)
+        elif self.output == AS_DICT:
+            return (OrderedDict(x) for x in rows)
+        elif self.output == AS_COLUMNS:
+            return ([list(c) for c in x] for x in rows)
+        return iter(rows)
+
+    def _iter(self):
         self.exec_if_not_yet_execed()
 
-        row_i = 0
-
-        # Iterate until all rows are fetched / the query is aborted.
-        while True:
-            try:
-                # Iterate over a set of rows.
-                for r in range(self.gqo.rowCnt):
-                    if self.limit is not None and row_i >= self.limit:
-                        self._close()
-                        return
-
-                    row = [self.gqo.sqlResult[c].row(r) for c in range(len(self.columns))]
-                    row_i += 1
-
-                    if self.output == AS_TUPLE:
-                        yield row[0] if len(self.columns) == 1 else tuple(row)
-                    elif self.output == AS_LIST:
-                        yield row
+        row_i   = 0
+        fetched = 0
+        single  = len(self.columns) == 1
+        if self.output == AS_ROW:
+            make_row = row_type(self.columns)._make
+
+        try:
+            # Iterate until all rows are fetched / the query is aborted.
+            while True:
+                try:
+                    # Iterate over a set of rows.
+                    n = self.gqo.rowCnt
+                    fetched += n
+                    if self.limit is not None:
+                        n = min(n, self.limit - row_i)
+
+                    results = [self.gqo.sqlResult[c] for c in range(len(self.columns))]
+
+                    if self.output == AS_COLUMNS:
+                        if n > 0:
+                            row_i += n
+                            yield [[x.row(r) for r in range(n)] for x in results]
                     else:
-                        yield OrderedDict(zip(self.columns, row))
-
-            except GeneratorExit:
-                self._close()
-                return
-
-            if self.cti <= 0 or self.limit is not None and row_i >= self.limit:
-                self._close()
-                return
-
-            self._fetch()
+                        for r in range(n):
+                            row = [x.row(r) for x in results]
+                            row_i += 1
+
+                            if self.output == AS_TUPLE:
+                                yield row[0] if single else tuple(row)
+                            elif self.output == AS_ROW:
+                                yield make_row(row)
+                            elif self.output == AS_LIST:
+                                yield row
+                            else:
+                                yield OrderedDict(zip(self.columns, row))
+
+                except GeneratorExit:
+                    self._close()
+                    return
+
+                if self.cti <= 0 or self.limit is not None and row_i >= self.limit:
+                    self._close()
+                    return
+
+                if self.limit is not None and self.limit - row_i <= MAX_SQL_ROWS:
+                    # This is the last batch we need, close the query right after it.
+                    self.gqi.maxRows  = self.limit - row_i
+                    self.gqi.options |= Option.AUTO_CLOSE
+
+                with instrumentation.timed('fetch'):
+                    self._fetch()
+        finally:
+            # Count rows once per iteration rather than once per row.
+            instrumentation.count('rows', row_i)
+            instrumentation.count('rows_unused', fetched - row_i)
 
     def _fetch(self):
         """Fetch the next batch of results."""
@@ -245,15 +367,23 @@ class Query(object):
 
         # msiCloseGenQuery fails with internal errors.
         # Close the query using msiGetMoreRows instead.
-        # This is less than ideal, because it may fetch 256 more rows
-        # (gqi.maxRows is overwritten) resulting in unnecessary processing
-        # work. However there appears to be no other way to close the query.
+        # This is less than ideal, because it fetches another batch of rows
+        # that is thrown away. We ask for a single row, but depending on the
+        # iRODS version gqi.maxRows may be overwritten, resulting in up to 256
+        # discarded rows. However there appears to be no other way to close
+        # the query.
+        # Queries that know in advance how many rows they need (limit,
+        # first()) avoid this by setting AUTO_CLOSE before fetching their
+        # last batch, see exec_if_not_yet_execed() and _iter().
 
         while self.cti > 0:
             # Close query immediately after getting the next batch.
             # This avoids having to soak up all remaining results.
+            self.gqi.maxRows  = 1
             self.gqi.options |= Option.AUTO_CLOSE
-            self._fetch()
+            with instrumentation.timed('close'):
+                self._fetch()
+            instrumentation.count('rows_discarded', self.gqo.rowCnt)
 
         # Mark self as closed.
         self.gqi = None
@@ -262,6 +392,10 @@ class Query(object):
 
     def first(self):
         """Get exactly one result (or None if no results are available)."""
+        if not self.cache:
+            # Fetch only a single row, and skip counting the total.
+            self.exec_if_not_yet_execed(rows=1)
+
         for x in self:
             self._close()
             return x
@@ -275,3 +409,275 @@ class Query(object):
     def __del__(self):
         """Auto-close query on when Query goes out of scope."""
         self._close()
+
+
+def lookup(callback, key_column, keys, columns, conditions='', output=AS_TUPLE):
+    """Run a query for many keys at once, grouping the results by key.
+
+    This replaces loops that run one query per key (e.g. per DATA_ID of an
+    outer query) by as few queries as possible, using "KEY in ('a', 'b', ...)"
+    conditions that respect the maximum condition length of iRODS.
+
+    GenQuery string literals cannot contain quotes. Keys that contain a quote
+    are matched on the part of the key before the first quote instead, using
+    "KEY like 'prefix_%' || like ..." conditions, and the rows of other keys
+    with the same prefix are skipped.
+
+    :param callback:   iRODS callback
+    :param key_column: Column to match the keys against (e.g. 'DATA_ID')
+    :param keys:       Iterable of key values (the result is keyed by their string representation)
+    :param columns:    a list of SELECT column names, or columns as a comma-separated string
+    :param conditions: (optional) additional where clause, as a string
+    :param output:     (optional) [default=AS_TUPLE] either AS_DICT/AS_LIST/AS_TUPLE/AS_ROW
+
+    :returns: Dict of key => list of result rows (without the key column), for every given key
+
+    Example:
+
+        # Get the modification time of a list of data objects.
+        times = lookup(ctx, 'DATA_ID', ids, 'DATA_MODIFY_TIME')
+        for data_id in ids:
+            print('{}: {}'.format(data_id, times[data_id]))
+    """
+    if type(columns) is str:
+        columns = [x.strip() for x in columns.split(',')]
+
+    assert output in (AS_TUPLE, AS_LIST, AS_DICT, AS_ROW)
+    if output == AS_ROW:
+        make_row = row_type(columns)._make
+
+    results = OrderedDict((str(k), []) for k in keys)
+    quoted  = set(k for k in results if "'" in k)
+
+    def chunked(items, separator):
+        """Split items into chunks of limited condition length."""
+        chunks = [[]]
+        length = 0
+        for item in items:
+            if chunks[-1] and length + len(item) + len(separator) > MAX_IN_LENGTH:
+                chunks.append([])
+                length = 0
+            chunks[-1].append(item)
+            length += len(item) + len(separator)
+        return [separator.join(chunk) for chunk in chunks if chunk]
+
+    # Escape LIKE wildcards in the part of each quoted key before the quote.
+    prefixes = OrderedDict((re.sub(r'([\\%_])', r'\\\1', k.split("'")[0]), None) for k in quoted)
+
+    # Key conditions, with the keys to keep from their rows (None: all rows).
+    key_conditions = ([('{} in ({})'.format(key_column, x), None)
+                       for x in chunked(["'{}'".format(k) for k in results if k not in quoted], ', ')]
+                      + [('{} {}'.format(key_column, x), quoted)
+                         for x in chunked(["like '{}_%'".format(p) for p in prefixes], ' || ')])
+
+    for condition, wanted in key_conditions:
+        if conditions:
+            condition += ' AND ' + conditions
+
+        for row in Query(callback, [key_column] + columns, condition, output=AS_LIST, count=False):
+            if wanted is not None and row[0] not in wanted:
+                continue
+            if output == AS_TUPLE:
+                value = row[1] if len(columns) == 1 else tuple(row[1:])
+            elif output == AS_ROW:
+                value = make_row(row[1:])
+            elif output == AS_LIST:
+                value = row[1:]
+            else:
+                value = OrderedDict(zip(columns, row[1:]))
+            results.setdefault(row[0], []).append(value)
+
+    return results
+
+
+def encode_cursor(position):
+    """Encode a pagination position (a JSON-serializable dict) as an opaque string for API clients."""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')))
+
+
+def decode_cursor(cursor):
+    """Decode a cursor created with encode_cursor().
+
+    :param cursor: Cursor string
+
+    :raises ValueError: Cursor is invalid
+
+    :returns: Pagination position dict
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if type(position) is not dict:
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def page(callback, columns, conditions, key, tiebreaker, after=None, limit=10,
+         descending=False, count=False):
+    """Get a page of results, starting after a given row (keyset pagination).
+
+    Unlike pagination with an offset, fetching a page does not require the
+    database to scan and discard all rows on earlier pages: the next page is
+    selected with a condition on the sort key of the last row of the previous
+    page. This makes every page equally cheap.
+
+    Rows are ordered on the sort key, and on a unique tiebreaker column for
+    rows with equal keys. GenQuery cannot combine conditions on different
+    columns with 'or', so a page is fetched with up to two queries: first the
+    rows with a key equal to the last key of the previous page (and a later
+    tiebreaker), then the rows with a later key.
+
+    Conditions are always case sensitive: GenQuery orders case sensitively,
+    so a case insensitive key condition would skip rows.
+
+    GenQuery string literals cannot contain quotes. If the last key of the
+    previous page contains a quote, the rows are selected with a condition on
+    the part of the key before the first quote instead (see _page_after_quote).
+
+    :param callback:   iRODS callback
+    :param columns:    List of SELECT column names, including the sort key
+    :param conditions: Where clause, as a string
+    :param key:        Column to sort on (e.g. 'DATA_NAME'), may be wrapped in ORDER/ORDER_DESC in columns
+    :param tiebreaker: Unique column to order rows with equal sort keys (e.g. 'DATA_ID')
+    :param after:      Position of the last row of the previous page, as returned by the
+                       previous call (None for the first page)
+    :param limit:      Maximum amount of rows on the page
+    :param descending: Sort in descending order
+    :param count:      Count the total amount of rows (first page only)
+
+    :raises ValueError: Position contains a quote in the tiebreaker
+
+    :returns: Tuple of rows (as AS_ROW), the position of the last row (None if there are no
+              further rows) and the total amount of rows (None if not counted)
+    """
+    order = 'ORDER_DESC' if descending else 'ORDER'
+
+    # Make sure the result is ordered on the key first, then on the tiebreaker.
+    columns = [c for c in columns if field_names([c])[0] not in (key, tiebreaker)]
+    columns = ['{}({})'.format(order, key)] + columns + ['{}({})'.format(order, tiebreaker)]
+
+    total = None
+    if after is None:
+        q     = Query(callback, columns, conditions, output=AS_ROW, limit=limit + 1, count=count)
+        rows  = list(q)
+        total = q.total_rows() if count else None
+    elif "'" in after['id']:
+        raise ValueError('Invalid cursor')
+    elif "'" in after['key']:
+        rows = _page_after_quote(callback, columns, conditions, key, tiebreaker, after, limit, descending)
+    else:
+        op   = '<' if descending else '>'
+        rows = []
+        for condition in ["{} = '{}' AND {} {} '{}'".format(key, after['key'], tiebreaker, op, after['id']),
+                          "{} {} '{}'".format(key, op, after['key'])]:
+            if len(rows) > limit:
+                break
+            rows += list(Query(callback, columns, ' AND '.join([x for x in [conditions, condition] if x]),
+                               output=AS_ROW, limit=limit + 1 - len(rows), count=False))
+
+    position = None
+    if len(rows) > limit:
+        rows     = rows[:limit]
+        position = {'key': getattr(rows[-1], key), 'id': getattr(rows[-1], tiebreaker)}
+
+    return rows, position, total
+
+
+def _page_after_quote(callback, columns, conditions, key, tiebreaker, after, limit, descending):
+    """Get the rows after a position with a key that contains a quote (see page()).
+
+    Rows are selected from the part of the key before the first quote: all
+    later keys are at least this prefix, and (when descending) less than the
+    prefix followed by the character after the quote. Rows up to and including
+    the position are skipped here, fetching more rows until enough remain.
+
+    :returns: Up to limit + 1 rows after the position
+    """
+    prefix = after['key'].split("'")[0]
+    if descending:
+        condition = "{} < '{}('".format(key, prefix)
+    else:
+        condition = "{} >= '{}'".format(key, prefix) if prefix else ''
+
+    def passed(row):
+        row_key, row_id, after_id = getattr(row, key), getattr(row, tiebreaker), after['id']
+        if row_key != after['key']:
+            return row_key < after['key'] if descending else row_key > after['key']
+        if row_id.isdigit() and after_id.isdigit():
+            row_id, after_id = int(row_id), int(after_id)
+        return row_id < after_id if descending else row_id > after_id
+
+    n = limit + 1
+    while True:
+        rows = list(Query(callback, columns, ' AND '.join([x for x in [conditions, condition] if x]),
+                          output=AS_ROW, limit=n, count=False))
+        skip = next((i for i, row in enumerate(rows) if passed(row)), len(rows))
+        if len(rows) < n or len(rows) - skip > limit:
+            return rows[skip:skip + limit + 1]
+        n *= 2
+
+
+def paginate(callback, queries, cursor=None, limit=10, descending=False, count=True):
+    """Get a page of the concatenated results of one or more queries, using keyset pagination.
+
+    The returned cursor is an opaque string that encodes the position of the
+    last row. The total amount of rows is counted on the first page only, and
+    is carried in the cursor for subsequent pages.
+
+    :param callback:       iRODS callback
+    :param queries:        List of (columns, conditions, key, tiebreaker) tuples (see page())
+    :param cursor:         Cursor returned by the previous call ('' or None for the first page)
+    :param limit:          Maximum amount of rows on the page
+    :param descending:     Sort in descending order
+    :param count:          Count the total amount of rows
+
+    :raises ValueError: Cursor is invalid
+
+    :returns: Tuple of rows (as AS_ROW), the next cursor (None on the last page) and
+              the total amount of rows (None if not counted)
+    """
+    if cursor:
+        position = decode_cursor(cursor)
+        try:
+            phase = int(position['phase'])
+            after = position['after']
+            total = position['total']
+            if after is not None:
+                after = {'key': str(after['key']), 'id': str(after['id'])}
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+    else:
+        phase, after, total = 0, None, 0 if count else None
+
+    first = not cursor
+    rows  = []
+    next_position = None
+
+    for i in range(phase, len(queries)):
+        columns, conditions, key, tiebreaker = queries[i]
+        n = None
+
+        if next_position is None and len(rows) < limit:
+            result, last, n = page(callback, columns, conditions, key, tiebreaker,
+                                   after if i == phase else None,
+                                   limit=limit - len(rows), descending=descending,
+                                   count=first and count)
+            rows += result
+            if last is not None:
+                next_position = {'phase': i, 'after': last}
+        elif next_position is None:
+            # The page is full, continue with this query on the next page.
+            next_position = {'phase': i, 'after': None}
+
+        if first and count:
+            # Queries that do not contribute to the first page are counted separately.
+            total += n if n is not None else Query(callback, columns, conditions, limit=0).total_rows()
+        elif next_position is not None:
+            break
+
+    if next_position is None:
+        return rows, None, total
+
+    next_position['total'] = total
+    return rows, encode_cursor(next_position), total
@@ -13,10 +13,13 @@ class Context(object):
 
     `Context` can be treated as a rule engine callback for all intents and purposes.
     However @rule and @api functions that need access to the rei, can do so through this object.
+
+    The context also carries a cache for lookups that may be repeated within one request (see util.cache).
     """
     def __init__(self, callback, rei):
         self.callback = callback
         self.rei      = rei
+        self.cache    = {}
 
     def __getattr__(self, name):
         """Allow accessing the callback directly."""
@@ -9,6 +9,7 @@ from collections import namedtuple
 import genquery
 import session_vars
 
+import cache
 from query import Query
 
 # User is a tuple consisting of a name and a zone, which stringifies into 'user#zone'.
@@ -16,9 +17,14 @@ User = namedtuple('User', ['name', 'zone'])
 User.__str__ = lambda self: '{}#{}'.format(*self)
 
 
+def _client_user(ctx):
+    """Obtain the client user session variables (once per request)."""
+    return cache.get(ctx, ('client_user',), lambda: session_vars.get_map(ctx.rei)['client_user'])
+
+
 def user_and_zone(ctx):
     """Obtain client name and zone."""
-    client = session_vars.get_map(ctx.rei)['client_user']
+    client = _client_user(ctx)
     return User(client['user_name'], client['irods_zone'])
 
 
@@ -29,12 +35,12 @@ def full_name(ctx):
 
 def name(ctx):
     """Get the name of the client user."""
-    return session_vars.get_map(ctx.rei)['client_user']['user_name']
+    return _client_user(ctx)['user_name']
 
 
 def zone(ctx):
     """Get the zone of the client user."""
-    return session_vars.get_map(ctx.rei)['client_user']['irods_zone']
+    return _client_user(ctx)['irods_zone']
 
 
 def from_str(ctx, s):
@@ -21,6 +21,23 @@ UUSYSTEMCOLLECTION = "/yoda"
 # \constant  UUREVISIONCOLLECTION   irods path where all revisions will be stored
 UUREVISIONCOLLECTION = UUSYSTEMCOLLECTION ++ "/revisions"
 
+# \constant  UUREVISIONINDEX   metadata on the revision store of a group, with per revision
+#                               the original path as value and "data id:modify time:size" as unit
+UUREVISIONINDEX = UUORGMETADATAPREFIX ++ "revision_index"
+
+# \constant  UUREVISIONNAMEINDEX   metadata on the revision store of a group, with per original path
+#                                   in the revision index the data name as value and the original path as unit
+UUREVISIONNAMEINDEX = UUORGMETADATAPREFIX ++ "revision_name_index"
+
+# \constant  UUREVISIONDEDUPCOUNT   metadata on the revision store of a group: amount of revisions
+#                                    not stored because they were identical to the latest revision,
+#                                    one counter per worker (unit), summed on read
+UUREVISIONDEDUPCOUNT = UUORGMETADATAPREFIX ++ "revision_dedup_count"
+
+# \constant  UUREVISIONDEDUPBYTES   metadata on the revision store of a group: bytes saved by not
+#                                    storing identical revisions, one counter per worker (unit)
+UUREVISIONDEDUPBYTES = UUORGMETADATAPREFIX ++ "revision_dedup_bytes"
+
 # \constant UUDATAREQUESTCOLLECTION irods path where system data of the datarequest module will be
 # stored
 UUDATAREQUESTCOLLECTION = UUSYSTEMCOLLECTION ++ "/datarequest"
@@ -13,6 +13,7 @@ acPreprocForCollCreate         { cut; py_acPreprocForCollCreate }
 acPreprocForRmColl             { cut; py_acPreprocForRmColl }
 acPreprocForDataObjOpen        { cut; py_acPreprocForDataObjOpen }
 acDataDeletePolicy             { cut; py_acDataDeletePolicy }
+acPostProcForDelete            { py_acPostProcForDelete }
 acPreProcForObjRename(*x, *y)  { cut; py_acPreProcForObjRename(*x, *y) }
 acPreProcForExecCmd(*cmd, *args, *addr, *hint) { cut; py_acPreProcForExecCmd(*cmd, *args, *addr, *hint) }
 acPostProcForObjRename(*src, *dst) { py_acPostProcForObjRename(*src, *dst) }
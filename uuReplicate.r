@@ -83,6 +83,9 @@ uuReplicateBatch() {
             if (*replstatus == 0) {
                 *countOk = *countOk + 1;
 
+                # Account the new replica in the storage counters of its group.
+                errorcode(rule_resource_storage_usage_add_replica(*path, *to));
+
                 # Replication OK. Remove any existing error indication attribute.
                 *c = *row."COLL_NAME";
                 *d = *row."DATA_NAME";
@@ -27,12 +27,22 @@ __all__ = ['api_vault_submit',
            'api_vault_unpreservable_files',
            'rule_vault_copy_original_metadata_to_vault',
            'rule_vault_write_license',
+           'rule_vault_copy_folder_to_vault',
            'rule_vault_process_status_transitions',
            'api_vault_system_metadata',
            'api_vault_collection_details',
            'api_vault_copy_to_research',
            'api_vault_get_publication_terms']
 
+# Access levels that allow reading a data object or collection.
+INGEST_READ_ACCESS = ('read object', 'modify object', 'own')
+
+# Access names as set with msiSetACL.
+INGEST_ACCESS_NAMES = {'read object': 'read', 'modify object': 'write'}
+
+# Amount of data objects copied to the vault between progress updates.
+INGEST_PROGRESS_INTERVAL = 100
+
 
 @api.make()
 def api_vault_submit(ctx, coll):
@@ -330,7 +340,7 @@ def vault_write_license(ctx, vault_pkg_coll):
             try:
                 ctx.iiCopyACLsFromParent(license_file, 'default')
             except Exception as e:
-                log.write(ctx, "rule_vault_write_license: Failed to set vault permissions on <{}>".format(license_file))
+                log.error(ctx, "rule_vault_write_license: Failed to set vault permissions on <{}>".format(license_file))
         else:
             log.write(ctx, "rule_vault_write_license: License text not available for <{}>".format(license))
 
@@ -451,7 +461,7 @@ def get_coll_vault_status(ctx, path, org_metadata=None):
         try:
             return constants.vault_package_state(x)
         except Exception as e:
-            log.write(ctx, 'Invalid vault folder status <{}>'.format(x))
+            log.warning(ctx, 'Invalid vault folder status <{}>'.format(x))
 
     return constants.vault_package_state.EMPTY
 
@@ -568,119 +578,202 @@ def api_vault_get_publication_terms(ctx):
         return api.Error('TermsReadFailed', 'Could not open Terms and Agreements.')
 
 
-def copy_folder_to_vault(ctx, folder, target):
-    """Copy folder and all its contents to target in vault.
+def ingest_listing(ctx, coll):
+    """Get the subcollections and data objects of a collection, recursively.
+
+    :param ctx:  Combined type of a callback and rei struct
+    :param coll: Path of a collection
+
+    :returns: Tuple of a sorted list of paths of subcollections relative to coll, and
+              a dict of paths of data objects relative to coll to a list of (size, checksum) of their replicas
+    """
+    prefix = coll + '/'
+
+    # Collection names with LIKE wildcards (_, %) may match more than the collection.
+    collections = [name[len(prefix):] for name in query.Query(ctx, "COLL_NAME", "COLL_NAME like '{}%'".format(prefix))
+                   if name.startswith(prefix)]
+
+    objects = {}
+    for coll_name, name, size, checksum in query.Query(ctx, "COLL_NAME, DATA_NAME, DATA_SIZE, DATA_CHECKSUM",
+                                                       "COLL_NAME = '{}' || like '{}%'".format(coll, prefix)):
+        if coll_name == coll:
+            path = name
+        elif coll_name.startswith(prefix):
+            path = coll_name[len(prefix):] + '/' + name
+        else:
+            continue
+        objects.setdefault(path, []).append((int(size), checksum))
+
+    return sorted(collections), objects
 
-    The data will reside onder folder '/original' within the vault.
+
+def ingest_identical(ctx, path, source, copy):
+    """Check whether a data object was copied to the vault before.
 
     :param ctx:    Combined type of a callback and rei struct
-    :param folder: Path of a folder in the research space
-    :param target: Path of a package in the vault space
+    :param path:   Path of the data object in the research space
+    :param source: List of (size, checksum) of the replicas of the data object
+    :param copy:   List of (size, checksum) of the replicas of the copy in the vault, or None
 
-    :raises Exception: Raises exception when treewalk_and_ingest did not finish correctly
+    :returns: Boolean indicating whether the copy has the same size and checksum as the data object
     """
-    destination = target + '/original'
-    origin = folder
+    if not copy or any(size != source[0][0] for size, _ in copy):
+        return False
 
-    # Origin is a never changing value to be able to designate a relative path within ingest_object
-    error = 0  # Initial error state. Should stay 0.
-    if treewalk_and_ingest(ctx, folder, destination, origin, error):
-        raise Exception('copy_folder_to_vault: Error copying folder to vault')
+    checksum = next((checksum for _, checksum in source if checksum), None)
+    if checksum is None:
+        try:
+            checksum = msi.data_obj_chksum(ctx, path, '', '')['arguments'][2]
+        except msi.Error:
+            return False
+
+    return checksum in [x for _, x in copy]
 
 
-def treewalk_and_ingest(ctx, folder, target, origin, error):
-    """Treewalk folder and ingest.
+def ingest_access(ctx, folder):
+    """Get the access that the client user has directly on a research folder and its contents.
 
     :param ctx:    Combined type of a callback and rei struct
-    :param folder: Will change every time as it represents every folder that has to be copied to vault
-    :param target: Target of ingest
-    :param origin: Origin of treewalk
-    :param error:  0/1 indicating if treewalk or ingest failed
+    :param folder: Path of a folder in the research space
 
-    :returns: Error status (which should remain 0 for further processing in iterative manner)
+    :returns: Dict of path to access name (e.g. 'read object'), of the items with direct access
     """
-    parent_coll, coll = pathutil.chop(folder)
+    prefix  = folder + '/'
+    user_id = query.Query(ctx, "USER_ID", "USER_NAME = '{}' AND USER_ZONE = '{}'"
+                                          .format(user.name(ctx), user.zone(ctx))).first()
+    access  = {}
 
-    # 1. Process this collection itself as a collection.
-    # INGEST
-    if error == 0:
-        # INGEST COLLECTION
-        error = ingest_object(ctx, parent_coll, coll, True, target, origin)
+    for coll, level in query.Query(ctx, "COLL_NAME, COLL_ACCESS_NAME",
+                                   "COLL_NAME = '{}' || like '{}%' AND COLL_ACCESS_USER_ID = '{}'"
+                                   .format(folder, prefix, user_id)):
+        access[coll] = level
 
-    # 2. Process dataobjects located directly within the collection
-    if error == 0:
-        iter = genquery.row_iterator(
-            "DATA_NAME",
-            "COLL_NAME = '" + folder + "'",
-            genquery.AS_LIST, ctx
-        )
-        for row in iter:
-            # INGEST OBJECT
-            error = ingest_object(ctx, folder, row[0], False, target, origin)
-            if error:
-                break
-
-    if error == 0:
-        # 3. Process the subfolders
-        # Loop through subfolders which have folder as parent folder
-        iter = genquery.row_iterator(
-            "COLL_NAME",
-            "COLL_PARENT_NAME = '" + folder + "'",
-            genquery.AS_LIST, ctx
-        )
-        for row in iter:
-            error = treewalk_and_ingest(ctx, row[0], target, origin, error)
-            if error:
-                break
+    for coll, name, level in query.Query(ctx, "COLL_NAME, DATA_NAME, DATA_ACCESS_NAME",
+                                         "COLL_NAME = '{}' || like '{}%' AND DATA_ACCESS_USER_ID = '{}'"
+                                         .format(folder, prefix, user_id)):
+        access[coll + '/' + name] = level
 
-    return error
+    return dict((path, level) for path, level in access.items() if path == folder or path.startswith(prefix))
 
 
-def ingest_object(ctx, parent, item, item_is_collection, destination, origin):
-    source_path = parent + "/" + item
-    read_access = msi.check_access(ctx, source_path, 'read object', irods_types.BytesBuf())['arguments'][2]
+def copy_folder_to_vault(ctx, folder, target):
+    """Copy folder and all its contents to target in vault.
 
-    if read_access != b'\x01':
-        try:
-            msi.set_acl(ctx, "default", "admin:read", user.full_name(ctx), source_path)
-        except msi.Error as e:
-            return 1
+    The data will reside onder folder '/original' within the vault.
 
-    dest_path = destination
+    The contents of the folder are listed with a few recursive queries. The
+    collection tree is created first, in sorted order, after which the data
+    objects are copied. When the client user cannot read all of the folder,
+    read access is granted on the whole folder at once, and revoked afterwards.
 
-    if source_path != origin:
-        markIncomplete = False
-        # rewrite path to copy objects that are located underneath the toplevel collection
-        source_length = len(source_path)
-        relative_path = source_path[len(origin) + 1: source_length]
-        dest_path = destination + '/' + relative_path
-    else:
-        markIncomplete = True
+    Progress is recorded on the vault package. When copying is retried after
+    a failure, data objects that were copied completely before are skipped.
 
-    if item_is_collection:
-        # CREATE COLLECTION
-        try:
-            msi.coll_create(ctx, dest_path, '', irods_types.BytesBuf())
-        except msi.Error as e:
-            return 1
+    :param ctx:    Combined type of a callback and rei struct
+    :param folder: Path of a folder in the research space
+    :param target: Path of a package in the vault space
 
-        if markIncomplete:
-            avu.set_on_coll(ctx, dest_path, constants.IIVAULTSTATUSATTRNAME, constants.vault_package_state.INCOMPLETE)
-    else:
-        # CREATE COPY OF DATA OBJECT
+    :raises Exception: Raises exception when the folder could not be copied completely
+    """
+    destination = target + '/original'
+    collections, objects = ingest_listing(ctx, folder)
+    access = ingest_access(ctx, folder)
+    grant  = any(access.get(folder + ('/' + path if path else '')) not in INGEST_READ_ACCESS
+                 for path in [''] + collections + sorted(objects))
+
+    # Only list what was copied before when retrying.
+    resume = query.Query(ctx, "META_COLL_ATTR_VALUE", "COLL_NAME = '{}' AND META_COLL_ATTR_NAME = '{}'"
+                                                      .format(target, constants.IIVAULTINGESTPROGRESS)).first()
+    copied_collections, copied = ingest_listing(ctx, destination) if resume else ([], {})
+
+    full_name = user.full_name(ctx)
+    if grant:
         try:
-            # msi.data_obj_copy(ctx, source_path, dest_path, '', irods_types.BytesBuf())
-            ctx.msiDataObjCopy(source_path, dest_path, 'verifyChksum=', 0)
+            msi.set_acl(ctx, 'recursive', 'admin:read', full_name, folder)
         except msi.Error as e:
-            return 1
+            raise Exception('copy_folder_to_vault: Failed to acquire read access to {}: {}'.format(folder, e))
 
-    if read_access != b'\x01':
-        try:
-            msi.set_acl(ctx, "default", "admin:null", user.full_name(ctx), source_path)
-        except msi.Error as e:
-            return 1
+    try:
+        plan = [path for path in sorted(objects)
+                if not ingest_identical(ctx, folder + '/' + path, objects[path], copied.get(path))]
+        done = len(objects) - len(plan)
+        if resume:
+            log.write(ctx, 'copy_folder_to_vault: Resuming copy of {} to {}, {} of {} data objects copied before'
+                           .format(folder, target, done, len(objects)))
+        avu.set_on_coll(ctx, target, constants.IIVAULTINGESTPROGRESS, '{}/{}'.format(done, len(objects)))
+
+        # The root collection of the vault package is marked incomplete until the last step in FolderSecure.
+        msi.coll_create(ctx, destination, '1', irods_types.BytesBuf())
+        avu.set_on_coll(ctx, destination, constants.IIVAULTSTATUSATTRNAME, constants.vault_package_state.INCOMPLETE)
+
+        for path in collections:
+            if path not in copied_collections:
+                msi.coll_create(ctx, destination + '/' + path, '1', irods_types.BytesBuf())
+
+        for path in plan:
+            # Overwrite incomplete or outdated copies.
+            # Copy as the rule language does, msi.data_obj_copy did not properly copy large files to the vault.
+            ctx.msiDataObjCopy(folder + '/' + path, destination + '/' + path,
+                               'verifyChksum={}'.format('++++forceFlag=' if path in copied else ''), 0)
+            done += 1
+            if done % INGEST_PROGRESS_INTERVAL == 0:
+                avu.set_on_coll(ctx, target, constants.IIVAULTINGESTPROGRESS, '{}/{}'.format(done, len(objects)))
+    except (msi.Error, RuntimeError) as e:
+        raise Exception('copy_folder_to_vault: Error copying {} to vault: {}'.format(folder, e))
+    finally:
+        if grant:
+            # Revoke read access, and restore access that the client user had before.
+            # A failure must neither hide an error of the copy nor stop the remaining restores.
+            changes = [('recursive', 'null', folder)]
+            changes += [('default', INGEST_ACCESS_NAMES.get(level, level), path) for path, level in sorted(access.items())]
+            for recursive, level, path in changes:
+                try:
+                    msi.set_acl(ctx, recursive, 'admin:' + level, full_name, path)
+                except msi.Error as e:
+                    log.error(ctx, 'copy_folder_to_vault: Could not set {} access on {}: {}'.format(level, path, e))
+
+    avu.rmw_from_coll(ctx, target, constants.IIVAULTINGESTPROGRESS, '%')
+
+
+def copy_folder_to_vault_failed(ctx, folder, target):
+    """Mark a folder for retrying to copy it to its vault package.
+
+    :param ctx:    Combined type of a callback and rei struct
+    :param folder: Path of a folder in the research space
+    :param target: Path of a package in the vault space
+    """
+    modify_access = msi.check_access(ctx, folder, 'modify object', irods_types.BytesBuf())['arguments'][2]
+    try:
+        if modify_access != b'\x01':
+            msi.set_acl(ctx, "default", "admin:write", user.full_name(ctx), folder)
+
+        avu.set_on_coll(ctx, folder, constants.UUORGMETADATAPREFIX + "cronjob_copy_to_vault", constants.CRONJOB_STATE['RETRY'])
+        avu.set_on_coll(ctx, folder, constants.IICOPYPARAMSNAME, target)
+
+        if modify_access != b'\x01':
+            msi.set_acl(ctx, "default", "admin:null", user.full_name(ctx), folder)
+    except msi.Error as e:
+        log.error(ctx, "Could not mark <{}> for retrying copy to vault: {}".format(folder, e))
+
+
+@rule.make(inputs=[0, 1], outputs=[2])
+def rule_vault_copy_folder_to_vault(ctx, folder, target):
+    """Copy folder and all its contents to target in vault.
+
+    :param ctx:    Combined type of a callback and rei struct
+    :param folder: Path of a folder in the research space
+    :param target: Path of a package in the vault space
+
+    :returns: '0' when no error occurred, the folder is marked for retry otherwise
+    """
+    try:
+        copy_folder_to_vault(ctx, folder, target)
+    except Exception as e:
+        log.error(ctx, str(e))
+        copy_folder_to_vault_failed(ctx, folder, target)
+        return '1'
 
-    return 0
+    return '0'
 
 
 def set_vault_permissions(ctx, group_name, folder, target):
@@ -733,7 +826,7 @@ def set_vault_permissions(ctx, group_name, folder, target):
                 msi.set_acl(ctx, "default", "admin:read", group_name, vault_path)
                 log.write(ctx, "Granted " + group_name + " read access to " + vault_path)
             except msi.Error as e:
-                log.write(ctx, "Failed to grant " + group_name + " read access to " + vault_path)
+                log.error(ctx, "Failed to grant " + group_name + " read access to " + vault_path)
 
     # Check if vault group has ownership
     iter = genquery.row_iterator(
@@ -926,7 +1019,7 @@ def vault_request_status_transitions(ctx, coll, new_vault_status):
 
     actor_group = folder.collection_group_name(ctx, coll)
     if actor_group == '':
-        log.write(ctx, "Cannot determine which research group " + coll + " belongs to")
+        log.error(ctx, "Cannot determine which research group " + coll + " belongs to")
         return ['1', '']
 
     is_datamanager = meta_form.user_member_type(ctx, 'datamanager-' + category, actor) in ['normal', 'manager']
@@ -390,12 +390,12 @@ def iiCheckVaultMetadataXmlForTransformationToJsonBatch(callback, rods_zone, col
                 data_name = metadataXmlPath.split('/')[-1]
 
                 if data_name == "":
-                    log.write(callback, 'ERROR: Could not determine vault XML path for collection {}'.format(vault_collection))
+                    log.error(callback, 'Could not determine vault XML path for collection {}'.format(vault_collection))
                 else:
                     transformVaultMetadataXmlToJson(callback, rods_zone, vault_collection, group_name, data_name)
 
         except Exception as e:
-            log.write(callback, str(e))
+            log.error(callback, str(e))
             pass
 
         # Sleep briefly between checks.